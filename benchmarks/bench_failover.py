@@ -0,0 +1,280 @@
+"""
+故障切换基准
+
+用模拟的内核进程测量“当前节点劣化 → 隧道恢复可用”的耗时：
+  - 若干本地 TCP 监听端口充当节点；关闭某个端口即模拟该节点故障
+  - 模拟内核（独立 Python 进程）读取 config.json，在 socks 入站端口提供 SOCKS5，
+    只有 proxy 出站对应的节点可连接时才转发请求，节点失效后断开已有隧道
+  - 本地 http.server 作为探测地址
+  - HealthMonitor + FailoverController 按真实流程探测、判定、选点、写配置，再重启模拟内核
+
+输出每轮的检测耗时、选点耗时、重启耗时和总耗时。
+
+用法（在仓库根目录）：
+    python benchmarks/bench_failover.py [--nodes 20] [--rounds 5] [--interval 0.2]
+"""
+import argparse
+import asyncio
+import http.server
+import itertools
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.failover import FailoverController, FailoverPolicy  # noqa: E402
+from core.health_monitor import HealthMonitor, ProxyHttpClient  # noqa: E402
+from core.latency_probe import LatencyProber  # noqa: E402
+
+STUB_CORE = r'''
+import json, socket, struct, sys, threading, time
+
+config = json.load(open(sys.argv[1]))
+port = next(ib["port"] for ib in config["inbounds"] if ib["protocol"] == "socks")
+proxy = next(ob for ob in config["outbounds"] if ob["tag"] == "proxy")
+server = (proxy["settings"].get("servers") or proxy["settings"]["vnext"])[0]
+node = (server["address"], server["port"])
+tunnels = set()
+
+def node_alive():
+    try:
+        socket.create_connection(node, 0.5).close()
+        return True
+    except OSError:
+        return False
+
+def watchdog():
+    while True:
+        time.sleep(0.05)
+        if not node_alive():
+            for s in list(tunnels):
+                s.close()
+
+def pipe(a, b):
+    try:
+        while True:
+            data = a.recv(65536)
+            if not data:
+                break
+            b.sendall(data)
+    except OSError:
+        pass
+    finally:
+        for s in (a, b):
+            try:
+                s.close()
+            except OSError:
+                pass
+
+def handle(c):
+    try:
+        c.recv(3)
+        c.sendall(b"\x05\x00")
+        c.recv(4)
+        host = c.recv(c.recv(1)[0]).decode()
+        target = (host, struct.unpack("!H", c.recv(2))[0])
+        if not node_alive():
+            c.sendall(b"\x05\x05\x00\x01" + bytes(6))
+            c.close()
+            return
+        up = socket.create_connection(target, 2)
+        c.sendall(b"\x05\x00\x00\x01" + bytes(6))
+    except (OSError, IndexError):
+        c.close()
+        return
+    tunnels.update((c, up))
+    threading.Thread(target=pipe, args=(up, c), daemon=True).start()
+    pipe(c, up)
+
+listener = socket.socket()
+listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+listener.bind(("127.0.0.1", port))
+listener.listen(64)
+threading.Thread(target=watchdog, daemon=True).start()
+while True:
+    conn, _ = listener.accept()
+    threading.Thread(target=handle, args=(conn,), daemon=True).start()
+'''
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+# 127.0.0.1 会被当作占位地址忽略，节点使用另一个回环地址
+NODE_HOST = "127.0.0.2"
+
+
+class _Node:
+    """一个模拟节点：接受连接后立即关闭。"""
+
+    def __init__(self):
+        self.sock = socket.socket()
+        self.sock.bind((NODE_HOST, 0))
+        self.sock.listen(64)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        try:
+            while True:
+                conn, _ = self.sock.accept()
+                conn.close()
+        except OSError:
+            pass
+
+    def kill(self):
+        # shutdown 才能唤醒阻塞在 accept() 的线程并立即停止监听
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class _Context:
+    """基准中代替 JobContext：只提供 failover 用到的接口。"""
+
+    def progress(self, message: str) -> None:
+        pass
+
+    async def run_blocking(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: func(*args, **kwargs))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class _Core:
+    def __init__(self, stub: str, config_path: str, socks_port: int):
+        self.stub = stub
+        self.config_path = config_path
+        self.socks_port = socks_port
+        self.proc = None
+
+    def restart(self) -> None:
+        if self.proc is not None:
+            self.proc.kill()
+            self.proc.wait()
+        self.proc = subprocess.Popen([sys.executable, self.stub, self.config_path])
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", self.socks_port), 0.2).close()
+                return
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError("模拟内核未能启动")
+
+    def stop(self) -> None:
+        if self.proc is not None:
+            self.proc.kill()
+            self.proc.wait()
+
+
+async def run(args) -> None:
+    workdir = tempfile.mkdtemp(prefix="ov2n-failover-")
+    stub = os.path.join(workdir, "stub_core.py")
+    with open(stub, "w") as f:
+        f.write(STUB_CORE)
+
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{httpd.server_address[1]}/generate_204"
+
+    nodes = [_Node() for _ in range(args.nodes)]
+    socks_port = _free_port()
+    config = {
+        "inbounds": [{"listen": "127.0.0.1", "port": socks_port, "protocol": "socks",
+                      "tag": "socks-in"}],
+        "outbounds": [
+            {"tag": "proxy" if i == 0 else f"node-{i}", "protocol": "shadowsocks",
+             "settings": {"servers": [{"address": NODE_HOST, "port": n.port,
+                                       "method": "aes-256-gcm", "password": "x"}]}}
+            for i, n in enumerate(nodes)
+        ] + [{"tag": "direct", "protocol": "freedom"}],
+    }
+    config_path = os.path.join(workdir, "config.json")
+    with open(config_path, "w") as f:
+        json.dump(config, f)
+
+    core = _Core(stub, config_path, socks_port)
+    core.restart()
+    # 模拟链路上一直有流量：探测间隔保持在基础间隔，不做空闲退避
+    traffic = itertools.count(0, 10 * 1024 * 1024)
+    monitor = HealthMonitor(ProxyHttpClient("socks", ("127.0.0.1", socks_port), url, timeout=1.0),
+                            activity=lambda: next(traffic), base_interval=args.interval)
+    policy = FailoverPolicy(fail_after=args.fail_after, cooldown=0,
+                            suspect_interval=args.interval)
+    controller = FailoverController(monitor, config_path, policy=policy,
+                                    prober=LatencyProber(timeout=0.5))
+    ctx = _Context()
+    loop = asyncio.get_running_loop()
+    by_port = {n.port: n for n in nodes}
+
+    print(f"{args.nodes} 个节点，探测间隔 {args.interval}s，连续 {args.fail_after} 次失败判定劣化")
+    print(f"{'轮次':<4} {'检测':>8} {'选点':>8} {'重启':>8} {'总计':>8}")
+    totals = []
+    try:
+        for round_no in range(1, args.rounds + 1):
+            sample = await loop.run_in_executor(None, monitor.check)
+            assert sample.ok, sample.error
+            current = json.load(open(config_path))["outbounds"][0]
+            by_port[current["settings"]["servers"][0]["port"]].kill()
+
+            degraded_at = time.perf_counter()
+            while True:
+                sample = await loop.run_in_executor(None, monitor.check)
+                if controller.observe(sample):
+                    break
+                await asyncio.sleep(controller.next_delay())
+            detected = time.perf_counter()
+            if not await controller.fail_over(ctx):
+                print("没有可用的备用节点")
+                break
+            selected = time.perf_counter()
+            await loop.run_in_executor(None, core.restart)
+            while not (await loop.run_in_executor(None, monitor.check)).ok:
+                await asyncio.sleep(0.05)
+            recovered = time.perf_counter()
+            totals.append(recovered - degraded_at)
+            print(f"{round_no:<6} {detected - degraded_at:7.2f}s {selected - detected:7.2f}s "
+                  f"{recovered - selected:7.2f}s {recovered - degraded_at:7.2f}s")
+    finally:
+        core.stop()
+        httpd.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+    if totals:
+        print(f"平均 {sum(totals) / len(totals):.2f}s，最长 {max(totals):.2f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--interval", type=float, default=0.2)
+    parser.add_argument("--fail-after", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
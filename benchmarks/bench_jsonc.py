@@ -0,0 +1,96 @@
+"""
+JSONC 解析微基准
+
+生成数 MB 的 xray 风格配置（大量 outbounds 与路由规则），比较：
+  - json.loads                 标准 JSON 基线
+  - jsonc.loads（标准 JSON）    快速路径，应与基线持平
+  - jsonc.loads（含注释/尾逗号） 单遍预处理 + 解析
+  - 旧实现：整行 // 正则替换后 json.loads（无论有无注释都要多扫一遍）
+
+用法（在仓库根目录）：
+    python benchmarks/bench_jsonc.py [--mb 4] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import jsonc  # noqa: E402
+
+_LEGACY_RE = re.compile(r'(?m)^\s*//.*$')
+
+
+def build_config(target_mb: float) -> dict:
+    outbounds, rules = [], []
+    i = 0
+    while True:
+        outbounds.append({
+            "tag": f"ss-{i}", "protocol": "shadowsocks",
+            "settings": {"servers": [{"address": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}",
+                                      "port": 8388 + i % 1000,
+                                      "method": "chacha20-ietf-poly1305",
+                                      "password": f"pw-{i}-//not-a-comment"}]},
+        })
+        rules.append({"type": "field", "domain": [f"domain:site{i}.example.com"],
+                      "outboundTag": f"ss-{i}"})
+        i += 1
+        if i % 2000 == 0 and len(json.dumps(outbounds)) + len(json.dumps(rules)) > target_mb * 1024 * 1024:
+            break
+    return {"log": {"loglevel": "warning"}, "outbounds": outbounds,
+            "routing": {"rules": rules}}
+
+
+def to_jsonc(plain: str) -> str:
+    """在缩进文本中加入行注释、行尾注释、块注释和尾随逗号。"""
+    lines = []
+    for n, line in enumerate(plain.splitlines()):
+        if n % 50 == 0:
+            lines.append("  // comment line")
+        if line.rstrip().endswith(("}", "]", '"')) and n % 7 == 0:
+            line += ",  /* trailing */" if not line.rstrip().endswith(",") else ""
+        elif n % 13 == 0:
+            line += "  // tail"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def bench(label: str, func, text: str, repeat: int) -> None:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - t0)
+    mb = len(text) / 1024 / 1024
+    print(f"{label:<34} {best * 1000:8.1f} ms   {mb / best:7.1f} MB/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=float, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    plain = json.dumps(build_config(args.mb), indent=2)
+    commented = to_jsonc(plain)
+    try:
+        jsonc.loads(commented)
+    except json.JSONDecodeError:
+        # 生成器在不合法的位置加了逗号时直接退回只含注释的版本
+        commented = "\n".join(l + "  // tail" if i % 13 == 0 else l
+                              for i, l in enumerate(plain.splitlines()))
+
+    print(f"plain: {len(plain) / 1024 / 1024:.1f} MB, jsonc: {len(commented) / 1024 / 1024:.1f} MB")
+    bench("json.loads (plain)", json.loads, plain, args.repeat)
+    bench("jsonc.loads (plain, fast path)", jsonc.loads, plain, args.repeat)
+    bench("jsonc.loads (comments, commas)", jsonc.loads, commented, args.repeat)
+    bench("jsonc.strip_jsonc only", jsonc.strip_jsonc, commented, args.repeat)
+    bench("legacy regex + json.loads (plain)",
+          lambda t: json.loads(_LEGACY_RE.sub("", t)), plain, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
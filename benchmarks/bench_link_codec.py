@@ -0,0 +1,106 @@
+"""
+分享链接编解码微基准
+
+生成 ss（明文 / base64 userinfo / 旧格式）、vmess、vless（ws+tls / reality）、trojan
+混合链接，单线程测量：
+  - link_codec.parse_links      批量解析（目标 > 10k 条/秒）
+  - ProxyLink.to_link           编码回分享链接
+  - ProxyLink.to_outbound       转换为 xray outbound
+  - SSUrlParser.parse           ss 链接（旧实现逐条打印调试信息）
+
+用法（在仓库根目录）：
+    python benchmarks/bench_link_codec.py [--count 20000] [--repeat 5]
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import link_codec  # noqa: E402
+
+
+def _b64(text: str) -> str:
+    return base64.b64encode(text.encode()).decode()
+
+
+def build_links(count: int) -> list:
+    links = []
+    for i in range(count):
+        host = f"node{i}.example.com"
+        port = 10000 + i % 50000
+        kind = i % 7
+        if kind == 0:
+            links.append(f"ss://chacha20-ietf-poly1305:pw{i}@{host}:{port}#SS%20{i}")
+        elif kind == 1:
+            userinfo = base64.urlsafe_b64encode(f"aes-256-gcm:pw{i}".encode()).decode().rstrip("=")
+            links.append(f"ss://{userinfo}@{host}:{port}#SS-b64-{i}")
+        elif kind == 2:
+            links.append(f"ss://{_b64(f'aes-128-gcm:pw{i}@{host}:{port}')}#legacy-{i}")
+        elif kind == 3:
+            links.append("vmess://" + _b64(json.dumps({
+                "v": "2", "ps": f"vmess-{i}", "add": host, "port": str(port),
+                "id": f"b831381d-6324-4d53-ad4f-{i:012d}", "aid": "0", "net": "ws",
+                "type": "none", "host": host, "path": "/ray", "tls": "tls"})))
+        elif kind == 4:
+            links.append(f"vless://b831381d-6324-4d53-ad4f-{i:012d}@{host}:{port}"
+                         f"?encryption=none&security=tls&type=ws&host={host}&path=%2Fws"
+                         f"&sni={host}#vless-ws-{i}")
+        elif kind == 5:
+            links.append(f"vless://b831381d-6324-4d53-ad4f-{i:012d}@{host}:443"
+                         f"?encryption=none&flow=xtls-rprx-vision&security=reality"
+                         f"&sni=www.example.com&fp=chrome&pbk=abcdEFGH{i}&sid=6ba85179"
+                         f"&type=tcp#vless-reality-{i}")
+        else:
+            links.append(f"trojan://pass{i}@{host}:{port}?sni={host}&type=grpc"
+                         f"&serviceName=grpc{i}#trojan-{i}")
+    return links
+
+
+def bench(label: str, func, items: list, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(items)
+        best = min(best, time.perf_counter() - t0)
+    rate = len(items) / best
+    print(f"{label:<28} {best * 1000:8.1f} ms   {rate:10,.0f} 条/秒")
+    return rate
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    links = build_links(args.count)
+    nodes, errors = link_codec.parse_links(links)
+    if errors:
+        raise SystemExit(f"解析失败 {len(errors)} 条: {errors[:3]}")
+    # 往返校验：编码后再解析应得到相同的服务器和凭据
+    for node in nodes[:700]:
+        again = link_codec.parse_link_strict(node.to_link())
+        assert (again.protocol, again.address, again.port, again.settings, again.name) == \
+            (node.protocol, node.address, node.port, node.settings, node.name), node
+
+    print(f"{len(links)} 条混合链接（ss/vmess/vless/trojan）")
+    rate = bench("parse_links", link_codec.parse_links, links, args.repeat)
+    bench("ProxyLink.to_link", lambda ns: [n.to_link() for n in ns], nodes, args.repeat)
+    bench("ProxyLink.to_outbound", lambda ns: [n.to_outbound() for n in ns], nodes, args.repeat)
+    try:
+        from core.ss_config_manager import SSUrlParser
+    except ImportError as e:  # 依赖 PyQt5
+        print(f"SSUrlParser 跳过: {e}")
+    else:
+        ss_links = [l for l in links if l.startswith("ss://")]
+        bench("SSUrlParser.parse (ss)", lambda ls: [SSUrlParser.parse(l) for l in ls],
+              ss_links, args.repeat)
+    print("目标 10,000 条/秒:", "达到" if rate >= 10000 else "未达到")
+
+
+if __name__ == "__main__":
+    main()
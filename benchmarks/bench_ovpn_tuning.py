@@ -0,0 +1,220 @@
+"""
+OpenVPN 调优基准
+
+在本机两个 network namespace 之间建立真实的 OpenVPN 隧道，比较各性能档位的吞吐：
+  - ov2n-bench-c（客户端）与 ov2n-bench-s（服务端）通过 veth 相连，
+    --link-mtu 设置 veth 的 MTU（模拟较小的路径 MTU），--delay 用 netem 给链路加延迟
+  - openssl 生成临时 CA 和证书，服务端为 p2p TLS 模式（tls-server + ifconfig）
+  - 客户端配置经 ovpn_tuning.build_overlay() 追加各档位的调优指令
+    （路径 MTU 按 --link-mtu 计算，AES 指令按本机 CPU 判断），服务端保持默认
+  - 每个档位重新启动两端，隧道建立后在隧道内用 TCP 发送 --seconds 秒数据，分别测上行和下行
+
+需要 root 以及 openvpn、openssl、ip（--delay 另需 tc）。
+
+用法（在仓库根目录）：
+    sudo python benchmarks/bench_ovpn_tuning.py [--seconds 5] [--link-mtu 1500] [--delay 0]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.ovpn_profile import parse_profile  # noqa: E402
+from core.ovpn_tuning import TUNINGS, build_overlay, has_aes_instructions, render_overlay  # noqa: E402
+from core.perf_profiles import PROFILE_NONE  # noqa: E402
+
+NS_CLIENT = "ov2n-bench-c"
+NS_SERVER = "ov2n-bench-s"
+LINK_CLIENT, LINK_SERVER = "10.98.0.2", "10.98.0.1"
+TUN_CLIENT, TUN_SERVER = "10.99.0.2", "10.99.0.1"
+OVPN_PORT = 1194
+DATA_PORT = 5201
+CONNECT_TIMEOUT = 20.0
+
+SERVER_CONF = f"""dev tun
+proto udp
+port {OVPN_PORT}
+ifconfig {TUN_SERVER} {TUN_CLIENT}
+tls-server
+dh none
+ca ca.crt
+cert server.crt
+key server.key
+verb 3
+"""
+
+CLIENT_CONF = f"""dev tun
+proto udp
+remote {LINK_SERVER} {OVPN_PORT}
+nobind
+ifconfig {TUN_CLIENT} {TUN_SERVER}
+tls-client
+ca ca.crt
+cert client.crt
+key client.key
+verb 3
+"""
+
+SINK = r'''
+import socket, sys, time
+srv = socket.socket()
+srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+srv.bind((sys.argv[1], int(sys.argv[2])))
+srv.listen(1)
+print("ready", flush=True)
+conn, _ = srv.accept()
+total, started = 0, None
+while True:
+    data = conn.recv(1 << 20)
+    if not data:
+        break
+    if started is None:
+        started = time.monotonic()
+    total += len(data)
+print(total, time.monotonic() - started if started else 0.0, flush=True)
+'''
+
+SOURCE = r'''
+import socket, sys, time
+sock = socket.create_connection((sys.argv[1], int(sys.argv[2])), timeout=10)
+chunk = b"x" * 65536
+deadline = time.monotonic() + float(sys.argv[3])
+while time.monotonic() < deadline:
+    sock.sendall(chunk)
+sock.close()
+'''
+
+
+def run(*cmd: str) -> None:
+    subprocess.run(cmd, check=True, capture_output=True)
+
+
+def netns(ns: str, *cmd: str):
+    return ["ip", "netns", "exec", ns, *cmd]
+
+
+def setup_network(link_mtu: int, delay_ms: float) -> None:
+    for ns in (NS_CLIENT, NS_SERVER):
+        run("ip", "netns", "add", ns)
+        run("ip", "-n", ns, "link", "set", "lo", "up")
+    run("ip", "link", "add", "ov2n-veth-c", "netns", NS_CLIENT,
+        "type", "veth", "peer", "name", "ov2n-veth-s", "netns", NS_SERVER)
+    for ns, dev, addr in ((NS_CLIENT, "ov2n-veth-c", LINK_CLIENT),
+                          (NS_SERVER, "ov2n-veth-s", LINK_SERVER)):
+        run("ip", "-n", ns, "addr", "add", f"{addr}/24", "dev", dev)
+        run("ip", "-n", ns, "link", "set", dev, "mtu", str(link_mtu), "up")
+        if delay_ms:
+            run(*netns(ns, "tc", "qdisc", "add", "dev", dev, "root",
+                       "netem", "delay", f"{delay_ms / 2}ms"))
+
+
+def teardown_network() -> None:
+    for ns in (NS_CLIENT, NS_SERVER):
+        subprocess.run(["ip", "netns", "del", ns], capture_output=True)
+
+
+def make_certs(workdir: str) -> None:
+    curve = ["-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1", "-nodes"]
+    run("openssl", "req", "-x509", *curve, "-keyout", f"{workdir}/ca.key",
+        "-out", f"{workdir}/ca.crt", "-days", "1", "-subj", "/CN=ov2n-bench-ca")
+    for name in ("server", "client"):
+        run("openssl", "req", *curve, "-keyout", f"{workdir}/{name}.key",
+            "-out", f"{workdir}/{name}.csr", "-subj", f"/CN={name}")
+        run("openssl", "x509", "-req", "-in", f"{workdir}/{name}.csr",
+            "-CA", f"{workdir}/ca.crt", "-CAkey", f"{workdir}/ca.key", "-CAcreateserial",
+            "-out", f"{workdir}/{name}.crt", "-days", "1")
+
+
+def start_openvpn(workdir: str, ns: str, name: str, text: str) -> subprocess.Popen:
+    conf = os.path.join(workdir, f"{name}.conf")
+    with open(conf, "w", encoding="utf-8") as f:
+        f.write(text)
+    with open(os.path.join(workdir, f"{name}.log"), "w") as log:
+        return subprocess.Popen(netns(ns, "openvpn", "--cd", workdir, "--config", conf),
+                                stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_connected(workdir: str, name: str, timeout: float = CONNECT_TIMEOUT) -> bool:
+    path = os.path.join(workdir, f"{name}.log")
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            if "Initialization Sequence Completed" in f.read():
+                return True
+        time.sleep(0.2)
+    return False
+
+
+def measure(sink_ns: str, sink_addr: str, source_ns: str, seconds: float) -> float:
+    """从 source_ns 向 sink_ns 发送 seconds 秒数据，返回吞吐（Mbit/s）。"""
+    sink = subprocess.Popen(netns(sink_ns, sys.executable, "-c", SINK, sink_addr, str(DATA_PORT)),
+                            stdout=subprocess.PIPE, text=True)
+    try:
+        sink.stdout.readline()
+        subprocess.run(netns(source_ns, sys.executable, "-c", SOURCE,
+                             sink_addr, str(DATA_PORT), str(seconds)), check=True)
+        total, elapsed = sink.stdout.readline().split()
+    finally:
+        sink.kill()
+        sink.wait()
+    return int(total) * 8 / float(elapsed) / 1e6 if float(elapsed) else 0.0
+
+
+def bench_profile(workdir: str, name: str, seconds: float, path_mtu: int,
+                  aes) -> tuple:
+    changes = build_overlay(parse_profile(CLIENT_CONF), name, path_mtu, aes)
+    server = start_openvpn(workdir, NS_SERVER, "server", SERVER_CONF)
+    client = start_openvpn(workdir, NS_CLIENT, "client",
+                           CLIENT_CONF + render_overlay(changes, name))
+    try:
+        if not wait_connected(workdir, "client"):
+            raise RuntimeError(f"隧道未建立，见 {workdir}/client.log")
+        up = measure(NS_SERVER, TUN_SERVER, NS_CLIENT, seconds)
+        down = measure(NS_CLIENT, TUN_CLIENT, NS_SERVER, seconds)
+    finally:
+        for proc in (client, server):
+            proc.terminate()
+            proc.wait()
+    return changes, up, down
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--link-mtu", type=int, default=1500)
+    parser.add_argument("--delay", type=float, default=0.0, help="链路往返延迟（毫秒）")
+    args = parser.parse_args()
+
+    if os.geteuid() != 0:
+        sys.exit("需要 root 权限（创建 network namespace）")
+    missing = [b for b in ("openvpn", "openssl", "ip") + (("tc",) if args.delay else ())
+               if shutil.which(b) is None]
+    if missing:
+        sys.exit(f"缺少命令: {', '.join(missing)}")
+
+    aes = has_aes_instructions()
+    path_mtu = args.link_mtu - 28
+    workdir = tempfile.mkdtemp(prefix="ov2n-bench-ovpn-")
+    teardown_network()
+    try:
+        make_certs(workdir)
+        setup_network(args.link_mtu, args.delay)
+        print(f"链路 MTU {args.link_mtu}，往返延迟 {args.delay:g} ms，AES 指令: {aes}")
+        print(f"{'档位':<16} {'改动':>4} {'上行':>14} {'下行':>14}")
+        for name in (PROFILE_NONE, *TUNINGS):
+            changes, up, down = bench_profile(workdir, name, args.seconds, path_mtu, aes)
+            print(f"{name:<16} {len(changes):>4} {up:9.0f}Mbit/s {down:9.0f}Mbit/s")
+            for change in changes:
+                print(f"{'':<16}   {change.path} {change.new}")
+    finally:
+        teardown_network()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+性能档位基准
+
+本机没有 xray 也能运行：用 perf_profiles.optimize() 生成各档位的运行时配置，
+把代理出站和 policy 中的设置映射到回环上的等价套接字行为后比较：
+  - 短请求：每个请求分两次写出（头部 + 正文）再读响应，
+    tcpNoDelay 决定是否受 Nagle 与延迟 ACK 影响，tcpFastOpen 省掉一次握手往返，
+    mux 开启时 concurrency 个请求复用一条上游连接
+  - 大流量：按 policy.bufferSize 的缓冲区转发数据，测吞吐
+  - 内存：按 bufferSize 和 mux 复用后的上游连接数估算 N 个并发连接占用的缓冲区
+
+用法（在仓库根目录）：
+    python benchmarks/bench_perf_profiles.py [--requests 200] [--mb 64] [--connections 256]
+"""
+import argparse
+import math
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.perf_profiles import PROFILE_NONE, PROFILES, optimize  # noqa: E402
+
+HEADER = b"H" * 32
+BODY = b"B" * 200
+RESPONSE = b"R" * 1024
+DEFAULT_BUFFER_KB = 4     # 没有 policy 时按 xray 的默认值估算
+
+SAMPLE_CONFIG = {
+    "outbounds": [
+        {"tag": "proxy", "protocol": "vmess",
+         "settings": {"vnext": [{"address": "203.0.113.10", "port": 443,
+                                 "users": [{"id": "00000000-0000-0000-0000-000000000000"}]}]},
+         "streamSettings": {"network": "tcp", "security": "tls"}},
+        {"tag": "direct", "protocol": "freedom"},
+    ],
+}
+
+
+class Settings:
+    """从调优后的配置中取出基准关心的设置。"""
+
+    def __init__(self, config: dict):
+        proxy = config["outbounds"][0]
+        sockopt = proxy.get("streamSettings", {}).get("sockopt", {})
+        mux = proxy.get("mux", {})
+        level = config.get("policy", {}).get("levels", {}).get("0", {})
+        self.nodelay = bool(sockopt.get("tcpNoDelay"))
+        self.fastopen = bool(sockopt.get("tcpFastOpen")) and hasattr(socket, "MSG_FASTOPEN")
+        self.mux = mux.get("concurrency", 8) if mux.get("enabled") else 0
+        self.buffer = (level.get("bufferSize") or DEFAULT_BUFFER_KB) * 1024
+
+
+def _recv_exact(sock: socket.socket, n: int) -> None:
+    while n:
+        chunk = sock.recv(n)
+        if not chunk:
+            raise ConnectionError("连接被关闭")
+        n -= len(chunk)
+
+
+class _Server:
+    """回环服务端：请求模式下逐个应答，bulk 模式下按请求发送指定字节数。"""
+
+    def __init__(self):
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "TCP_FASTOPEN"):
+            try:
+                self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_FASTOPEN, 64)
+            except OSError:
+                pass
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(256)
+        self.addr = self.sock.getsockname()
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    @staticmethod
+    def _handle(conn: socket.socket):
+        with conn:
+            try:
+                while True:
+                    kind = conn.recv(1)
+                    if kind == b"Q":
+                        _recv_exact(conn, len(HEADER) + len(BODY))
+                        conn.sendall(RESPONSE)
+                    elif kind == b"S":
+                        size = int.from_bytes(conn.recv(8), "big")
+                        chunk = b"\0" * 65536
+                        while size > 0:
+                            conn.sendall(chunk[:size])
+                            size -= len(chunk)
+                    else:
+                        return
+            except OSError:
+                return
+
+    def close(self):
+        self.sock.close()
+
+
+def _connect(addr, settings: Settings, first: bytes) -> socket.socket:
+    sock = socket.socket()
+    if settings.nodelay:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    if settings.fastopen:
+        try:
+            sock.sendto(first, socket.MSG_FASTOPEN, addr)
+            return sock
+        except OSError:
+            sock.close()
+            sock = socket.socket()
+            if settings.nodelay:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.connect(addr)
+    sock.sendall(first)
+    return sock
+
+
+def bench_requests(addr, settings: Settings, count: int) -> float:
+    """返回单个请求的平均耗时（毫秒）。"""
+    upstream = None
+    streams = 0
+    start = time.perf_counter()
+    for _ in range(count):
+        if upstream is None:
+            upstream = _connect(addr, settings, b"Q" + HEADER)
+        else:
+            upstream.sendall(b"Q" + HEADER)
+        upstream.sendall(BODY)
+        _recv_exact(upstream, len(RESPONSE))
+        streams += 1
+        if not settings.mux or streams >= settings.mux:
+            upstream.close()
+            upstream, streams = None, 0
+    if upstream is not None:
+        upstream.close()
+    return (time.perf_counter() - start) / count * 1000
+
+
+def bench_bulk(addr, settings: Settings, size: int) -> float:
+    """按 bufferSize 分块读取 size 字节，返回吞吐（MB/s）。"""
+    sock = _connect(addr, settings, b"S" + size.to_bytes(8, "big"))
+    buf = bytearray(settings.buffer)
+    view = memoryview(buf)
+    start = time.perf_counter()
+    received = 0
+    with sock:
+        while received < size:
+            n = sock.recv_into(view)
+            if not n:
+                break
+            received += n
+    return received / (time.perf_counter() - start) / 1e6
+
+
+def estimate_memory(settings: Settings, connections: int) -> float:
+    """并发连接的缓冲区占用估算（MB）：每条上下游连接各一份上行、下行缓冲。"""
+    upstream = math.ceil(connections / settings.mux) if settings.mux else connections
+    return (connections + upstream) * 2 * settings.buffer / 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--mb", type=int, default=64)
+    parser.add_argument("--connections", type=int, default=256)
+    args = parser.parse_args()
+
+    server = _Server()
+    try:
+        print(f"{'档位':<16} {'改动':>4} {'短请求':>10} {'吞吐':>12} {'缓冲区内存':>12}")
+        for name in (PROFILE_NONE, *PROFILES):
+            config, changes = optimize(SAMPLE_CONFIG, name)
+            settings = Settings(config)
+            latency = bench_requests(server.addr, settings, args.requests)
+            throughput = bench_bulk(server.addr, settings, args.mb * 1024 * 1024)
+            memory = estimate_memory(settings, args.connections)
+            print(f"{name:<16} {len(changes):>4} {latency:8.2f}ms {throughput:8.0f}MB/s "
+                  f"{memory:10.1f}MB")
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,511 @@
+"""
+运行时产物模块
+把（配置、性能档位、透明代理参数、geo 文件版本）编译为 xray 启动所需的产物：
+  - runtime：运行时 JSON。按性能档位调优，开启 xray API 供热更新使用（core.hot_reload；
+    端口为回环地址上的空闲端口，记录在 manifest 中，端口仍空闲时下次启动沿用），
+    启用透明代理时代理出站带上 sockopt.mark，流量不会被 TProxy 再次劫持
+  - rules：透明代理的 iptables-restore 规则集，由 helper 校验哈希后一次性应用
+  - geo：只保留配置实际引用的分类的 geoip.dat / geosite.dat（Linux）
+
+产物按内容哈希存放在缓存目录（<缓存目录>/artifacts/<类型>/），manifest.json 记录
+每个产物的输入哈希和内容哈希。再次连接时输入不变的产物直接复用，不重新生成；
+只有输入变化的产物才重新编译（例如只换了节点时，规则集只随 vps_ip 变化而重建）。
+
+geo 文件按 protobuf 顶层条目裁剪：GeoIPList / GeoSiteList 都是 repeated 字段 1，
+每个条目的字段 1 为分类名，无需完整解析即可按分类名挑出条目并原样拼接。
+配置中使用 ext: 外部文件时不裁剪（xray 会在资源目录中查找这些文件）。
+geo 产物的输入是配置引用的分类集合（而不是配置原文），只换节点时不会重新裁剪。
+
+编译由模块锁串行化（后台校验和启动任务可能同时编译）；运行中的 Xray 使用的产物
+由 mark_in_use() 登记，清理旧产物时不会删除。
+"""
+import hashlib
+import json
+import logging
+import os
+import platform
+import shutil
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from core import config_io, config_repo, jsonc
+from core.handoff import apply_slot, slot_port
+from core.hot_reload import api_inbound_port, enable_api, pick_api_port, port_free
+from core.perf_profiles import PROFILE_NONE, optimize
+
+log = logging.getLogger("ov2n.artifacts")
+
+IS_WINDOWS = platform.system() == "Windows"
+
+ARTIFACT_VERSION = 2      # 产物格式变化时递增，旧产物全部失效
+KEEP_PER_KIND = 5         # 每类产物保留最近的几个版本（切回旧配置时可直接复用）
+
+KIND_RUNTIME = "runtime"
+KIND_RULES = "rules"
+KIND_GEO = "geo"
+
+GEO_FILES = {"geoip": "geoip.dat", "geosite": "geosite.dat"}
+GEO_SOURCE_DIRS = (
+    "/usr/local/share/xray",
+    "/usr/local/share/v2ray",
+    "/usr/share/xray",
+    "/usr/share/v2ray",
+)
+
+# 与 vpn-helper.py 中的 tproxy_setup 一致：这些目标地址不经过代理
+TPROXY_BYPASS_CIDRS = (
+    "0.0.0.0/8", "127.0.0.0/8", "10.0.0.0/8", "169.254.0.0/16",
+    "172.16.0.0/12", "192.168.0.0/16", "224.0.0.0/4", "240.0.0.0/4",
+)
+TPROXY_SKIP_MARK = 255
+RULESET_HEADER = "# ov2n-tproxy"
+
+_compile_lock = threading.Lock()
+_in_use_lock = threading.Lock()
+_in_use: Dict[int, Set[str]] = {}   # 端口槽位 -> 运行中的 Xray 使用的产物路径
+
+
+def get_cache_dir() -> str:
+    """缓存目录：Linux 用 ~/.cache/ov2n，Windows 用 %LOCALAPPDATA%\\ov2n\\cache。"""
+    if IS_WINDOWS:
+        base = os.environ.get("LOCALAPPDATA", os.path.expanduser("~"))
+        return os.path.join(base, "ov2n", "cache")
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "ov2n")
+
+
+def _mark_proxy_outbounds(config: Dict) -> None:
+    """代理出站的 socket 带上 TProxy 放行的 mark（已设置 mark 的不改）。"""
+    for outbound in config.get("outbounds", []):
+        if outbound.get("protocol") in config_repo.PROXY_PROTOCOLS:
+            sockopt = outbound.setdefault("streamSettings", {}).setdefault("sockopt", {})
+            sockopt.setdefault("mark", TPROXY_SKIP_MARK)
+
+
+def _digest(*parts) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = json.dumps(part, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        h.update(len(part).to_bytes(8, "big"))
+        h.update(part)
+    return h.hexdigest()
+
+
+# ============================================
+# 规则集
+# ============================================
+
+def build_tproxy_ruleset(port: int, vps_ip: str, mark: int, table: int) -> str:
+    """生成 iptables-restore 格式的 mangle 规则集（首行注释携带参数，供 helper 配置策略路由）。"""
+    lines = [
+        f"{RULESET_HEADER} port={int(port)} vps_ip={vps_ip} mark={int(mark)} table={int(table)}",
+        "*mangle",
+        ":V2RAY - [0:0]",
+    ]
+    lines += [f"-A V2RAY -d {cidr} -j RETURN" for cidr in TPROXY_BYPASS_CIDRS]
+    lines += [
+        f"-A V2RAY -d {vps_ip} -j RETURN",
+        f"-A V2RAY -m mark --mark {TPROXY_SKIP_MARK} -j RETURN",
+        f"-A V2RAY -p tcp -j MARK --set-mark {int(mark)}",
+        f"-A V2RAY -p udp -j MARK --set-mark {int(mark)}",
+        "-A OUTPUT -j V2RAY",
+        "-A PREROUTING -j V2RAY",
+    ]
+    lines += [f"-A PREROUTING -m mark --mark {int(mark)} -p {proto} -j TPROXY "
+              f"--on-port {int(port)} --tproxy-mark {int(mark)}" for proto in ("tcp", "udp")]
+    lines.append("COMMIT")
+    return "\n".join(lines) + "\n"
+
+
+# ============================================
+# geo 裁剪
+# ============================================
+
+def _read_varint(buf: memoryview, pos: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _entry_code(entry: memoryview) -> str:
+    """条目中字段 1（分类名）的值。"""
+    pos = 0
+    while pos < len(entry):
+        key, pos = _read_varint(entry, pos)
+        field, wire = key >> 3, key & 7
+        if wire == 0:
+            _, pos = _read_varint(entry, pos)
+        elif wire == 2:
+            size, pos = _read_varint(entry, pos)
+            if field == 1:
+                return bytes(entry[pos:pos + size]).decode("utf-8", "replace")
+            pos += size
+        elif wire == 1:
+            pos += 8
+        elif wire == 5:
+            pos += 4
+        else:
+            raise ValueError(f"geo 文件格式错误 (wire type {wire})")
+    return ""
+
+
+def trim_geo_file(data: bytes, codes: Set[str]) -> bytes:
+    """
+    只保留分类名在 codes 中的顶层条目（不区分大小写）。
+
+    Raises:
+        ValueError: 文件不是 GeoIPList / GeoSiteList 格式
+    """
+    buf = memoryview(data)
+    out = bytearray()
+    pos = 0
+    try:
+        while pos < len(buf):
+            start = pos
+            key, pos = _read_varint(buf, pos)
+            if key != 0x0A:
+                raise ValueError("geo 文件格式错误")
+            size, pos = _read_varint(buf, pos)
+            end = pos + size
+            if end > len(buf):
+                raise ValueError("geo 文件被截断")
+            if _entry_code(buf[pos:end]).lower() in codes:
+                out += buf[start:end]
+            pos = end
+    except IndexError:
+        raise ValueError("geo 文件被截断") from None
+    return bytes(out)
+
+
+def geo_references(config: Dict) -> Optional[Dict[str, Set[str]]]:
+    """
+    收集配置中引用的 geoip / geosite 分类（小写，去掉 ! 前缀和 @ 属性）。
+    使用 ext: 外部文件时返回 None（不能裁剪）。
+    """
+    refs: Dict[str, Set[str]] = {kind: set() for kind in GEO_FILES}
+    stack: List = [config]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+        elif isinstance(value, str):
+            prefix, sep, rest = value.partition(":")
+            if not sep:
+                continue
+            if prefix in ("ext", "ext-domain", "ext-ip"):
+                return None
+            if prefix in refs:
+                refs[prefix].add(rest.lstrip("!").split("@", 1)[0].lower())
+    return refs
+
+
+def find_geo_source() -> Optional[str]:
+    """第一个同时含 geoip.dat 和 geosite.dat 的系统 geo 目录。"""
+    for directory in GEO_SOURCE_DIRS:
+        if all(os.path.isfile(os.path.join(directory, f)) for f in GEO_FILES.values()):
+            return directory
+    return None
+
+
+def _geo_version(directory: str) -> List:
+    """geo 文件版本：按 (mtime, size) 判断，不读取文件内容。"""
+    version = []
+    for filename in GEO_FILES.values():
+        st = os.stat(os.path.join(directory, filename))
+        version.append([filename, st.st_mtime_ns, st.st_size])
+    return version
+
+
+# ============================================
+# 产物存储与 manifest
+# ============================================
+
+class Manifest:
+    """一次编译的结果。entries: 类型 -> {"input", "sha256", "path"}；rebuilt 为本次重新生成的类型。"""
+
+    __slots__ = ("entries", "rebuilt")
+
+    def __init__(self, entries: Optional[Dict[str, Dict]] = None,
+                 rebuilt: Iterable[str] = ()):
+        self.entries = entries or {}
+        self.rebuilt = list(rebuilt)
+
+    def path(self, kind: str) -> Optional[str]:
+        entry = self.entries.get(kind)
+        return entry["path"] if entry else None
+
+    def sha256(self, kind: str) -> Optional[str]:
+        entry = self.entries.get(kind)
+        return entry["sha256"] if entry else None
+
+    @property
+    def runtime_path(self) -> Optional[str]:
+        return self.path(KIND_RUNTIME)
+
+    @property
+    def rules_path(self) -> Optional[str]:
+        return self.path(KIND_RULES)
+
+    @property
+    def geo_dir(self) -> Optional[str]:
+        return self.path(KIND_GEO)
+
+    @property
+    def api_port(self) -> Optional[int]:
+        """运行时配置中 API 入站的端口（未开启 API 时为 None）。"""
+        return self.entries.get(KIND_RUNTIME, {}).get("api_port")
+
+    def paths(self) -> List[str]:
+        return [entry["path"] for entry in self.entries.values()]
+
+    def reusable(self, kind: str, input_hash: str) -> Optional[Dict]:
+        entry = self.entries.get(kind)
+        if entry and entry.get("input") == input_hash and os.path.exists(entry.get("path", "")):
+            return entry
+        return None
+
+
+class ArtifactStore:
+    """按内容哈希存放产物的目录。"""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or os.path.join(get_cache_dir(), "artifacts")
+        self.manifest_path = os.path.join(self.root, "manifest.json")
+
+    def load_manifest(self) -> Manifest:
+        try:
+            text, _ = config_io.read_text(self.manifest_path)
+            data = json.loads(text)
+        except (OSError, ValueError):
+            return Manifest()
+        if not isinstance(data, dict) or data.get("version") != ARTIFACT_VERSION:
+            return Manifest()
+        return Manifest(data.get("entries", {}))
+
+    def save_manifest(self, manifest: Manifest) -> None:
+        config_io.write_json(self.manifest_path,
+                             {"version": ARTIFACT_VERSION, "entries": manifest.entries})
+
+    def put(self, kind: str, data: bytes, suffix: str, input_hash: str) -> Dict:
+        """写入单文件产物（同内容已存在时不重写）。"""
+        sha = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.root, kind, sha + suffix)
+        if not os.path.exists(path):
+            config_io.atomic_write_bytes(path, data)
+        else:
+            os.utime(path)
+        return {"input": input_hash, "sha256": sha, "path": path}
+
+    def put_dir(self, kind: str, files: Dict[str, bytes], input_hash: str) -> Dict:
+        """写入目录产物（如裁剪后的 geo 文件），目录名为全部文件内容的哈希。"""
+        sha = _digest(*[[name, hashlib.sha256(data).hexdigest()]
+                        for name, data in sorted(files.items())])
+        path = os.path.join(self.root, kind, sha)
+        if not os.path.isdir(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = tempfile.mkdtemp(prefix=f".{sha[:12]}.", suffix=".tmp",
+                                   dir=os.path.dirname(path))
+            try:
+                for name, data in files.items():
+                    with open(os.path.join(tmp, name), "wb") as f:
+                        f.write(data)
+                os.replace(tmp, path)
+            except OSError:
+                # 另一个进程已写入同样的目录
+                shutil.rmtree(tmp, ignore_errors=True)
+                if not os.path.isdir(path):
+                    raise
+        else:
+            os.utime(path)
+        return {"input": input_hash, "sha256": sha, "path": path}
+
+    def prune(self, manifest: Manifest, keep: int = KEEP_PER_KIND) -> None:
+        """每类产物只保留 manifest 引用的、运行中使用的（mark_in_use）和最近使用的 keep 个。"""
+        in_use = set(manifest.paths())
+        with _in_use_lock:
+            for paths in _in_use.values():
+                in_use |= paths
+        for kind in (KIND_RUNTIME, KIND_RULES, KIND_GEO):
+            directory = os.path.join(self.root, kind)
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            # 其他进程正在写入的临时目录不动，超过一小时的视为中断后的残留
+            stale_before = time.time() - 3600
+            for name in names:
+                tmp = os.path.join(directory, name)
+                try:
+                    if name.endswith(".tmp") and os.stat(tmp).st_mtime < stale_before:
+                        shutil.rmtree(tmp, ignore_errors=True)
+                except OSError:
+                    pass
+            paths = sorted((os.path.join(directory, n) for n in names
+                            if not n.endswith(".tmp")),
+                           key=lambda p: os.stat(p).st_mtime, reverse=True)
+            for path in paths[keep:]:
+                if path in in_use:
+                    continue
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+
+
+def mark_in_use(slot: int, paths: Iterable[Optional[str]], replace: bool = True) -> None:
+    """
+    登记运行中的 Xray（按端口槽位）使用的产物，prune 不会删除它们。
+    replace 为 False 时追加到该槽位已登记的路径。
+    """
+    paths = {p for p in paths if p}
+    with _in_use_lock:
+        if replace:
+            _in_use[slot] = paths
+        else:
+            _in_use.setdefault(slot, set()).update(paths)
+
+
+# ============================================
+# 编译
+# ============================================
+
+def _tproxy_input(tproxy: Dict) -> Dict:
+    return {k: tproxy[k] for k in ("port", "vps_ip", "mark", "table")}
+
+
+def compile_artifacts(config_path: str, perf_profile: str = PROFILE_NONE,
+                      tproxy: Optional[Dict] = None,
+                      geo_source: Optional[str] = None,
+                      store: Optional[ArtifactStore] = None,
+                      slot: int = 0, api_port: Optional[int] = None) -> Manifest:
+    """
+    编译运行时产物，输入未变的产物直接复用。
+
+    Args:
+        config_path: 用户配置（USER_V2RAY_CONFIG）
+        perf_profile: 性能档位
+        tproxy: 透明代理参数（键: port / vps_ip / mark / table），None 时不生成规则集
+        geo_source: geo 文件所在目录，None 时自动查找；Windows 上不裁剪 geo
+        store: 产物存储，默认为缓存目录
+        slot: 端口槽位（见 core.handoff），槽位 1 的透明代理入站和规则集使用偏移后的端口
+        api_port: API 入站端口，热更新时传入运行中核心的端口；
+            None 表示新启动的核心，沿用上次记录且仍空闲的端口，否则另选空闲端口
+
+    Raises:
+        OSError: 读写失败
+        ValueError: 配置无法解析、性能档位不存在或槽位端口冲突
+    """
+    with _compile_lock:
+        return _compile(config_path, perf_profile, tproxy, geo_source,
+                        store or ArtifactStore(), slot, api_port)
+
+
+def _choose_api_port(previous: Manifest) -> Optional[int]:
+    # 上次的端口仍空闲时沿用，运行时配置才能复用；被占用（如切换时旧核心仍在运行）时另选
+    port = previous.api_port
+    if port and port_free(port):
+        return port
+    return pick_api_port()
+
+
+def _compile(config_path: str, perf_profile: str, tproxy: Optional[Dict],
+             geo_source: Optional[str], store: ArtifactStore, slot: int,
+             api_port: Optional[int]) -> Manifest:
+    previous = store.load_manifest()
+    if api_port is None:
+        api_port = _choose_api_port(previous)
+    entries: Dict[str, Dict] = {}
+    rebuilt: List[str] = []
+    started = time.perf_counter()
+
+    with open(config_path, "rb") as f:
+        raw = f.read()
+    runtime_input = _digest(ARTIFACT_VERSION, KIND_RUNTIME, raw, perf_profile, bool(tproxy),
+                            slot, api_port)
+    source_config = None
+    entry = previous.reusable(KIND_RUNTIME, runtime_input)
+    if entry is None:
+        source_config = jsonc.loads(config_io.decode_bytes(raw)[0])
+        if api_port is None:
+            log.warning("没有可用的 API 端口，运行时配置不开启 API（改动需要重启生效）")
+            with_api = source_config
+        else:
+            with_api = enable_api(source_config, api_port)
+        runtime_config, changes = optimize(apply_slot(with_api, slot), perf_profile)
+        if tproxy:
+            _mark_proxy_outbounds(runtime_config)
+        entry = store.put(KIND_RUNTIME, config_io.dump_json_bytes(runtime_config), ".json",
+                          runtime_input)
+        entry["api_port"] = api_inbound_port(runtime_config)
+        rebuilt.append(KIND_RUNTIME)
+        log.info("生成运行时配置（性能档位 %s，%d 处改动）", perf_profile, len(changes))
+    entries[KIND_RUNTIME] = entry
+
+    if tproxy and tproxy.get("vps_ip"):
+        params = dict(_tproxy_input(tproxy), port=slot_port(tproxy["port"], slot))
+        rules_input = _digest(ARTIFACT_VERSION, KIND_RULES, params)
+        entry = previous.reusable(KIND_RULES, rules_input)
+        if entry is None:
+            ruleset = build_tproxy_ruleset(**params)
+            entry = store.put(KIND_RULES, ruleset.encode("utf-8"), ".rules", rules_input)
+            rebuilt.append(KIND_RULES)
+        entries[KIND_RULES] = entry
+
+    if not IS_WINDOWS:
+        geo_source = geo_source or find_geo_source()
+    if geo_source:
+        # 只取决于引用的分类（与节点、性能档位无关）和 geo 文件版本
+        if source_config is None:
+            source_config = jsonc.loads(config_io.decode_bytes(raw)[0])
+        refs = geo_references(source_config)
+        if refs is None:
+            log.info("配置使用 ext: 外部 geo 文件，不裁剪")
+        else:
+            geo_input = _digest(ARTIFACT_VERSION, KIND_GEO,
+                                {kind: sorted(codes) for kind, codes in refs.items()},
+                                geo_source, _geo_version(geo_source))
+            entry = previous.reusable(KIND_GEO, geo_input)
+            if entry is None:
+                entry = _build_geo(store, refs, geo_source, geo_input)
+                if entry is not None:
+                    rebuilt.append(KIND_GEO)
+            if entry is not None:
+                entries[KIND_GEO] = entry
+
+    manifest = Manifest(entries, rebuilt)
+    if rebuilt or entries.keys() != previous.entries.keys():
+        store.save_manifest(manifest)
+        store.prune(manifest)
+    log.info("运行时产物: 重新生成 %s，复用 %s (%.1f ms)",
+             rebuilt or "无", [k for k in entries if k not in rebuilt] or "无",
+             (time.perf_counter() - started) * 1000)
+    return manifest
+
+
+def _build_geo(store: ArtifactStore, refs: Dict[str, Set[str]], source: str,
+               input_hash: str) -> Optional[Dict]:
+    files = {}
+    for kind, filename in GEO_FILES.items():
+        with open(os.path.join(source, filename), "rb") as f:
+            data = f.read()
+        try:
+            files[filename] = trim_geo_file(data, refs[kind])
+        except ValueError as e:
+            log.warning("裁剪 %s 失败，使用完整文件: %s", filename, e)
+            return None
+        log.info("裁剪 %s: %d -> %d 字节 (%s)", filename, len(data),
+                 len(files[filename]), ", ".join(sorted(refs[kind])) or "未引用")
+    return store.put_dir(KIND_GEO, files, input_hash)
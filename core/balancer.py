@@ -0,0 +1,197 @@
+"""
+负载均衡配置生成模块
+把多个代理出站组合成 xray 的 routing.balancers，并生成对应的观测配置：
+  - leastPing：observatory 定时经各出站访问探测地址，选延迟最低的出站
+  - leastLoad：burstObservatory 持续采样，在延迟稳定的若干出站之间分配连接
+  - random / roundRobin：不需要观测
+原本指向 proxy 出站的路由规则改为指向均衡器，xray 在进程内分散连接并绕开慢节点，
+不需要客户端重启或切换节点。默认出站（第一个出站）是 proxy 且没有兜底规则时，
+追加一条 tcp,udp 的兜底规则指向均衡器（ruleTag 为 CATCH_ALL_RULE_TAG，撤销时删除），
+否则未命中任何规则的流量仍走 proxy，均衡器收不到流量。
+
+注意 xray 的 selector 是 tag 前缀匹配：选择 "ss-1-2-3-4" 也会选中 "ss-1-2-3-4-1"。
+
+所有函数都返回新的配置 dict，不修改传入的配置。
+"""
+import copy
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from core import config_repo
+from core.profile_store import PROXY_TAG, outbound_endpoint
+
+BALANCER_TAG = "proxy-balancer"
+NODE_TAG_PREFIX = "node-"     # 从档案库加入的节点出站 tag 前缀
+STRATEGIES = frozenset(("leastPing", "leastLoad", "random", "roundRobin"))
+DEFAULT_PROBE_URL = "https://www.google.com/generate_204"
+DEFAULT_PROBE_INTERVAL = "1m"
+SOCKOPT_MARK = 255            # 与 TProxy 规则中放行的 mark 一致，避免出站流量被再次劫持
+CATCH_ALL_RULE_TAG = "ov2n-balancer-default"
+
+# 路由规则中不属于匹配条件的字段
+_RULE_TARGET_KEYS = frozenset(("type", "outboundTag", "balancerTag", "ruleTag"))
+
+
+def _is_balanceable(outbound) -> bool:
+    if outbound.get("protocol") not in config_repo.PROXY_PROTOCOLS:
+        return False
+    try:
+        _protocol, address, port = outbound_endpoint(outbound)
+    except (TypeError, ValueError, AttributeError):
+        return False
+    return bool(address) and address.lower() not in config_repo.PLACEHOLDER_ADDRESSES \
+        and port > 0
+
+
+def balanceable_tags(config: Dict) -> List[str]:
+    """配置中带真实服务器地址的代理出站 tag（按出现顺序）。"""
+    return [ob["tag"] for ob in config.get("outbounds", [])
+            if ob.get("tag") and _is_balanceable(ob)]
+
+
+def _is_catch_all(rule: Dict) -> bool:
+    """规则是否匹配全部流量（没有匹配条件，或只有覆盖 tcp 和 udp 的 network）。"""
+    conditions = set(rule) - _RULE_TARGET_KEYS
+    if not conditions:
+        return True
+    if conditions != {"network"}:
+        return False
+    network = rule["network"]
+    parts = network.split(",") if isinstance(network, str) else list(network or ())
+    return {"tcp", "udp"} <= {str(p).strip().lower() for p in parts}
+
+
+def _with_mark(outbound: Dict) -> Dict:
+    outbound = copy.deepcopy(outbound)
+    stream = outbound.setdefault("streamSettings", {})
+    stream.setdefault("sockopt", {}).setdefault("mark", SOCKOPT_MARK)
+    return outbound
+
+
+def _observatory(strategy: str, tags: Sequence[str], probe_url: str,
+                 probe_interval: str) -> Tuple[Optional[str], Optional[Dict]]:
+    if strategy == "leastPing":
+        return "observatory", {
+            "subjectSelector": list(tags),
+            "probeUrl": probe_url,
+            "probeInterval": probe_interval,
+            "enableConcurrency": True,
+        }
+    if strategy == "leastLoad":
+        return "burstObservatory", {
+            "subjectSelector": list(tags),
+            "pingConfig": {
+                "destination": probe_url,
+                "interval": probe_interval,
+                "timeout": "5s",
+                "sampling": 3,
+            },
+        }
+    return None, None
+
+
+def build_balanced_config(config: Dict, tags: Optional[Sequence[str]] = None,
+                          extra_outbounds: Iterable[Tuple[str, Dict]] = (),
+                          strategy: str = "leastPing",
+                          probe_url: str = DEFAULT_PROBE_URL,
+                          probe_interval: str = DEFAULT_PROBE_INTERVAL,
+                          max_rtt: str = "1s",
+                          balancer_tag: str = BALANCER_TAG) -> Dict:
+    """
+    生成启用负载均衡的配置。
+
+    Args:
+        config: 原配置
+        tags: 参与均衡的出站 tag，默认为全部带真实服务器地址的代理出站
+        extra_outbounds: 追加的 (tag, outbound)，如档案库中的节点；tag 自动加入 tags
+        strategy: leastPing / leastLoad / random / roundRobin
+        probe_url: 观测使用的探测地址
+        probe_interval: 观测间隔（xray 时长格式，如 "30s"、"1m"）
+        max_rtt: leastLoad 时可接受的最大延迟
+        balancer_tag: 均衡器 tag
+
+    Raises:
+        ValueError: 策略不支持，或可用于均衡的出站少于 2 个
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"不支持的均衡策略: {strategy}")
+    result = copy.deepcopy(config)
+    outbounds = result.setdefault("outbounds", [])
+    existing = {ob.get("tag") for ob in outbounds}
+
+    selected = list(tags) if tags is not None else balanceable_tags(result)
+    for tag, outbound in extra_outbounds:
+        if tag in existing:
+            continue
+        ob = dict(outbound)
+        ob["tag"] = tag
+        outbounds.append(ob)
+        existing.add(tag)
+        selected.append(tag)
+    selected = list(dict.fromkeys(t for t in selected if t in existing))
+    if len(selected) < 2:
+        raise ValueError("可用于负载均衡的节点少于 2 个")
+
+    chosen = set(selected)
+    result["outbounds"] = [_with_mark(ob) if ob.get("tag") in chosen else ob
+                           for ob in outbounds]
+
+    balancer = {"tag": balancer_tag, "selector": selected,
+                "strategy": {"type": strategy}, "fallbackTag": selected[0]}
+    if strategy == "leastLoad":
+        balancer["strategy"]["settings"] = {"maxRTT": max_rtt, "tolerance": 0.01}
+
+    routing = result.setdefault("routing", {})
+    routing["balancers"] = [b for b in routing.get("balancers", [])
+                            if b.get("tag") != balancer_tag] + [balancer]
+    rules = routing.setdefault("rules", [])
+    for rule in rules:
+        if rule.get("outboundTag") == PROXY_TAG:
+            del rule["outboundTag"]
+            rule["balancerTag"] = balancer_tag
+    default_is_proxy = bool(outbounds) and outbounds[0].get("tag") == PROXY_TAG
+    if default_is_proxy and not any(_is_catch_all(rule) for rule in rules):
+        # 未命中规则的流量走默认出站 proxy，需要显式交给均衡器
+        rules.append({"type": "field", "network": "tcp,udp",
+                      "balancerTag": balancer_tag, "ruleTag": CATCH_ALL_RULE_TAG})
+
+    result.pop("observatory", None)
+    result.pop("burstObservatory", None)
+    section, observatory = _observatory(strategy, selected, probe_url, probe_interval)
+    if section:
+        result[section] = observatory
+    return result
+
+
+def remove_balancer(config: Dict, balancer_tag: str = BALANCER_TAG,
+                    drop_nodes: bool = True) -> Dict:
+    """
+    撤销负载均衡：规则重新指向 proxy 出站，删除均衡器、追加的兜底规则和观测配置。
+    drop_nodes 时同时删除从档案库加入的 node-* 出站。
+    """
+    result = copy.deepcopy(config)
+    routing = result.get("routing", {})
+    routing["balancers"] = [b for b in routing.get("balancers", [])
+                            if b.get("tag") != balancer_tag]
+    if not routing["balancers"]:
+        del routing["balancers"]
+    if "rules" in routing:
+        routing["rules"] = [rule for rule in routing["rules"]
+                            if rule.get("ruleTag") != CATCH_ALL_RULE_TAG]
+    for rule in routing.get("rules", []):
+        if rule.get("balancerTag") == balancer_tag:
+            del rule["balancerTag"]
+            rule["outboundTag"] = PROXY_TAG
+    result.pop("observatory", None)
+    result.pop("burstObservatory", None)
+    if drop_nodes:
+        result["outbounds"] = [ob for ob in result.get("outbounds", [])
+                               if not str(ob.get("tag", "")).startswith(NODE_TAG_PREFIX)]
+    return result
+
+
+def balancer_info(config: Dict, balancer_tag: str = BALANCER_TAG) -> Optional[Dict]:
+    """返回配置中的均衡器（未启用时返回 None）。"""
+    for balancer in config.get("routing", {}).get("balancers", []):
+        if balancer.get("tag") == balancer_tag:
+            return balancer
+    return None
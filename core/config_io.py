@@ -0,0 +1,133 @@
+"""
+配置文件读写模块
+  - 读取：一次读入全部字节，先按 BOM 判断编码，再依次尝试 UTF-8 / GB18030 / Latin-1，
+    只对内存中的缓冲区解码，不再为每个候选编码重复读盘
+  - 写入：在内存中完成序列化和校验（无 BOM、可被重新解析），
+    写入同目录临时文件并 fsync 后 os.replace 原子替换，
+    xray 或其他读取方不会看到写了一半的文件；
+    目标为符号链接时替换其指向的文件，已有文件的权限和属主保持不变
+
+GBK 与 GB2312 都是 GB18030 的子集，因此中文编码只需尝试 GB18030 一次。
+"""
+import codecs
+import json
+import logging
+import os
+import stat
+from typing import Any, Optional, Tuple
+
+log = logging.getLogger("ov2n.config")
+
+# BOM → 编码（UTF-32 须在 UTF-16 之前判断，二者 LE BOM 前缀相同）
+_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# 无 BOM 时依次尝试的编码（latin-1 可解码任意字节，作为兜底）
+FALLBACK_ENCODINGS = ('utf-8', 'gb18030', 'latin-1')
+
+
+def decode_bytes(data: bytes) -> Tuple[str, str]:
+    """根据 BOM 和内容判断编码并解码，返回 (文本, 编码)。"""
+    for bom, encoding in _BOMS:
+        if data.startswith(bom):
+            return data.decode(encoding), encoding
+    for encoding in FALLBACK_ENCODINGS:
+        try:
+            return data.decode(encoding), encoding
+        except UnicodeDecodeError:
+            continue
+    return data.decode('latin-1'), 'latin-1'
+
+
+def read_text(path: str) -> Tuple[str, str]:
+    """
+    读取文本文件（一次读盘、一次成功解码）。
+
+    Returns:
+        (文本, 检测到的编码)
+
+    Raises:
+        OSError: 文件不存在或无法读取
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    text, encoding = decode_bytes(data)
+    if encoding not in ('utf-8', 'utf-8-sig'):
+        log.info("配置文件编码: %s (%s)", encoding, path)
+    return text, encoding
+
+
+def _copy_owner_and_mode(fd: int, st: os.stat_result) -> None:
+    if not hasattr(os, 'fchmod'):
+        return      # Windows
+    os.fchmod(fd, stat.S_IMODE(st.st_mode))
+    try:
+        os.fchown(fd, st.st_uid, st.st_gid)
+    except OSError:
+        pass        # 非 root 只能保留自己的属主
+
+
+def atomic_write_bytes(path: str, data: bytes, mode: Optional[int] = None) -> None:
+    """
+    写入同目录临时文件并原子替换目标文件。
+    path 为符号链接时写入其最终指向的文件（链接本身保留）。
+
+    Args:
+        mode: 文件权限；None 时沿用已有文件的权限和属主，新文件为 0666（受 umask 影响）
+    """
+    path = os.path.realpath(path)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    tmp = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    try:
+        existing = os.stat(path) if mode is None else None
+    except FileNotFoundError:
+        existing = None
+    try:
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0),
+                     0o666 if mode is None else mode)
+        if existing is not None:
+            _copy_owner_and_mode(fd, existing)
+        elif mode is not None and hasattr(os, 'fchmod'):
+            os.fchmod(fd, mode)     # 临时文件名可能已存在（上次中断遗留），O_CREAT 不会改其权限
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def write_private(path: str, data: bytes) -> None:
+    """原子写入只有当前用户可读写的文件（目录 0700、文件 0600），用于含密钥或密码的文件。"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), mode=0o700, exist_ok=True)
+    atomic_write_bytes(path, data, mode=0o600)
+
+
+def dump_json_bytes(obj: Any, indent: int = 2) -> bytes:
+    """
+    序列化为无 BOM 的 UTF-8 JSON 字节，并在内存中校验可被重新解析。
+
+    Raises:
+        ValueError: 序列化结果异常（含 BOM 或无法解析）
+    """
+    data = json.dumps(obj, ensure_ascii=False, indent=indent).encode('utf-8')
+    if data.startswith(codecs.BOM_UTF8):
+        raise ValueError("序列化结果含有 BOM")
+    json.loads(data)
+    return data
+
+
+def write_json(path: str, obj: Any, indent: int = 2) -> None:
+    """将对象序列化为 UTF-8（无 BOM）JSON，校验后原子写入。"""
+    atomic_write_bytes(path, dump_json_bytes(obj, indent))
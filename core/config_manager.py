@@ -5,7 +5,7 @@
 - 导入标志持久化 (imported_flags.json)
 - TProxy 配置持久化 (tproxy.conf)
 - V2Ray 配置验证与默认配置创建
-- 从 V2Ray 配置中提取 TProxy 参数
+- 从 V2Ray 配置中提取 TProxy 参数（解析结果由 core.config_repo 统一缓存）
 
 核心设计原则：
   用户导入配置时，将配置文件**复制**到用户配置目录下，而非仅保存路径。
@@ -18,10 +18,10 @@
 import json
 import os
 import platform
-import re
 import shutil
 from typing import Dict, Optional
 
+from core import config_io, config_repo, config_schema
 from core.utils import get_app_root
 
 IS_WINDOWS = platform.system() == "Windows"
@@ -149,6 +149,8 @@ def import_v2ray_config(source_path: str) -> str:
     dst_real = os.path.realpath(USER_V2RAY_CONFIG)
     if src_real != dst_real:
         shutil.copy2(source_path, USER_V2RAY_CONFIG)
+        # copy2 保留源文件 mtime，不能依赖 stat 判断内容已变化
+        config_repo.invalidate(USER_V2RAY_CONFIG)
         print(f"[ov2n] OK V2Ray config copied to: {USER_V2RAY_CONFIG}")
     else:
         print(f"[ov2n] OK V2Ray config already in place: {USER_V2RAY_CONFIG}")
@@ -205,15 +207,6 @@ def save_tproxy_config(enabled: bool, vps_ip: str, port: int,
 # V2Ray 配置提取与验证
 # ============================================
 
-def _strip_json_comments(text: str) -> str:
-    """
-    移除 JSON 中的单行注释（// 开头的行）。
-    用于支持 xray Windows 模板中含注释的 config.json。
-    Linux 上的标准 JSON 文件同样兼容（无注释则原样返回）。
-    """
-    return re.sub(r'(?m)^\s*//.*$', '', text)
-
-
 def extract_tproxy_config_from_v2ray(config_path: str) -> Optional[Dict]:
     """
     从 V2Ray 配置文件中提取 TProxy 相关参数（VPS IP 和 TProxy 端口）。
@@ -224,36 +217,10 @@ def extract_tproxy_config_from_v2ray(config_path: str) -> Optional[Dict]:
     if not os.path.exists(config_path):
         return None
     try:
-        with open(config_path, 'r', encoding='utf-8-sig') as f:
-            raw = f.read()
-
         # 支持含注释的 JSON（xray Windows 模板）
-        config = json.loads(_strip_json_comments(raw))
-
-        vps_ip = None
-        tproxy_port = None
-
-        # 从 outbounds 提取 VPS IP
-        for ob in config.get('outbounds', []):
-            if ob.get('protocol') in [
-                    'shadowsocks', 'vmess', 'vless', 'trojan', 'socks', 'http']:
-                servers = ob.get('settings', {}).get('servers', [])
-                if servers:
-                    addr = servers[0].get('address', '')
-                    if addr and re.match(
-                            r'^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$', addr):
-                        vps_ip = addr
-                        break
-
-        # 从 inbounds 提取 TProxy 端口
-        for ib in config.get('inbounds', []):
-            if ib.get('protocol') == 'dokodemo-door':
-                if ib.get('settings', {}).get('network') in ['tcp,udp', 'tcp', 'udp']:
-                    tproxy_port = ib.get('port')
-                    break
-            elif 'tproxy' in ib.get('tag', '').lower():
-                tproxy_port = ib.get('port')
-                break
+        doc = config_repo.load_document(config_path)
+        vps_ip = doc.vps_ip
+        tproxy_port = doc.tproxy_port
 
         if vps_ip and tproxy_port:
             print(f"[ov2n] OK extracted: VPS IP={vps_ip}, TProxy port={tproxy_port}")
@@ -268,7 +235,7 @@ def extract_tproxy_config_from_v2ray(config_path: str) -> Optional[Dict]:
 
 def validate_v2ray_config(path: str) -> bool:
     """
-    验证 V2Ray 配置文件是否有效（非空且包含 inbounds/outbounds）。
+    验证 V2Ray 配置文件是否有效：按 core.config_schema 做结构校验，没有错误级别的问题。
     支持含 // 单行注释的 JSON（xray Windows 模板格式）。
 
     增强容错：
@@ -281,12 +248,10 @@ def validate_v2ray_config(path: str) -> bool:
             return False
         if os.path.getsize(path) == 0:
             return False
-        with open(path, 'r', encoding='utf-8-sig') as f:
-            raw = f.read()
-        if not raw.strip():
-            return False
-        cfg = json.loads(_strip_json_comments(raw))
-        return 'inbounds' in cfg and 'outbounds' in cfg
+        problems = config_schema.errors(config_repo.load_document(path).issues)
+        if problems:
+            print(f"[ov2n] WARN V2Ray config invalid:\n{config_schema.format_issues(problems)}")
+        return not problems
     except (OSError, IOError) as e:
         # 文件被锁定、权限不足等 → 不能确定无效，返回 True 以避免误覆盖
         print(f"[ov2n] WARN V2Ray config IO error (treated as valid): {e}")
@@ -304,30 +269,17 @@ def has_real_vps_config(path: str) -> bool:
     检查 V2Ray 配置文件是否包含真实的 VPS 服务器信息（非占位符）。
 
     用于判断用户是否已经成功导入过有效的 SS/V2Ray 配置。
-    占位符地址包括：your.server.com, YOUR_VPS_IP, 127.0.0.1, placeholder 等。
+    占位符地址见 config_repo.PLACEHOLDER_ADDRESSES
+    （your.server.com, YOUR_VPS_IP, 127.0.0.1 等）。
 
     Returns:
         True  - 配置中包含看起来真实的 VPS 地址
         False - 配置中只有占位符或无法解析
     """
-    placeholder_addresses = {
-        "your.server.com", "your_vps_ip", "127.0.0.1",
-        "0.0.0.0", "localhost", "example.com",
-    }
     try:
         if not os.path.exists(path) or os.path.getsize(path) == 0:
             return False
-        with open(path, 'r', encoding='utf-8-sig') as f:
-            raw = f.read()
-        cfg = json.loads(_strip_json_comments(raw))
-        for ob in cfg.get('outbounds', []):
-            if ob.get('protocol') in ('shadowsocks', 'vmess', 'vless', 'trojan'):
-                servers = ob.get('settings', {}).get('servers', [])
-                for srv in servers:
-                    addr = srv.get('address', '').strip().lower()
-                    if addr and addr not in placeholder_addresses:
-                        return True
-        return False
+        return config_repo.load_document(path).has_real_server
     except Exception:
         return False
 
@@ -363,9 +315,8 @@ def create_default_v2ray_config(config_path: str) -> None:
         },
     }
     try:
-        os.makedirs(os.path.dirname(config_path), exist_ok=True)
-        with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump(cfg, f, indent=2, ensure_ascii=False)
+        config_io.write_json(config_path, cfg)
+        config_repo.invalidate(config_path)
         print("[ov2n] OK default V2Ray config created")
     except Exception as e:
         print(f"[ov2n] ERR create default V2Ray config: {e}")
@@ -430,6 +381,7 @@ def _migrate_legacy_config_paths() -> None:
         if not os.path.exists(USER_V2RAY_CONFIG) or os.path.getsize(USER_V2RAY_CONFIG) == 0:
             try:
                 shutil.copy2(old_v2ray_path, USER_V2RAY_CONFIG)
+                config_repo.invalidate(USER_V2RAY_CONFIG)
                 print(f"[ov2n] OK V2Ray config migrated: {old_v2ray_path} -> {USER_V2RAY_CONFIG}")
                 migrated_v2ray = True
             except Exception as e:
@@ -0,0 +1,225 @@
+"""
+配置仓库模块
+集中读取和解析 V2Ray/Xray 的 config.json，供所有配置读取方共享：
+  - 解析结果按 (realpath, st_mtime_ns, st_size) 缓存，文件未变化时不再读取和解析
+  - 对外只提供只读视图（MappingProxyType / tuple），避免调用方意外修改共享缓存
+  - 需要修改配置的调用方（V2RayConfigManager、Xray 启动流程）通过 to_dict() 取得独立的深拷贝
+  - 派生信息（服务器列表、入站端口、TProxy 参数等）在同一份文档上只计算一次
+
+写入配置文件后请调用 invalidate()：部分文件系统的 mtime 精度较粗，
+同一时刻写入相同大小的内容时仅靠 stat 无法区分。
+"""
+import copy
+import logging
+import os
+import re
+import threading
+from types import MappingProxyType
+from typing import Any, Dict, List, Optional, Tuple
+
+from core import config_io, config_schema, jsonc
+
+log = logging.getLogger("ov2n.config")
+
+# 视为代理服务器的出站协议
+PROXY_PROTOCOLS = ('shadowsocks', 'vmess', 'vless', 'trojan', 'socks', 'http')
+
+# 视为“未配置”的占位符地址
+PLACEHOLDER_ADDRESSES = frozenset({
+    "your.server.com", "your_vps_ip", "127.0.0.1",
+    "0.0.0.0", "localhost", "example.com",
+})
+
+_IPV4_RE = re.compile(r'^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$')
+
+FileKey = Tuple[str, int, int]
+
+
+def freeze(value: Any) -> Any:
+    """递归转换为只读结构：dict → MappingProxyType，list → tuple。"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def file_key(path: str) -> FileKey:
+    """文件身份：(realpath, mtime_ns, size)，文件不存在时抛出 OSError。"""
+    real = os.path.realpath(path)
+    st = os.stat(real)
+    return real, st.st_mtime_ns, st.st_size
+
+
+def _server_entries(outbound: Dict) -> List[Dict]:
+    """出站中的服务器条目：shadowsocks/trojan 等为 settings.servers，vmess/vless 为 settings.vnext。"""
+    settings = outbound.get('settings', {})
+    return [srv for srv in list(settings.get('servers', [])) + list(settings.get('vnext', []))
+            if isinstance(srv, dict)]
+
+
+def _parse(raw: str) -> Dict:
+    """按 JSONC 解析（支持注释和尾随逗号，标准 JSON 走快速路径）。"""
+    data = jsonc.loads(raw)
+    if not isinstance(data, dict):
+        raise ValueError("配置文件顶层不是 JSON 对象")
+    return data
+
+
+class ConfigDocument:
+    """
+    一次解析的结果（只读）。
+
+    data 为只读视图；派生属性首次访问时计算并缓存。
+    """
+
+    def __init__(self, key: FileKey, data: Dict):
+        self.key = key
+        self._data = data
+        self._frozen = None
+        self._derived: Dict[str, Any] = {}
+
+    @property
+    def path(self) -> str:
+        return self.key[0]
+
+    @property
+    def data(self):
+        if self._frozen is None:
+            self._frozen = freeze(self._data)
+        return self._frozen
+
+    def to_dict(self) -> Dict:
+        """返回可自由修改的深拷贝（不影响缓存）。"""
+        return copy.deepcopy(self._data)
+
+    def _derive(self, name: str, func):
+        if name not in self._derived:
+            self._derived[name] = func()
+        return self._derived[name]
+
+    # ── 派生信息 ──────────────────────────────
+
+    @property
+    def has_inbounds_outbounds(self) -> bool:
+        return 'inbounds' in self._data and 'outbounds' in self._data
+
+    @property
+    def servers(self) -> Tuple[Tuple[str, str, str, int], ...]:
+        """代理出站中的服务器：(tag, protocol, address, port)。"""
+        return self._derive('servers', self._collect_servers)
+
+    def _collect_servers(self) -> Tuple[Tuple[str, str, str, int], ...]:
+        result: List[Tuple[str, str, str, int]] = []
+        for ob in self._data.get('outbounds', []):
+            protocol = ob.get('protocol')
+            if protocol not in PROXY_PROTOCOLS:
+                continue
+            for srv in _server_entries(ob):
+                result.append((ob.get('tag', ''), protocol,
+                               str(srv.get('address', '')).strip(),
+                               srv.get('port', 0)))
+        return tuple(result)
+
+    @property
+    def inbound_ports(self) -> Dict[str, int]:
+        """入站 tag → 端口（只读）。"""
+        return self._derive('inbound_ports', lambda: MappingProxyType({
+            ib.get('tag', ib.get('protocol', '')): ib.get('port')
+            for ib in self._data.get('inbounds', [])
+            if ib.get('port') is not None
+        }))
+
+    @property
+    def vps_ip(self) -> Optional[str]:
+        """第一个代理出站中的 IPv4 服务器地址。"""
+        def find():
+            for ob in self._data.get('outbounds', []):
+                if ob.get('protocol') in PROXY_PROTOCOLS:
+                    servers = _server_entries(ob)
+                    if servers:
+                        addr = servers[0].get('address', '')
+                        if addr and _IPV4_RE.match(addr):
+                            return addr
+            return None
+        return self._derive('vps_ip', find)
+
+    @property
+    def tproxy_port(self) -> Optional[int]:
+        """透明代理入站端口（dokodemo-door 或 tag 含 tproxy 的入站）。"""
+        def find():
+            for ib in self._data.get('inbounds', []):
+                if ib.get('protocol') == 'dokodemo-door':
+                    if ib.get('settings', {}).get('network') in ['tcp,udp', 'tcp', 'udp']:
+                        return ib.get('port')
+                elif 'tproxy' in ib.get('tag', '').lower():
+                    return ib.get('port')
+            return None
+        return self._derive('tproxy_port', find)
+
+    @property
+    def issues(self) -> Tuple[config_schema.Issue, ...]:
+        """结构校验发现的问题（见 core.config_schema），错误在前。"""
+        return self._derive('issues', lambda: tuple(config_schema.validate(self._data)))
+
+    @property
+    def has_real_server(self) -> bool:
+        """是否包含非占位符的 shadowsocks/vmess/vless/trojan 服务器地址。"""
+        return self._derive('has_real_server', lambda: any(
+            protocol in ('shadowsocks', 'vmess', 'vless', 'trojan')
+            and address and address.lower() not in PLACEHOLDER_ADDRESSES
+            for _tag, protocol, address, _port in self.servers
+        ))
+
+
+# ============================================
+# 缓存
+# ============================================
+
+_lock = threading.Lock()
+_documents: Dict[str, ConfigDocument] = {}
+
+
+def load_document(path: str) -> ConfigDocument:
+    """
+    读取并解析配置文件，文件未变化时直接返回缓存的文档。
+
+    Raises:
+        OSError: 文件不存在或无法读取
+        ValueError: 内容为空或不是合法的 JSON 对象（json.JSONDecodeError 是其子类）
+    """
+    key = file_key(path)
+    real = key[0]
+    with _lock:
+        doc = _documents.get(real)
+        if doc is not None and doc.key == key:
+            return doc
+
+    raw, _encoding = config_io.read_text(real)
+    if not raw.strip():
+        raise ValueError("配置文件为空")
+    data = _parse(raw)
+
+    doc = ConfigDocument(key, data)
+    with _lock:
+        _documents[real] = doc
+    log.debug("解析配置: %s", real)
+    return doc
+
+
+def get_document(path: str) -> Optional[ConfigDocument]:
+    """load_document 的宽松版本：文件不存在、读取或解析失败时返回 None。"""
+    try:
+        return load_document(path)
+    except (OSError, ValueError) as e:
+        log.debug("读取配置失败 %s: %s", path, e)
+        return None
+
+
+def invalidate(path: Optional[str] = None) -> None:
+    """丢弃指定文件（或全部）的缓存，写入配置文件后调用。"""
+    with _lock:
+        if path is None:
+            _documents.clear()
+        else:
+            _documents.pop(os.path.realpath(path), None)
@@ -0,0 +1,460 @@
+"""
+配置结构校验模块
+用声明式 schema 描述客户端依赖的 v2ray/xray 配置子集，编译为嵌套的检查函数后
+一次遍历完成校验（纯 Python，不启动子进程）：
+  - 协议名（入站 / 出站）与各协议的必填字段（vnext / servers 或扁平写法、address、port、id、password 等）
+  - 端口范围（1-65535，入站端口支持 "1000-2000,3000" 和 env:）
+  - tag 引用：路由规则 → 出站 / 均衡器 / 入站，均衡器与观测的 selector → 出站 tag 前缀，
+    tag 重复
+  - 透明代理入站：sockopt.tproxy 只用于 dokodemo-door，需要 followRedirect 和 tcp/udp 网络
+
+schema 中未声明的键不检查也不遍历（如路由规则中的 domain / ip 大列表），
+大型配置的校验耗时为毫秒级。问题按 JSON 路径报告，例如 outbounds[2].settings.vnext[0].port。
+
+完整校验由 `xray run -test` 完成（见 core.config_validation）；本模块只负责
+无需外部程序即可发现的错误。
+"""
+import logging
+import re
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+log = logging.getLogger("ov2n.schema")
+
+LEVEL_ERROR = "error"
+LEVEL_WARNING = "warning"
+
+INBOUND_PROTOCOLS = frozenset((
+    "dokodemo-door", "tunnel", "http", "socks", "mixed", "vless", "vmess", "trojan",
+    "shadowsocks", "wireguard", "tun",
+))
+OUTBOUND_PROTOCOLS = frozenset((
+    "freedom", "blackhole", "dns", "http", "socks", "vless", "vmess", "trojan",
+    "shadowsocks", "wireguard", "loopback", "hysteria",
+))
+NETWORKS = frozenset(("tcp", "raw", "kcp", "mkcp", "ws", "http", "h2", "quic", "grpc",
+                      "httpupgrade", "splithttp", "xhttp", "domainsocket", "hysteria"))
+SECURITIES = frozenset(("", "none", "tls", "reality", "xtls"))
+TPROXY_MODES = frozenset(("tproxy", "redirect", "off"))
+BALANCER_STRATEGIES = frozenset(("random", "roundRobin", "leastPing", "leastLoad"))
+LOG_LEVELS = frozenset(("debug", "info", "warning", "error", "none"))
+DOMAIN_STRATEGIES = frozenset(("AsIs", "IPIfNonMatch", "IPOnDemand"))
+
+_PORT_LIST_RE = re.compile(r"^\d+(-\d+)?(,\d+(-\d+)?)*$")
+
+
+class Issue:
+    """一个校验问题。path 为 JSON 路径，level 为 error / warning。"""
+
+    __slots__ = ("path", "message", "level")
+
+    def __init__(self, path: str, message: str, level: str = LEVEL_ERROR):
+        self.path = path
+        self.message = message
+        self.level = level
+
+    def __str__(self) -> str:
+        return f"{self.path or '$'}: {self.message}"
+
+    def __repr__(self) -> str:
+        return f"<Issue {self.level} {self}>"
+
+
+class _Context:
+    """一次遍历中收集的问题、tag 定义和引用。"""
+
+    __slots__ = ("issues", "defs", "refs", "selectors")
+
+    def __init__(self):
+        self.issues: List[Issue] = []
+        self.defs: Dict[str, Dict[str, str]] = {}
+        self.refs: List[Tuple[str, str, str]] = []
+        self.selectors: List[Tuple[str, str]] = []
+
+    def error(self, path: str, message: str) -> None:
+        self.issues.append(Issue(path, message))
+
+    def warn(self, path: str, message: str) -> None:
+        self.issues.append(Issue(path, message, LEVEL_WARNING))
+
+
+Checker = Callable[[Any, str, _Context], None]
+
+
+# ============================================
+# schema 节点
+# ============================================
+
+class Node:
+    """schema 节点；compile() 返回检查函数 (value, path, ctx)。"""
+
+    def compile(self) -> Checker:
+        raise NotImplementedError
+
+
+class Bool(Node):
+    def compile(self) -> Checker:
+        def check(value, path, ctx):
+            if not isinstance(value, bool):
+                ctx.error(path, "应为 true / false")
+        return check
+
+
+class Int(Node):
+    def __init__(self, minimum: Optional[int] = None, maximum: Optional[int] = None):
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def compile(self) -> Checker:
+        lo, hi = self.minimum, self.maximum
+
+        def check(value, path, ctx):
+            if isinstance(value, bool) or not isinstance(value, int):
+                ctx.error(path, "应为整数")
+            elif (lo is not None and value < lo) or (hi is not None and value > hi):
+                ctx.error(path, f"超出范围 {lo}-{hi}: {value}")
+        return check
+
+
+class Port(Node):
+    """端口：1-65535 的整数；ranges 为 True 时还接受 "1000-2000,3000" 和 env:VAR 字符串。"""
+
+    def __init__(self, ranges: bool = False):
+        self.ranges = ranges
+
+    def compile(self) -> Checker:
+        ranges = self.ranges
+
+        def check(value, path, ctx):
+            if isinstance(value, int) and not isinstance(value, bool):
+                if not 1 <= value <= 65535:
+                    ctx.error(path, f"端口超出范围 1-65535: {value}")
+                return
+            if ranges and isinstance(value, str):
+                if value.startswith("env:"):
+                    return
+                if _PORT_LIST_RE.match(value):
+                    bounds = [int(p) for p in re.split(r"[,-]", value)]
+                    if all(1 <= p <= 65535 for p in bounds):
+                        return
+                    ctx.error(path, f"端口超出范围 1-65535: {value}")
+                    return
+            ctx.error(path, f"无效的端口: {value!r}")
+        return check
+
+
+class Str(Node):
+    """
+    字符串。enum 为允许的取值；nonempty 要求非空；
+    define / ref 为 tag 命名空间：define 登记定义，ref 登记引用（遍历结束后检查）。
+    """
+
+    def __init__(self, enum: Optional[Iterable[str]] = None, nonempty: bool = False,
+                 define: Optional[str] = None, ref: Optional[str] = None):
+        self.enum = frozenset(enum) if enum is not None else None
+        self.nonempty = nonempty
+        self.define = define
+        self.ref = ref
+
+    def compile(self) -> Checker:
+        enum, nonempty, define, ref = self.enum, self.nonempty, self.define, self.ref
+
+        def check(value, path, ctx):
+            if not isinstance(value, str):
+                ctx.error(path, "应为字符串")
+                return
+            if nonempty and not value.strip():
+                ctx.error(path, "不能为空")
+                return
+            if enum is not None and value not in enum:
+                ctx.error(path, f"不支持的取值: {value!r}")
+                return
+            if define and value:
+                seen = ctx.defs.setdefault(define, {})
+                if value in seen:
+                    ctx.error(path, f"tag 重复: {value!r}（首次出现于 {seen[value]}）")
+                else:
+                    seen[value] = path
+            if ref and value:
+                ctx.refs.append((ref, value, path))
+        return check
+
+
+class Selector(Node):
+    """均衡器 / 观测的 selector：按前缀匹配出站 tag。"""
+
+    def compile(self) -> Checker:
+        def check(value, path, ctx):
+            if not isinstance(value, str) or not value:
+                ctx.error(path, "应为非空字符串")
+            else:
+                ctx.selectors.append((value, path))
+        return check
+
+
+class Arr(Node):
+    def __init__(self, item: Node, min_items: int = 0):
+        self.item = item
+        self.min_items = min_items
+
+    def compile(self) -> Checker:
+        item, min_items = self.item.compile(), self.min_items
+
+        def check(value, path, ctx):
+            if isinstance(value, (str, bytes, Mapping)) or not isinstance(value, Sequence):
+                ctx.error(path, "应为数组")
+                return
+            if len(value) < min_items:
+                ctx.error(path, f"至少需要 {min_items} 项")
+            for i, element in enumerate(value):
+                item(element, f"{path}[{i}]", ctx)
+        return check
+
+
+class Obj(Node):
+    """
+    对象。fields 为已知字段的 schema（其余字段不检查），required 为必填字段；
+    switch = (判别字段, 目标字段, {判别值: schema}) 按判别值选择目标字段的 schema，
+    判别值对应的 schema 为 None 时不检查目标字段；
+    checks 为遍历字段后执行的额外检查 (value, path, ctx)。
+    """
+
+    def __init__(self, fields: Optional[Dict[str, Node]] = None,
+                 required: Sequence[str] = (),
+                 switch: Optional[Tuple[str, str, Dict[str, Optional[Node]]]] = None,
+                 checks: Sequence[Checker] = ()):
+        self.fields = fields or {}
+        self.required = tuple(required)
+        self.switch = switch
+        self.checks = tuple(checks)
+
+    def compile(self) -> Checker:
+        fields = {name: node.compile() for name, node in self.fields.items()}
+        required, checks = self.required, self.checks
+        switch = None
+        if self.switch is not None:
+            key, target, cases = self.switch
+            switch = (key, target, {value: node.compile() if node is not None else None
+                                    for value, node in cases.items()})
+
+        def check(value, path, ctx):
+            if not isinstance(value, Mapping):
+                ctx.error(path, "应为对象")
+                return
+            prefix = f"{path}." if path else ""
+            for name in required:
+                if name not in value:
+                    ctx.error(f"{prefix}{name}", "缺少必填字段")
+            for name, sub in value.items():
+                checker = fields.get(name)
+                if checker is not None:
+                    checker(sub, f"{prefix}{name}", ctx)
+            if switch is not None:
+                key, target, cases = switch
+                case = cases.get(value.get(key))
+                if case is not None:
+                    if target in value:
+                        case(value[target], f"{prefix}{target}", ctx)
+                    else:
+                        ctx.error(f"{prefix}{target}", f"{value.get(key)} 协议缺少必填字段")
+            for extra in checks:
+                extra(value, path, ctx)
+        return check
+
+
+class Alt(Node):
+    """
+    同一对象的几种写法：cases 为 [(标志字段, schema)]，按对象中先出现的标志字段选择 schema；
+    都不出现时按第一种写法报告。
+    """
+
+    def __init__(self, *cases: Tuple[str, Node]):
+        self.cases = cases
+
+    def compile(self) -> Checker:
+        cases = [(marker, node.compile()) for marker, node in self.cases]
+
+        def check(value, path, ctx):
+            if isinstance(value, Mapping):
+                for marker, case in cases:
+                    if marker in value:
+                        case(value, path, ctx)
+                        return
+            cases[0][1](value, path, ctx)
+        return check
+
+
+# ============================================
+# 额外检查
+# ============================================
+
+def _get(value: Mapping, *keys: str) -> Any:
+    for key in keys:
+        if not isinstance(value, Mapping):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _check_inbound(inbound: Mapping, path: str, ctx: _Context) -> None:
+    protocol = inbound.get("protocol")
+    listen = str(inbound.get("listen") or "")
+    if "port" not in inbound and protocol != "tun" and not listen.startswith(("/", "@")):
+        ctx.error(f"{path}.port", "缺少必填字段")
+
+    mode = _get(inbound, "streamSettings", "sockopt", "tproxy")
+    if mode not in ("tproxy", "redirect"):
+        if protocol == "dokodemo-door" and "tproxy" in str(inbound.get("tag", "")).lower():
+            ctx.warn(f"{path}.streamSettings.sockopt.tproxy",
+                     "透明代理入站未设置 sockopt.tproxy，TProxy 转发的流量无法还原目标地址")
+        return
+    if protocol not in ("dokodemo-door", "tunnel"):
+        ctx.error(f"{path}.streamSettings.sockopt.tproxy",
+                  f"透明代理只能用于 dokodemo-door 入站，当前为 {protocol}")
+        return
+    if _get(inbound, "settings", "followRedirect") is not True:
+        ctx.error(f"{path}.settings.followRedirect", "透明代理入站需要 followRedirect: true")
+    network = str(_get(inbound, "settings", "network") or "tcp")
+    if not {"tcp", "udp"} & {n.strip() for n in network.split(",")}:
+        ctx.error(f"{path}.settings.network", f"透明代理入站需要 tcp 或 udp 网络: {network!r}")
+    if listen in ("127.0.0.1", "localhost", "::1"):
+        ctx.warn(f"{path}.listen", "透明代理入站只监听回环地址，局域网转发的流量无法进入")
+
+
+def _check_rule(rule: Mapping, path: str, ctx: _Context) -> None:
+    if "outboundTag" not in rule and "balancerTag" not in rule:
+        ctx.error(path, "路由规则需要 outboundTag 或 balancerTag")
+    elif "outboundTag" in rule and "balancerTag" in rule:
+        ctx.warn(path, "同时设置了 outboundTag 和 balancerTag，balancerTag 不生效")
+
+
+# ============================================
+# schema
+# ============================================
+
+_SERVER_FIELDS = {"address": Str(nonempty=True), "port": Port()}
+
+# vnext / servers 之外，xray 也接受把服务器字段直接写在 settings 中的扁平写法
+_VNEXT = Alt(
+    ("vnext", Obj({"vnext": Arr(Obj(
+        dict(_SERVER_FIELDS, users=Arr(Obj({"id": Str(nonempty=True)}, required=("id",)),
+                                       min_items=1)),
+        required=("address", "port", "users")), min_items=1)}, required=("vnext",))),
+    ("address", Obj(dict(_SERVER_FIELDS, id=Str(nonempty=True)),
+                    required=("address", "port", "id"))),
+)
+
+
+def _servers(*required: str) -> Alt:
+    fields = dict(_SERVER_FIELDS, **{name: Str(nonempty=True) for name in required})
+    return Alt(
+        ("servers", Obj({"servers": Arr(Obj(fields, required=("address", "port") + required),
+                                        min_items=1)},
+                        required=("servers",))),
+        ("address", Obj(fields, required=("address", "port") + required)),
+    )
+
+
+_OUTBOUND_SETTINGS: Dict[str, Optional[Node]] = {
+    "vmess": _VNEXT,
+    "vless": _VNEXT,
+    "shadowsocks": _servers("method", "password"),
+    "trojan": _servers("password"),
+    "socks": _servers(),
+    "http": _servers(),
+}
+
+_STREAM = Obj({
+    "network": Str(enum=NETWORKS),
+    "security": Str(enum=SECURITIES),
+    "sockopt": Obj({
+        "mark": Int(0, 2 ** 32 - 1),
+        "tproxy": Str(enum=TPROXY_MODES),
+    }),
+})
+
+_INBOUND = Obj({
+    "tag": Str(define="inbounds"),
+    "protocol": Str(enum=INBOUND_PROTOCOLS),
+    "port": Port(ranges=True),
+    "listen": Str(),
+    "settings": Obj(),
+    "streamSettings": _STREAM,
+    "sniffing": Obj({"enabled": Bool(), "destOverride": Arr(Str())}),
+}, required=("protocol",), checks=(_check_inbound,))
+
+_OUTBOUND = Obj({
+    "tag": Str(define="outbounds"),
+    "protocol": Str(enum=OUTBOUND_PROTOCOLS),
+    "settings": Obj(),
+    "streamSettings": _STREAM,
+    "mux": Obj({"enabled": Bool(), "concurrency": Int(-1, 1024)}),
+    "proxySettings": Obj({"tag": Str(nonempty=True, ref="outbounds")}, required=("tag",)),
+}, required=("protocol",), switch=("protocol", "settings", _OUTBOUND_SETTINGS))
+
+_RULE = Obj({
+    "type": Str(enum=("field",)),
+    "outboundTag": Str(nonempty=True, ref="outbounds"),
+    "balancerTag": Str(nonempty=True, ref="balancers"),
+    "inboundTag": Arr(Str(nonempty=True, ref="inbounds")),
+    "port": Port(ranges=True),
+}, checks=(_check_rule,))
+
+_BALANCER = Obj({
+    "tag": Str(nonempty=True, define="balancers"),
+    "selector": Arr(Selector(), min_items=1),
+    "strategy": Obj({"type": Str(enum=BALANCER_STRATEGIES)}),
+    "fallbackTag": Str(nonempty=True, ref="outbounds"),
+}, required=("tag", "selector"))
+
+SCHEMA = Obj({
+    "log": Obj({"loglevel": Str(enum=LOG_LEVELS)}),
+    "api": Obj({"tag": Str(nonempty=True, define="outbounds"), "services": Arr(Str())}),
+    "inbounds": Arr(_INBOUND),
+    "outbounds": Arr(_OUTBOUND, min_items=1),
+    "routing": Obj({
+        "domainStrategy": Str(enum=DOMAIN_STRATEGIES),
+        "rules": Arr(_RULE),
+        "balancers": Arr(_BALANCER),
+    }),
+    "observatory": Obj({"subjectSelector": Arr(Selector())}),
+    "burstObservatory": Obj({"subjectSelector": Arr(Selector())}),
+}, required=("outbounds",))
+
+_check_config = SCHEMA.compile()
+
+
+# ============================================
+# 对外接口
+# ============================================
+
+def _check_references(ctx: _Context) -> None:
+    for namespace, tag, path in ctx.refs:
+        if tag not in ctx.defs.get(namespace, {}):
+            kind = {"outbounds": "出站", "balancers": "均衡器", "inbounds": "入站"}[namespace]
+            ctx.error(path, f"引用了不存在的{kind} tag: {tag!r}")
+    outbound_tags = ctx.defs.get("outbounds", {})
+    for prefix, path in ctx.selectors:
+        if not any(tag.startswith(prefix) for tag in outbound_tags):
+            ctx.warn(path, f"没有 tag 以 {prefix!r} 开头的出站")
+
+
+def validate(config: Any) -> List[Issue]:
+    """校验配置（dict 或 config_repo 的只读视图），返回问题列表（错误在前）。"""
+    ctx = _Context()
+    _check_config(config, "", ctx)
+    if isinstance(config, Mapping):
+        _check_references(ctx)
+    return sorted(ctx.issues, key=lambda issue: issue.level != LEVEL_ERROR)
+
+
+def errors(issues: Iterable[Issue]) -> List[Issue]:
+    return [issue for issue in issues if issue.level == LEVEL_ERROR]
+
+
+def format_issues(issues: Sequence[Issue], limit: int = 10) -> str:
+    """多行文本，超过 limit 条时省略其余。"""
+    lines = [str(issue) for issue in issues[:limit]]
+    if len(issues) > limit:
+        lines.append(f"……另有 {len(issues) - limit} 处问题")
+    return "\n".join(lines)
@@ -0,0 +1,203 @@
+"""
+配置预校验模块
+连接前用 `xray run -test -c <运行时配置>` 在普通用户权限下检查配置，
+不必等 pkexec 授权、helper 启动核心、进程退出后再从日志里找错误。
+
+先用 core.config_schema 对用户配置做结构校验（毫秒级，不启动进程，错误带 JSON 路径），
+通过后再校验 core.artifacts 编译出的运行时配置（连同裁剪后的 geo 目录），
+结果按 (运行时配置哈希, geo 哈希, xray 文件身份) 缓存到 <缓存目录>/validation.json：
+  - 导入配置后在后台校验（validate_config_job），结果写入缓存
+  - 连接时命中“无效”立即拒绝，命中“有效”不再重复校验，未命中时先校验再启动
+xray 不存在、校验超时等无法判断的情况不缓存，也不阻止启动。
+"""
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Optional
+
+from core import config_io, config_repo, config_schema
+from core.artifacts import KIND_GEO, KIND_RUNTIME, Manifest, compile_artifacts, get_cache_dir
+from core.env_probe import find_binary
+from core.perf_profiles import PROFILE_NONE
+
+if TYPE_CHECKING:
+    from core.job_engine import JobContext
+
+log = logging.getLogger("ov2n.validate")
+
+RES_VALIDATE = "validate"
+
+VALIDATION_CACHE_VERSION = 1
+VALIDATE_TIMEOUT = 15.0     # 单次校验时限（秒）
+MAX_CACHE_ENTRIES = 64      # 缓存条目上限，超过时淘汰最早的
+MAX_ERROR_LINES = 12        # 错误信息保留的行数
+
+_CREATE_NO_WINDOW = 0x08000000 if os.name == "nt" else 0
+
+_lock = threading.Lock()
+
+
+class ValidationResult:
+    """
+    一次校验的结果。
+
+    Args:
+        ok: 配置是否有效
+        error: 无效时 xray 输出的错误信息
+        cached: 是否来自缓存
+    """
+
+    __slots__ = ("ok", "error", "cached")
+
+    def __init__(self, ok: bool, error: str = "", cached: bool = False):
+        self.ok = ok
+        self.error = error
+        self.cached = cached
+
+    def __repr__(self) -> str:
+        return f"<ValidationResult {'ok' if self.ok else 'invalid'}{' cached' if self.cached else ''}>"
+
+
+def _cache_path() -> str:
+    return os.path.join(get_cache_dir(), "validation.json")
+
+
+def _load() -> Dict[str, Dict]:
+    try:
+        data = json.loads(config_io.read_text(_cache_path())[0])
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != VALIDATION_CACHE_VERSION:
+        return {}
+    return data.get("entries", {})
+
+
+def _save(entries: Dict[str, Dict]) -> None:
+    if len(entries) > MAX_CACHE_ENTRIES:
+        newest = sorted(entries.items(), key=lambda kv: kv[1].get("time", 0), reverse=True)
+        entries = dict(newest[:MAX_CACHE_ENTRIES])
+    try:
+        config_io.write_json(_cache_path(),
+                             {"version": VALIDATION_CACHE_VERSION, "entries": entries})
+    except OSError as e:
+        log.debug("写入校验缓存失败: %s", e)
+
+
+def find_validator() -> Optional[str]:
+    """用于校验的 xray 可执行文件（与 helper 查找顺序一致，/usr/local/bin 优先）。"""
+    return find_binary("xray", extra_dirs=("/usr/local/bin",))
+
+
+def validation_key(manifest: Manifest, binary: str) -> Optional[str]:
+    """缓存键；运行时配置不存在或 xray 无法访问时返回 None。"""
+    runtime = manifest.sha256(KIND_RUNTIME)
+    if runtime is None:
+        return None
+    try:
+        st = os.stat(binary)
+    except OSError:
+        return None
+    identity = [runtime, manifest.sha256(KIND_GEO), binary, st.st_ino, st.st_mtime_ns, st.st_size]
+    return hashlib.sha256(json.dumps(identity).encode("utf-8")).hexdigest()
+
+
+def _extract_error(output: str) -> str:
+    """从 xray 输出中取出错误行（跳过版本横幅和 Info 日志）。"""
+    lines = [line.strip() for line in output.splitlines() if line.strip()]
+    errors = [line for line in lines if "failed" in line.lower() or "error" in line.lower()]
+    return "\n".join((errors or lines)[-MAX_ERROR_LINES:])
+
+
+def run_test(runtime_path: str, binary: str, geo_dir: Optional[str] = None,
+             timeout: float = VALIDATE_TIMEOUT) -> Optional[ValidationResult]:
+    """
+    执行 `xray run -test`。
+
+    Returns:
+        校验结果；xray 无法运行或超时时返回 None
+    """
+    env = None
+    if geo_dir:
+        env = dict(os.environ, XRAY_LOCATION_ASSET=geo_dir, V2RAY_LOCATION_ASSET=geo_dir)
+    try:
+        r = subprocess.run([binary, "run", "-test", "-c", runtime_path],
+                           capture_output=True, text=True, timeout=timeout, env=env,
+                           creationflags=_CREATE_NO_WINDOW)
+    except (OSError, subprocess.SubprocessError) as e:
+        log.warning("配置校验无法执行: %s", e)
+        return None
+    if r.returncode == 0:
+        return ValidationResult(True)
+    return ValidationResult(False, _extract_error(f"{r.stdout}\n{r.stderr}")
+                            or f"xray 退出码 {r.returncode}")
+
+
+def check_schema(config_path: str) -> Optional[ValidationResult]:
+    """结构校验用户配置；无法解析或有错误时返回无效结果，否则返回 None（文件无法读取时同样返回 None）。"""
+    try:
+        doc = config_repo.load_document(config_path)
+    except OSError as e:
+        log.debug("读取配置失败 %s: %s", config_path, e)
+        return None
+    except ValueError as e:
+        return ValidationResult(False, f"配置文件无法解析: {e}")
+    problems = config_schema.errors(doc.issues)
+    if problems:
+        return ValidationResult(False, config_schema.format_issues(problems))
+    return None
+
+
+def validate_runtime(manifest: Manifest, binary: Optional[str] = None,
+                     config_path: Optional[str] = None) -> Optional[ValidationResult]:
+    """
+    校验编译后的运行时配置，命中缓存时不运行 xray。
+    提供 config_path 时先对用户配置做结构校验，发现错误时不再运行 xray。
+
+    Returns:
+        校验结果；无法判断（找不到 xray、校验超时）时返回 None
+    """
+    if config_path:
+        result = check_schema(config_path)
+        if result is not None:
+            log.info("配置结构校验失败: %s", result.error)
+            return result
+    binary = binary or find_validator()
+    key = validation_key(manifest, binary) if binary else None
+    if key is None:
+        return None
+    with _lock:
+        entry = _load().get(key)
+    if entry is not None:
+        return ValidationResult(entry["ok"], entry.get("error", ""), cached=True)
+
+    started = time.perf_counter()
+    result = run_test(manifest.runtime_path, binary, manifest.geo_dir)
+    if result is None:
+        return None
+    log.info("配置校验%s (%.0f ms)", "通过" if result.ok else f"失败: {result.error}",
+             (time.perf_counter() - started) * 1000)
+    with _lock:
+        entries = _load()
+        entries[key] = {"ok": result.ok, "error": result.error, "time": time.time()}
+        _save(entries)
+    return result
+
+
+async def validate_config_job(ctx: "JobContext", config_path: str,
+                              perf_profile: str = PROFILE_NONE,
+                              tproxy: Optional[Dict] = None,
+                              binary: Optional[str] = None) -> Optional[ValidationResult]:
+    """
+    导入配置后在后台编译并校验（任务引擎任务，资源: RES_VALIDATE）。
+    perf_profile / tproxy / binary 需与连接时一致，结果才能被连接时的校验复用。
+    """
+    ctx.progress("正在校验配置...")
+    result = await ctx.run_blocking(check_schema, config_path)
+    if result is not None:
+        return result
+    manifest = await ctx.run_blocking(compile_artifacts, config_path, perf_profile, tproxy)
+    return await ctx.run_blocking(validate_runtime, manifest, binary, config_path)
@@ -0,0 +1,184 @@
+"""
+运行环境探测模块
+统一解析外部命令（pkexec、openvpn、xray 等）的位置和版本，替代每次操作前的
+`which` / `<binary> version` 子进程：
+  - 查找使用 shutil.which（纯 stat，无子进程）
+  - 结果按 (inode, mtime, size) 校验：二进制被升级/替换后自动失效
+  - 查找结果同时记录搜索目录的 mtime，目录中新增/删除命令后自动重新查找
+  - 缓存写入 <配置目录>/env_cache.json，下次启动直接复用
+
+校验命中时整个探测过程只有若干次 stat 调用。
+polkit helper 以 root 独立运行，无法导入本模块，其中有一份等价实现
+（缓存位于 /var/cache/ov2n/env.json）。
+"""
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from core.config_manager import get_config_dir
+
+log = logging.getLogger("ov2n.env")
+
+ENV_CACHE_VERSION = 1
+
+_lock = threading.Lock()
+_cache: Optional[Dict] = None
+_dirty = False
+
+
+def _cache_path() -> str:
+    return os.path.join(get_config_dir(), "env_cache.json")
+
+
+def _stat_key(path: str) -> Optional[List[int]]:
+    """文件身份：inode + mtime + size，任一变化即视为不同的文件。"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_ino, st.st_mtime_ns, st.st_size]
+
+
+def _dir_key(directory: str) -> Optional[int]:
+    try:
+        return os.stat(directory).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _search_dirs(extra_dirs: Sequence[str] = ()) -> List[str]:
+    dirs = list(extra_dirs)
+    for d in os.environ.get("PATH", os.defpath).split(os.pathsep):
+        if d and d not in dirs:
+            dirs.append(d)
+    return dirs
+
+
+def _load() -> Dict:
+    global _cache
+    if _cache is None:
+        try:
+            with open(_cache_path(), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != ENV_CACHE_VERSION:
+                raise ValueError("缓存版本不匹配")
+            _cache = data
+        except (OSError, ValueError, AttributeError):
+            _cache = {"version": ENV_CACHE_VERSION, "lookups": {}, "binaries": {}}
+    return _cache
+
+
+def _save() -> None:
+    global _dirty
+    if not _dirty:
+        return
+    path = _cache_path()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(_cache, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        _dirty = False
+    except OSError as e:
+        log.debug("写入环境缓存失败: %s", e)
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+
+
+def find_binary(name: str, extra_dirs: Sequence[str] = ()) -> Optional[str]:
+    """
+    查找可执行文件，等价于 `which name`，但不启动子进程且结果可缓存。
+
+    Args:
+        name: 命令名
+        extra_dirs: 优先于 PATH 搜索的目录
+
+    Returns:
+        可执行文件绝对路径，找不到返回 None
+    """
+    global _dirty
+    dirs = _search_dirs(extra_dirs)
+    lookup_key = f"{name}@{os.pathsep.join(dirs)}"
+
+    with _lock:
+        cache = _load()
+        entry = cache["lookups"].get(lookup_key)
+        if entry and all(_dir_key(d) == m for d, m in entry["dirs"].items()):
+            path = entry["path"]
+            if path is None:
+                return None
+            binary = cache["binaries"].get(path)
+            if binary and binary["key"] == _stat_key(path):
+                return path
+
+        path = shutil.which(name, path=os.pathsep.join(dirs))
+        cache["lookups"][lookup_key] = {
+            "path": path,
+            "dirs": {d: _dir_key(d) for d in dirs},
+        }
+        if path is not None:
+            key = _stat_key(path)
+            binary = cache["binaries"].get(path)
+            if not binary or binary["key"] != key:
+                cache["binaries"][path] = {"key": key}
+        _dirty = True
+        _save()
+        log.debug("探测 %s -> %s", name, path)
+        return path
+
+
+def get_binary_version(path: str, args: Sequence[str] = ("--version",),
+                       timeout: float = 5) -> str:
+    """
+    获取二进制的版本输出（首行），同一文件只执行一次，结果随缓存持久化；
+    执行失败或没有输出时不缓存。
+    """
+    global _dirty
+    key = _stat_key(path)
+    with _lock:
+        cache = _load()
+        binary = cache["binaries"].get(path)
+        if binary and binary["key"] == key and "version" in binary:
+            return binary["version"]
+
+    try:
+        result = subprocess.run([path, *args], capture_output=True,
+                                text=True, timeout=timeout)
+        output = (result.stdout or result.stderr).strip()
+        version = output.splitlines()[0] if output else ""
+    except (OSError, subprocess.SubprocessError) as e:
+        log.debug("获取 %s 版本失败: %s", path, e)
+        return ""
+    if not version:
+        return ""
+
+    with _lock:
+        cache = _load()
+        cache["binaries"][path] = {"key": key, "version": version}
+        _dirty = True
+        _save()
+    return version
+
+
+def has_command(name: str) -> bool:
+    """命令是否存在（替代 `which name` 的返回码判断）。"""
+    return find_binary(name) is not None
+
+
+def clear_cache() -> None:
+    """清空内存和磁盘上的环境缓存（调试或重新安装后使用）。"""
+    global _cache, _dirty
+    with _lock:
+        _cache = None
+        _dirty = False
+        try:
+            os.unlink(_cache_path())
+        except OSError:
+            pass
@@ -0,0 +1,204 @@
+"""
+自动故障切换模块
+根据健康监测（health_monitor）的结果判断当前节点是否劣化，劣化时切换到测速最快的备用节点：
+  - 迟滞：连续 fail_after 次探测失败或 TTFB 超过阈值才判定劣化，
+    之后需连续 recover_after 次正常才清除劣化计数，偶发的单次成功不会打断判定
+  - 冷却：两次切换之间至少间隔 cooldown 秒；被切走的节点按服务器地址
+    在 penalty 秒内不会被再次选中，避免在两个节点之间来回切换
+  - 疑似劣化期间把探测间隔缩短到 suspect_interval，
+    从劣化到切换完成的时间约为 fail_after × suspect_interval + 测速 + 重启
+
+FailoverController 只负责判断、选点和写配置；重启 Xray 由 worker.failover_job 完成。
+新节点的配置未通过校验时由 revert() 恢复切换前的 config.json 和当前节点记录，
+该节点按 penalty 暂不参与选择。
+切换耗时基准见 benchmarks/bench_failover.py（使用模拟的内核进程）。
+"""
+import logging
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from core import config_io, config_repo
+from core.health_monitor import HealthMonitor, HealthSample
+from core.latency_probe import (
+    LatencyProber, get_prober, promote_outbound, targets_from_config, targets_from_store,
+)
+from core.profile_store import PROXY_TAG, ProfileStore, outbound_endpoint
+
+if TYPE_CHECKING:
+    from core.job_engine import JobContext
+
+log = logging.getLogger("ov2n.failover")
+
+
+class FailoverPolicy:
+    """
+    切换阈值。
+
+    Args:
+        max_ttfb_ms: TTFB 超过此值的探测视为异常
+        fail_after: 连续异常次数达到此值判定劣化
+        recover_after: 连续正常次数达到此值清除异常计数
+        cooldown: 两次切换的最小间隔（秒）
+        penalty: 被切走的节点在此时间内不参与选择（秒）
+        suspect_interval: 出现异常后的探测间隔（秒）
+    """
+
+    __slots__ = ("max_ttfb_ms", "fail_after", "recover_after", "cooldown",
+                 "penalty", "suspect_interval")
+
+    def __init__(self, max_ttfb_ms: float = 2000.0, fail_after: int = 3,
+                 recover_after: int = 2, cooldown: float = 60.0,
+                 penalty: float = 600.0, suspect_interval: float = 3.0):
+        self.max_ttfb_ms = max_ttfb_ms
+        self.fail_after = fail_after
+        self.recover_after = recover_after
+        self.cooldown = cooldown
+        self.penalty = penalty
+        self.suspect_interval = suspect_interval
+
+
+class FailoverController:
+    """
+    故障切换控制器。
+
+    Args:
+        monitor: 当前 Xray 的健康监测器
+        config_path: 运行时配置路径（USER_V2RAY_CONFIG）
+        store: 档案库；有节点时在档案库节点中选择，否则在 config.json 的代理出站之间选择
+        policy: 切换阈值
+        prober: 测速器，默认使用共享测速器
+    """
+
+    def __init__(self, monitor: HealthMonitor, config_path: str,
+                 store: Optional[ProfileStore] = None,
+                 policy: Optional[FailoverPolicy] = None,
+                 prober: Optional[LatencyProber] = None):
+        self.monitor = monitor
+        self.config_path = config_path
+        self.store = store
+        self.policy = policy or FailoverPolicy()
+        self.prober = prober or get_prober()
+        self._bad = 0
+        self._good = 0
+        self._last_attempt = float("-inf")
+        self._penalized: Dict[Tuple[str, int], float] = {}  # (地址, 端口) -> 解禁时间
+        # 最近一次切换前的 (config.json 原始内容, 档案库当前节点, 新节点地址)，供 revert() 使用
+        self._undo: Optional[Tuple[bytes, Optional[int], Tuple[str, int]]] = None
+
+    # ── 判断 ──────────────────────────────────
+
+    def _is_bad(self, sample: HealthSample) -> bool:
+        return not sample.ok or (sample.ttfb_ms or 0.0) > self.policy.max_ttfb_ms
+
+    def observe(self, sample: HealthSample) -> bool:
+        """记录一次探测结果，返回是否应立即切换。"""
+        if self._is_bad(sample):
+            self._bad += 1
+            self._good = 0
+        else:
+            self._good += 1
+            if self._good >= self.policy.recover_after:
+                self._bad = 0
+        return self.degraded and self.cooldown_left() == 0
+
+    @property
+    def degraded(self) -> bool:
+        return self._bad >= self.policy.fail_after
+
+    def cooldown_left(self) -> float:
+        return max(0.0, self._last_attempt + self.policy.cooldown - time.monotonic())
+
+    def next_delay(self) -> float:
+        """下一次健康探测的间隔：有异常时缩短到 suspect_interval。"""
+        delay = self.monitor.next_delay()
+        if self._bad:
+            delay = min(delay, self.policy.suspect_interval)
+        return delay
+
+    # ── 切换 ──────────────────────────────────
+
+    def _current_endpoint(self, doc) -> Optional[Tuple[str, int]]:
+        proxy = next((ob for ob in doc.data.get("outbounds", [])
+                      if ob.get("tag") == PROXY_TAG), None)
+        if proxy is None:
+            return None
+        _protocol, address, port = outbound_endpoint(proxy)
+        return address, port
+
+    async def fail_over(self, ctx: "JobContext", bypass: Optional[List] = None) -> Optional[str]:
+        """
+        选择最快的可用备用节点并写入 config.json（不重启 Xray）。
+        透明代理生效时传入 bypass（见 LatencyProber.probe），会被重定向的节点不参与选择。
+
+        Returns:
+            新节点名称；没有可用备用节点时返回 None
+        """
+        now = time.monotonic()
+        self._last_attempt = now
+        self._undo = None   # 上一次切换已生效，失败时不能恢复到它之前
+        self._penalized = {k: t for k, t in self._penalized.items() if t > now}
+
+        doc = await ctx.run_blocking(config_repo.load_document, self.config_path)
+        current = self._current_endpoint(doc)
+        if current is not None:
+            self._penalized[current] = now + self.policy.penalty
+
+        use_store = self.store is not None and bool(await ctx.run_blocking(
+            self.store.find_nodes, limit=1))
+        if use_store:
+            targets = await ctx.run_blocking(targets_from_store, self.store)
+        else:
+            targets = [t for t in targets_from_config(doc.data) if t.key != PROXY_TAG]
+        targets = [t for t in targets if (t.address, t.port) not in self._penalized]
+        if not targets:
+            log.warning("没有可用的备用节点")
+            return None
+
+        ctx.progress(f"当前节点异常，正在测速 {len(targets)} 个备用节点...")
+        results = await self.prober.probe(targets, bypass=bypass)
+        if not results:
+            log.warning("透明代理生效中，备用节点均无法直连测速")
+            return None
+        best = self.prober.best(results)
+        if best is None:
+            log.warning("备用节点均不可达")
+            return None
+        target = next(t for t in targets if t.key == best)
+        name = target.name
+
+        previous = await ctx.run_blocking(_read_bytes, self.config_path)
+        selected = await ctx.run_blocking(self.store.selected_node_id) if use_store else None
+        self._undo = (previous, selected, (target.address, target.port))
+        if use_store:
+            await ctx.run_blocking(self.store.activate_node, best, self.config_path,
+                                   doc.to_dict())
+        else:
+            config = promote_outbound(doc.to_dict(), best)
+            await ctx.run_blocking(config_io.write_json, self.config_path, config)
+            config_repo.invalidate(self.config_path)
+
+        # 新节点重新开始统计；旧的 keep-alive 连接属于旧进程
+        self._bad = self._good = 0
+        self.monitor.samples.clear()
+        self.monitor.client.close()
+        log.info("故障切换: %s -> %s (%.0f ms)", current, name, results[best].median)
+        ctx.progress(f"已切换到节点: {name}")
+        return name
+
+    async def revert(self, ctx: "JobContext") -> None:
+        """撤销最近一次 fail_over() 写入的配置（新节点未通过校验、Xray 仍在使用旧节点时调用）。"""
+        if self._undo is None:
+            return
+        previous, selected, endpoint = self._undo
+        self._undo = None
+        self._penalized[endpoint] = time.monotonic() + self.policy.penalty
+        await ctx.run_blocking(config_io.atomic_write_bytes, self.config_path, previous)
+        config_repo.invalidate(self.config_path)
+        if self.store is not None:
+            await ctx.run_blocking(self.store.select_node, selected)
+        log.info("新节点配置无效，已恢复切换前的配置")
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
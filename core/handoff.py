@@ -0,0 +1,108 @@
+"""
+双实例无缝切换模块
+配置改动无法热更新（core.hot_reload）且透明代理在运行时，不再先停旧核心再启新核心，而是：
+  1. 新核心使用另一组入站端口（端口槽位）启动，与旧核心并存
+  2. 新核心的 API 端口可以连接后视为就绪
+  3. helper 的 tproxy-handoff 命令用一次 iptables-restore 把 TPROXY --on-port
+     切到新端口（原子替换，切换间隔为毫秒级）
+  4. 旧核心继续处理已建立的连接，宽限期后停止
+
+端口槽位：槽位 0 为配置中的原端口，槽位 1 把透明代理入站的端口加上
+HANDOFF_PORT_OFFSET。每次切换在两个槽位之间交替；运行中核心所在的槽位从其运行时配置
+（透明代理入站端口）推断，热更新时新配置使用相同槽位和 API 端口，比较时入站不会被视为改动。
+API 端口不随槽位偏移：新核心编译时另选空闲端口（见 core.artifacts）。
+
+socks / http 等本地入站无法同时被两个实例监听：切换前通过 API 从旧核心移除，
+由新核心接管（这些入站的中断时间为新核心的启动时间）；切换失败时重新加入旧核心。
+"""
+import copy
+import logging
+import socket
+import time
+from typing import Dict, List, Optional
+
+from core.hot_reload import API_INBOUND_TAG, API_LISTEN
+
+log = logging.getLogger("ov2n.handoff")
+
+HANDOFF_PORT_OFFSET = 1     # 槽位 1 的端口偏移
+HANDOFF_GRACE = 10.0        # 旧核心的排空时间（秒）
+READY_TIMEOUT = 5.0         # 等待新核心就绪的时限（秒）
+READY_POLL_INTERVAL = 0.05
+
+
+def _is_tproxy_inbound(inbound: Dict) -> bool:
+    """与 config_repo.ConfigDocument.tproxy_port 的判断一致。"""
+    if inbound.get("protocol") == "dokodemo-door":
+        return inbound.get("settings", {}).get("network") in ("tcp,udp", "tcp", "udp")
+    return "tproxy" in inbound.get("tag", "").lower()
+
+
+def _tproxy_inbound(config: Dict) -> Optional[Dict]:
+    for inbound in config.get("inbounds", []):
+        if inbound.get("tag") != API_INBOUND_TAG and _is_tproxy_inbound(inbound):
+            return inbound
+    return None
+
+
+def slot_port(port: int, slot: int) -> int:
+    return int(port) + HANDOFF_PORT_OFFSET * slot
+
+
+def apply_slot(config: Dict, slot: int) -> Dict:
+    """
+    返回把透明代理入站移到指定槽位后的配置副本。
+
+    Raises:
+        ValueError: 偏移后的端口与其他入站冲突
+    """
+    result = copy.deepcopy(config)
+    if not slot:
+        return result
+    tproxy = _tproxy_inbound(result)
+    if tproxy is None or not tproxy.get("port"):
+        return result
+    tproxy["port"] = slot_port(tproxy["port"], slot)
+    if any(ib.get("port") == tproxy["port"] for ib in result.get("inbounds", [])
+           if ib is not tproxy):
+        raise ValueError(f"切换端口与其他入站冲突: {tproxy['port']}")
+    return result
+
+
+def running_slot(config: Optional[Dict], tproxy_port: Optional[int]) -> int:
+    """
+    运行中核心所在的槽位：透明代理入站端口为 tproxy_port（配置中的原端口）偏移后的值时为 1，
+    无法判断时为 0。
+    """
+    inbound = _tproxy_inbound(config or {})
+    if inbound is None or not tproxy_port:
+        return 0
+    return 1 if inbound.get("port") == slot_port(tproxy_port, 1) else 0
+
+
+def can_handoff(config: Dict) -> bool:
+    """运行中的配置是否支持双实例切换：需要本程序加入的 API 入站、透明代理入站，本地入站都有 tag。"""
+    return (any(ib.get("tag") == API_INBOUND_TAG for ib in config.get("inbounds", []))
+            and _tproxy_inbound(config) is not None
+            and all(ib.get("tag") for ib in shared_inbounds(config)))
+
+
+def shared_inbounds(config: Dict) -> List[Dict]:
+    """切换时需要从旧核心移交给新核心的入站（端口不随槽位变化的监听入站）。"""
+    tproxy = _tproxy_inbound(config)
+    return [ib for ib in config.get("inbounds", [])
+            if ib.get("port") and ib is not tproxy and ib.get("tag") != API_INBOUND_TAG]
+
+
+def wait_ready(port: int, timeout: float = READY_TIMEOUT) -> bool:
+    """等待新核心的 API 入站可以连接。"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.create_connection((API_LISTEN, port), timeout=0.5):
+                return True
+        except OSError:
+            pass
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(READY_POLL_INTERVAL)
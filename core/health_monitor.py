@@ -0,0 +1,373 @@
+"""
+代理健康监测模块
+xray 进程存活不代表流量能通过代理。本模块周期性地经本地 socks/http 入站
+向探测地址发送一个小 HTTP 请求：
+  - ProxyHttpClient 只维护一条 keep-alive 连接（SOCKS5 或 HTTP CONNECT 隧道），
+    连接可用时重复使用，探测只多一次请求往返
+  - 每次结果（首字节时间 TTFB、是否成功）写入环形缓冲区，HealthMonitor.score 给出 0-100 的健康分
+  - 链路空闲且探测正常时逐步拉长探测间隔（退避），出现失败或有流量时恢复为基础间隔
+
+界面用单次定时器按 HealthMonitor.next_delay() 提交 health_check_job。
+只依赖标准库（流量统计使用 psutil，可替换），可以用本地 SOCKS5 替身和 http.server 测试。
+"""
+import http.client
+import json
+import logging
+import os
+import socket
+import ssl
+import statistics
+import struct
+import threading
+import time
+import urllib.parse
+from collections import deque
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Tuple
+
+from core import config_io, config_repo
+from core.config_manager import get_config_dir
+
+if TYPE_CHECKING:
+    from core.job_engine import JobContext
+
+log = logging.getLogger("ov2n.health")
+
+RES_HEALTH = "health"
+
+DEFAULT_PROBE_URL = "http://www.gstatic.com/generate_204"
+PROBE_TIMEOUT = 8.0        # 单次探测超时（秒）
+HISTORY_SIZE = 20          # 环形缓冲区长度
+BASE_INTERVAL = 30.0       # 基础探测间隔（秒）
+MAX_INTERVAL = 300.0       # 空闲时最长探测间隔（秒）
+FAILURE_INTERVAL = 10.0    # 失败后的重试间隔（秒）
+IDLE_BYTES = 64 * 1024     # 两次探测之间流量低于此值视为空闲
+GOOD_TTFB_MS = 300.0       # 不扣分的 TTFB
+BAD_TTFB_MS = 2000.0       # 延迟分降到最低的 TTFB
+
+USER_AGENT = "ov2n-health/1.0"
+
+
+class ProxyError(OSError):
+    """与本地代理的握手失败。"""
+
+
+# ============================================
+# 经代理的 HTTP 客户端
+# ============================================
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    data = b""
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise ProxyError("代理关闭了连接")
+        data += chunk
+    return data
+
+
+def socks5_connect(sock: socket.socket, host: str, port: int) -> None:
+    """在已连接到 SOCKS5 代理的 socket 上建立到 host:port 的隧道（无认证，域名由代理解析）。"""
+    sock.sendall(b"\x05\x01\x00")
+    if _recv_exact(sock, 2) != b"\x05\x00":
+        raise ProxyError("SOCKS5 代理不接受无认证连接")
+    name = host.encode("idna")
+    sock.sendall(b"\x05\x01\x00\x03" + bytes((len(name),)) + name + struct.pack("!H", port))
+    version, reply, _rsv, atyp = _recv_exact(sock, 4)
+    if version != 5 or reply != 0:
+        raise ProxyError(f"SOCKS5 连接失败 (REP={reply})")
+    if atyp == 1:
+        _recv_exact(sock, 4 + 2)
+    elif atyp == 4:
+        _recv_exact(sock, 16 + 2)
+    elif atyp == 3:
+        _recv_exact(sock, _recv_exact(sock, 1)[0] + 2)
+    else:
+        raise ProxyError(f"SOCKS5 应答地址类型无效: {atyp}")
+
+
+class _SocksHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, proxy: Tuple[str, int], *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._proxy = proxy
+
+    def connect(self):
+        self.sock = socket.create_connection(self._proxy, self.timeout)
+        socks5_connect(self.sock, self.host, self.port)
+
+
+class _SocksHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, proxy: Tuple[str, int], *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._proxy = proxy
+
+    def connect(self):
+        sock = socket.create_connection(self._proxy, self.timeout)
+        socks5_connect(sock, self.host, self.port)
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+
+
+class ProxyHttpClient:
+    """
+    经本地代理访问固定 URL 的 HTTP 客户端，只保留一条 keep-alive 连接（线程安全）。
+
+    Args:
+        proxy_type: "socks" 或 "http"
+        proxy: 代理地址 (host, port)
+        url: 探测地址（http 或 https）
+    """
+
+    def __init__(self, proxy_type: str, proxy: Tuple[str, int], url: str,
+                 timeout: float = PROBE_TIMEOUT):
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"不支持的探测地址: {url}")
+        self.proxy_type = proxy_type
+        self.proxy = proxy
+        self.url = url
+        self.timeout = timeout
+        self._https = parts.scheme == "https"
+        self._host = parts.hostname
+        self._port = parts.port or (443 if self._https else 80)
+        self._path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self._conn: Optional[http.client.HTTPConnection] = None
+        self._lock = threading.Lock()
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        if self.proxy_type == "socks":
+            cls = _SocksHTTPSConnection if self._https else _SocksHTTPConnection
+            return cls(self.proxy, self._host, self._port, timeout=self.timeout)
+        # HTTP 入站：http / https 都走 CONNECT 隧道，便于复用同一条连接
+        cls = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+        conn = cls(*self.proxy, timeout=self.timeout)
+        conn.set_tunnel(self._host, self._port)
+        return conn
+
+    def _request(self, conn: http.client.HTTPConnection) -> Tuple[int, float]:
+        started = time.perf_counter()
+        conn.request("GET", self._path, headers={
+            "Host": self._host, "User-Agent": USER_AGENT, "Connection": "keep-alive"})
+        resp = conn.getresponse()
+        ttfb = (time.perf_counter() - started) * 1000
+        resp.read()
+        if resp.will_close:
+            conn.close()
+            self._conn = None
+        return resp.status, ttfb
+
+    def fetch(self) -> Tuple[int, float, bool]:
+        """
+        发送一次探测请求。
+
+        Returns:
+            (HTTP 状态码, TTFB 毫秒（含新建隧道的耗时）, 是否复用了连接)
+
+        Raises:
+            OSError / http.client.HTTPException: 代理或网络错误
+        """
+        with self._lock:
+            conn = self._conn
+            if conn is not None:
+                try:
+                    status, ttfb = self._request(conn)
+                    return status, ttfb, True
+                except (OSError, http.client.HTTPException):
+                    # 空闲连接已被代理或服务器关闭，换新连接重试一次
+                    conn.close()
+                    self._conn = None
+            conn = self._conn = self._new_connection()
+            try:
+                started = time.perf_counter()
+                conn.connect()
+                setup = (time.perf_counter() - started) * 1000
+                status, ttfb = self._request(conn)
+            except BaseException:
+                conn.close()
+                self._conn = None
+                raise
+            return status, setup + ttfb, False
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# ============================================
+# 健康评分
+# ============================================
+
+class HealthSample:
+    """一次探测结果。"""
+
+    __slots__ = ("at", "ok", "ttfb_ms", "error")
+
+    def __init__(self, at: float, ok: bool, ttfb_ms: Optional[float], error: str = ""):
+        self.at = at
+        self.ok = ok
+        self.ttfb_ms = ttfb_ms
+        self.error = error
+
+
+def _system_bytes() -> int:
+    import psutil  # 仅默认的流量统计需要
+    counters = psutil.net_io_counters()
+    return counters.bytes_sent + counters.bytes_recv
+
+
+def find_proxy_inbound(doc) -> Optional[Tuple[str, Tuple[str, int]]]:
+    """
+    从配置中找到可用于探测的本地入站，优先 socks。
+
+    Returns:
+        ("socks" 或 "http", (host, port))；没有时返回 None
+    """
+    found: Dict[str, Tuple[str, int]] = {}
+    for ib in doc.data.get("inbounds", []):
+        protocol = ib.get("protocol")
+        if protocol in ("socks", "http") and protocol not in found and ib.get("port"):
+            listen = ib.get("listen") or "127.0.0.1"
+            if listen in ("0.0.0.0", "::"):
+                listen = "127.0.0.1"
+            found[protocol] = (listen, int(ib["port"]))
+    for protocol in ("socks", "http"):
+        if protocol in found:
+            return protocol, found[protocol]
+    return None
+
+
+class HealthMonitor:
+    """
+    代理健康状态：环形缓冲区 + 健康分 + 退避间隔。
+
+    Args:
+        client: 探测使用的 ProxyHttpClient
+        activity: 返回累计流量字节数的函数（用于判断链路是否空闲），默认统计全部网卡
+    """
+
+    def __init__(self, client: ProxyHttpClient,
+                 activity: Optional[Callable[[], int]] = _system_bytes,
+                 history: int = HISTORY_SIZE, base_interval: float = BASE_INTERVAL,
+                 max_interval: float = MAX_INTERVAL):
+        self.client = client
+        self.samples: deque = deque(maxlen=history)
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self._activity = activity
+        self._last_bytes: Optional[int] = None
+        self._interval = base_interval
+
+    @classmethod
+    def from_config(cls, config_path: str, url: str = DEFAULT_PROBE_URL,
+                    **kwargs) -> Optional["HealthMonitor"]:
+        """根据 config.json 中的 socks/http 入站创建监测器；没有可用入站时返回 None。"""
+        doc = config_repo.get_document(config_path)
+        inbound = find_proxy_inbound(doc) if doc is not None else None
+        if inbound is None:
+            return None
+        proxy_type, proxy = inbound
+        return cls(ProxyHttpClient(proxy_type, proxy, url), **kwargs)
+
+    def check(self) -> HealthSample:
+        """执行一次探测并记录结果（阻塞）。"""
+        try:
+            status, ttfb, _reused = self.client.fetch()
+            ok = 200 <= status < 400
+            sample = HealthSample(time.time(), ok, ttfb, "" if ok else f"HTTP {status}")
+        except (OSError, http.client.HTTPException, ssl.SSLError) as e:
+            sample = HealthSample(time.time(), False, None, str(e) or type(e).__name__)
+        self.samples.append(sample)
+        self._update_interval(sample.ok)
+        if not sample.ok:
+            log.info("代理探测失败: %s", sample.error)
+        return sample
+
+    def _idle(self) -> bool:
+        if self._activity is None:
+            return True
+        try:
+            current = self._activity()
+        except Exception:
+            return True
+        previous, self._last_bytes = self._last_bytes, current
+        return previous is not None and current - previous < IDLE_BYTES
+
+    def _update_interval(self, ok: bool) -> None:
+        idle = self._idle()
+        if not ok:
+            self._interval = min(FAILURE_INTERVAL, self.base_interval)
+        elif idle:
+            self._interval = min(max(self._interval, self.base_interval) * 2, self.max_interval)
+        else:
+            self._interval = self.base_interval
+
+    def next_delay(self) -> float:
+        """距下一次探测的间隔（秒）。"""
+        return self._interval
+
+    @property
+    def success_rate(self) -> Optional[float]:
+        if not self.samples:
+            return None
+        return sum(s.ok for s in self.samples) / len(self.samples)
+
+    @property
+    def median_ttfb(self) -> Optional[float]:
+        values = [s.ttfb_ms for s in self.samples if s.ok and s.ttfb_ms is not None]
+        return statistics.median(values) if values else None
+
+    @property
+    def score(self) -> Optional[int]:
+        """
+        健康分 0-100：成功率 × 延迟系数。
+        TTFB 中位数不超过 GOOD_TTFB_MS 时延迟系数为 1，到 BAD_TTFB_MS 线性降到 0.5。
+        尚无探测结果时返回 None。
+        """
+        rate = self.success_rate
+        if rate is None:
+            return None
+        ttfb = self.median_ttfb
+        if ttfb is None:
+            return 0
+        excess = min(max(ttfb - GOOD_TTFB_MS, 0.0), BAD_TTFB_MS - GOOD_TTFB_MS)
+        factor = 1.0 - 0.5 * excess / (BAD_TTFB_MS - GOOD_TTFB_MS)
+        return round(100 * rate * factor)
+
+    def summary(self) -> str:
+        score = self.score
+        if score is None:
+            return "未检测"
+        last = self.samples[-1]
+        if not last.ok:
+            return f"异常 ({score}) {last.error}"
+        label = "良好" if score >= 80 else "一般" if score >= 50 else "较差"
+        return f"{label} ({score}) {last.ttfb_ms:.0f} ms"
+
+    def close(self) -> None:
+        self.client.close()
+
+
+async def health_check_job(ctx: "JobContext", monitor: HealthMonitor) -> HealthSample:
+    """执行一次健康探测（任务引擎任务，资源: RES_HEALTH）。"""
+    return await ctx.run_blocking(monitor.check)
+
+
+# ============================================
+# 探测地址设置（health.json）
+# ============================================
+
+def _settings_path() -> str:
+    return os.path.join(get_config_dir(), "health.json")
+
+
+def load_probe_url() -> str:
+    try:
+        text, _ = config_io.read_text(_settings_path())
+        url = json.loads(text).get("probe_url")
+    except (OSError, ValueError, AttributeError):
+        return DEFAULT_PROBE_URL
+    return url if isinstance(url, str) and url else DEFAULT_PROBE_URL
+
+
+def save_probe_url(url: str) -> None:
+    config_io.write_json(_settings_path(), {"probe_url": url})
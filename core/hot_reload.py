@@ -0,0 +1,258 @@
+"""
+Xray 热更新模块
+运行时配置开启 xray 的 API（HandlerService / RoutingService），配置改动时不重启核心：
+  - 出站按 tag 比较：删除的和内容变化的用 `xray api rmo` 移除，
+    新增的和变化后的用 `xray api ado` 加入
+  - 路由规则和均衡器用 `xray api adrules`（不带 -append）整体替换
+  - 已建立的连接不经过出站管理器，移除旧出站不会断开它们
+
+入站、DNS、policy、观测等其他部分变化，或首个出站（默认出站）的 tag 改变时，
+plan_reload() 返回 None，由调用方重启 Xray。API 调用失败时同样回退为重启。
+
+API 入站只监听 127.0.0.1（回环地址不会被 TProxy 劫持），端口不固定：
+新启动的核心使用 pick_api_port() 选出的空闲端口（记录在产物 manifest 中，见 core.artifacts），
+热更新时沿用运行中核心的端口。选不到端口时运行时配置不开启 API，改动一律重启生效。
+"""
+import copy
+import json
+import logging
+import os
+import socket
+import subprocess
+import tempfile
+from typing import Dict, List, Optional
+
+from core import config_io
+from core.env_probe import find_binary
+
+log = logging.getLogger("ov2n.reload")
+
+API_TAG = "api"
+API_INBOUND_TAG = "api-in"
+API_LISTEN = "127.0.0.1"
+API_SERVICES = ("HandlerService", "RoutingService")
+API_TIMEOUT = 10.0
+
+# 可以热更新的顶层配置项；其余项变化时需要重启
+RELOADABLE_KEYS = frozenset(("outbounds", "routing"))
+# 路由中可以通过 adrules 替换的部分
+_ROUTING_RELOADABLE = frozenset(("rules", "balancers"))
+
+
+def pick_api_port() -> Optional[int]:
+    """在回环地址上选一个当前空闲的端口；无法绑定时返回 None。"""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.bind((API_LISTEN, 0))
+            return sock.getsockname()[1]
+    except OSError as e:
+        log.warning("无法为 API 选择端口: %s", e)
+        return None
+
+
+def port_free(port: int) -> bool:
+    """回环地址上的端口当前是否可以绑定。"""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.bind((API_LISTEN, port))
+        return True
+    except OSError:
+        return False
+
+
+def enable_api(config: Dict, port: int) -> Dict:
+    """
+    返回开启 API 的配置副本，API 入站监听 127.0.0.1:port。配置中已有 api 段时保持原样
+    （使用其已有的入站和路由规则）。
+    """
+    result = copy.deepcopy(config)
+    if "api" in result:
+        return result
+    result["api"] = {"tag": API_TAG, "services": list(API_SERVICES)}
+    result.setdefault("inbounds", []).append({
+        "tag": API_INBOUND_TAG, "listen": API_LISTEN, "port": port,
+        "protocol": "dokodemo-door", "settings": {"address": API_LISTEN},
+    })
+    routing = result.setdefault("routing", {})
+    routing["rules"] = [{"type": "field", "inboundTag": [API_INBOUND_TAG],
+                         "outboundTag": API_TAG}] + routing.get("rules", [])
+    return result
+
+
+def api_server(config: Dict) -> Optional[str]:
+    """配置中 API 的监听地址（host:port），未开启 API 时返回 None。"""
+    api = config.get("api")
+    if not isinstance(api, dict) or "HandlerService" not in api.get("services", ()):
+        return None
+    if api.get("listen"):
+        return api["listen"]
+    tag = api.get("tag", API_TAG)
+    inbound_tags = {t for rule in config.get("routing", {}).get("rules", [])
+                    if rule.get("outboundTag") == tag for t in rule.get("inboundTag", [])}
+    for inbound in config.get("inbounds", []):
+        if inbound.get("tag") in inbound_tags and inbound.get("port"):
+            return f"{inbound.get('listen') or API_LISTEN}:{inbound['port']}"
+    return None
+
+
+def api_inbound_port(config: Optional[Dict]) -> Optional[int]:
+    """enable_api() 加入的 API 入站端口；没有该入站（未开启或使用配置自带的 api 段）时返回 None。"""
+    for inbound in (config or {}).get("inbounds", []):
+        if inbound.get("tag") == API_INBOUND_TAG and inbound.get("port"):
+            return int(inbound["port"])
+    return None
+
+
+class ReloadPlan:
+    """
+    热更新步骤。
+
+    Args:
+        remove: 需要移除的出站 tag
+        add: 需要加入的出站（按新配置中的顺序）
+        routing: 替换后的路由（rules / balancers），路由未变化时为 None
+    """
+
+    __slots__ = ("remove", "add", "routing")
+
+    def __init__(self, remove: List[str], add: List[Dict], routing: Optional[Dict]):
+        self.remove = remove
+        self.add = add
+        self.routing = routing
+
+    @property
+    def empty(self) -> bool:
+        return not self.remove and not self.add and self.routing is None
+
+    def __repr__(self) -> str:
+        return (f"<ReloadPlan -{self.remove} +{[ob.get('tag') for ob in self.add]}"
+                f"{' routing' if self.routing is not None else ''}>")
+
+
+def _without(config: Dict, keys) -> Dict:
+    return {k: v for k, v in config.items() if k not in keys}
+
+
+def plan_reload(old: Dict, new: Dict) -> Optional[ReloadPlan]:
+    """比较运行中的配置和新配置，返回热更新步骤；无法热更新时返回 None。"""
+    if api_server(old) is None:
+        return None
+    if _without(old, RELOADABLE_KEYS) != _without(new, RELOADABLE_KEYS):
+        return None
+    old_routing, new_routing = old.get("routing", {}), new.get("routing", {})
+    if _without(old_routing, _ROUTING_RELOADABLE) != _without(new_routing, _ROUTING_RELOADABLE):
+        return None
+
+    old_outbounds = {ob.get("tag"): ob for ob in old.get("outbounds", [])}
+    new_outbounds = new.get("outbounds", [])
+    if None in old_outbounds or any(not ob.get("tag") for ob in new_outbounds):
+        return None     # 没有 tag 的出站无法通过 API 移除
+    if new_outbounds and old.get("outbounds") \
+            and new_outbounds[0]["tag"] != old["outbounds"][0]["tag"]:
+        return None     # 默认出站只能在启动时确定
+
+    new_by_tag = {ob["tag"]: ob for ob in new_outbounds}
+    remove = [tag for tag, ob in old_outbounds.items() if new_by_tag.get(tag) != ob]
+    add = [ob for ob in new_outbounds
+           if ob["tag"] not in old_outbounds or ob["tag"] in remove]
+
+    routing = None
+    if any(old_routing.get(k) != new_routing.get(k) for k in _ROUTING_RELOADABLE):
+        routing = {k: new_routing[k] for k in _ROUTING_RELOADABLE if k in new_routing}
+    return ReloadPlan(remove, add, routing)
+
+
+def find_xray_binary() -> Optional[str]:
+    """客户端侧调用 API 使用的 xray 可执行文件（API 命令不需要 root）。"""
+    return find_binary("xray", extra_dirs=("/usr/local/bin",))
+
+
+class XrayApi:
+    """通过 `xray api` 子命令调用运行中核心的 gRPC API。"""
+
+    def __init__(self, binary: str, server: str, timeout: float = API_TIMEOUT):
+        self.binary = binary
+        self.server = server
+        self.timeout = timeout
+
+    def _run(self, command: str, *args: str) -> None:
+        cmd = [self.binary, "api", command, f"--server={self.server}", *args]
+        log.debug("执行: %s", " ".join(cmd))
+        r = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout)
+        if r.returncode != 0:
+            raise RuntimeError(f"xray api {command} 失败: "
+                               f"{(r.stderr or r.stdout).strip() or r.returncode}")
+
+    def _run_with_file(self, command: str, obj: Dict) -> None:
+        fd, path = tempfile.mkstemp(prefix="ov2n-api-", suffix=".json")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(obj, f, ensure_ascii=False)
+            self._run(command, path)
+        finally:
+            os.unlink(path)
+
+    def remove_outbound(self, tag: str) -> None:
+        self._run("rmo", tag)
+
+    def add_outbounds(self, outbounds: List[Dict]) -> None:
+        self._run_with_file("ado", {"outbounds": outbounds})
+
+    def remove_inbound(self, tag: str) -> None:
+        self._run("rmi", tag)
+
+    def add_inbounds(self, inbounds: List[Dict]) -> None:
+        self._run_with_file("adi", {"inbounds": inbounds})
+
+    def replace_routing(self, routing: Dict) -> None:
+        self._run_with_file("adrules", {"routing": routing})
+
+
+def apply_reload(old: Dict, new: Dict, binary: Optional[str] = None) -> Optional[ReloadPlan]:
+    """
+    把新配置热更新到运行中的 Xray。
+
+    Returns:
+        已执行的步骤；无法热更新或 API 调用失败（需要重启）时返回 None
+    """
+    plan = plan_reload(old, new)
+    if plan is None:
+        log.info("配置改动无法热更新，需要重启")
+        return None
+    if plan.empty:
+        return plan
+    binary = binary or find_xray_binary()
+    if binary is None:
+        log.info("未找到 xray 可执行文件，无法调用 API")
+        return None
+    api = XrayApi(binary, api_server(old))
+    try:
+        for tag in plan.remove:
+            api.remove_outbound(tag)
+        if plan.add:
+            api.add_outbounds(plan.add)
+        if plan.routing is not None:
+            api.replace_routing(plan.routing)
+    except (OSError, RuntimeError, subprocess.SubprocessError) as e:
+        log.warning("热更新失败: %s", e)
+        return None
+    log.info("热更新完成: %r", plan)
+    return plan
+
+
+def load_config(path: str) -> Optional[Dict]:
+    """读取运行时配置（编译后的纯 JSON），失败时返回 None。"""
+    try:
+        return json.loads(config_io.read_text(path)[0])
+    except (OSError, ValueError) as e:
+        log.warning("读取运行时配置失败: %s", e)
+        return None
+
+
+def reload_from_files(running_path: str, new_path: str,
+                      binary: Optional[str] = None) -> Optional[ReloadPlan]:
+    """apply_reload 的文件版本：running_path 为运行中 Xray 使用的运行时配置。"""
+    old, new = load_config(running_path), load_config(new_path)
+    if old is None or new is None:
+        return None
+    return apply_reload(old, new, binary)
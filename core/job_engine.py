@@ -0,0 +1,432 @@
+"""
+后台任务引擎
+替代"每个操作一个 QThread"的做法：所有启停任务都作为协程提交到同一个
+asyncio 事件循环（运行在独立线程中），并通过 Qt 信号把进度和结果送回 UI。
+
+  - 子进程使用 asyncio subprocess，等待期间不占用线程，可随时终止
+  - 每个任务带取消令牌，JobHandle.cancel() 立即中断任务并终止其子进程
+  - 按资源串行：每个资源（如 "openvpn" / "xray"）一个 FIFO 队列，任务启动时
+    一次性排入它所需的全部资源队列，位于所有队列队首时才执行。
+    顺序完全由启动顺序决定，不会死锁；不同资源上的任务可以并行
+  - 阻塞调用（Windows 管理器、psutil 等）通过 run_blocking() 放到线程池执行
+
+用法：
+    engine = get_engine()
+    handle = engine.create_job(start_vpn_job, cfg_path, resources=("openvpn",),
+                               name="start-openvpn")
+    handle.progress.connect(...)
+    handle.finished.connect(...)   # 协程返回值
+    handle.failed.connect(...)     # 错误信息
+    handle.cancelled.connect(...)
+    handle.start()                 # 先连接信号再启动，避免丢失早期信号
+    ...
+    handle.cancel()
+"""
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import itertools
+import logging
+import subprocess
+import threading
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Sequence
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+log = logging.getLogger("ov2n.jobs")
+
+JOB_EXECUTOR_WORKERS = 4      # run_blocking() 使用的线程数
+PROCESS_KILL_GRACE = 2.0      # 取消任务时 terminate 后等待子进程退出的时间（秒）
+ROLLBACK_TIMEOUT = 60.0       # 退出时等待已取消任务回滚的时限（秒，pkexec 授权对话框可能仍在等待输入）
+
+
+class JobCancelled(Exception):
+    """任务已被取消。"""
+
+
+class JobError(Exception):
+    """任务失败，消息直接展示给用户。"""
+
+
+class CancelToken:
+    """线程安全的取消令牌，UI 线程设置，任务协程检查。"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise JobCancelled()
+
+
+class JobHandle(QObject):
+    """
+    任务句柄，驻留在 UI 线程。
+    信号从事件循环线程发出，Qt 自动以队列方式投递到 UI 线程。
+    """
+    progress = pyqtSignal(str)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, job_id: int, name: str, resources: Sequence[str],
+                 cancellable: bool = True):
+        super().__init__()
+        self.job_id = job_id
+        self.name = name
+        self.resources = tuple(resources)
+        self.cancellable = cancellable
+        self.token = CancelToken()
+        self._done = threading.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+        self._engine: Optional["JobEngine"] = None
+        self._start: Optional[Callable[[], None]] = None
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def start(self) -> "JobHandle":
+        """把任务交给事件循环（只能调用一次）。"""
+        start, self._start = self._start, None
+        if start is not None:
+            start()
+        return self
+
+    def cancel(self) -> None:
+        """请求取消：设置令牌并中断正在等待的协程（排队中的任务直接出队）。"""
+        if self.done or not self.cancellable:
+            return
+        self.token.cancel()
+        if self._engine is not None:
+            self._engine.loop.call_soon_threadsafe(self._cancel_task)
+
+    def _cancel_task(self) -> None:
+        # 只取消已开始执行的协程；尚未执行的协程会在入口处检查令牌。
+        # (未开始的 Task 被取消时 finally 不会执行，资源队列无法清理)
+        if self._task is not None and self._running:
+            self._task.cancel()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """阻塞等待任务结束，返回是否已结束。"""
+        return self._done.wait(timeout)
+
+    def __repr__(self) -> str:
+        return f"<Job #{self.job_id} {self.name} {list(self.resources)}>"
+
+
+class JobContext:
+    """传给任务协程的上下文：进度、取消令牌、子进程和阻塞调用。"""
+
+    def __init__(self, engine: "JobEngine", handle: JobHandle):
+        self._engine = engine
+        self._handle = handle
+        self.token = handle.token
+
+    @property
+    def name(self) -> str:
+        return self._handle.name
+
+    def progress(self, message: str) -> None:
+        log.debug("%r: %s", self._handle, message)
+        self._handle.progress.emit(message)
+
+    async def sleep(self, seconds: float) -> None:
+        """可被取消的 sleep。"""
+        self.token.raise_if_cancelled()
+        await asyncio.sleep(seconds)
+
+    async def run_blocking(self, func: Callable, *args,
+                           on_cancel: Optional[Callable[[], Any]] = None,
+                           **kwargs) -> Any:
+        """
+        在线程池中执行阻塞函数。
+        取消时协程立即返回，线程中的调用无法中断、会自然结束；
+        on_cancel 在该调用成功结束后于线程池中执行（如停止刚启动的进程）。
+        """
+        self.token.raise_if_cancelled()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self._engine.executor, functools.partial(func, *args, **kwargs))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if on_cancel is not None:
+                self._engine.track(self._cleanup_after(future, on_cancel))
+            raise
+
+    async def _cleanup_after(self, future: asyncio.Future, on_cancel: Callable[[], Any]) -> None:
+        try:
+            await future
+        except Exception:
+            return
+        log.info("任务已取消，执行清理: %r", on_cancel)
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._engine.executor, on_cancel)
+        except Exception:
+            log.exception("已取消任务的清理失败")
+
+    async def run_process(self, cmd: Sequence[str],
+                          timeout: Optional[float] = None,
+                          input_data: Optional[bytes] = None,
+                          check_cancel: bool = True,
+                          on_cancel: Optional[Callable[
+                              [subprocess.CompletedProcess], Awaitable[Any]]] = None
+                          ) -> subprocess.CompletedProcess:
+        """
+        异步执行子进程，返回与 subprocess.run(text=True) 相同结构的结果。
+        超时抛出 subprocess.TimeoutExpired；任务取消时先 terminate 再 kill 子进程。
+
+        check_cancel=False 用于取消后的清理/回滚：令牌已取消也照常执行。
+        on_cancel: 取消时子进程无法终止（如 pkexec 已切换为 root），
+                   则在后台等它结束，并以其结果调用 on_cancel 做回滚。
+        """
+        if check_cancel:
+            self.token.raise_if_cancelled()
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.PIPE if input_data is not None else None,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE)
+        communicate = asyncio.ensure_future(proc.communicate(input_data))
+        try:
+            stdout, stderr = await asyncio.wait_for(
+                asyncio.shield(communicate), timeout)
+        except asyncio.TimeoutError:
+            await _terminate(proc)
+            communicate.cancel()
+            raise subprocess.TimeoutExpired(list(cmd), timeout)
+        except asyncio.CancelledError:
+            await asyncio.shield(_terminate(proc))
+            if proc.returncode is None and on_cancel is not None:
+                self._engine.track(self._finish_orphan(cmd, proc, communicate, on_cancel))
+            else:
+                communicate.cancel()
+            raise
+        return _completed(cmd, proc.returncode, stdout, stderr)
+
+    async def _finish_orphan(self, cmd, proc, communicate, on_cancel) -> None:
+        try:
+            stdout, stderr = await communicate
+            log.info("已取消任务的子进程结束 (rc=%s)，执行回滚", proc.returncode)
+            await on_cancel(_completed(cmd, proc.returncode, stdout, stderr))
+        except Exception:
+            log.exception("已取消任务的回滚失败")
+
+
+def _completed(cmd, returncode, stdout: bytes, stderr: bytes) -> subprocess.CompletedProcess:
+    return subprocess.CompletedProcess(
+        list(cmd), returncode,
+        (stdout or b"").decode("utf-8", errors="replace"),
+        (stderr or b"").decode("utf-8", errors="replace"))
+
+
+async def _terminate(proc: "asyncio.subprocess.Process") -> None:
+    """尽力终止子进程。pkexec 切换到 root 后普通用户无权发送信号，此时只能放弃等待。"""
+    if proc.returncode is not None:
+        return
+    try:
+        proc.terminate()
+        try:
+            await asyncio.wait_for(proc.wait(), PROCESS_KILL_GRACE)
+            return
+        except asyncio.TimeoutError:
+            proc.kill()
+            await asyncio.wait_for(proc.wait(), PROCESS_KILL_GRACE)
+    except (ProcessLookupError, PermissionError, asyncio.TimeoutError) as e:
+        log.warning("无法终止子进程 PID=%s: %s", proc.pid, e)
+
+
+class JobEngine:
+    """asyncio 事件循环 + 专用线程，按资源串行调度任务。"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=JOB_EXECUTOR_WORKERS, thread_name_prefix="ov2n-job")
+        self._queues: Dict[str, collections.deque] = {}
+        self._queue_changed: Optional[asyncio.Condition] = None
+        self._jobs: Dict[int, JobHandle] = {}
+        self._background: set = set()
+        self._ids = itertools.count(1)
+        self._thread = threading.Thread(
+            target=self._run_loop, name="ov2n-jobs", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+        self.loop.close()
+
+    # ══════════════════════════════════════════
+    # 提交与查询
+    # ══════════════════════════════════════════
+
+    def create_job(self, job: Callable[..., Awaitable[Any]], *args,
+                   resources: Iterable[str] = (), name: str = "",
+                   cancellable: bool = True, **kwargs) -> JobHandle:
+        """
+        创建任务 job(ctx, *args, **kwargs)，连接信号后调用 handle.start() 执行。
+        资源锁的排队顺序以 start() 的调用顺序为准。
+
+        Args:
+            job: 第一个参数为 JobContext 的协程函数
+            resources: 任务独占的资源名；同一资源上的任务按启动顺序执行
+            name: 任务名（日志/调试用）
+            cancellable: False 时 cancel() 无效（停止/清理类任务必须执行完）
+        """
+        resources = sorted(set(resources))
+        handle = JobHandle(next(self._ids), name or job.__name__, resources,
+                           cancellable)
+        handle._engine = self
+
+        def _create():
+            # 在事件循环线程中入队，保证与 start() 调用顺序一致
+            for resource in handle.resources:
+                self._queues.setdefault(resource, collections.deque()).append(handle)
+            handle._task = self.loop.create_task(
+                self._run(handle, job, args, kwargs))
+
+        def _start():
+            self._jobs[handle.job_id] = handle
+            log.info("提交任务 %r", handle)
+            self.loop.call_soon_threadsafe(_create)
+
+        handle._start = _start
+        return handle
+
+    def submit(self, job: Callable[..., Awaitable[Any]], *args,
+               resources: Iterable[str] = (), name: str = "",
+               cancellable: bool = True, **kwargs) -> JobHandle:
+        """创建并立即启动任务（不关心早期进度信号时使用）。"""
+        return self.create_job(job, *args, resources=resources, name=name,
+                               cancellable=cancellable, **kwargs).start()
+
+    def track(self, coro) -> asyncio.Task:
+        """在事件循环中运行不属于任何任务的后台协程（回滚等），保留引用直至结束。"""
+        task = self.loop.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    def is_busy(self, resource: str) -> bool:
+        """资源上是否有未结束（运行中或排队中）的任务。"""
+        return any(resource in h.resources and not h.done
+                   for h in list(self._jobs.values()))
+
+    def active_jobs(self) -> list:
+        return [h for h in list(self._jobs.values()) if not h.done]
+
+    def cancel_all(self) -> None:
+        for handle in self.active_jobs():
+            handle.cancel()
+
+    # ══════════════════════════════════════════
+    # 执行
+    # ══════════════════════════════════════════
+
+    def _is_head(self, handle: JobHandle) -> bool:
+        return all(self._queues[r][0] is handle for r in handle.resources)
+
+    async def _wait_turn(self, handle: JobHandle) -> None:
+        """等到任务位于其所有资源队列的队首。"""
+        if self._is_head(handle):
+            return
+        if self._queue_changed is None:
+            self._queue_changed = asyncio.Condition()
+        log.info("%r 排队等待资源 %s", handle, list(handle.resources))
+        async with self._queue_changed:
+            await self._queue_changed.wait_for(lambda: self._is_head(handle))
+
+    async def _leave_queues(self, handle: JobHandle) -> None:
+        for resource in handle.resources:
+            queue = self._queues[resource]
+            queue.remove(handle)
+            if not queue:
+                del self._queues[resource]
+        if self._queue_changed is not None:
+            async with self._queue_changed:
+                self._queue_changed.notify_all()
+
+    async def _run(self, handle: JobHandle, job, args, kwargs) -> None:
+        handle._running = True
+        try:
+            handle.token.raise_if_cancelled()
+            await self._wait_turn(handle)
+            handle.token.raise_if_cancelled()
+
+            result = await job(JobContext(self, handle), *args, **kwargs)
+            log.info("任务完成 %r", handle)
+            handle.finished.emit(result)
+        except (asyncio.CancelledError, JobCancelled):
+            log.info("任务已取消 %r", handle)
+            handle.cancelled.emit()
+        except JobError as e:
+            log.warning("任务失败 %r: %s", handle, e)
+            handle.failed.emit(str(e))
+        except subprocess.TimeoutExpired as e:
+            log.warning("任务超时 %r: %s", handle, e)
+            handle.failed.emit(f"操作超时（{e.timeout:g}s）")
+        except Exception as e:
+            log.exception("任务失败 %r", handle)
+            handle.failed.emit(f"{handle.name} 异常: {e}")
+        finally:
+            await asyncio.shield(self._leave_queues(handle))
+            self._jobs.pop(handle.job_id, None)
+            handle._done.set()
+
+    async def _drain(self, timeout: float, rollback_timeout: float) -> bool:
+        """等待任务和 track() 的后台协程结束；有后台协程（回滚）时时限延长为 rollback_timeout。"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        while True:
+            pending = [h._task for h in self.active_jobs() if h._task is not None]
+            pending += list(self._background)
+            if not pending:
+                return True
+            limit = rollback_timeout if self._background else timeout
+            remaining = started + limit - loop.time()
+            if remaining <= 0:
+                return False
+            await asyncio.wait(pending, timeout=remaining,
+                               return_when=asyncio.FIRST_COMPLETED)
+
+    def shutdown(self, timeout: float = 5.0, rollback_timeout: float = ROLLBACK_TIMEOUT) -> None:
+        """
+        取消所有任务并停止事件循环。
+        任务最多等待 timeout 秒；已取消任务留下的回滚（如 pkexec 启动的进程结束后将其停止）
+        最多等待 rollback_timeout 秒，不随事件循环一起丢弃。
+        """
+        self.cancel_all()
+        drained = asyncio.run_coroutine_threadsafe(
+            self._drain(timeout, rollback_timeout), self.loop)
+        try:
+            if not drained.result(max(timeout, rollback_timeout) + 1.0):
+                log.warning("退出时仍有未结束的任务或回滚: %d 个后台任务", len(self._background))
+        except concurrent.futures.TimeoutError:
+            log.warning("等待任务结束超时")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        self.executor.shutdown(wait=False)
+
+
+_engine: Optional[JobEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> JobEngine:
+    """全局任务引擎（首次调用时启动事件循环线程）。"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = JobEngine()
+        return _engine
@@ -0,0 +1,134 @@
+"""
+JSONC 解析模块
+xray/v2ray 的 config.json 允许注释，用户手写配置中也常见尾随逗号。本模块提供：
+  - loads(): 先直接 json.loads（标准 JSON 零额外开销），失败后才做一次 JSONC 预处理再解析
+  - strip_jsonc(): 线性扫描，正确跳过字符串内的 // 和 /*，
+    移除 // 行尾注释、/* */ 块注释和尾随逗号（旧实现只能去掉整行 // 注释）
+
+预处理把注释和尾随逗号替换为等长空白（保留换行），解析错误的位置与原文一一对应，
+抛出的 json.JSONDecodeError 中的行号/列号可直接指向用户文件中的出错位置。
+"""
+import json
+import re
+from typing import Any, List
+
+# 紧跟 ] 或 } 的逗号（注释已替换为空白后匹配）
+_TRAILING_COMMA_RE = re.compile(r',(?=\s*[\]}])')
+_ESCAPED_QUOTE_RE = re.compile(r'(\\+)"')
+_NON_NEWLINE_RE = re.compile(r'[^\n]')
+
+
+def _count_quotes(text: str, start: int, end: int) -> int:
+    """统计 [start, end) 内未被转义的双引号个数。"""
+    n = text.count('"', start, end)
+    if n and text.find('\\', start, end) != -1:
+        for m in _ESCAPED_QUOTE_RE.finditer(text, start, end):
+            if len(m.group(1)) % 2:
+                n -= 1
+    return n
+
+
+class _StringTracker:
+    """
+    沿文本单向前进，判断某个位置是否处于字符串内部。
+    两个候选位置之间只用 str.count 统计引号奇偶，不逐字符扫描。
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+        self.inside = False
+
+    def advance(self, to: int) -> bool:
+        """前进到 to，返回该位置是否在字符串内。"""
+        if _count_quotes(self.text, self.pos, to) % 2:
+            self.inside = not self.inside
+        self.pos = to
+        return self.inside
+
+    def skip(self, to: int) -> None:
+        """跳过一段不参与统计的区域（注释）。"""
+        self.pos = to
+
+
+def _strip_comments(text: str) -> str:
+    out: List[str] = []
+    copied = 0
+    tracker = _StringTracker(text)
+    i = text.find('/')
+    while i != -1:
+        if not tracker.advance(i):
+            kind = text[i + 1:i + 2]
+            if kind == '/':
+                end = text.find('\n', i)
+                if end == -1:
+                    end = len(text)
+                out.append(text[copied:i])
+                out.append(' ' * (end - i))
+            elif kind == '*':
+                end = text.find('*/', i + 2)
+                if end == -1:
+                    raise json.JSONDecodeError("Unterminated comment", text, i)
+                end += 2
+                out.append(text[copied:i])
+                out.append(_NON_NEWLINE_RE.sub(' ', text[i:end]))
+            else:
+                i = text.find('/', i + 1)
+                continue
+            copied = end
+            tracker.skip(end)
+            i = text.find('/', end)
+        else:
+            i = text.find('/', i + 1)
+    if not out:
+        return text
+    out.append(text[copied:])
+    return ''.join(out)
+
+
+def _strip_trailing_commas(text: str) -> str:
+    out: List[str] = []
+    copied = 0
+    tracker = _StringTracker(text)
+    for m in _TRAILING_COMMA_RE.finditer(text):
+        i = m.start()
+        if not tracker.advance(i):
+            out.append(text[copied:i])
+            out.append(' ')
+            copied = i + 1
+    if not out:
+        return text
+    out.append(text[copied:])
+    return ''.join(out)
+
+
+def strip_jsonc(text: str) -> str:
+    """
+    移除 // 和 /* */ 注释以及尾随逗号，返回与原文等长的标准 JSON 文本。
+
+    只在 '/' 和疑似尾随逗号处停下，用引号奇偶判断是否位于字符串内，
+    其余内容由 str.find / str.count 在 C 层跳过。
+
+    Raises:
+        json.JSONDecodeError: 块注释未闭合
+    """
+    return _strip_trailing_commas(_strip_comments(text))
+
+
+def loads(text: str) -> Any:
+    """
+    解析 JSON/JSONC 文本。
+
+    Raises:
+        json.JSONDecodeError: 语法错误，lineno/colno 指向原文位置
+    """
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    stripped = strip_jsonc(text)
+    try:
+        return json.loads(stripped)
+    except json.JSONDecodeError as e:
+        # 预处理保持等长，错误位置直接对应原文
+        raise json.JSONDecodeError(e.msg, text, e.pos) from None
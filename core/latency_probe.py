@@ -0,0 +1,438 @@
+"""
+节点测速模块
+并发测量各节点的 TCP 连接耗时（可选 TLS 握手耗时），用于显示延迟和自动选择最快节点：
+  - LatencyProber 用 asyncio 信号量限制并发，同一域名在一轮探测中只解析一次，
+    DNS 耗时不计入连接延迟
+  - 每个节点保留最近 STATS_WINDOW 次结果（ProbeStats），给出中位数、抖动和丢包率
+  - 节点来源：config.json 中的代理出站（targets_from_config）或档案库节点（targets_from_store）
+  - auto_select_proxy() 在启动 Xray 前测速，并把最快的节点设为 proxy 出站
+  - 透明代理生效时，本机发出的连接除 RETURN 规则放行的网段外都会被 TPROXY 转给本机 Xray，
+    测得的只是本机耗时；probe() 传入 bypass（tproxy_bypass()）后跳过这些节点
+
+连接建立由 LatencyProber._open() 完成，可在子类中注入延迟或失败，
+对本地监听端口即可测试，不依赖外网。
+"""
+import asyncio
+import ipaddress
+import logging
+import socket
+import ssl
+import statistics
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from core import config_io, config_repo
+from core.artifacts import TPROXY_BYPASS_CIDRS
+from core.profile_store import PROXY_TAG, ProfileStore, outbound_endpoint
+
+if TYPE_CHECKING:
+    from core.job_engine import JobContext
+
+log = logging.getLogger("ov2n.probe")
+
+RES_PROBE = "probe"
+
+PROBE_CONCURRENCY = 64   # 同时进行的连接数
+PROBE_TIMEOUT = 3.0      # 单次探测超时（秒，含 DNS、TCP、TLS）
+STATS_WINDOW = 10        # 每个节点保留的探测次数
+MAX_LOSS = 0.5           # 自动选择时允许的最大丢包率
+
+_TLS_SECURITY = frozenset(("tls", "reality", "xtls"))
+
+
+class _Redirected(Exception):
+    """目标地址会被 TPROXY 重定向，不能直连测速。"""
+
+
+class ProbeTarget:
+    """一个待测节点。key 为出站 tag 或档案库节点 id。"""
+
+    __slots__ = ("key", "name", "address", "port", "sni")
+
+    def __init__(self, key, name: str, address: str, port: int, sni: Optional[str] = None):
+        self.key = key
+        self.name = name
+        self.address = address
+        self.port = port
+        self.sni = sni
+
+    def __repr__(self) -> str:
+        return f"<ProbeTarget {self.key!r} {self.address}:{self.port}>"
+
+
+class ProbeStats:
+    """单个节点的滚动统计（毫秒）。"""
+
+    __slots__ = ("connect", "tls", "_results")
+
+    def __init__(self, window: int = STATS_WINDOW):
+        self.connect: deque = deque(maxlen=window)  # 成功探测的 TCP 耗时
+        self.tls: deque = deque(maxlen=window)      # 成功探测的 TLS 握手耗时
+        self._results: deque = deque(maxlen=window)  # True / False，用于丢包率
+
+    def add(self, connect_ms: Optional[float], tls_ms: Optional[float] = None) -> None:
+        """记录一次探测结果，connect_ms 为 None 表示失败。"""
+        self._results.append(connect_ms is not None)
+        if connect_ms is not None:
+            self.connect.append(connect_ms)
+            if tls_ms is not None:
+                self.tls.append(tls_ms)
+
+    @property
+    def samples(self) -> int:
+        return len(self._results)
+
+    @property
+    def median(self) -> Optional[float]:
+        return statistics.median(self.connect) if self.connect else None
+
+    @property
+    def tls_median(self) -> Optional[float]:
+        return statistics.median(self.tls) if self.tls else None
+
+    @property
+    def jitter(self) -> float:
+        """相邻两次成功探测耗时之差的平均值。"""
+        values = list(self.connect)
+        if len(values) < 2:
+            return 0.0
+        return sum(abs(b - a) for a, b in zip(values, values[1:])) / (len(values) - 1)
+
+    @property
+    def loss(self) -> float:
+        if not self._results:
+            return 0.0
+        return 1.0 - sum(self._results) / len(self._results)
+
+    @property
+    def score(self) -> Optional[float]:
+        """排序用分数（越小越好）：中位数 + 抖动，含 TLS 时加上握手耗时。"""
+        if self.median is None:
+            return None
+        return self.median + self.jitter + (self.tls_median or 0.0)
+
+    def __repr__(self) -> str:
+        if self.median is None:
+            return f"<ProbeStats 不可达 ({self.samples} 次)>"
+        return (f"<ProbeStats {self.median:.1f} ms ±{self.jitter:.1f} "
+                f"丢包 {self.loss:.0%} ({self.samples} 次)>")
+
+
+# ============================================
+# 探测
+# ============================================
+
+class LatencyProber:
+    """
+    并发测速器。统计结果按 target.key 累积在 self.stats 中，多轮探测形成滚动窗口。
+
+    Args:
+        concurrency: 最大并发连接数
+        timeout: 单次探测超时（秒）
+        tls: 同时测量 TLS 握手耗时（只对使用 TLS/REALITY 的节点进行）
+        window: 每个节点保留的探测次数
+    """
+
+    def __init__(self, concurrency: int = PROBE_CONCURRENCY, timeout: float = PROBE_TIMEOUT,
+                 tls: bool = False, window: int = STATS_WINDOW):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.tls = tls
+        self.window = window
+        self.stats: Dict[object, ProbeStats] = {}
+        self._ssl_context: Optional[ssl.SSLContext] = None
+
+    def _ssl(self) -> ssl.SSLContext:
+        # 只测握手耗时，不校验证书（REALITY 节点返回的是伪装站点的证书）
+        if self._ssl_context is None:
+            ctx = ssl.create_default_context()
+            ctx.check_hostname = False
+            ctx.verify_mode = ssl.CERT_NONE
+            self._ssl_context = ctx
+        return self._ssl_context
+
+    async def _resolve(self, host: str) -> Tuple:
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        if not infos:
+            raise OSError(f"无法解析 {host}")
+        family, _type, _proto, _name, sockaddr = infos[0]
+        return family, sockaddr[0]
+
+    async def _open(self, family: int, ip: str, port: int) -> asyncio.BaseTransport:
+        """建立 TCP 连接（测试时可在子类中注入延迟）。"""
+        loop = asyncio.get_running_loop()
+        transport, _protocol = await loop.create_connection(
+            asyncio.Protocol, ip, port, family=family)
+        return transport
+
+    async def _probe_once(self, target: ProbeTarget, resolved: "asyncio.Future",
+                          bypass: Optional[List] = None) -> Tuple[Optional[float], Optional[float]]:
+        # 解析结果由同域名的节点共享，超时取消本次探测时不能连带取消解析
+        family, ip = await asyncio.shield(resolved)
+        if bypass is not None and not is_direct(ip, bypass):
+            raise _Redirected(ip)
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        transport = await self._open(family, ip, target.port)
+        connect_ms = (time.perf_counter() - started) * 1000
+        tls_ms = None
+        try:
+            if self.tls and target.sni is not None:
+                started = time.perf_counter()
+                transport = await loop.start_tls(
+                    transport, transport.get_protocol(), self._ssl(),
+                    server_hostname=target.sni or target.address)
+                tls_ms = (time.perf_counter() - started) * 1000
+        finally:
+            transport.close()
+        return connect_ms, tls_ms
+
+    async def probe(self, targets: Iterable[ProbeTarget], rounds: int = 1,
+                    bypass: Optional[List] = None) -> Dict[object, ProbeStats]:
+        """
+        探测所有节点 rounds 轮，返回本次涉及节点的统计。
+        失败（超时、拒绝连接、解析失败）记为一次丢包，不抛异常。
+
+        bypass 为透明代理放行的网段（tproxy_bypass()），None 表示透明代理未生效。
+        地址不在其中的节点会被重定向到本机，不探测、不计入统计，也不出现在返回结果中。
+        """
+        targets = list(targets)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        resolving: Dict[str, asyncio.Future] = {}
+        redirected = set()
+
+        def resolve(target: ProbeTarget) -> "asyncio.Future":
+            host = target.address
+            if host not in resolving:
+                resolving[host] = asyncio.ensure_future(self._resolve(host))
+            return resolving[host]
+
+        async def one(target: ProbeTarget) -> None:
+            async with semaphore:
+                try:
+                    connect_ms, tls_ms = await asyncio.wait_for(
+                        self._probe_once(target, resolve(target), bypass), self.timeout)
+                except _Redirected:
+                    redirected.add(target.key)
+                    return
+                except (OSError, asyncio.TimeoutError, ssl.SSLError) as e:
+                    log.debug("测速失败 %s:%s: %s", target.address, target.port, e)
+                    connect_ms, tls_ms = None, None
+            stats = self.stats.get(target.key)
+            if stats is None:
+                stats = self.stats[target.key] = ProbeStats(self.window)
+            stats.add(connect_ms, tls_ms)
+
+        started = time.monotonic()
+        try:
+            for _ in range(rounds):
+                await asyncio.gather(*(one(t) for t in targets))
+        finally:
+            for future in resolving.values():
+                if not future.done():
+                    future.cancel()
+                elif not future.cancelled():
+                    future.exception()  # 已记为丢包，避免 "exception never retrieved"
+        log.info("测速完成: %d 个节点 × %d 轮，用时 %.2fs",
+                 len(targets), rounds, time.monotonic() - started)
+        if redirected:
+            log.warning("透明代理生效中，%d 个节点的连接会被重定向到本机，已跳过测速",
+                        len(redirected))
+        return {t.key: self.stats[t.key] for t in targets if t.key not in redirected}
+
+    def best(self, keys: Optional[Iterable] = None,
+             max_loss: float = MAX_LOSS) -> Optional[object]:
+        """返回分数最低且丢包率不超过 max_loss 的节点 key。"""
+        candidates = self.stats if keys is None else {
+            k: self.stats[k] for k in keys if k in self.stats}
+        ranked = [(s.score, s.loss, k) for k, s in candidates.items()
+                  if s.score is not None and s.loss <= max_loss]
+        if not ranked:
+            return None
+        return min(ranked, key=lambda r: (r[0], r[1]))[2]
+
+
+def tproxy_bypass(vps_ip: Optional[str] = None) -> List:
+    """
+    透明代理生效时本机直连的网段，与 build_tproxy_ruleset() 的 RETURN 规则一致。
+    vps_ip 为域名时规则按 iptables 加载时的解析结果放行，这里无法确认，不计入。
+    """
+    networks = [ipaddress.ip_network(cidr) for cidr in TPROXY_BYPASS_CIDRS]
+    if vps_ip:
+        try:
+            networks.append(ipaddress.ip_network(vps_ip))
+        except ValueError:
+            pass
+    return networks
+
+
+def is_direct(ip: str, bypass: List) -> bool:
+    """ip 是否在 bypass 网段内。TPROXY 规则只对 IPv4 生效，IPv6 地址总是直连。"""
+    address = ipaddress.ip_address(ip.split("%", 1)[0])
+    if address.version == 6:
+        return True
+    return any(address in network for network in bypass if network.version == 4)
+
+
+_prober: Optional[LatencyProber] = None
+
+
+def get_prober() -> LatencyProber:
+    """进程内共享的测速器（多次测速的结果累积为滚动统计）。"""
+    global _prober
+    if _prober is None:
+        _prober = LatencyProber()
+    return _prober
+
+
+# ============================================
+# 节点来源
+# ============================================
+
+def _target_sni(outbound) -> Optional[str]:
+    """使用 TLS/REALITY 的出站返回 SNI（未配置时为空字符串），否则返回 None。"""
+    stream = outbound.get("streamSettings") or {}
+    security = stream.get("security") or ""
+    if outbound.get("protocol") == "trojan" and not security:
+        security = "tls"
+    if security not in _TLS_SECURITY:
+        return None
+    settings = stream.get("realitySettings" if security == "reality" else "tlsSettings") or {}
+    return settings.get("serverName") or ""
+
+
+def _is_real(address: str, port: int) -> bool:
+    return bool(address) and address.lower() not in config_repo.PLACEHOLDER_ADDRESSES \
+        and 0 < port < 65536
+
+
+def targets_from_config(config) -> List[ProbeTarget]:
+    """config.json 中带真实服务器地址的代理出站（key 为出站 tag）。"""
+    targets = []
+    for index, ob in enumerate(config.get("outbounds", [])):
+        if ob.get("protocol") not in config_repo.PROXY_PROTOCOLS:
+            continue
+        try:
+            _protocol, address, port = outbound_endpoint(ob)
+        except (TypeError, ValueError, AttributeError):
+            continue
+        if _is_real(address, port):
+            tag = ob.get("tag") or f"#{index}"
+            targets.append(ProbeTarget(tag, tag, address, port, _target_sni(ob)))
+    return targets
+
+
+def targets_from_store(store: ProfileStore, group: Optional[str] = None) -> List[ProbeTarget]:
+    """档案库中的节点（key 为节点 id）。"""
+    targets = []
+    for node in store.find_nodes(group=group):
+        if not _is_real(node.address, node.port):
+            continue
+        sni = None
+        if node.protocol in ("vmess", "vless", "trojan"):
+            outbound = store.get_outbound(node.id) or {}
+            sni = _target_sni(outbound)
+        targets.append(ProbeTarget(node.id, node.name, node.address, node.port, sni))
+    return targets
+
+
+def promote_outbound(config: Dict, tag: str) -> Dict:
+    """
+    把 tag 对应的出站设为 proxy 并移到首位（xray 默认使用第一个出站），
+    原 proxy 出站改用被选中出站的旧 tag，路由规则中的引用不受影响。
+    返回新配置，config 不会被修改。
+    """
+    outbounds = [dict(ob) for ob in config.get("outbounds", [])]
+    chosen = next((ob for ob in outbounds if ob.get("tag") == tag), None)
+    if chosen is None:
+        raise KeyError(f"出站不存在: {tag}")
+    if tag != PROXY_TAG:
+        for ob in outbounds:
+            if ob.get("tag") == PROXY_TAG:
+                ob["tag"] = tag
+        chosen["tag"] = PROXY_TAG
+    outbounds.remove(chosen)
+    result = dict(config)
+    result["outbounds"] = [chosen] + outbounds
+    return result
+
+
+# ============================================
+# 任务
+# ============================================
+
+async def probe_nodes_job(ctx: "JobContext", store: Optional[ProfileStore] = None,
+                          config_path: Optional[str] = None, group: Optional[str] = None,
+                          tls: bool = False, rounds: int = 1,
+                          bypass: Optional[List] = None) -> Dict[object, ProbeStats]:
+    """
+    测速任务：有档案库时测档案库节点并写回延迟，否则测 config.json 中的出站。
+    透明代理生效时传入 bypass（见 LatencyProber.probe），被跳过的节点保留原有延迟。
+    """
+    if store is not None:
+        targets = await ctx.run_blocking(targets_from_store, store, group)
+    elif config_path:
+        doc = await ctx.run_blocking(config_repo.load_document, config_path)
+        targets = targets_from_config(doc.data)
+    else:
+        targets = []
+    if not targets:
+        return {}
+
+    ctx.progress(f"正在测速 {len(targets)} 个节点...")
+    prober = get_prober()
+    prober.tls = tls
+    results = await prober.probe(targets, rounds, bypass)
+    if len(results) < len(targets):
+        ctx.progress(f"⚠ 透明代理生效中，{len(targets) - len(results)} 个节点无法直连测速")
+    if store is not None:
+        await ctx.run_blocking(store.set_latencies,
+                               {key: stats.median for key, stats in results.items()})
+    return results
+
+
+async def auto_select_proxy(ctx: "JobContext", config_path: str,
+                            store: Optional[ProfileStore] = None,
+                            group: Optional[str] = None) -> Optional[str]:
+    """
+    启动前自动选择最快节点并写入 config.json。
+
+    档案库中有节点时在档案库节点中选择（activate_node 渲染配置），
+    否则在 config.json 的代理出站之间选择（promote_outbound）。
+    所有节点都不可达时保持原配置。
+
+    Returns:
+        选中节点的名称；未切换时返回 None
+    """
+    doc = await ctx.run_blocking(config_repo.load_document, config_path)
+    use_store = store is not None and bool(await ctx.run_blocking(
+        store.find_nodes, group=group, limit=1))
+    if use_store:
+        targets = await ctx.run_blocking(targets_from_store, store, group)
+    else:
+        targets = targets_from_config(doc.data)
+    if len(targets) < 2:
+        return None
+
+    ctx.progress(f"正在测速 {len(targets)} 个节点，选择最快节点...")
+    prober = get_prober()
+    results = await prober.probe(targets)
+    best = prober.best(results)
+    if best is None:
+        ctx.progress("⚠ 所有节点均不可达，使用当前配置")
+        return None
+    name = next(t.name for t in targets if t.key == best)
+
+    if use_store:
+        await ctx.run_blocking(store.set_latencies,
+                               {key: stats.median for key, stats in results.items()})
+        if best != store.selected_node_id():
+            await ctx.run_blocking(store.activate_node, best, config_path, doc.to_dict())
+    elif best != PROXY_TAG:
+        config = promote_outbound(doc.to_dict(), best)
+        await ctx.run_blocking(config_io.write_json, config_path, config)
+        config_repo.invalidate(config_path)
+    ctx.progress(f"✓ 已选择最快节点: {name} ({results[best].median:.0f} ms)")
+    return name
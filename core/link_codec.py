@@ -0,0 +1,533 @@
+"""
+分享链接编解码模块
+在节点分享链接和 xray outbound 之间双向转换：
+  - ss://      SIP002（明文或 base64 userinfo）以及完全 base64 的旧格式
+  - vmess://   base64 编码的 JSON（v2rayN 格式）
+  - vless://   uuid@host:port?参数#名称（支持 tls / reality，tcp / ws / grpc / h2）
+  - trojan://  password@host:port?参数#名称
+
+为批量导入（订阅、剪贴板、文件）设计：
+  - 正则预编译、查表用 frozenset / dict，解析过程不打印任何内容
+  - 节点记录 ProxyLink 使用 __slots__，上千条链接也只占很少内存
+  - parse_links() 一次处理一批链接，失败项以 LinkError（序号 + 原因）返回，不抛异常
+
+订阅内容解码见 SubscriptionDecoder：按块输入字节，边解码边产出链接。
+吞吐基准见 benchmarks/bench_link_codec.py。
+"""
+import base64
+import binascii
+import json
+import re
+import urllib.parse
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+SUPPORTED_SCHEMES = frozenset(("ss", "vmess", "vless", "trojan"))
+
+# Shadowsocks 加密方法：小写 → 规范写法
+SS_METHODS = {m.lower(): m for m in (
+    "aes-256-gcm", "aes-128-gcm", "chacha20-poly1305", "chacha20-ietf-poly1305",
+    "xchacha20-ietf-poly1305", "2022-blake3-aes-128-gcm", "2022-blake3-aes-256-gcm",
+    "2022-blake3-chacha20-poly1305", "aes-256-cfb", "aes-128-cfb", "chacha20",
+    "chacha20-ietf", "rc4-md5", "none",
+)}
+
+_LINK_RE = re.compile(r'(?:ss|vmess|vless|trojan)://[^\s]+', re.IGNORECASE)
+_WHITESPACE = b" \t\r\n"
+_URLSAFE_TO_STD = bytes.maketrans(b"-_", b"+/")
+_DECODE_ERRORS = (ValueError, KeyError, TypeError, IndexError, AttributeError,
+                  UnicodeDecodeError, binascii.Error)
+
+# 链接查询参数 ↔ stream 字段
+_QUERY_FIELDS = (
+    ("type", "network"), ("security", "security"), ("host", "host"),
+    ("path", "path"), ("serviceName", "service_name"), ("sni", "sni"),
+    ("alpn", "alpn"), ("fp", "fp"), ("pbk", "pbk"), ("sid", "sid"),
+    ("spx", "spx"), ("headerType", "header"),
+)
+
+
+class LinkParseError(ValueError):
+    """单条链接解析失败。"""
+
+
+class LinkError:
+    """批量解析中的失败项（不含完整链接，避免日志泄露密码）。"""
+
+    __slots__ = ("index", "scheme", "reason")
+
+    def __init__(self, index: int, scheme: str, reason: str):
+        self.index = index
+        self.scheme = scheme
+        self.reason = reason
+
+    def __repr__(self) -> str:
+        return f"<LinkError #{self.index} {self.scheme}: {self.reason}>"
+
+
+def _b64decode(text: str) -> bytes:
+    """宽松的 base64 解码：兼容 urlsafe 字符、缺失的填充和换行。"""
+    data = text.encode("ascii", "ignore").translate(_URLSAFE_TO_STD, _WHITESPACE).rstrip(b"=")
+    return binascii.a2b_base64(data + b"=" * (-len(data) % 4))
+
+
+def _b64encode(data: str, urlsafe: bool = False) -> str:
+    raw = data.encode("utf-8")
+    if urlsafe:
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+    return base64.b64encode(raw).decode("ascii")
+
+
+def _split_host_port(hostport: str) -> Tuple[str, int]:
+    """解析 host:port，支持 [IPv6]:port。"""
+    if hostport.startswith("["):
+        host, _, rest = hostport[1:].partition("]")
+        port = rest[1:] if rest.startswith(":") else ""
+    else:
+        host, _, port = hostport.rpartition(":")
+    return host, int(port)
+
+
+def _same_host_port(text: str, hostport: str) -> bool:
+    try:
+        return _split_host_port(text) == _split_host_port(hostport)
+    except ValueError:
+        return False
+
+
+def _join_host_port(host: str, port: int) -> str:
+    return f"[{host}]:{port}" if ":" in host else f"{host}:{port}"
+
+
+class ProxyLink:
+    """
+    一条节点记录。
+
+    settings 为协议相关字段，stream 为传输层参数（network / security / sni 等）。
+    """
+
+    __slots__ = ("protocol", "name", "address", "port", "settings", "stream")
+
+    def __init__(self, protocol: str, name: str, address: str, port: int,
+                 settings: Dict, stream: Optional[Dict] = None):
+        self.protocol = protocol
+        self.name = name
+        self.address = address
+        self.port = port
+        self.settings = settings
+        self.stream = stream or {}
+
+    def __repr__(self) -> str:
+        return f"<ProxyLink {self.protocol}://{self.address}:{self.port} {self.name!r}>"
+
+    @property
+    def display_name(self) -> str:
+        return self.name or f"{self.address}:{self.port}"
+
+    # ── → xray outbound ───────────────────────
+
+    def to_outbound(self, tag: str = "proxy") -> Dict:
+        """转换为 xray outbound。"""
+        s = self.settings
+        if self.protocol == "shadowsocks":
+            settings = {"servers": [{"address": self.address, "port": self.port,
+                                     "method": s["method"], "password": s["password"]}]}
+        elif self.protocol == "trojan":
+            settings = {"servers": [{"address": self.address, "port": self.port,
+                                     "password": s["password"]}]}
+        elif self.protocol == "vmess":
+            settings = {"vnext": [{"address": self.address, "port": self.port, "users": [
+                {"id": s["id"], "alterId": s.get("alterId", 0),
+                 "security": s.get("security") or "auto"}]}]}
+        else:  # vless
+            user = {"id": s["id"], "encryption": s.get("encryption") or "none"}
+            if s.get("flow"):
+                user["flow"] = s["flow"]
+            settings = {"vnext": [{"address": self.address, "port": self.port,
+                                   "users": [user]}]}
+
+        outbound = {"tag": tag, "protocol": self.protocol, "settings": settings}
+        stream = self._stream_settings()
+        if stream:
+            outbound["streamSettings"] = stream
+        return outbound
+
+    def _stream_settings(self) -> Dict:
+        st = self.stream
+        network = st.get("network") or "tcp"
+        security = st.get("security") or ""
+        if network == "tcp" and security in ("", "none") and not st.get("header"):
+            return {}
+
+        result: Dict = {"network": network}
+        if network == "ws":
+            ws = {"path": st.get("path") or "/"}
+            if st.get("host"):
+                ws["headers"] = {"Host": st["host"]}
+            result["wsSettings"] = ws
+        elif network == "grpc":
+            result["grpcSettings"] = {"serviceName": st.get("service_name") or st.get("path") or ""}
+        elif network in ("h2", "http"):
+            result["network"] = "http"
+            h2 = {"path": st.get("path") or "/"}
+            if st.get("host"):
+                h2["host"] = [h.strip() for h in st["host"].split(",") if h.strip()]
+            result["httpSettings"] = h2
+        elif network == "tcp" and st.get("header") == "http":
+            result["tcpSettings"] = {"header": {"type": "http", "request": {
+                "path": [st.get("path") or "/"],
+                "headers": {"Host": [st["host"]]} if st.get("host") else {}}}}
+
+        if security == "tls":
+            tls = {"serverName": st.get("sni") or st.get("host") or self.address}
+            if st.get("alpn"):
+                tls["alpn"] = [a for a in st["alpn"].split(",") if a]
+            if st.get("fp"):
+                tls["fingerprint"] = st["fp"]
+            if st.get("insecure"):
+                tls["allowInsecure"] = True
+            result["security"] = "tls"
+            result["tlsSettings"] = tls
+        elif security == "reality":
+            result["security"] = "reality"
+            result["realitySettings"] = {
+                "serverName": st.get("sni") or "",
+                "fingerprint": st.get("fp") or "chrome",
+                "publicKey": st.get("pbk") or "",
+                "shortId": st.get("sid") or "",
+                "spiderX": st.get("spx") or "",
+            }
+        return result
+
+    # ── → 分享链接 ─────────────────────────────
+
+    def to_link(self) -> str:
+        """编码为分享链接（parse_link 的逆操作）。"""
+        fragment = f"#{urllib.parse.quote(self.name)}" if self.name else ""
+        hostport = _join_host_port(self.address, self.port)
+        s = self.settings
+
+        if self.protocol == "shadowsocks":
+            userinfo = _b64encode(f"{s['method']}:{s['password']}", urlsafe=True)
+            return f"ss://{userinfo}@{hostport}{fragment}"
+
+        if self.protocol == "vmess":
+            st = self.stream
+            data = {
+                "v": "2", "ps": self.name, "add": self.address, "port": str(self.port),
+                "id": s["id"], "aid": str(s.get("alterId", 0)),
+                "scy": s.get("security") or "auto", "net": st.get("network") or "tcp",
+                "type": st.get("header") or "none", "host": st.get("host") or "",
+                "path": st.get("service_name") or st.get("path") or "",
+                "tls": st.get("security") or "", "sni": st.get("sni") or "",
+                "alpn": st.get("alpn") or "", "fp": st.get("fp") or "",
+            }
+            return "vmess://" + _b64encode(json.dumps(data, ensure_ascii=False,
+                                                      separators=(",", ":")))
+
+        query = {}
+        for key, field in _QUERY_FIELDS:
+            value = self.stream.get(field)
+            if value:
+                query[key] = value
+        if self.stream.get("insecure"):
+            query["allowInsecure"] = "1"
+        if self.protocol == "vless":
+            query["encryption"] = s.get("encryption") or "none"
+            if s.get("flow"):
+                query["flow"] = s["flow"]
+            secret = s["id"]
+        else:
+            secret = s["password"]
+        qs = urllib.parse.urlencode(query, quote_via=urllib.parse.quote)
+        scheme = "vless" if self.protocol == "vless" else "trojan"
+        return (f"{scheme}://{urllib.parse.quote(secret, safe='')}@{hostport}"
+                f"{'?' + qs if qs else ''}{fragment}")
+
+
+# ============================================
+# outbound → ProxyLink
+# ============================================
+
+def from_outbound(outbound: Dict, name: str = "") -> ProxyLink:
+    """
+    由 xray outbound 构造节点记录（用于导出分享链接）。
+
+    Raises:
+        LinkParseError: 协议不支持或缺少服务器信息
+    """
+    protocol = outbound.get("protocol", "")
+    settings = outbound.get("settings", {})
+    try:
+        if protocol in ("shadowsocks", "trojan"):
+            server = settings["servers"][0]
+            fields = ({"method": server["method"], "password": server["password"]}
+                      if protocol == "shadowsocks" else {"password": server["password"]})
+        elif protocol in ("vmess", "vless"):
+            server = settings["vnext"][0]
+            user = server["users"][0]
+            fields = {"id": user["id"]}
+            if protocol == "vmess":
+                fields["alterId"] = user.get("alterId", 0)
+                fields["security"] = user.get("security") or "auto"
+            else:
+                fields["encryption"] = user.get("encryption") or "none"
+                fields["flow"] = user.get("flow") or ""
+        else:
+            raise LinkParseError(f"不支持的协议: {protocol}")
+        address, port = str(server["address"]), int(server["port"])
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise LinkParseError(f"outbound 缺少服务器信息: {e}") from None
+
+    ss = outbound.get("streamSettings") or {}
+    network = ss.get("network") or "tcp"
+    stream: Dict = {"network": "h2" if network == "http" else network,
+                    "security": ss.get("security") or ""}
+    if network == "ws":
+        ws = ss.get("wsSettings") or {}
+        stream["path"] = ws.get("path") or ""
+        stream["host"] = (ws.get("headers") or {}).get("Host", "")
+    elif network == "grpc":
+        stream["service_name"] = (ss.get("grpcSettings") or {}).get("serviceName", "")
+    elif network == "http":
+        h2 = ss.get("httpSettings") or {}
+        stream["path"] = h2.get("path") or ""
+        stream["host"] = ",".join(h2.get("host") or [])
+    tls = ss.get("tlsSettings") or {}
+    reality = ss.get("realitySettings") or {}
+    if stream["security"] == "tls":
+        stream["sni"] = tls.get("serverName") or ""
+        stream["alpn"] = ",".join(tls.get("alpn") or [])
+        stream["fp"] = tls.get("fingerprint") or ""
+        stream["insecure"] = bool(tls.get("allowInsecure"))
+    elif stream["security"] == "reality":
+        stream["sni"] = reality.get("serverName") or ""
+        stream["fp"] = reality.get("fingerprint") or ""
+        stream["pbk"] = reality.get("publicKey") or ""
+        stream["sid"] = reality.get("shortId") or ""
+        stream["spx"] = reality.get("spiderX") or ""
+    return ProxyLink(protocol, name, address, port, fields, stream)
+
+
+# ============================================
+# 分享链接 → ProxyLink
+# ============================================
+
+def _parse_ss(body: str, name: str) -> ProxyLink:
+    body = body.partition("?")[0].rstrip("/")
+    if "@" in body:
+        userinfo, hostport = body.rsplit("@", 1)
+        userinfo = urllib.parse.unquote(userinfo)
+        if ":" not in userinfo or userinfo.split(":", 1)[0].lower() not in SS_METHODS:
+            # base64(method:password)，个别客户端会编码成 method:password@host:port
+            userinfo = _b64decode(userinfo).decode("utf-8")
+            head, sep, tail = userinfo.rpartition("@")
+            if sep and _same_host_port(tail, hostport):
+                userinfo = head     # 密码本身可以含 @，只去掉结尾重复的 host:port
+    else:
+        # 旧格式：base64(method:password@host:port)
+        userinfo, _, hostport = _b64decode(body).decode("utf-8").rpartition("@")
+        if not userinfo:
+            raise LinkParseError("缺少服务器地址")
+    method, sep, password = userinfo.partition(":")
+    if not sep:
+        raise LinkParseError("缺少加密方法或密码")
+    address, port = _split_host_port(hostport)
+    return ProxyLink("shadowsocks", name, address, port,
+                     {"method": SS_METHODS.get(method.lower(), method), "password": password})
+
+
+def _parse_vmess(body: str, name: str) -> ProxyLink:
+    data = json.loads(_b64decode(body))
+    header = data.get("type")
+    network = data.get("net") or "tcp"
+    stream = {
+        "network": network,
+        "security": data.get("tls") or "",
+        "host": data.get("host") or "",
+        "path": data.get("path") or "",
+        "sni": data.get("sni") or "",
+        "alpn": data.get("alpn") or "",
+        "fp": data.get("fp") or "",
+        "header": header if header not in (None, "", "none") else "",
+    }
+    if network == "grpc":
+        stream["service_name"] = stream["path"]
+    return ProxyLink(
+        "vmess", name or str(data.get("ps") or ""), str(data.get("add", "")),
+        int(data.get("port", 0)),
+        {"id": data["id"], "alterId": int(data.get("aid", 0) or 0),
+         "security": data.get("scy") or "auto"},
+        stream)
+
+
+def _parse_url_style(protocol: str, body: str, name: str) -> ProxyLink:
+    userinfo, sep, rest = body.partition("@")
+    if not sep:
+        raise LinkParseError("缺少 @")
+    hostport, _, query_string = rest.partition("?")
+    address, port = _split_host_port(hostport.rstrip("/"))
+    q = dict(urllib.parse.parse_qsl(query_string)) if query_string else {}
+
+    stream = {field: q.get(key, "") for key, field in _QUERY_FIELDS}
+    stream["network"] = stream["network"] or "tcp"
+    if stream["header"] == "none":
+        stream["header"] = ""
+    stream["insecure"] = q.get("allowInsecure") in ("1", "true")
+    if not stream["sni"] and q.get("peer"):
+        stream["sni"] = q["peer"]
+
+    secret = urllib.parse.unquote(userinfo)
+    if protocol == "trojan":
+        # trojan 默认使用 TLS
+        stream["security"] = stream["security"] or "tls"
+        return ProxyLink("trojan", name, address, port, {"password": secret}, stream)
+    return ProxyLink("vless", name, address, port,
+                     {"id": secret, "flow": q.get("flow", ""),
+                      "encryption": q.get("encryption") or "none"}, stream)
+
+
+def parse_link_strict(link: str) -> ProxyLink:
+    """
+    解析单条分享链接。
+
+    Raises:
+        LinkParseError: 不支持的协议或格式错误（消息为失败原因）
+    """
+    scheme, sep, rest = link.strip().partition("://")
+    scheme = scheme.lower()
+    if not sep or scheme not in SUPPORTED_SCHEMES:
+        raise LinkParseError(f"不支持的链接类型: {scheme or link[:10]}")
+    body, _, fragment = rest.partition("#")
+    name = urllib.parse.unquote(fragment).strip() if fragment else ""
+    try:
+        if scheme == "ss":
+            result = _parse_ss(body, name)
+        elif scheme == "vmess":
+            result = _parse_vmess(body, name)
+        else:
+            result = _parse_url_style(scheme, body, name)
+    except LinkParseError:
+        raise
+    except _DECODE_ERRORS as e:
+        raise LinkParseError(f"{type(e).__name__}: {e}") from None
+    if not result.address or not 0 < result.port < 65536:
+        raise LinkParseError("服务器地址或端口无效")
+    return result
+
+
+def parse_link(link: str) -> Optional[ProxyLink]:
+    """解析单条分享链接，不支持或格式错误时返回 None。"""
+    try:
+        return parse_link_strict(link)
+    except LinkParseError:
+        return None
+
+
+def parse_links(links: Iterable[str]) -> Tuple[List[ProxyLink], List[LinkError]]:
+    """
+    批量解析分享链接，不打印、不抛异常。
+
+    Returns:
+        (成功解析的节点, 失败项列表)
+    """
+    nodes: List[ProxyLink] = []
+    errors: List[LinkError] = []
+    append = nodes.append
+    for index, link in enumerate(links):
+        try:
+            append(parse_link_strict(link))
+        except LinkParseError as e:
+            errors.append(LinkError(index, link.partition("://")[0].lower(), str(e)))
+    return nodes, errors
+
+
+def find_links(text: str) -> List[str]:
+    """从任意文本中找出所有支持的分享链接。"""
+    return _LINK_RE.findall(text)
+
+
+# ============================================
+# 订阅内容解码
+# ============================================
+
+class SubscriptionDecoder:
+    """
+    增量解码订阅内容（base64 编码的链接列表，或直接的明文链接列表）。
+
+    用法::
+
+        decoder = SubscriptionDecoder()
+        for chunk in chunks:
+            for link in decoder.feed(chunk):
+                ...
+        for link in decoder.finish():
+            ...
+    """
+
+    __slots__ = ("_mode", "_head", "_b64", "_line")
+
+    _PROBE = 64  # 判断明文/base64 需要的字节数
+
+    def __init__(self):
+        self._mode: Optional[str] = None  # "plain" / "base64"
+        self._head = b""
+        self._b64 = b""       # 尚未凑满 4 字节的 base64 残余
+        self._line = b""      # 尚未遇到换行的解码内容
+
+    def feed(self, chunk: bytes) -> List[str]:
+        if self._mode is None:
+            self._head += chunk
+            stripped = self._head.lstrip()
+            if len(stripped) < self._PROBE and b"://" not in stripped:
+                return []
+            self._mode = "plain" if b"://" in stripped[:self._PROBE] else "base64"
+            chunk, self._head = self._head, b""
+        if self._mode == "plain":
+            return self._lines(chunk)
+
+        data = self._b64 + chunk.translate(_URLSAFE_TO_STD, _WHITESPACE)
+        usable = len(data) - len(data) % 4
+        self._b64 = data[usable:]
+        if not usable:
+            return []
+        return self._lines(binascii.a2b_base64(data[:usable]))
+
+    def finish(self) -> List[str]:
+        links: List[str] = []
+        if self._mode is None:
+            # 内容太短，未能在 feed 中判断
+            head, self._head = self._head, b""
+            self._mode = "plain" if b"://" in head else "base64"
+            links = self.feed(head) if head.strip() else []
+        if self._mode == "base64" and self._b64.rstrip(b"="):
+            rest = self._b64.rstrip(b"=")
+            self._b64 = b""
+            links += self._lines(binascii.a2b_base64(rest + b"=" * (-len(rest) % 4)))
+        tail, self._line = self._line, b""
+        links += self._emit(tail)
+        return links
+
+    def _lines(self, data: bytes) -> List[str]:
+        data = self._line + data
+        body, sep, self._line = data.rpartition(b"\n")
+        if not sep:
+            self._line = data
+            return []
+        links: List[str] = []
+        for line in body.split(b"\n"):
+            links += self._emit(line)
+        return links
+
+    @staticmethod
+    def _emit(line: bytes) -> List[str]:
+        line = line.strip()
+        if not line or b"://" not in line:
+            return []
+        return [line.decode("utf-8", errors="replace")]
+
+
+def decode_subscription(data: bytes) -> Iterator[str]:
+    """一次性解码完整的订阅内容。"""
+    decoder = SubscriptionDecoder()
+    yield from decoder.feed(data)
+    yield from decoder.finish()
@@ -0,0 +1,209 @@
+"""
+日志管理模块
+为 GUI 进程配置统一的 "ov2n" 日志树：
+  - 单一文件句柄 + 用户态缓冲，WARNING 以上或超过 flush 间隔才落盘，
+    之后没有新记录时由定时器在 flush 间隔到期后落盘（实时日志窗口不会一直滞后）
+  - 每条记录一行 JSON（时间、级别、logger、线程、消息、异常）
+  - 按大小和时间轮转
+  - 每次启动一个会话目录，旧会话按数量和时间清理
+
+目录结构：
+  <配置目录>/logs/sessions/<时间>-<PID>/ov2n.log
+
+Linux 上 helper（root）的日志和核心进程输出位于 /var/log/ov2n
+（LinuxPaths.log_dir），结构与此相同，由 vpn-helper.py 自行维护。
+"""
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import shutil
+import threading
+import time
+from typing import Optional
+
+from core.config_manager import get_config_dir
+
+LOG_MAX_BYTES = 2 * 1024 * 1024   # 单个日志文件最大 2MB
+LOG_BACKUPS = 3                   # 每个会话保留的轮转文件数
+LOG_MAX_AGE = 24 * 3600           # 单个日志文件最多写 1 天
+LOG_FLUSH_INTERVAL = 2.0          # 缓冲落盘间隔（秒）
+SESSION_KEEP = 20                 # 最多保留的会话目录数
+SESSION_MAX_AGE = 7 * 24 * 3600   # 会话目录最长保留 7 天
+
+_session_dir: Optional[str] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录输出为一行 JSON。"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created).isoformat(
+                timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class BufferedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    单一文件句柄 + 用户态缓冲的轮转日志处理器。
+
+    与标准 RotatingFileHandler 的区别：
+      - 不在每条记录后 flush，只在超过 flush_interval 或记录级别 >= WARNING 时 flush；
+        未落盘的记录由后台定时器在 flush_interval 到期后落盘
+      - 自行累计写入字节数判断轮转，不在每条记录上 stat/seek 文件
+      - 除大小上限外，文件写满 max_age 秒也会轮转
+    """
+
+    def __init__(self, filename: str, max_bytes: int = LOG_MAX_BYTES,
+                 backup_count: int = LOG_BACKUPS, max_age: float = LOG_MAX_AGE,
+                 flush_interval: float = LOG_FLUSH_INTERVAL,
+                 buffer_size: int = 64 * 1024):
+        self._buffer_size = buffer_size
+        self._max_age = max_age
+        self._flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+        self._force_flush = False
+        self._pending = False
+        self._timer: Optional[threading.Timer] = None
+        self._bytes = 0
+        self._opened_at = time.time()
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count,
+                         encoding="utf-8", delay=True)
+
+    def _open(self):
+        stream = open(self.baseFilename, self.mode, encoding=self.encoding,
+                      buffering=self._buffer_size)
+        stream.seek(0, os.SEEK_END)
+        self._bytes = stream.tell()
+        self._opened_at = time.time()
+        return stream
+
+    def _need_rollover(self, size: int) -> bool:
+        if self.maxBytes > 0 and self._bytes + size > self.maxBytes:
+            return True
+        return (self._max_age > 0 and self._bytes > 0
+                and time.time() - self._opened_at >= self._max_age)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            msg = self.format(record) + self.terminator
+            size = len(msg.encode("utf-8"))
+            if self.stream is None:
+                self.stream = self._open()
+            if self._need_rollover(size):
+                self.doRollover()
+                if self.stream is None:
+                    self.stream = self._open()
+            self.stream.write(msg)
+            self._bytes += size
+            self._force_flush = record.levelno >= logging.WARNING
+            self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self) -> None:
+        now = time.monotonic()
+        if self._force_flush or now - self._last_flush >= self._flush_interval:
+            self._force_flush = False
+            self._pending = False
+            self._last_flush = now
+            super().flush()
+        elif self.stream is not None:
+            self._pending = True
+            self._schedule_flush(self._flush_interval - (now - self._last_flush))
+
+    def _schedule_flush(self, delay: float) -> None:
+        if self._timer is None:
+            self._timer = threading.Timer(max(delay, 0.0), self._flush_pending)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_pending(self) -> None:
+        self.acquire()
+        try:
+            self._timer = None
+            if self._pending:
+                self._force_flush = True
+                self.flush()
+        finally:
+            self.release()
+
+    def close(self) -> None:
+        self.acquire()
+        try:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._force_flush = True
+        finally:
+            self.release()
+        super().close()
+
+
+def get_log_root() -> str:
+    """GUI 日志根目录（<配置目录>/logs）。"""
+    return os.path.join(get_config_dir(), "logs")
+
+
+def get_session_dir() -> Optional[str]:
+    """当前会话的日志目录，init_logging() 之前返回 None。"""
+    return _session_dir
+
+
+def prune_sessions(sessions_dir: str, keep: int = SESSION_KEEP,
+                   max_age: float = SESSION_MAX_AGE) -> None:
+    """按数量和时间清理旧的会话目录（目录名按时间排序）。"""
+    try:
+        entries = sorted(
+            (e for e in os.scandir(sessions_dir) if e.is_dir(follow_symlinks=False)),
+            key=lambda e: e.name, reverse=True)
+    except OSError:
+        return
+    now = time.time()
+    for index, entry in enumerate(entries):
+        if entry.path == _session_dir:
+            continue
+        try:
+            expired = now - entry.stat(follow_symlinks=False).st_mtime > max_age
+        except OSError:
+            continue
+        if index >= keep or expired:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def init_logging(level: int = logging.INFO) -> str:
+    """
+    初始化 GUI 日志：创建会话目录，为 "ov2n" logger 挂载 JSON 文件处理器。
+    重复调用直接返回已有会话目录。
+
+    Returns:
+        当前会话日志目录
+    """
+    global _session_dir
+    if _session_dir is not None:
+        return _session_dir
+
+    sessions_dir = os.path.join(get_log_root(), "sessions")
+    name = datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+    _session_dir = os.path.join(sessions_dir, name)
+    os.makedirs(_session_dir, exist_ok=True)
+
+    handler = BufferedRotatingFileHandler(os.path.join(_session_dir, "ov2n.log"))
+    handler.setFormatter(JsonFormatter())
+
+    root = logging.getLogger("ov2n")
+    root.setLevel(level)
+    root.addHandler(handler)
+
+    prune_sessions(sessions_dir)
+    root.info("日志会话: %s", _session_dir)
+    return _session_dir
@@ -0,0 +1,145 @@
+"""
+子进程输出捕获模块
+把核心进程（openvpn / xray）的 stdout/stderr 通过管道读入：
+  - 有界环形缓冲区：按行保存最近 N 行，内存占用恒定
+  - 轮转日志文件：复用 log_manager.BufferedRotatingFileHandler
+
+启动失败时调用方用 last_lines(n) 立即取最后 N 行，不必回读日志文件；
+GUI 实时跟随读取轮转日志文件（见 ui.log_viewer）。
+
+Linux 上核心进程由 pkexec helper 启动后 helper 即退出，无法持有管道，
+此时用 tail_file() 从日志文件末尾倒读最后 N 行。
+"""
+import collections
+import logging
+import os
+import subprocess
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+from core.log_manager import BufferedRotatingFileHandler
+
+log = logging.getLogger("ov2n.capture")
+
+CAPTURE_MAX_LINES = 2000              # 环形缓冲区保留的行数
+CAPTURE_MAX_BYTES = 5 * 1024 * 1024   # 单个核心日志文件最大 5MB
+CAPTURE_BACKUPS = 2                   # 核心日志轮转文件数
+CAPTURE_FLUSH_INTERVAL = 0.5          # 核心日志落盘间隔（秒），兼顾实时查看
+
+
+def tail_file(path: str, n: int = 50, start: int = 0,
+              block_size: int = 8192) -> List[str]:
+    """
+    从文件末尾倒序分块读取，返回最后 n 行。
+
+    Args:
+        path: 日志文件路径
+        n: 行数
+        start: 只看该偏移量之后的内容（如本次启动前文件已有的长度）
+        block_size: 每次向前读取的块大小
+    """
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            data = b""
+            while pos > start and data.count(b"\n") <= n:
+                read_size = min(block_size, pos - start)
+                pos -= read_size
+                f.seek(pos)
+                data = f.read(read_size) + data
+    except OSError:
+        return []
+    lines = data.decode("utf-8", errors="replace").splitlines()
+    return lines[-n:] if n > 0 else []
+
+
+class OutputRing:
+    """线程安全的有界行缓冲区。"""
+
+    def __init__(self, max_lines: int = CAPTURE_MAX_LINES):
+        self._lines = collections.deque(maxlen=max_lines)
+        self._lock = threading.Lock()
+
+    def append(self, line: str) -> None:
+        with self._lock:
+            self._lines.append(line)
+
+    def last(self, n: int = 50) -> List[str]:
+        with self._lock:
+            if n <= 0:
+                return []
+            return list(self._lines)[-n:]
+
+
+class OutputCapture:
+    """
+    子进程输出捕获管道。
+
+    用法：
+        capture = OutputCapture(log_path)
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT, ...)
+        capture.attach(proc)
+        ...
+        print("\\n".join(capture.last_lines(30)))
+    """
+
+    def __init__(self, log_path: Path, max_lines: int = CAPTURE_MAX_LINES,
+                 max_bytes: int = CAPTURE_MAX_BYTES,
+                 backup_count: int = CAPTURE_BACKUPS):
+        self.log_path = Path(log_path)
+        self.ring = OutputRing(max_lines)
+        self._max_bytes = max_bytes
+        self._backup_count = backup_count
+        self._thread: Optional[threading.Thread] = None
+        self._handler: Optional[BufferedRotatingFileHandler] = None
+
+    def attach(self, proc: subprocess.Popen, name: str = "core") -> None:
+        """开始在后台线程读取 proc.stdout（需以 stdout=PIPE 启动）。"""
+        if proc.stdout is None:
+            raise ValueError("子进程未以 stdout=subprocess.PIPE 启动")
+        self.close()
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        self._handler = BufferedRotatingFileHandler(
+            str(self.log_path), max_bytes=self._max_bytes,
+            backup_count=self._backup_count, max_age=0,
+            flush_interval=CAPTURE_FLUSH_INTERVAL)
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+        self._thread = threading.Thread(
+            target=self._pump, args=(proc.stdout, self._handler),
+            name=f"capture-{name}", daemon=True)
+        self._thread.start()
+
+    def _pump(self, stream, handler: BufferedRotatingFileHandler) -> None:
+        try:
+            for raw in iter(stream.readline, b""):
+                line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+                self.ring.append(line)
+                handler.emit(logging.makeLogRecord(
+                    {"msg": line, "levelno": logging.INFO, "levelname": "INFO"}))
+        except (OSError, ValueError) as e:
+            log.debug("输出管道已关闭: %s", e)
+        finally:
+            try:
+                stream.close()
+            except OSError:
+                pass
+            handler.close()
+
+    def last_lines(self, n: int = 50) -> List[str]:
+        """最后 n 行输出（失败诊断用）。"""
+        return self.ring.last(n)
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        """等待读取线程结束（子进程退出后管道 EOF）。"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def close(self) -> None:
+        if self._handler is not None and (self._thread is None
+                                          or not self._thread.is_alive()):
+            self._handler.close()
+        self._thread = None
+        self._handler = None
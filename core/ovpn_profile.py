@@ -0,0 +1,416 @@
+"""
+OpenVPN 配置分析模块
+.ovpn 中常有多个 remote（多为域名），OpenVPN 按顺序逐个尝试，每个不可达的 remote
+都要等满 connect-timeout 才会换下一个。启动 OpenVPN 前（prepare_profile）：
+  - 解析 remote / proto / port / rport 指令，得到每个 remote 的 (主机, 端口, 协议)
+  - 并发解析所有域名，并发探测解析出的每个地址：
+      TCP：测量 TCP 连接耗时
+      UDP：发送 P_CONTROL_HARD_RESET_CLIENT_V2 握手初始包，以收到服务端回包为准
+  - 生成运行时 .ovpn（<缓存目录>/ovpn/），remote 按延迟排序并固定为 IP，去掉 remote-random；
+    不可达的 remote 排在最后而不删除（全部失败时 OpenVPN 仍会按原有方式重试）
+
+使用 tls-auth / tls-crypt 的服务端会丢弃未认证的握手包，此时 UDP remote 没有回包：
+只等待 TLS_WRAP_ICMP_WAIT 秒，收到 ICMP 端口不可达时判为不可达，否则视为未知，
+排在可达的 remote 之后、保持原有顺序（不必为等不到的回包等满 PROBE_TIMEOUT）。
+
+以下情况不改写 remote（只追加调优指令，或直接使用原配置）：<connection> 块、http-proxy / socks-proxy、
+remote-random-hostname、只有一个候选地址、没有任何可达的 remote。
+按性能档位追加的调优指令见 core.ovpn_tuning，管理接口（软重启）见 core.ovpn_session。
+运行时配置开头加入 `cd <原配置目录>`，相对路径的证书 / 密钥文件仍在原目录中查找；
+inline 证书原样保留，运行时配置只有当前用户可读。
+"""
+import asyncio
+import logging
+import os
+import shlex
+import socket
+import struct
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from core import config_io, ovpn_session, ovpn_tuning
+from core.artifacts import get_cache_dir
+from core.perf_profiles import PROFILE_NONE
+
+if TYPE_CHECKING:
+    from core.job_engine import JobContext
+
+log = logging.getLogger("ov2n.ovpn")
+
+DEFAULT_PORT = 1194
+DEFAULT_PROTO = "udp"
+
+PROBE_TIMEOUT = 2.0         # 单个地址的探测时限（秒，含 DNS）
+PROBE_CONCURRENCY = 32
+UDP_RESEND_INTERVAL = 0.5   # UDP 握手包的重发间隔（秒）
+TLS_WRAP_ICMP_WAIT = 0.3    # tls-auth / tls-crypt 的 UDP remote 只等待 ICMP 不可达的时间（秒）
+MAX_ADDRESSES = 4           # 每个域名最多探测的地址数
+
+# OpenVPN 控制通道：opcode 占高 5 位，key_id 占低 3 位
+P_CONTROL_HARD_RESET_CLIENT_V2 = 7
+P_CONTROL_HARD_RESET_SERVER_V2 = 8
+
+# 出现这些指令时不改写配置
+_UNSUPPORTED = frozenset(("http-proxy", "socks-proxy", "remote-random-hostname"))
+# 服务端只响应带认证的控制包
+_TLS_WRAP = frozenset(("tls-auth", "tls-crypt", "tls-crypt-v2"))
+
+REACHABLE = "reachable"
+UNKNOWN = "unknown"
+DEAD = "dead"
+UNRESOLVED = "unresolved"
+_STATE_RANK = {REACHABLE: 0, UNKNOWN: 1, DEAD: 2, UNRESOLVED: 3}
+
+
+class Remote:
+    """
+    配置中的一条 remote。
+
+    Args:
+        host: 主机名或 IP
+        port: 端口（未指定时取 rport / port，默认 1194）
+        proto: 协议原文（udp / tcp-client / udp6 等，未指定时取 proto 指令）
+        explicit_proto: remote 行中是否写了协议
+    """
+
+    __slots__ = ("host", "port", "proto", "explicit_proto")
+
+    def __init__(self, host: str, port: int, proto: str, explicit_proto: bool = False):
+        self.host = host
+        self.port = port
+        self.proto = proto
+        self.explicit_proto = explicit_proto
+
+    @property
+    def transport(self) -> str:
+        return "tcp" if self.proto.startswith("tcp") else "udp"
+
+    @property
+    def family(self) -> int:
+        if self.proto.endswith("6"):
+            return socket.AF_INET6
+        if self.proto.endswith("4"):
+            return socket.AF_INET
+        return socket.AF_UNSPEC
+
+    def __repr__(self) -> str:
+        return f"<Remote {self.host}:{self.port}/{self.proto}>"
+
+
+class Endpoint:
+    """remote 解析出的一个地址及其探测结果（address 为 None 表示无法解析）。"""
+
+    __slots__ = ("remote", "order", "address", "state", "latency")
+
+    def __init__(self, remote: Remote, order: int, address: Optional[str] = None):
+        self.remote = remote
+        self.order = order
+        self.address = address
+        self.state = UNRESOLVED if address is None else UNKNOWN
+        self.latency: Optional[float] = None
+
+    @property
+    def sort_key(self) -> Tuple:
+        return _STATE_RANK[self.state], self.latency or 0.0, self.order
+
+    def __repr__(self) -> str:
+        latency = f" {self.latency:.1f} ms" if self.latency is not None else ""
+        return f"<Endpoint {self.remote.host}={self.address} {self.state}{latency}>"
+
+
+class Profile:
+    """
+    解析后的 .ovpn。
+
+    Args:
+        lines: 原文各行（不含换行符）
+        remotes: remote 列表（按出现顺序）
+        remote_lines: remote 所在的行号
+        options: 出现过的指令名
+        tls_wrapped: 是否使用 tls-auth / tls-crypt
+    """
+
+    __slots__ = ("lines", "remotes", "remote_lines", "options", "tls_wrapped")
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self.remotes: List[Remote] = []
+        self.remote_lines: List[int] = []
+        self.options: Dict[str, List[str]] = {}
+        self.tls_wrapped = False
+
+    @property
+    def rewritable(self) -> bool:
+        return (bool(self.remotes) and "connection" not in self.options
+                and not _UNSUPPORTED.intersection(self.options))
+
+
+# ============================================
+# 解析
+# ============================================
+
+def _split(line: str) -> List[str]:
+    try:
+        return shlex.split(line, comments=False, posix=True)
+    except ValueError:
+        return line.split()
+
+
+def _is_block_start(stripped: str) -> bool:
+    return stripped.startswith("<") and stripped.endswith(">") and not stripped.startswith("</")
+
+
+def parse_profile(text: str) -> Profile:
+    """解析 .ovpn 文本；inline 块（<ca> ... </ca>）内的内容不作为指令。"""
+    profile = Profile()
+    profile.lines = text.splitlines()
+    raw_remotes: List[Tuple[List[str], int]] = []
+    inline: Optional[str] = None
+    for index, line in enumerate(profile.lines):
+        stripped = line.strip()
+        if inline is not None:
+            if stripped.lower() == f"</{inline}>":
+                inline = None
+            continue
+        if not stripped or stripped[0] in "#;":
+            continue
+        if _is_block_start(stripped):
+            inline = stripped[1:-1].strip().lower()
+            profile.options.setdefault(inline, [])
+            continue
+        tokens = _split(stripped)
+        if not tokens:
+            continue
+        name = tokens[0].lower().lstrip("-")
+        profile.options[name] = tokens[1:]
+        if name == "remote" and len(tokens) >= 2:
+            raw_remotes.append((tokens[1:], index))
+
+    profile.tls_wrapped = bool(_TLS_WRAP.intersection(profile.options))
+    default_proto = (profile.options.get("proto") or [DEFAULT_PROTO])[0].lower()
+    default_port = DEFAULT_PORT
+    for name in ("port", "rport"):  # rport 优先于 port
+        if profile.options.get(name):
+            try:
+                default_port = int(profile.options[name][0])
+            except ValueError:
+                pass
+    for args, index in raw_remotes:
+        try:
+            port = int(args[1]) if len(args) > 1 else default_port
+        except ValueError:
+            continue
+        proto = args[2].lower() if len(args) > 2 else default_proto
+        profile.remotes.append(Remote(args[0], port, proto, len(args) > 2))
+        profile.remote_lines.append(index)
+    return profile
+
+
+# ============================================
+# 探测
+# ============================================
+
+def handshake_packet(session_id: bytes) -> bytes:
+    """P_CONTROL_HARD_RESET_CLIENT_V2（key_id 0，无 ACK，消息 packet-id 0）。"""
+    return struct.pack("!B8sBI", P_CONTROL_HARD_RESET_CLIENT_V2 << 3, session_id, 0, 0)
+
+
+async def _resolve(remote: Remote) -> List[str]:
+    loop = asyncio.get_running_loop()
+    kind = socket.SOCK_STREAM if remote.transport == "tcp" else socket.SOCK_DGRAM
+    infos = await loop.getaddrinfo(remote.host, remote.port, family=remote.family, type=kind)
+    addresses: List[str] = []
+    for _family, _type, _proto, _name, sockaddr in infos:
+        if sockaddr[0] not in addresses:
+            addresses.append(sockaddr[0])
+    return addresses[:MAX_ADDRESSES]
+
+
+def _socket_for(address: str, kind: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in address else socket.AF_INET
+    sock = socket.socket(family, kind)
+    sock.setblocking(False)
+    return sock
+
+
+async def _probe_tcp(address: str, port: int) -> float:
+    loop = asyncio.get_running_loop()
+    with _socket_for(address, socket.SOCK_STREAM) as sock:
+        started = time.perf_counter()
+        await loop.sock_connect(sock, (address, port))
+        return (time.perf_counter() - started) * 1000
+
+
+async def _probe_udp(address: str, port: int) -> float:
+    """
+    发送握手初始包直到收到 HARD_RESET_SERVER 回包。
+
+    Raises:
+        ConnectionRefusedError: 收到 ICMP 端口不可达
+    """
+    loop = asyncio.get_running_loop()
+    packet = handshake_packet(os.urandom(8))
+    with _socket_for(address, socket.SOCK_DGRAM) as sock:
+        sock.connect((address, port))
+        while True:
+            started = time.perf_counter()
+            sock.send(packet)
+            try:
+                reply = await asyncio.wait_for(loop.sock_recv(sock, 2048), UDP_RESEND_INTERVAL)
+            except asyncio.TimeoutError:
+                continue
+            if reply and reply[0] >> 3 == P_CONTROL_HARD_RESET_SERVER_V2:
+                return (time.perf_counter() - started) * 1000
+
+
+async def probe_profile(profile: Profile,
+                        timeout: float = PROBE_TIMEOUT) -> List[Endpoint]:
+    """解析并探测所有 remote，返回按探测结果排序的地址。"""
+    semaphore = asyncio.Semaphore(PROBE_CONCURRENCY)
+
+    async def resolve(order: int, remote: Remote) -> List[Endpoint]:
+        try:
+            addresses = await asyncio.wait_for(_resolve(remote), timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            log.debug("无法解析 %s: %s", remote.host, e)
+            addresses = []
+        if not addresses:
+            return [Endpoint(remote, order)]
+        return [Endpoint(remote, order, address) for address in addresses]
+
+    async def probe(endpoint: Endpoint) -> None:
+        remote = endpoint.remote
+        probe_once = _probe_tcp if remote.transport == "tcp" else _probe_udp
+        # 带 tls-auth / tls-crypt 的 UDP 服务端不回应未认证的握手包，只等 ICMP 不可达
+        silent = remote.transport == "udp" and profile.tls_wrapped
+        async with semaphore:
+            try:
+                endpoint.latency = await asyncio.wait_for(
+                    probe_once(endpoint.address, remote.port),
+                    min(timeout, TLS_WRAP_ICMP_WAIT) if silent else timeout)
+                endpoint.state = REACHABLE
+            except asyncio.TimeoutError:
+                endpoint.state = UNKNOWN if silent else DEAD
+            except OSError as e:
+                log.debug("探测失败 %s:%s: %s", endpoint.address, remote.port, e)
+                endpoint.state = DEAD
+
+    groups = await asyncio.gather(*(resolve(i, r) for i, r in enumerate(profile.remotes)))
+    endpoints = [endpoint for group in groups for endpoint in group]
+    if len(endpoints) > 1:
+        await asyncio.gather(*(probe(e) for e in endpoints if e.address is not None))
+    return sorted(endpoints, key=lambda e: e.sort_key)
+
+
+# ============================================
+# 运行时配置
+# ============================================
+
+def _quote(value: str) -> str:
+    if not value or any(c in value for c in ' \t"\'\\#;'):
+        return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return value
+
+
+def _remote_line(endpoint: Endpoint) -> str:
+    remote = endpoint.remote
+    parts = ["remote", endpoint.address or remote.host, str(remote.port)]
+    if remote.explicit_proto:
+        parts.append(remote.proto)
+    line = " ".join(parts)
+    if endpoint.address is None:
+        return line
+    latency = f" {endpoint.latency:.0f} ms" if endpoint.latency is not None else ""
+    return f"# {remote.host}: {endpoint.state}{latency}\n{line}"
+
+
+def render_profile(profile: Profile, endpoints: Optional[List[Endpoint]], base_dir: str) -> str:
+    """
+    生成运行时 .ovpn：首个 remote 处替换为排序后的全部地址，其余 remote 与 remote-random 去掉。
+    endpoints 为 None 时 remote 保持原样。
+    """
+    drop = set(profile.remote_lines) if endpoints else set()
+    first = profile.remote_lines[0] if endpoints else -1
+    out = [] if "cd" in profile.options else [f"cd {_quote(base_dir)}"]
+    inline = False
+    for index, line in enumerate(profile.lines):
+        stripped = line.strip()
+        if inline:
+            inline = not stripped.startswith("</")
+        elif _is_block_start(stripped):
+            inline = True
+        elif index == first:
+            out.extend(_remote_line(e) for e in endpoints)
+            continue
+        elif index in drop:
+            continue
+        elif endpoints and _split(stripped)[:1] == ["remote-random"]:
+            continue
+        out.append(line)
+    return "\n".join(out) + "\n"
+
+
+def runtime_path(config_path: str) -> str:
+    """运行时配置路径（与原配置同名，helper 按文件名生成 pidfile）。"""
+    return os.path.join(get_cache_dir(), "ovpn", os.path.basename(config_path))
+
+
+def _new_session(profile: Profile) -> Optional[ovpn_session.ManagementSession]:
+    """用户配置中已有 management 时不加入管理接口（清除上次的会话参数）。"""
+    if "management" in profile.options:
+        ovpn_session.clear_session()
+        return None
+    try:
+        return ovpn_session.new_session()
+    except OSError as e:
+        log.warning("生成 OpenVPN 管理接口参数失败: %s", e)
+        return None
+
+
+async def prepare_profile(ctx: "JobContext", config_path: str,
+                          perf_profile: str = PROFILE_NONE) -> str:
+    """
+    启动 OpenVPN 前探测 remote、按性能档位追加调优指令（core.ovpn_tuning）、
+    开启管理接口（core.ovpn_session），生成运行时配置。
+
+    Returns:
+        OpenVPN 应使用的配置路径；无需或无法改写时为原路径
+    """
+    try:
+        text, _encoding = await ctx.run_blocking(config_io.read_text, config_path)
+    except OSError as e:
+        log.warning("读取 OpenVPN 配置失败: %s", e)
+        return config_path
+    profile = parse_profile(text)
+
+    endpoints: Optional[List[Endpoint]] = None
+    if profile.rewritable:
+        ctx.progress(f"正在探测 {len(profile.remotes)} 个 OpenVPN 服务器...")
+        started = time.monotonic()
+        probed = await probe_profile(profile)
+        log.info("OpenVPN 服务器探测完成 (%.2fs): %r", time.monotonic() - started, probed)
+        if len(probed) >= 2 and any(e.state == REACHABLE for e in probed):
+            endpoints = probed
+
+    mtu_target = endpoints[0].address if endpoints else None
+    changes = await ctx.run_blocking(ovpn_tuning.tune_profile, profile, perf_profile, mtu_target)
+    session = await ctx.run_blocking(_new_session, profile)
+    directives = ovpn_session.render_directives(session, profile.options)
+    if endpoints is None and not changes and not directives:
+        return config_path
+
+    path = runtime_path(config_path)
+    base_dir = os.path.dirname(os.path.abspath(config_path))
+    overlay = ovpn_tuning.render_overlay(changes, perf_profile)
+    text = render_profile(profile, endpoints, base_dir) + overlay + directives
+    try:
+        await ctx.run_blocking(config_io.write_private, path, text.encode("utf-8"))
+    except OSError as e:
+        log.warning("写入 OpenVPN 运行时配置失败: %s", e)
+        await ctx.run_blocking(ovpn_session.clear_session)
+        return config_path
+    await ctx.run_blocking(ovpn_tuning.record_overlay, overlay)
+    if endpoints:
+        best = endpoints[0]
+        ctx.progress(f"✓ 优先连接 {best.remote.host} ({best.address}, {best.latency:.0f} ms)")
+    return path
@@ -0,0 +1,255 @@
+"""
+OpenVPN 会话管理模块
+运行时 .ovpn 开启 OpenVPN 的管理接口（只监听 127.0.0.1，带随机密码），
+网络波动或隧道卡住时不再停止进程、重新 pkexec 启动，而是软重启：
+  - 通过管理接口发送 `signal SIGUSR1`：OpenVPN 进程、tun 设备和路由保持不变
+    （运行时配置补上 persist-tun / persist-key），只重新协商会话，一次 TLS 握手即可恢复
+  - 发送前打开 `state on`，收到 >STATE:...,CONNECTED 通知视为重连完成
+
+会话参数（端口、密码）每次启动时重新生成，保存在 <缓存目录>/ovpn/management.json
+（只有当前用户可读），密码文件供 OpenVPN 启动时读取。
+用户配置中已有 management 指令（或生成会话参数失败）时不加入管理接口，软重启由 helper
+发送 SIGUSR1（见 core.worker），运行时配置同样补上 persist-tun / persist-key。
+"""
+import json
+import logging
+import os
+import secrets
+import socket
+import time
+from typing import List, Optional, Sequence
+
+from core import config_io
+from core.artifacts import get_cache_dir
+
+log = logging.getLogger("ov2n.ovpn")
+
+MANAGEMENT_HOST = "127.0.0.1"
+MANAGEMENT_TIMEOUT = 5.0        # 连接和单条命令的时限（秒）
+SOFT_RESTART_TIMEOUT = 30.0     # 软重启后等待 CONNECTED 的时限（秒）
+SESSION_HEADER = "# ov2n-session"
+
+_PASSWORD_PROMPT = b"ENTER PASSWORD:"
+
+
+class SoftRestartPending(Exception):
+    """信号已发出，但 OpenVPN 未在时限内重新连接（进程仍在自动重试）。"""
+
+
+class ManagementSession:
+    """
+    管理接口参数。
+
+    Args:
+        port: 管理接口端口（127.0.0.1）
+        password: 管理接口密码
+    """
+
+    __slots__ = ("port", "password")
+
+    def __init__(self, port: int, password: str):
+        self.port = port
+        self.password = password
+
+    def __repr__(self) -> str:
+        return f"<ManagementSession {MANAGEMENT_HOST}:{self.port}>"
+
+
+def _session_dir() -> str:
+    return os.path.join(get_cache_dir(), "ovpn")
+
+
+def _session_path() -> str:
+    return os.path.join(_session_dir(), "management.json")
+
+
+def password_path() -> str:
+    return os.path.join(_session_dir(), "management.pw")
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((MANAGEMENT_HOST, 0))
+        return sock.getsockname()[1]
+
+
+def new_session() -> ManagementSession:
+    """
+    生成新的管理接口参数并写入会话文件和密码文件。
+
+    Raises:
+        OSError: 写入失败
+    """
+    session = ManagementSession(_free_port(), secrets.token_hex(16))
+    config_io.write_private(password_path(), f"{session.password}\n".encode("utf-8"))
+    config_io.write_private(_session_path(), config_io.dump_json_bytes(
+        {"port": session.port, "password": session.password}))
+    return session
+
+
+def load_session() -> Optional[ManagementSession]:
+    """最近一次启动的管理接口参数，没有时返回 None。"""
+    try:
+        data = json.loads(config_io.read_text(_session_path())[0])
+        return ManagementSession(int(data["port"]), str(data["password"]))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def clear_session() -> None:
+    for path in (_session_path(), password_path()):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def render_directives(session: Optional[ManagementSession], options: Sequence[str]) -> str:
+    """
+    运行时配置中开启管理接口、软重启时保留 tun 设备和密钥的指令。
+
+    Args:
+        session: 管理接口参数，None 时只补 persist-tun / persist-key（软重启由 helper 发送 SIGUSR1）
+        options: 用户配置中已有的指令名
+
+    Returns:
+        指令文本，无需追加时为空字符串
+    """
+    lines = []
+    if session is not None:
+        quoted = password_path().replace("\\", "\\\\").replace('"', '\\"')
+        lines.append(f'management {MANAGEMENT_HOST} {session.port} "{quoted}"')
+    lines += [name for name in ("persist-tun", "persist-key") if name not in options]
+    if not lines:
+        return ""
+    return "\n".join([SESSION_HEADER] + lines) + "\n"
+
+
+# ============================================
+# 管理接口客户端
+# ============================================
+
+class ManagementClient:
+    """
+    OpenVPN 管理接口的最小客户端（阻塞 socket，按行读取）。
+    以 > 开头的行是实时通知，其余为命令的回应（SUCCESS: / ERROR:）。
+    """
+
+    def __init__(self, session: ManagementSession, timeout: float = MANAGEMENT_TIMEOUT):
+        self.session = session
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._buffer = b""
+
+    def __enter__(self) -> "ManagementClient":
+        self.connect()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def connect(self) -> None:
+        """
+        Raises:
+            OSError: 无法连接
+            RuntimeError: 密码错误
+        """
+        self._sock = socket.create_connection(
+            (MANAGEMENT_HOST, self.session.port), timeout=self.timeout)
+        line = self._read_line(time.monotonic() + self.timeout)
+        if line.startswith(_PASSWORD_PROMPT.decode()):
+            self._send(self.session.password)
+            line = self._read_line(time.monotonic() + self.timeout)
+            if not line.startswith("SUCCESS:"):
+                raise RuntimeError(f"管理接口认证失败: {line}")
+
+    def close(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+
+    def _send(self, line: str) -> None:
+        self._sock.sendall(f"{line}\n".encode("utf-8"))
+
+    def _read_line(self, deadline: float) -> str:
+        while True:
+            # 密码提示后没有换行
+            if self._buffer.startswith(_PASSWORD_PROMPT):
+                self._buffer = self._buffer[len(_PASSWORD_PROMPT):]
+                return _PASSWORD_PROMPT.decode()
+            line, sep, rest = self._buffer.partition(b"\n")
+            if sep:
+                self._buffer = rest
+                return line.decode("utf-8", "replace").rstrip("\r")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise socket.timeout("管理接口响应超时")
+            self._sock.settimeout(remaining)
+            data = self._sock.recv(4096)
+            if not data:
+                raise ConnectionError("管理接口连接已关闭")
+            self._buffer += data
+
+    def command(self, line: str) -> str:
+        """
+        发送一条命令，返回 SUCCESS: 后的内容（期间的实时通知被忽略）。
+
+        Raises:
+            RuntimeError: OpenVPN 返回 ERROR:
+        """
+        self._send(line)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            reply = self._read_line(deadline)
+            if reply.startswith("SUCCESS:"):
+                return reply[len("SUCCESS:"):].strip()
+            if reply.startswith("ERROR:"):
+                raise RuntimeError(f"管理接口命令 {line!r} 失败: {reply[6:].strip()}")
+
+    def wait_state(self, states: Sequence[str], timeout: float) -> List[str]:
+        """
+        等待 >STATE: 通知进入 states 之一，返回通知的各字段。
+
+        Raises:
+            RuntimeError: OpenVPN 正在退出
+            socket.timeout: 超时
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            line = self._read_line(deadline)
+            if not line.startswith(">STATE:"):
+                continue
+            fields = line[len(">STATE:"):].split(",")
+            state = fields[1] if len(fields) > 1 else ""
+            log.debug("OpenVPN 状态: %s", state)
+            if state in states:
+                return fields
+            if state == "EXITING":
+                raise RuntimeError("OpenVPN 正在退出")
+
+
+def soft_restart(session: ManagementSession, timeout: float = SOFT_RESTART_TIMEOUT) -> float:
+    """
+    通过管理接口发送 SIGUSR1，等待重新连接完成。
+
+    Returns:
+        从发送信号到 CONNECTED 的耗时（秒）
+
+    Raises:
+        OSError: 管理接口无法连接或超时
+        RuntimeError: 认证失败、命令失败或 OpenVPN 退出
+        SoftRestartPending: 信号已发出但 timeout 内未重新连接
+    """
+    with ManagementClient(session) as client:
+        client.command("state on")
+        started = time.monotonic()
+        client.command("signal SIGUSR1")
+        try:
+            fields = client.wait_state(("CONNECTED",), timeout)
+        except socket.timeout:
+            raise SoftRestartPending(f"{timeout:g} 秒内未重新连接") from None
+        elapsed = time.monotonic() - started
+    log.info("OpenVPN 软重启完成 (%.2fs): %s", elapsed, ",".join(fields[1:5]))
+    return elapsed
@@ -0,0 +1,235 @@
+"""
+OpenVPN 运行时调优模块
+按性能档位（与 Xray 共用 core.perf_profiles 的档位名）在运行时 .ovpn 末尾追加调优指令，
+用户导入的 .ovpn 保持原样（运行时配置由 core.ovpn_profile 生成）：
+  - sndbuf / rcvbuf：socket 缓冲区（bulk-throughput 加大，low-memory 不改）
+  - fast-io：所有 remote 都是 UDP 时开启（非 Windows），写 tun 前不再等待 poll
+  - txqueuelen：tun 设备发送队列长度（仅 Linux）
+  - mssfix：按到首个 remote 的路径 MTU 计算（仅 UDP，路径 MTU 低于以太网时才调整）
+  - data-ciphers：按 CPU 是否支持 AES 指令排序，有 AES-NI 时 AES-GCM 优先，否则 CHACHA20 优先
+
+用户配置中已有的指令不覆盖（data-ciphers 只调整顺序，不增删）。
+tun-mtu 需要与服务端一致，不做调整。
+路径 MTU 取自内核路由缓存（已连接 UDP socket 的 IP_MTU，含接口 MTU 与 ICMP 学到的 PMTU），
+不需要 root，也不向服务端发送探测包。
+调优内容写入当前日志会话目录（openvpn-overlay.conf）。
+各档位在本机 network namespace 中的吞吐对比见 benchmarks/bench_ovpn_tuning.py。
+"""
+import logging
+import os
+import platform
+import socket
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from core import config_io
+from core.log_manager import get_session_dir
+from core.perf_profiles import PROFILE_NONE, Change
+
+if TYPE_CHECKING:
+    from core.ovpn_profile import Profile
+
+log = logging.getLogger("ov2n.ovpn")
+
+IS_WINDOWS = platform.system() == "Windows"
+IS_LINUX = platform.system() == "Linux"
+
+OVERLAY_HEADER = "# ov2n-tuning"
+OVERLAY_FILE = "openvpn-overlay.conf"
+
+MSSFIX_DEFAULT = 1450       # OpenVPN 默认的 mssfix（不含外层 IP/UDP 头）
+_OUTER_HEADER = {socket.AF_INET: 28, socket.AF_INET6: 48}   # 外层 IP + UDP 头
+
+AEAD_CIPHERS = ("AES-256-GCM", "AES-128-GCM", "CHACHA20-POLY1305")
+
+# Linux 常量（socket 模块不一定导出）
+_IP_MTU_DISCOVER = getattr(socket, "IP_MTU_DISCOVER", 10)
+_IP_PMTUDISC_DO = getattr(socket, "IP_PMTUDISC_DO", 2)
+_IP_MTU = getattr(socket, "IP_MTU", 14)
+_IPV6_MTU_DISCOVER = getattr(socket, "IPV6_MTU_DISCOVER", 23)
+_IPV6_PMTUDISC_DO = getattr(socket, "IPV6_PMTUDISC_DO", 2)
+_IPV6_MTU = getattr(socket, "IPV6_MTU", 24)
+
+
+class OvpnTuning:
+    """
+    一个档位的 OpenVPN 调优参数，None 表示不调整。
+
+    Args:
+        sndbuf / rcvbuf: socket 缓冲区（字节）
+        txqueuelen: tun 设备发送队列长度
+        fast_io: UDP 时开启 fast-io
+    """
+
+    __slots__ = ("sndbuf", "rcvbuf", "txqueuelen", "fast_io")
+
+    def __init__(self, sndbuf: Optional[int], rcvbuf: Optional[int],
+                 txqueuelen: Optional[int], fast_io: bool):
+        self.sndbuf = sndbuf
+        self.rcvbuf = rcvbuf
+        self.txqueuelen = txqueuelen
+        self.fast_io = fast_io
+
+
+TUNINGS: Dict[str, OvpnTuning] = {
+    "low-latency": OvpnTuning(sndbuf=262144, rcvbuf=262144, txqueuelen=500, fast_io=True),
+    "bulk-throughput": OvpnTuning(sndbuf=1048576, rcvbuf=1048576, txqueuelen=1000,
+                                  fast_io=True),
+    "low-memory": OvpnTuning(sndbuf=None, rcvbuf=None, txqueuelen=None, fast_io=True),
+}
+
+
+# ============================================
+# 探测
+# ============================================
+
+def has_aes_instructions() -> Optional[bool]:
+    """CPU 是否支持 AES 指令（x86 AES-NI / ARMv8 AES）；无法判断时返回 None。"""
+    if IS_LINUX:
+        try:
+            text, _ = config_io.read_text("/proc/cpuinfo")
+        except OSError:
+            return None
+        for line in text.splitlines():
+            key, _, value = line.partition(":")
+            if key.strip().lower() in ("flags", "features"):
+                return "aes" in value.split()
+        return None
+    if platform.machine().lower() in ("amd64", "x86_64"):
+        return True     # 2010 年以后的 x86-64 处理器基本都支持 AES-NI
+    return None
+
+
+def probe_path_mtu(host: str, port: int) -> Optional[int]:
+    """
+    到 remote 的路径 MTU（Linux，读取已连接 UDP socket 的 IP_MTU / IPV6_MTU）。
+
+    Returns:
+        减去外层 IP/UDP 头后的 UDP 载荷上限；非 Linux 或无法获取时返回 None
+    """
+    if not IS_LINUX:
+        return None
+    try:
+        family, _type, _proto, _name, sockaddr = socket.getaddrinfo(
+            host, port, type=socket.SOCK_DGRAM)[0]
+        with socket.socket(family, socket.SOCK_DGRAM) as sock:
+            if family == socket.AF_INET6:
+                sock.setsockopt(socket.IPPROTO_IPV6, _IPV6_MTU_DISCOVER, _IPV6_PMTUDISC_DO)
+                sock.connect(sockaddr)
+                mtu = sock.getsockopt(socket.IPPROTO_IPV6, _IPV6_MTU)
+            else:
+                sock.setsockopt(socket.IPPROTO_IP, _IP_MTU_DISCOVER, _IP_PMTUDISC_DO)
+                sock.connect(sockaddr)
+                mtu = sock.getsockopt(socket.IPPROTO_IP, _IP_MTU)
+    except (OSError, IndexError) as e:
+        log.debug("获取路径 MTU 失败 %s: %s", host, e)
+        return None
+    return mtu - _OUTER_HEADER[family]
+
+
+# ============================================
+# 生成
+# ============================================
+
+def order_ciphers(ciphers: List[str], aes: bool) -> List[str]:
+    """按是否有 AES 指令稳定排序：有时 AES-GCM 在前，否则 CHACHA20 在前。"""
+    def rank(cipher: str) -> int:
+        is_aes = cipher.upper().startswith("AES-") and cipher.upper().endswith("GCM")
+        is_chacha = cipher.upper().startswith("CHACHA20")
+        if aes:
+            return 0 if is_aes else 1
+        return 0 if is_chacha else 1
+    return sorted(ciphers, key=rank)
+
+
+def _cipher_change(profile: "Profile", aes: Optional[bool]) -> Optional[Change]:
+    if aes is None:
+        return None
+    for name in ("data-ciphers", "ncp-ciphers"):
+        if profile.options.get(name):
+            current = profile.options[name][0].split(":")
+            ordered = order_ciphers(current, aes)
+            return Change(name, ":".join(current), ":".join(ordered)) \
+                if ordered != current else None
+    ciphers = list(AEAD_CIPHERS)
+    legacy = (profile.options.get("cipher") or [""])[0]
+    if legacy and legacy.lower() != "none" and legacy.upper() not in ciphers:
+        ciphers.append(legacy)  # 保留与未协商加密算法的旧服务端的兼容
+    ordered = order_ciphers(ciphers, aes)
+    return Change("data-ciphers", None, ":".join(ordered)) if ordered != ciphers else None
+
+
+def build_overlay(profile: "Profile", perf_profile: str, path_mtu: Optional[int] = None,
+                  aes: Optional[bool] = None) -> List[Change]:
+    """
+    生成调优指令（Change.path 为指令名，new 为参数）。
+
+    Args:
+        path_mtu: 到首个 remote 的路径 MTU（已减去外层 IP/UDP 头）
+        aes: CPU 是否支持 AES 指令，None 表示未知（不调整 data-ciphers）
+
+    Raises:
+        ValueError: 档位不存在
+    """
+    if perf_profile == PROFILE_NONE:
+        return []
+    tuning = TUNINGS.get(perf_profile)
+    if tuning is None:
+        raise ValueError(f"未知的性能档位: {perf_profile}")
+
+    udp_only = bool(profile.remotes) and all(r.transport == "udp" for r in profile.remotes)
+    wanted = [
+        ("sndbuf", tuning.sndbuf),
+        ("rcvbuf", tuning.rcvbuf),
+        ("fast-io", "" if tuning.fast_io and udp_only and not IS_WINDOWS else None),
+        ("txqueuelen", tuning.txqueuelen if IS_LINUX else None),
+        ("mssfix", path_mtu if udp_only and path_mtu and path_mtu < MSSFIX_DEFAULT else None),
+    ]
+    changes = [Change(name, None, str(value)) for name, value in wanted
+               if value is not None and name not in profile.options]
+    cipher = _cipher_change(profile, aes)
+    if cipher is not None:
+        changes.append(cipher)
+    return changes
+
+
+def render_overlay(changes: List[Change], perf_profile: str) -> str:
+    """调优指令文本（追加在运行时配置末尾，后出现的指令覆盖前面的）。"""
+    if not changes:
+        return ""
+    lines = [f"{OVERLAY_HEADER} profile={perf_profile}"]
+    if any(c.path == "data-ciphers" for c in changes):
+        lines.append("ignore-unknown-option data-ciphers")     # OpenVPN 2.4 没有 data-ciphers
+    lines += [f"{c.path} {c.new}".rstrip() for c in changes]
+    return "\n".join(lines) + "\n"
+
+
+def tune_profile(profile: "Profile", perf_profile: str,
+                 mtu_target: Optional[str] = None) -> List[Change]:
+    """
+    build_overlay 的完整版本：探测路径 MTU 和 AES 指令后生成调优指令（阻塞，含 DNS 解析）。
+
+    Args:
+        mtu_target: 探测路径 MTU 的地址，默认取首个 remote
+    """
+    if perf_profile == PROFILE_NONE or perf_profile not in TUNINGS:
+        return []
+    path_mtu = None
+    if profile.remotes and "mssfix" not in profile.options:
+        first = profile.remotes[0]
+        path_mtu = probe_path_mtu(mtu_target or first.host, first.port)
+    changes = build_overlay(profile, perf_profile, path_mtu, has_aes_instructions())
+    if changes:
+        log.info("OpenVPN 调优 (%s): %s", perf_profile, changes)
+    return changes
+
+
+def record_overlay(overlay: str) -> None:
+    """把调优内容写入当前日志会话目录。"""
+    session = get_session_dir()
+    if not session or not overlay:
+        return
+    try:
+        config_io.atomic_write_bytes(os.path.join(session, OVERLAY_FILE),
+                                     overlay.encode("utf-8"))
+    except OSError as e:
+        log.debug("记录 OpenVPN 调优失败: %s", e)
@@ -0,0 +1,183 @@
+"""
+运行时性能配置模块
+在档案（config.json）与 xray 实际读取的运行时配置之间加一道可选的调优：
+  - low-latency：关闭 mux（避免队头阻塞），开启 TCP Fast Open / TCP_NODELAY，
+    较短的 keepalive 及早发现断线
+  - bulk-throughput：关闭 mux（每个连接独占一条 TCP），加大 policy 缓冲区，
+    延长空闲超时，长时间下载不被掐断
+  - low-memory：开启 mux 复用少量上游连接，缩小缓冲区，较短的空闲超时及早回收连接
+
+按协议取安全值：mux 只用于 vmess / trojan / 未启用 flow 的 vless（xtls-rprx-vision 与 mux 不兼容），
+TCP 相关的 sockopt 不用于 kcp / quic 等 UDP 传输；sockopt.mark 从不修改（TProxy 依赖它放行出站流量）。
+
+optimize() 返回新配置和改动列表（Change），不修改传入的配置；
+运行时配置由 core.artifacts 编译并按内容哈希缓存，原 config.json 保持用户导入时的内容。
+各档位在本机回环上的对比见 benchmarks/bench_perf_profiles.py。
+"""
+import copy
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from core import config_io, config_repo
+from core.config_manager import get_config_dir
+
+log = logging.getLogger("ov2n.perf")
+
+PROFILE_NONE = "none"
+
+_MUX_PROTOCOLS = frozenset(("vmess", "vless", "trojan"))
+_UDP_NETWORKS = frozenset(("kcp", "mkcp", "quic"))
+
+
+class PerfProfile:
+    """
+    一个调优档位。
+
+    Args:
+        name: 档位名
+        label: 界面显示名称
+        sockopt: 写入代理出站 streamSettings.sockopt 的 TCP 选项
+        mux: 出站 mux 设置（仅用于支持 mux 的协议）
+        policy: 写入 policy.levels["0"] 的缓冲区与超时（bufferSize 单位 KB，超时单位秒）
+    """
+
+    __slots__ = ("name", "label", "sockopt", "mux", "policy")
+
+    def __init__(self, name: str, label: str, sockopt: Dict[str, Any],
+                 mux: Dict[str, Any], policy: Dict[str, int]):
+        self.name = name
+        self.label = label
+        self.sockopt = sockopt
+        self.mux = mux
+        self.policy = policy
+
+
+PROFILES: Dict[str, PerfProfile] = {p.name: p for p in (
+    PerfProfile(
+        "low-latency", "低延迟",
+        sockopt={"tcpFastOpen": True, "tcpNoDelay": True,
+                 "tcpKeepAliveIdle": 30, "tcpKeepAliveInterval": 15},
+        mux={"enabled": False},
+        policy={"handshake": 4, "connIdle": 300, "uplinkOnly": 1, "downlinkOnly": 1,
+                "bufferSize": 64},
+    ),
+    PerfProfile(
+        "bulk-throughput", "大流量",
+        sockopt={"tcpFastOpen": True, "tcpNoDelay": False,
+                 "tcpKeepAliveIdle": 60, "tcpKeepAliveInterval": 30},
+        mux={"enabled": False},
+        policy={"handshake": 8, "connIdle": 600, "uplinkOnly": 2, "downlinkOnly": 5,
+                "bufferSize": 512},
+    ),
+    PerfProfile(
+        "low-memory", "低内存",
+        sockopt={"tcpFastOpen": True, "tcpKeepAliveIdle": 120,
+                 "tcpKeepAliveInterval": 60},
+        mux={"enabled": True, "concurrency": 4, "xudpConcurrency": 4},
+        policy={"handshake": 4, "connIdle": 120, "uplinkOnly": 1, "downlinkOnly": 1,
+                "bufferSize": 16},
+    ),
+)}
+
+
+class Change:
+    """一处配置改动。path 形如 outbounds[proxy].mux.enabled。"""
+
+    __slots__ = ("path", "old", "new")
+
+    def __init__(self, path: str, old: Any, new: Any):
+        self.path = path
+        self.old = old
+        self.new = new
+
+    def __str__(self) -> str:
+        return f"{self.path}: {self.old!r} -> {self.new!r}"
+
+    __repr__ = __str__
+
+
+def _set(container: Dict, key: str, value: Any, path: str, changes: List[Change]) -> None:
+    old = container.get(key)
+    if old != value:
+        container[key] = value
+        changes.append(Change(f"{path}.{key}", old, value))
+
+
+def _mux_allowed(outbound: Dict) -> bool:
+    protocol = outbound.get("protocol")
+    if protocol not in _MUX_PROTOCOLS:
+        return False
+    if protocol == "vless":
+        users = [u for v in outbound.get("settings", {}).get("vnext", [])
+                 for u in v.get("users", [])]
+        return not any(u.get("flow") for u in users)
+    return True
+
+
+def _tune_outbound(outbound: Dict, profile: PerfProfile, changes: List[Change]) -> None:
+    path = f"outbounds[{outbound.get('tag', '')}]"
+    stream = outbound.setdefault("streamSettings", {})
+    if stream.get("network", "tcp") not in _UDP_NETWORKS:
+        sockopt = stream.setdefault("sockopt", {})
+        for key, value in profile.sockopt.items():
+            _set(sockopt, key, value, f"{path}.streamSettings.sockopt", changes)
+    # 档位关闭 mux 时，没有 mux 设置的出站保持原样
+    if _mux_allowed(outbound) and (profile.mux.get("enabled") or "mux" in outbound):
+        mux = outbound.setdefault("mux", {})
+        for key, value in profile.mux.items():
+            _set(mux, key, value, f"{path}.mux", changes)
+        if not mux.get("enabled"):
+            # 关闭 mux 时并发数没有意义，只保留 enabled
+            for key in ("concurrency", "xudpConcurrency"):
+                if key in mux:
+                    changes.append(Change(f"{path}.mux.{key}", mux.pop(key), None))
+
+
+def optimize(config: Dict, profile: str) -> Tuple[Dict, List[Change]]:
+    """
+    按档位调优配置中所有代理出站和 policy。
+
+    Returns:
+        (新配置, 改动列表)；profile 为 none 时原样返回拷贝和空列表
+
+    Raises:
+        ValueError: 档位不存在
+    """
+    result = copy.deepcopy(config)
+    if profile == PROFILE_NONE:
+        return result, []
+    preset = PROFILES.get(profile)
+    if preset is None:
+        raise ValueError(f"未知的性能档位: {profile}")
+
+    changes: List[Change] = []
+    for outbound in result.get("outbounds", []):
+        if outbound.get("protocol") in config_repo.PROXY_PROTOCOLS:
+            _tune_outbound(outbound, preset, changes)
+    level = result.setdefault("policy", {}).setdefault("levels", {}).setdefault("0", {})
+    for key, value in preset.policy.items():
+        _set(level, key, value, 'policy.levels["0"]', changes)
+    return result, changes
+
+
+# ============================================
+# 档位设置（perf.json）
+# ============================================
+
+def _settings_path() -> str:
+    return os.path.join(get_config_dir(), "perf.json")
+
+
+def load_profile_name() -> str:
+    try:
+        text, _ = config_io.read_text(_settings_path())
+        name = json.loads(text).get("profile")
+    except (OSError, ValueError, AttributeError):
+        return PROFILE_NONE
+    return name if name in PROFILES else PROFILE_NONE
+
+
+def save_profile_name(name: Optional[str]) -> None:
+    config_io.write_json(_settings_path(), {"profile": name or PROFILE_NONE})
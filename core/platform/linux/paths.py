@@ -16,7 +16,8 @@ class LinuxPaths(PlatformPaths):
 
     @property
     def log_dir(self) -> str:
-        return "/tmp"
+        # vpn-helper.py 的日志根目录，核心进程输出按会话存放在 sessions/ 下
+        return "/var/log/ov2n"
 
     @property
     def helper_script(self) -> str:
@@ -24,11 +25,12 @@ class LinuxPaths(PlatformPaths):
 
     @property
     def openvpn_log(self) -> str:
-        return "/tmp/openvpn.log"
+        # 指向最近一次会话日志的符号链接
+        return os.path.join(self.log_dir, "openvpn.log")
 
     @property
     def v2ray_log(self) -> str:
-        return "/tmp/v2ray.log"
+        return os.path.join(self.log_dir, "v2ray.log")
 
     @property
     def tap_driver_dir(self) -> str:
@@ -6,6 +6,7 @@ import os
 import subprocess
 from typing import Dict, Tuple
 
+from core.env_probe import has_command
 from core.platform.base import PrivilegeHandler
 from core.platform.linux.paths import LinuxPaths
 
@@ -21,12 +22,9 @@ class LinuxPrivilegeHandler(PrivilegeHandler):
         return self._paths.helper_script
 
     def check_available(self) -> bool:
-        """检查 polkit (pkexec) 是否可用。"""
+        """检查 polkit (pkexec) 是否可用（经 env_probe 缓存）。"""
         try:
-            result = subprocess.run(
-                ["which", "pkexec"],
-                capture_output=True, text=True, timeout=5)
-            return result.returncode == 0
+            return has_command("pkexec")
         except Exception as e:
             print(f"检查 polkit 失败: {e}")
             return False
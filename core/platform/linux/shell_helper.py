@@ -5,6 +5,7 @@ import os
 import subprocess
 import tempfile
 
+from core.env_probe import has_command
 from core.platform.base import ShellHelper
 
 
@@ -30,12 +31,9 @@ class LinuxShellHelper(ShellHelper):
             return False
 
     def check_command_exists(self, command: str) -> bool:
-        """使用 which 检查命令是否存在。"""
+        """检查命令是否存在（经 env_probe 缓存，不启动 which 子进程）。"""
         try:
-            result = subprocess.run(
-                ["which", command],
-                capture_output=True, text=True, timeout=5)
-            return result.returncode == 0
+            return has_command(command)
         except Exception:
             return False
 
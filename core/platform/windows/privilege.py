@@ -175,7 +175,7 @@ class WindowsPrivilegeHandler(PrivilegeHandler):
         return xray_mgr.is_running
 
     # ══════════════════════════════════════════
-    # 联合启停（供 CombinedStartThread 调用）
+    # 联合启停（供联合启动任务调用）
     # ══════════════════════════════════════════
 
     def start_vpn(self, vpn_config_path: str, v2ray_config_path: str
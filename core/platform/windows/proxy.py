@@ -6,11 +6,11 @@ Windows 版使用 Xray TUN 模式实现透明代理（增强版），
 """
 import json
 import os
-import re
 import subprocess
 import time
 from typing import Dict, Tuple
 
+from core import config_repo
 from core.platform.base import ProxyManager
 
 
@@ -211,10 +211,7 @@ class WindowsProxyManager(ProxyManager):
             config_path = self._paths.xray_config
             if not os.path.isfile(config_path):
                 return ""
-            with open(config_path, "r", encoding="utf-8") as f:
-                content = f.read()
-            content = re.sub(r'(?m)^\s*//.*$', '', content)
-            config = json.loads(content)
+            config = config_repo.load_document(config_path).data
             for ob in config.get("outbounds", []):
                 if ob.get("tag") == "proxy":
                     servers = ob.get("settings", {}).get("servers", [])
@@ -6,6 +6,8 @@ import subprocess
 import os
 import sys
 
+from core.env_probe import has_command
+
 class PolkitHelper:
     """Polkit 权限提升辅助类"""
     
@@ -14,15 +16,9 @@ class PolkitHelper:
     
     @staticmethod
     def check_polkit_available():
-        """检查 polkit 是否可用"""
+        """检查 polkit 是否可用（结果经 env_probe 缓存，不启动子进程）"""
         try:
-            result = subprocess.run(
-                ["which", "pkexec"],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            return result.returncode == 0
+            return has_command("pkexec")
         except Exception as e:
             print(f"检查 polkit 失败: {e}")
             return False
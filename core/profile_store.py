@@ -0,0 +1,480 @@
+"""
+配置档案库模块
+用 SQLite（<配置目录>/profiles.db）保存多个 OpenVPN 配置和代理节点：
+  - 节点表按名称、分组、协议、地址、延迟建索引，几百上千个节点也能直接按键查询和排序
+  - 节点只保存其 outbound（JSON），运行时 config.json 在切换时由
+    “基础配置 + 选中节点” 渲染生成：一次主键查询 + 一次渲染 + 一次原子写入
+  - OpenVPN 配置保存完整文本，切换时写出到固定的 client.ovpn 位置
+  - 当前选中项保存在 meta 表，重启后保持
+
+USER_VPN_CONFIG / USER_V2RAY_CONFIG 仍是 openvpn / xray 实际读取的文件，
+档案库只是它们的来源，未使用档案库时行为与以前一致。
+数据库含节点密码和带 inline 密钥的 .ovpn，只有当前用户可读写（0600），
+写出的 OpenVPN 配置同样如此。
+"""
+import copy
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core import config_io, config_repo
+from core.config_manager import get_config_dir
+
+log = logging.getLogger("ov2n.profiles")
+
+SCHEMA_VERSION = 2
+PROXY_TAG = "proxy"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    id          INTEGER PRIMARY KEY,
+    name        TEXT NOT NULL,
+    group_name  TEXT NOT NULL DEFAULT '',
+    protocol    TEXT NOT NULL,
+    address     TEXT NOT NULL,
+    port        INTEGER NOT NULL DEFAULT 0,
+    outbound    TEXT NOT NULL,
+    content_hash TEXT NOT NULL DEFAULT '',
+    latency_ms  REAL,
+    updated_at  REAL NOT NULL,
+    UNIQUE (group_name, protocol, address, port, name)
+);
+CREATE INDEX IF NOT EXISTS idx_nodes_name     ON nodes(name);
+CREATE INDEX IF NOT EXISTS idx_nodes_group    ON nodes(group_name);
+CREATE INDEX IF NOT EXISTS idx_nodes_protocol ON nodes(protocol);
+CREATE INDEX IF NOT EXISTS idx_nodes_address  ON nodes(address);
+CREATE INDEX IF NOT EXISTS idx_nodes_latency  ON nodes(latency_ms);
+CREATE TABLE IF NOT EXISTS vpn_profiles (
+    id          INTEGER PRIMARY KEY,
+    name        TEXT NOT NULL UNIQUE,
+    group_name  TEXT NOT NULL DEFAULT '',
+    content     TEXT NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_vpn_group ON vpn_profiles(group_name);
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id            INTEGER PRIMARY KEY,
+    name          TEXT NOT NULL UNIQUE,
+    url           TEXT NOT NULL,
+    etag          TEXT,
+    last_modified TEXT,
+    body_hash     TEXT,
+    interval_min  INTEGER NOT NULL DEFAULT 360,
+    updated_at    REAL NOT NULL DEFAULT 0,
+    last_error    TEXT
+);
+"""
+
+# 旧版本数据库升级：目标版本 → 需要补充的列 (表, 列, 定义)
+_MIGRATIONS = {
+    2: (("nodes", "content_hash", "TEXT NOT NULL DEFAULT ''"),),
+}
+
+_NODE_COLUMNS = "id, name, group_name, protocol, address, port, latency_ms"
+
+
+class ProxyNode:
+    """节点摘要（列表显示用，不含 outbound 内容）。"""
+
+    __slots__ = ("id", "name", "group", "protocol", "address", "port", "latency_ms")
+
+    def __init__(self, id: int, name: str, group: str, protocol: str,
+                 address: str, port: int, latency_ms: Optional[float]):
+        self.id = id
+        self.name = name
+        self.group = group
+        self.protocol = protocol
+        self.address = address
+        self.port = port
+        self.latency_ms = latency_ms
+
+    def __repr__(self) -> str:
+        return f"<ProxyNode #{self.id} {self.name} {self.protocol}://{self.address}:{self.port}>"
+
+
+def outbound_endpoint(outbound: Dict) -> Tuple[str, str, int]:
+    """从 outbound 提取 (protocol, address, port)，支持 servers / vnext 两种格式。"""
+    settings = outbound.get("settings", {})
+    servers = settings.get("servers") or settings.get("vnext") or [{}]
+    server = servers[0]
+    return (outbound.get("protocol", ""), str(server.get("address", "")),
+            int(server.get("port", 0) or 0))
+
+
+def render_config(base: Dict, outbound: Dict) -> Dict:
+    """
+    以 base 为模板渲染运行时配置：用节点 outbound 替换 tag 为 proxy 的出站（放在首位）。
+    base 不会被修改。
+    """
+    config = dict(base)
+    node = copy.deepcopy(outbound)
+    node["tag"] = PROXY_TAG
+    config["outbounds"] = [node] + [
+        ob for ob in base.get("outbounds", []) if ob.get("tag") != PROXY_TAG
+    ]
+    return config
+
+
+def _create_private(path: str) -> None:
+    """先以 0600 创建数据库文件（SQLite 的 -wal / -shm 文件沿用其权限），已有文件收紧为 0600。"""
+    os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+    if os.name != "nt":
+        os.chmod(path, 0o600)
+
+
+class ProfileStore:
+    """SQLite 档案库，线程安全（内部单连接 + 锁）。"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.path.join(get_config_dir(), "profiles.db")
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        _create_private(self.db_path)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+            self._conn.execute(
+                "INSERT OR IGNORE INTO meta(key, value) VALUES ('schema_version', ?)",
+                (str(SCHEMA_VERSION),))
+        self._migrate()
+
+    def _migrate(self) -> None:
+        version = int(self._get_meta("schema_version") or SCHEMA_VERSION)
+        if version >= SCHEMA_VERSION:
+            return
+        with self._conn:
+            for target in range(version + 1, SCHEMA_VERSION + 1):
+                for table, column, definition in _MIGRATIONS.get(target, ()):
+                    columns = {r[1] for r in self._conn.execute(f"PRAGMA table_info({table})")}
+                    if column not in columns:
+                        self._conn.execute(
+                            f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            self._set_meta("schema_version", str(SCHEMA_VERSION))
+        log.info("档案库升级: v%s -> v%s", version, SCHEMA_VERSION)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # ============================================
+    # meta
+    # ============================================
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: Optional[str]) -> None:
+        self._conn.execute(
+            "INSERT INTO meta(key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, value))
+
+    # ============================================
+    # 代理节点
+    # ============================================
+
+    @staticmethod
+    def _node_row(name: str, outbound: Dict, group: str, now: float) -> Tuple:
+        protocol, address, port = outbound_endpoint(outbound)
+        stored = {k: v for k, v in outbound.items() if k != "tag"}
+        text = json.dumps(stored, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        return (name, group, protocol, address, port, text, digest, now)
+
+    _UPSERT_NODE = (
+        "INSERT INTO nodes(name, group_name, protocol, address, port, outbound, "
+        "content_hash, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(group_name, protocol, address, port, name) DO UPDATE SET "
+        "outbound = excluded.outbound, content_hash = excluded.content_hash, "
+        "updated_at = excluded.updated_at")
+
+    def add_node(self, name: str, outbound: Dict, group: str = "") -> int:
+        """
+        添加或更新节点（同分组下 协议+地址+端口+名称 相同视为同一节点），返回节点 id。
+        """
+        row = self._node_row(name, outbound, group, time.time())
+        with self._lock, self._conn:
+            self._conn.execute(self._UPSERT_NODE, row)
+            return self._conn.execute(
+                "SELECT id FROM nodes WHERE group_name = ? AND protocol = ? "
+                "AND address = ? AND port = ? AND name = ?",
+                (row[1], row[2], row[3], row[4], row[0])).fetchone()[0]
+
+    def add_nodes(self, items: Iterable[Tuple[str, Dict]], group: str = "") -> int:
+        """批量添加 (name, outbound)，单个事务完成，返回处理的条数。"""
+        now = time.time()
+        rows = [self._node_row(name, ob, group, now) for name, ob in items]
+        with self._lock, self._conn:
+            self._conn.executemany(self._UPSERT_NODE, rows)
+        return len(rows)
+
+    def sync_group(self, group: str,
+                   items: Iterable[Tuple[str, Dict]]) -> Tuple[int, int, int]:
+        """
+        用 items 同步整个分组（订阅刷新用）：按 (名称, 协议, 地址, 端口) 对应，
+        按内容哈希比较，只写入新增、变化和删除的节点，未变化的节点（及其 id、测速结果）保持不动。
+
+        Returns:
+            (新增数, 删除数, 变化数)
+        """
+        now = time.time()
+        wanted: Dict[Tuple, Tuple] = {}
+        for name, ob in items:
+            row = self._node_row(name, ob, group, now)
+            wanted[(row[0], row[2], row[3], row[4])] = row   # 重复项以后出现的为准
+
+        with self._lock, self._conn:
+            existing = {
+                (name, protocol, address, port): (node_id, digest)
+                for node_id, name, protocol, address, port, digest in self._conn.execute(
+                    "SELECT id, name, protocol, address, port, content_hash "
+                    "FROM nodes WHERE group_name = ?", (group,))
+            }
+            added = [row for key, row in wanted.items() if key not in existing]
+            changed = [(row[5], row[6], now, existing[key][0])
+                       for key, row in wanted.items()
+                       if key in existing and existing[key][1] != row[6]]
+            removed = [(node_id,) for key, (node_id, _) in existing.items()
+                       if key not in wanted]
+
+            if added:
+                self._conn.executemany(self._UPSERT_NODE, added)
+            if changed:
+                self._conn.executemany(
+                    "UPDATE nodes SET outbound = ?, content_hash = ?, updated_at = ? "
+                    "WHERE id = ?", changed)
+            if removed:
+                self._conn.executemany("DELETE FROM nodes WHERE id = ?", removed)
+                selected = self._get_meta("selected_node")
+                if selected and (int(selected),) in removed:
+                    self._set_meta("selected_node", None)
+        return len(added), len(removed), len(changed)
+
+    def get_node(self, node_id: int) -> Optional[ProxyNode]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {_NODE_COLUMNS} FROM nodes WHERE id = ?", (node_id,)).fetchone()
+        return ProxyNode(*row) if row else None
+
+    def get_outbound(self, node_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT outbound FROM nodes WHERE id = ?", (node_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find_nodes(self, group: Optional[str] = None, protocol: Optional[str] = None,
+                   name_like: Optional[str] = None, address: Optional[str] = None,
+                   order_by_latency: bool = False,
+                   limit: Optional[int] = None) -> List[ProxyNode]:
+        """按条件查询节点；order_by_latency 时未测速的节点排在最后。"""
+        where, params = [], []
+        for column, value in (("group_name", group), ("protocol", protocol),
+                              ("address", address)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if name_like:
+            where.append("name LIKE ?")
+            params.append(f"%{name_like}%")
+        sql = f"SELECT {_NODE_COLUMNS} FROM nodes"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if order_by_latency:
+            sql += " ORDER BY latency_ms IS NULL, latency_ms, name"
+        else:
+            sql += " ORDER BY group_name, name"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return [ProxyNode(*row) for row in self._conn.execute(sql, params)]
+
+    def groups(self) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute(
+                "SELECT DISTINCT group_name FROM nodes ORDER BY group_name")]
+
+    def delete_node(self, node_id: int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM nodes WHERE id = ?", (node_id,))
+            if self._get_meta("selected_node") == str(node_id):
+                self._set_meta("selected_node", None)
+
+    def set_latency(self, node_id: int, latency_ms: Optional[float]) -> None:
+        self.set_latencies({node_id: latency_ms})
+
+    def set_latencies(self, results: Dict[int, Optional[float]]) -> None:
+        """批量写入测速结果（None 表示不可达）。"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE nodes SET latency_ms = ? WHERE id = ?",
+                [(ms, node_id) for node_id, ms in results.items()])
+
+    # ── 选择与渲染 ─────────────────────────────
+
+    def selected_node_id(self) -> Optional[int]:
+        with self._lock:
+            value = self._get_meta("selected_node")
+        return int(value) if value else None
+
+    def select_node(self, node_id: Optional[int]) -> None:
+        """只记录当前节点，不写 config.json（配置已由其他途径写好时使用）。"""
+        with self._lock, self._conn:
+            self._set_meta("selected_node", str(node_id) if node_id else None)
+
+    def render_node(self, node_id: int, base: Dict) -> Dict:
+        """渲染选中节点的运行时配置（不写文件）。"""
+        outbound = self.get_outbound(node_id)
+        if outbound is None:
+            raise KeyError(f"节点不存在: {node_id}")
+        return render_config(base, outbound)
+
+    def activate_node(self, node_id: int, config_path: str, base: Dict) -> Dict:
+        """
+        切换到指定节点：渲染 config.json 并原子写入，记录为当前节点。
+
+        Args:
+            node_id: 节点 id
+            config_path: 运行时配置路径（USER_V2RAY_CONFIG）
+            base: 基础配置（入站、路由等），通常为当前 config.json 的内容
+
+        Returns:
+            渲染后的配置
+        """
+        config = self.render_node(node_id, base)
+        config_io.write_json(config_path, config)
+        config_repo.invalidate(config_path)
+        self.select_node(node_id)
+        log.info("切换节点 #%s -> %s", node_id, config_path)
+        return config
+
+    def import_outbounds(self, config: Dict, group: str = "") -> int:
+        """把配置中所有带服务器地址的代理出站导入为节点，返回导入条数。"""
+        items = []
+        for ob in config.get("outbounds", []):
+            if ob.get("protocol") not in config_repo.PROXY_PROTOCOLS:
+                continue
+            protocol, address, port = outbound_endpoint(ob)
+            if not address or address.lower() in config_repo.PLACEHOLDER_ADDRESSES:
+                continue
+            tag = ob.get("tag")
+            name = tag if tag and tag != PROXY_TAG else f"{address}:{port}"
+            items.append((name, ob))
+        return self.add_nodes(items, group)
+
+    # ============================================
+    # 订阅
+    # ============================================
+
+    def add_subscription(self, name: str, url: str, interval_min: int = 360) -> int:
+        """添加或更新（按名称）订阅，名称同时作为其节点的分组名，返回 id。"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO subscriptions(name, url, interval_min) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET url = excluded.url, "
+                "interval_min = excluded.interval_min, etag = NULL, "
+                "last_modified = NULL, body_hash = NULL",
+                (name, url, interval_min))
+            return self._conn.execute(
+                "SELECT id FROM subscriptions WHERE name = ?", (name,)).fetchone()[0]
+
+    def list_subscriptions(self) -> List[Dict]:
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT id, name, url, etag, last_modified, body_hash, interval_min, "
+                "updated_at, last_error FROM subscriptions ORDER BY name")
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor]
+
+    def update_subscription_state(self, sub_id: int, **fields) -> None:
+        """更新订阅的缓存校验信息（etag / last_modified / body_hash / updated_at / last_error）。"""
+        allowed = {"etag", "last_modified", "body_hash", "updated_at", "last_error"}
+        items = [(k, v) for k, v in fields.items() if k in allowed]
+        if not items:
+            return
+        sql = ", ".join(f"{k} = ?" for k, _ in items)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE subscriptions SET {sql} WHERE id = ?",
+                               [v for _, v in items] + [sub_id])
+
+    def delete_subscription(self, sub_id: int, remove_nodes: bool = True) -> None:
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT name FROM subscriptions WHERE id = ?", (sub_id,)).fetchone()
+            self._conn.execute("DELETE FROM subscriptions WHERE id = ?", (sub_id,))
+            if row and remove_nodes:
+                self._conn.execute("DELETE FROM nodes WHERE group_name = ?", (row[0],))
+
+    # ============================================
+    # OpenVPN 配置
+    # ============================================
+
+    def add_vpn_profile(self, name: str, content: str, group: str = "") -> int:
+        """添加或更新（按名称）OpenVPN 配置，返回 id。"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO vpn_profiles(name, group_name, content, updated_at) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT(name) DO UPDATE SET "
+                "group_name = excluded.group_name, content = excluded.content, "
+                "updated_at = excluded.updated_at",
+                (name, group, content, time.time()))
+            return self._conn.execute(
+                "SELECT id FROM vpn_profiles WHERE name = ?", (name,)).fetchone()[0]
+
+    def list_vpn_profiles(self) -> List[Tuple[int, str, str]]:
+        """返回 [(id, name, group)]。"""
+        with self._lock:
+            return list(self._conn.execute(
+                "SELECT id, name, group_name FROM vpn_profiles ORDER BY group_name, name"))
+
+    def delete_vpn_profile(self, profile_id: int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM vpn_profiles WHERE id = ?", (profile_id,))
+            if self._get_meta("selected_vpn") == str(profile_id):
+                self._set_meta("selected_vpn", None)
+
+    def selected_vpn_id(self) -> Optional[int]:
+        with self._lock:
+            value = self._get_meta("selected_vpn")
+        return int(value) if value else None
+
+    def select_vpn_profile(self, profile_id: Optional[int]) -> None:
+        """只记录当前 OpenVPN 配置，不写文件。"""
+        with self._lock, self._conn:
+            self._set_meta("selected_vpn", str(profile_id) if profile_id else None)
+
+    def activate_vpn_profile(self, profile_id: int, config_path: str) -> None:
+        """把指定 OpenVPN 配置写出到 config_path（原子替换，只有当前用户可读）并记录为当前配置。"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content FROM vpn_profiles WHERE id = ?", (profile_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"OpenVPN 配置不存在: {profile_id}")
+        config_io.write_private(config_path, row[0].encode("utf-8"))
+        self.select_vpn_profile(profile_id)
+        log.info("切换 OpenVPN 配置 #%s -> %s", profile_id, config_path)
+
+
+_store: Optional[ProfileStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> ProfileStore:
+    """全局档案库（首次调用时打开数据库）。"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ProfileStore()
+        return _store
@@ -7,19 +7,30 @@ SS URL 配置管理器 (修复版)
 - 支持混合格式: ss://base64@server:port
 - 增强调试信息
 - 修复 warn_legacy 误判：只有完全Base64且解码后含@的才是真正遗留格式
-- V2RayConfigManager._load_config 支持含 // 注释的 JSON（xray 模板格式）
+- V2RayConfigManager._load_config 支持含 // 注释的 JSON（xray 模板格式），解析结果由 config_repo 缓存
+- V2RayConfigManager.batch() 批量修改：内存中完成多次增改，退出时一次原子写入
+- 剪贴板中有多条 SS URL 时全部导入（第一条为 proxy，其余为额外出站），在一次 batch() 中写入
+- SSUrlParser 改由 link_codec 解析：不再逐条打印调试信息和异常堆栈
+- V2RayConfigManager.enable_balancer() 把多个出站组成 xray 均衡器，额外添加的服务器不再闲置
 """
-import json
+import contextlib
+import copy
+import logging
 import os
 import platform
 import re
-import base64
-import urllib.parse
 from typing import List, Dict, Optional, Tuple
 from PyQt5.QtWidgets import QMessageBox
 
+from core import balancer, config_io, config_repo
+from core.link_codec import SS_METHODS, LinkParseError, parse_link_strict
+
+log = logging.getLogger("ov2n.config")
+
 IS_WINDOWS = platform.system() == "Windows"
 
+_SS_URL_RE = re.compile(r'ss://[^\s,]+')
+
 
 class ShadowsocksServer:
     """Shadowsocks 服务器配置"""
@@ -59,14 +70,10 @@ class ShadowsocksServer:
 
 
 class SSUrlParser:
-    """SIP002 SS URL 解析器 (增强版)"""
+    """SIP002 SS URL 解析器（基于 link_codec，解析过程不打印调试信息）"""
     
     # 支持的加密方法列表
-    SUPPORTED_METHODS = [
-        "aes-256-gcm", "aes-128-gcm", "chacha20-poly1305", "chacha20-ietf-poly1305",
-        "aes-256-cfb", "aes-128-cfb", "chacha20", "chacha20-ietf",
-        "rc4-md5", "none"
-    ]
+    SUPPORTED_METHODS = tuple(SS_METHODS.values())
     
     @staticmethod
     def parse(ss_url: str) -> Optional[ShadowsocksServer]:
@@ -82,148 +89,21 @@ class SSUrlParser:
         """
         if not ss_url or not ss_url.startswith("ss://"):
             return None
-        
         try:
-            # 移除 ss:// 前缀
-            content = ss_url[5:]
-            
-            server = ShadowsocksServer()
-            
-            # 提取备注 (# 后面的内容)
-            if "#" in content:
-                remark_encoded = content.split("#")[-1]
-                content = content.rsplit("#", 1)[0]
-                try:
-                    server.remark = urllib.parse.unquote(remark_encoded)
-                except:
-                    server.remark = remark_encoded
-            
-            # ==================== 判断格式 ====================
-            is_plaintext = False
-            
-            if "@" in content:
-                userinfo_part = content.split("@")[0]
-                if ":" in userinfo_part:
-                    method_candidate = userinfo_part.split(":")[0]
-                    method_lower = method_candidate.lower()
-                    if method_lower in [m.lower() for m in SSUrlParser.SUPPORTED_METHODS]:
-                        is_plaintext = True
-                        print(f"[解析] 检测到明文格式: method={method_candidate}")
-            
-            # ==================== 按格式解析 ====================
-            if is_plaintext:
-                # 格式1: 明文 method:password@server:port，现代格式，不标记遗留
-                user_info, server_part = content.rsplit("@", 1)
-                server.warn_legacy = False
-                print(f"[解析] 明文模式: userinfo={user_info}, server={server_part}")
-
-            else:
-                # Base64 编码格式（格式2 或 格式3）
-                print(f"[解析] Base64 模式: content={content}")
-
-                if "@" in content:
-                    # 格式2: ss://base64(method:password)@server:port
-                    # URL 中有 @，服务器地址直接可见，属于现代合法格式
-                    base64_part, server_part = content.split("@", 1)
-                    print(f"[解析] 混合 Base64 格式 (现代): base64={base64_part}, server={server_part}")
-
-                    base64_str = base64_part.replace("-", "+").replace("_", "/")
-                    padding = 4 - len(base64_str) % 4
-                    if padding != 4:
-                        base64_str += "=" * padding
-
-                    try:
-                        decoded = base64.b64decode(base64_str).decode("utf-8")
-                        print(f"[解析] Base64 解码成功: {decoded}")
-                    except Exception as e:
-                        print(f"[解析] Base64 解码失败: {e}")
-                        return None
-
-                    if "@" in decoded:
-                        # 解码后仍含 @，说明 base64 部分编码了完整的 user@host 信息
-                        # 以解码内容的 user_info 为准，server_part 仍用 URL 中的
-                        user_info, _ = decoded.rsplit("@", 1)
-                    else:
-                        user_info = decoded
-
-                    # 格式2 是现代合法格式，不标记遗留
-                    server.warn_legacy = False
-
-                else:
-                    # 格式3: ss://base64(method:password@server:port)，完全编码
-                    # 服务器地址隐藏在 Base64 中，属于遗留格式
-                    base64_part = content
-                    server_part = None
-                    print(f"[解析] 完全 Base64 格式 (遗留): base64={base64_part}")
-
-                    base64_str = base64_part.replace("-", "+").replace("_", "/")
-                    padding = 4 - len(base64_str) % 4
-                    if padding != 4:
-                        base64_str += "=" * padding
-
-                    try:
-                        decoded = base64.b64decode(base64_str).decode("utf-8")
-                        print(f"[解析] Base64 解码成功: {decoded}")
-                    except Exception as e:
-                        print(f"[解析] Base64 解码失败: {e}")
-                        return None
-
-                    if "@" in decoded:
-                        # 解码后含 @：完整的 method:password@server:port，真正的遗留格式
-                        user_info, server_part = decoded.rsplit("@", 1)
-                        server.warn_legacy = True  # ← 只在这里标记遗留
-                        print(f"[解析] 标记为遗留格式")
-                    else:
-                        # 解码后不含 @：理论上不应出现，尝试当作纯 user_info 处理
-                        user_info = decoded
-                        server.warn_legacy = False
-                        print(f"[解析] 完全 Base64 解码后无 @，当作 user_info 处理")
-
-                if not server_part:
-                    print(f"[解析] 缺少服务器信息")
-                    return None
-
-            # ==================== 解析用户信息 ====================
-            if ":" not in user_info:
-                print(f"[解析] 用户信息格式错误: {user_info}")
-                return None
-            
-            server.method, server.password = user_info.split(":", 1)
-            print(f"[解析] 加密方法: {server.method}, 密码: {server.password[:3]}***")
-            
-            # ==================== 解析服务器信息 ====================
-            if not server_part or ":" not in server_part:
-                print(f"[解析] 服务器信息格式错误: {server_part}")
-                return None
-            
-            if server_part.startswith("[") and "]:" in server_part:
-                # IPv6: [::1]:8080
-                server.address, port_str = server_part.rsplit(":", 1)
-                server.address = server.address[1:-1]
-                server.port = int(port_str)
-            else:
-                # IPv4/域名: 1.2.3.4:8080
-                server.address, port_str = server_part.rsplit(":", 1)
-                server.port = int(port_str)
-            
-            print(f"[解析] 服务器地址: {server.address}:{server.port}")
-            
-            # ==================== 验证加密方法 ====================
-            if server.method not in SSUrlParser.SUPPORTED_METHODS:
-                method_lower = server.method.lower()
-                for m in SSUrlParser.SUPPORTED_METHODS:
-                    if m.lower() == method_lower:
-                        server.method = m
-                        break
-            
-            print(f"[解析] ✓ 解析成功: {server} (遗留格式={server.warn_legacy})")
-            return server
-            
-        except Exception as e:
-            print(f"[解析] ✗ 解析失败: {e}")
-            import traceback
-            traceback.print_exc()
+            link = parse_link_strict(ss_url)
+        except LinkParseError as e:
+            log.debug("SS URL 解析失败: %s", e)
             return None
+
+        server = ShadowsocksServer()
+        server.address = link.address
+        server.port = link.port
+        server.method = link.settings["method"]
+        server.password = link.settings["password"]
+        server.remark = link.name
+        # 服务器地址只出现在 Base64 内容中时才是遗留格式
+        server.warn_legacy = "@" not in ss_url.partition("#")[0]
+        return server
     
     @staticmethod
     def parse_multiple(input_text: str) -> List[ShadowsocksServer]:
@@ -234,9 +114,7 @@ class SSUrlParser:
         if not input_text:
             return servers
         
-        urls = re.findall(r'ss://[^\s,]+', input_text)
-        
-        for url in urls:
+        for url in _SS_URL_RE.findall(input_text):
             server = SSUrlParser.parse(url)
             if server:
                 servers.append(server)
@@ -465,7 +343,6 @@ class V2RayConfigManager:
     @staticmethod
     def _get_platform_default() -> Dict:
         """获取当前平台对应的默认配置（深拷贝）。"""
-        import copy
         if IS_WINDOWS:
             return copy.deepcopy(V2RayConfigManager.DEFAULT_CONFIG_WINDOWS)
         return copy.deepcopy(V2RayConfigManager.DEFAULT_CONFIG_LINUX)
@@ -473,41 +350,27 @@ class V2RayConfigManager:
     def __init__(self, config_path: str):
         self.config_path = config_path
         self.config = self._load_config()
+        # 出站 tag → 出站 dict 的索引，增删改时增量维护
+        self._tag_index: Dict[str, Dict] = {}
+        self._indexed_outbounds: Optional[List] = None
+        self._indexed_len = 0
+        self._tag_counters: Dict[str, int] = {}  # base tag → 下一个候选后缀
+        self._batch_depth = 0
+        self._dirty = False
     
-    @staticmethod
-    def _strip_json_comments(text: str) -> str:
-        """移除 JSON 中的单行注释（// 开头的行）。
-        与 config_manager._strip_json_comments 保持一致，
-        用于支持 xray 模板中含注释的 config.json。"""
-        return re.sub(r'(?m)^\s*//.*$', '', text)
-
     def _load_config(self) -> Dict:
         """加载配置文件，支持含 // 单行注释的 JSON（xray 模板格式）。
 
-        加载策略：
-          1. 先尝试标准 json.load（大多数情况）
-          2. 失败时用 _strip_json_comments 去除注释后重试
-          3. 仍然失败才回退到平台对应的默认配置
+        解析由 config_repo 完成并按文件 stat 缓存，这里拿到的是可修改的深拷贝；
+        文件不存在或无法解析时回退到平台对应的默认配置。
         """
         if os.path.exists(self.config_path):
             try:
-                with open(self.config_path, 'r', encoding='utf-8-sig') as f:
-                    raw = f.read()
-            except Exception as e:
+                return config_repo.load_document(self.config_path).to_dict()
+            except OSError as e:
                 print(f"读取配置文件失败: {e}")
                 return self._get_platform_default()
-
-            # 尝试1: 标准 JSON 解析
-            try:
-                return json.loads(raw)
-            except json.JSONDecodeError:
-                pass
-
-            # 尝试2: 去除 // 注释后解析
-            try:
-                stripped = self._strip_json_comments(raw)
-                return json.loads(stripped)
-            except json.JSONDecodeError as e:
+            except ValueError as e:
                 print(f"加载配置失败（含注释处理后仍无法解析），使用默认配置: {e}")
                 return self._get_platform_default()
 
@@ -519,36 +382,95 @@ class V2RayConfigManager:
         注意：save_config 会将 self.config（纯 JSON dict）写回文件，
         这意味着原始文件中的 // 注释会被移除。这是预期行为——
         通过 SS URL 导入或手动编辑后的配置不再需要注释。
+        写入为原子替换，xray 不会读到写了一半的文件。
         """
         try:
-            os.makedirs(os.path.dirname(self.config_path), exist_ok=True)
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=2, ensure_ascii=False)
+            config_io.write_json(self.config_path, self.config)
             return True
         except Exception as e:
             print(f"保存配置失败: {e}")
             return False
+        finally:
+            config_repo.invalidate(self.config_path)
     
+    # ── 批量修改 ──────────────────────────────
+
+    @contextlib.contextmanager
+    def batch(self):
+        """批量修改：块内的增删改只作用于内存，退出时一次性原子写入。
+
+        用法::
+
+            with manager.batch():
+                for server in servers:
+                    manager.add_shadowsocks_server(server)
+
+        块内抛出异常时回滚内存中的修改且不写文件；写入失败抛出 OSError。
+        可嵌套，只有最外层退出时才写入。
+        """
+        snapshot = copy.deepcopy(self.config) if self._batch_depth == 0 else None
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._batch_depth -= 1
+            if snapshot is not None:
+                self.config = snapshot
+                self._indexed_outbounds = None
+                self._dirty = False
+            raise
+        self._batch_depth -= 1
+        if self._batch_depth == 0 and self._dirty:
+            self._dirty = False
+            if not self.save_config():
+                raise OSError(f"保存配置失败: {self.config_path}")
+
+    def _commit(self) -> bool:
+        """修改后调用：批量模式下只标记，否则立即保存。"""
+        if self._batch_depth:
+            self._dirty = True
+            return True
+        return self.save_config()
+
+    def _outbounds(self) -> List[Dict]:
+        """返回出站列表，并在列表被替换或外部直接修改后重建 tag 索引。"""
+        outbounds = self.config.setdefault("outbounds", [])
+        if (outbounds is not self._indexed_outbounds
+                or len(outbounds) != self._indexed_len):
+            self._tag_index = {}
+            self._tag_counters = {}
+            for ob in outbounds:
+                self._tag_index.setdefault(ob.get("tag"), ob)
+            self._indexed_outbounds = outbounds
+            self._indexed_len = len(outbounds)
+        return outbounds
+
+    def _unique_tag(self, base_tag: str) -> str:
+        """生成不重复的 tag；记住每个 base tag 已用到的后缀，批量添加同一地址时不必从 1 重试。"""
+        if base_tag not in self._tag_index:
+            return base_tag
+        counter = self._tag_counters.get(base_tag, 1)
+        while f"{base_tag}-{counter}" in self._tag_index:
+            counter += 1
+        self._tag_counters[base_tag] = counter + 1
+        return f"{base_tag}-{counter}"
+
     def update_shadowsocks_server(self, server: ShadowsocksServer) -> bool:
         try:
-            if "outbounds" not in self.config:
-                self.config["outbounds"] = []
-            
-            outbounds = self.config["outbounds"]
-            proxy_index = -1
-            for i, outbound in enumerate(outbounds):
-                if outbound.get("tag") == "proxy":
-                    proxy_index = i
-                    break
-            
+            outbounds = self._outbounds()
             new_outbound = server.to_v2ray_outbound("proxy")
             
-            if proxy_index >= 0:
-                outbounds[proxy_index] = new_outbound
+            proxy = self._tag_index.get("proxy")
+            if proxy is not None:
+                # 原地替换，保持列表位置和索引中的对象不变
+                proxy.clear()
+                proxy.update(new_outbound)
             else:
                 outbounds.insert(0, new_outbound)
+                self._tag_index["proxy"] = new_outbound
+                self._indexed_len += 1
             
-            return self.save_config()
+            return self._commit()
             
         except Exception as e:
             print(f"更新服务器配置失败: {e}")
@@ -556,27 +478,43 @@ class V2RayConfigManager:
     
     def add_shadowsocks_server(self, server: ShadowsocksServer) -> bool:
         try:
-            if "outbounds" not in self.config:
-                self.config["outbounds"] = []
-            
-            base_tag = "ss-" + server.address.replace(".", "-")
-            tag = base_tag
-            counter = 1
-            
-            existing_tags = {o.get("tag") for o in self.config["outbounds"]}
-            while tag in existing_tags:
-                tag = f"{base_tag}-{counter}"
-                counter += 1
+            outbounds = self._outbounds()
+            tag = self._unique_tag("ss-" + server.address.replace(".", "-"))
             
             new_outbound = server.to_v2ray_outbound(tag)
-            self.config["outbounds"].append(new_outbound)
+            outbounds.append(new_outbound)
+            self._tag_index[tag] = new_outbound
+            self._indexed_len += 1
             
-            return self.save_config()
+            return self._commit()
             
         except Exception as e:
             print(f"添加服务器配置失败: {e}")
             return False
     
+    # ── 负载均衡 ──────────────────────────────
+
+    def enable_balancer(self, strategy: str = "leastPing",
+                        extra_outbounds=(), **kwargs) -> bool:
+        """把所有带真实地址的代理出站（及 extra_outbounds）组成均衡器，路由改为指向均衡器。
+
+        其余参数见 balancer.build_balanced_config。
+
+        Raises:
+            ValueError: 可用于均衡的节点少于 2 个或策略不支持
+        """
+        self.config = balancer.build_balanced_config(
+            self.config, extra_outbounds=extra_outbounds, strategy=strategy, **kwargs)
+        return self._commit()
+
+    def disable_balancer(self) -> bool:
+        """撤销负载均衡，路由重新指向 proxy 出站。"""
+        self.config = balancer.remove_balancer(self.config)
+        return self._commit()
+
+    def balancer_enabled(self) -> bool:
+        return balancer.balancer_info(self.config) is not None
+
     def get_current_servers(self) -> List[Tuple[str, str, int]]:
         servers = []
         for outbound in self.config.get("outbounds", []):
@@ -596,8 +534,10 @@ class SSConfigDialog:
     """SS 配置导入对话框（简化版，使用标准 QMessageBox）"""
     
     @staticmethod
-    def ask_import_ss_url(parent, url: str, server: ShadowsocksServer) -> bool:
+    def ask_import_ss_url(parent, url: str, server: ShadowsocksServer, count: int = 1) -> bool:
         preview = f"{server.remark or 'New Server'} ({server.address}:{server.port})"
+        if count > 1:
+            preview += f"\n（共 {count} 个服务器，其余作为额外出站导入）"
         
         reply = QMessageBox.question(
             parent,
@@ -610,13 +550,14 @@ class SSConfigDialog:
         return reply == QMessageBox.Yes
     
     @staticmethod
-    def show_success(parent, server: ShadowsocksServer):
+    def show_success(parent, server: ShadowsocksServer, count: int = 1):
+        extra = f"\n另有 {count - 1} 个服务器已作为额外出站导入" if count > 1 else ""
         QMessageBox.information(
             parent,
             "导入成功",
             f"已成功导入服务器:\n{server.remark or 'Unnamed'}\n"
             f"地址: {server.address}:{server.port}\n"
-            f"加密: {server.method}"
+            f"加密: {server.method}{extra}"
         )
     
     @staticmethod
@@ -662,24 +603,33 @@ def import_ss_url_from_clipboard(parent, config_path: str,
     
     server = servers[0]
     
-    if not SSConfigDialog.ask_import_ss_url(parent, text.strip(), server):
+    if not SSConfigDialog.ask_import_ss_url(parent, text.strip(), server, len(servers)):
         return False
     
     manager = V2RayConfigManager(config_path)
     
-    if replace_existing:
-        success = manager.update_shadowsocks_server(server)
-    else:
-        success = manager.add_shadowsocks_server(server)
+    # 多条链接在一次批量修改中导入：第一条作为 proxy（或追加），其余追加为额外出站，只写一次文件
+    try:
+        with manager.batch():
+            first = (manager.update_shadowsocks_server if replace_existing
+                     else manager.add_shadowsocks_server)
+            if not first(server) or not all(
+                    manager.add_shadowsocks_server(s) for s in servers[1:]):
+                raise ValueError("生成服务器配置失败")
+        success = True
+    except (OSError, ValueError) as e:
+        log.warning("导入 SS URL 失败: %s", e)
+        success = False
     
     if success:
-        SSConfigDialog.show_success(parent, server)
+        SSConfigDialog.show_success(parent, server, len(servers))
         
         # 只有真正的遗留格式才显示警告
-        if server.warn_legacy:
-            SSConfigDialog.show_legacy_warning(parent, server)
+        legacy = next((s for s in servers if s.warn_legacy), None)
+        if legacy is not None:
+            SSConfigDialog.show_legacy_warning(parent, legacy)
         
         return True
     else:
         SSConfigDialog.show_error(parent, "保存配置失败，请检查文件权限")
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,318 @@
+"""
+订阅模块
+从订阅地址获取节点列表并同步到配置档案库：
+  - HttpPool 按 (scheme, host, port) 复用 keep-alive 连接，多个订阅位于同一域名时不重复握手
+  - 条件请求：保存 ETag / Last-Modified，服务器返回 304 时不下载、不解析
+  - 边下载边解码（支持 gzip），同时计算响应体哈希；
+    哈希与上次相同（服务器不支持条件请求时）直接跳过解析
+  - 解析后的节点交给 ProfileStore.sync_group 按内容哈希比较，只写入新增/变化/删除的节点
+
+后台刷新由 refresh_subscriptions_job 在任务引擎上执行，界面用定时器按间隔提交。
+只依赖标准库，可以直接对本地 http.server 测试。
+"""
+import asyncio
+import hashlib
+import http.client
+import logging
+import threading
+import time
+import urllib.parse
+import zlib
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+from core.link_codec import SubscriptionDecoder, parse_link
+from core.profile_store import ProfileStore
+
+if TYPE_CHECKING:  # 刷新逻辑本身不依赖 Qt，便于脱离界面测试
+    from core.job_engine import JobContext
+
+log = logging.getLogger("ov2n.subscription")
+
+RES_SUBSCRIPTION = "subscription"
+
+FETCH_TIMEOUT = 20            # 单次请求超时（秒）
+READ_CHUNK = 64 * 1024        # 流式读取块大小
+MAX_REDIRECTS = 5
+POOL_IDLE_TIMEOUT = 60.0      # 空闲连接保留时间（秒）
+USER_AGENT = "ov2n/1.0"
+SUBSCRIPTION_CHECK_INTERVAL = 5 * 60  # 界面检查到期订阅的间隔（秒）
+
+_REDIRECT_STATUS = (301, 302, 303, 307, 308)
+_RETRYABLE = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+              ConnectionError, BrokenPipeError)
+
+
+class SubscriptionError(Exception):
+    """订阅获取或解析失败（消息可直接显示给用户）。"""
+
+
+# ============================================
+# 连接池
+# ============================================
+
+class PooledResponse:
+    """包装 http.client 响应：读完后自动把连接还给连接池。"""
+
+    def __init__(self, pool: "HttpPool", key: Tuple, conn, resp):
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._resp = resp
+        self.status = resp.status
+        self.reason = resp.reason
+
+    def header(self, name: str) -> Optional[str]:
+        return self._resp.getheader(name)
+
+    def iter_chunks(self, size: int = READ_CHUNK) -> Iterator[bytes]:
+        """逐块返回响应体（已按 Content-Encoding 解压）。"""
+        encoding = (self.header("Content-Encoding") or "").lower()
+        inflater = None
+        if encoding == "gzip":
+            inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == "deflate":
+            inflater = zlib.decompressobj()
+        while True:
+            chunk = self._resp.read(size)
+            if not chunk:
+                break
+            yield inflater.decompress(chunk) if inflater else chunk
+        if inflater:
+            tail = inflater.flush()
+            if tail:
+                yield tail
+
+    def close(self) -> None:
+        if self._conn is None:
+            return
+        reusable = self._resp.isclosed() and not self._resp.will_close
+        if reusable:
+            self._pool._release(self._key, self._conn)
+        else:
+            self._conn.close()
+        self._conn = None
+
+    def __enter__(self) -> "PooledResponse":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class HttpPool:
+    """简单的 HTTP(S) keep-alive 连接池（线程安全）。"""
+
+    def __init__(self, timeout: float = FETCH_TIMEOUT,
+                 idle_timeout: float = POOL_IDLE_TIMEOUT):
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._idle: Dict[Tuple, List[Tuple[http.client.HTTPConnection, float]]] = {}
+        self._lock = threading.Lock()
+
+    def _connect(self, key: Tuple) -> http.client.HTTPConnection:
+        scheme, host, port = key
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout)
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+    def _take(self, key: Tuple) -> Optional[http.client.HTTPConnection]:
+        now = time.monotonic()
+        with self._lock:
+            conns = self._idle.get(key, [])
+            while conns:
+                conn, since = conns.pop()
+                if now - since < self.idle_timeout:
+                    return conn
+                conn.close()
+        return None
+
+    def _release(self, key: Tuple, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            self._idle.setdefault(key, []).append((conn, time.monotonic()))
+
+    def close(self) -> None:
+        with self._lock:
+            for conns in self._idle.values():
+                for conn, _ in conns:
+                    conn.close()
+            self._idle.clear()
+
+    def _send(self, key: Tuple, path: str, headers: Dict[str, str]):
+        conn = self._take(key)
+        reused = conn is not None
+        if conn is None:
+            conn = self._connect(key)
+        try:
+            conn.request("GET", path, headers=headers)
+            return conn, conn.getresponse()
+        except _RETRYABLE:
+            conn.close()
+            if not reused:
+                raise
+        # 复用的连接已被服务器关闭，换新连接重试一次
+        conn = self._connect(key)
+        conn.request("GET", path, headers=headers)
+        return conn, conn.getresponse()
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> PooledResponse:
+        """
+        发送 GET 请求（自动跟随重定向），返回未读取响应体的 PooledResponse。
+
+        Raises:
+            SubscriptionError: 地址无效或重定向过多
+            OSError / http.client.HTTPException: 网络错误
+        """
+        request_headers = {"User-Agent": USER_AGENT, "Accept-Encoding": "gzip",
+                           "Connection": "keep-alive"}
+        request_headers.update(headers or {})
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urllib.parse.urlsplit(url)
+            if parts.scheme not in ("http", "https") or not parts.hostname:
+                raise SubscriptionError(f"不支持的订阅地址: {url}")
+            port = parts.port or (443 if parts.scheme == "https" else 80)
+            key = (parts.scheme, parts.hostname, port)
+            path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+            conn, resp = self._send(key, path, request_headers)
+            response = PooledResponse(self, key, conn, resp)
+            location = resp.getheader("Location")
+            if resp.status in _REDIRECT_STATUS and location:
+                resp.read()
+                response.close()
+                url = urllib.parse.urljoin(url, location)
+                continue
+            return response
+        raise SubscriptionError("订阅地址重定向次数过多")
+
+
+_pool = HttpPool()
+
+
+# ============================================
+# 刷新
+# ============================================
+
+class RefreshResult:
+    """单个订阅的刷新结果。"""
+
+    def __init__(self, name: str, added: int = 0, removed: int = 0, changed: int = 0,
+                 total: int = 0, not_modified: bool = False, error: str = ""):
+        self.name = name
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+        self.total = total
+        self.not_modified = not_modified
+        self.error = error
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+    def __str__(self) -> str:
+        if self.error:
+            return f"{self.name}: 失败 ({self.error})"
+        if self.not_modified:
+            return f"{self.name}: 无变化"
+        return (f"{self.name}: {self.total} 个节点，新增 {self.added}，"
+                f"删除 {self.removed}，变化 {self.changed}")
+
+
+def refresh_subscription(sub: Dict, store: ProfileStore, force: bool = False,
+                         pool: Optional[HttpPool] = None) -> RefreshResult:
+    """
+    刷新单个订阅（阻塞调用，在任务引擎的线程池中执行）。
+
+    Args:
+        sub: ProfileStore.list_subscriptions() 返回的记录
+        store: 档案库
+        force: 忽略 ETag / 内容哈希，强制重新解析并同步
+        pool: 连接池，默认使用模块级共享连接池
+    """
+    pool = pool or _pool
+    name = sub["name"]
+    headers = {}
+    if not force:
+        if sub.get("etag"):
+            headers["If-None-Match"] = sub["etag"]
+        if sub.get("last_modified"):
+            headers["If-Modified-Since"] = sub["last_modified"]
+
+    started = time.monotonic()
+    links: List[str] = []
+    digest = hashlib.sha256()
+    with pool.get(sub["url"], headers) as resp:
+        if resp.status == 304:
+            store.update_subscription_state(sub["id"], updated_at=time.time(), last_error=None)
+            return RefreshResult(name, not_modified=True)
+        if resp.status != 200:
+            raise SubscriptionError(f"HTTP {resp.status} {resp.reason}")
+        etag, last_modified = resp.header("ETag"), resp.header("Last-Modified")
+        decoder = SubscriptionDecoder()
+        for chunk in resp.iter_chunks():
+            digest.update(chunk)
+            links.extend(decoder.feed(chunk))
+        links.extend(decoder.finish())
+
+    body_hash = digest.hexdigest()
+    state = {"etag": etag, "last_modified": last_modified, "body_hash": body_hash,
+             "updated_at": time.time(), "last_error": None}
+    if not force and body_hash == sub.get("body_hash"):
+        store.update_subscription_state(sub["id"], **state)
+        return RefreshResult(name, not_modified=True)
+
+    items = []
+    for link in links:
+        parsed = parse_link(link)
+        if parsed is not None:
+            items.append((parsed.display_name, parsed.to_outbound()))
+    if links and not items:
+        raise SubscriptionError("订阅内容中没有可识别的节点")
+
+    added, removed, changed = store.sync_group(name, items)
+    store.update_subscription_state(sub["id"], **state)
+    log.info("订阅 %s: %d 条链接，%d 个节点，+%d -%d ~%d，用时 %.2fs",
+             name, len(links), len(items), added, removed, changed,
+             time.monotonic() - started)
+    return RefreshResult(name, added, removed, changed, total=len(items))
+
+
+def due_subscriptions(store: ProfileStore, now: Optional[float] = None) -> List[Dict]:
+    """返回已到刷新时间的订阅。"""
+    now = now or time.time()
+    return [sub for sub in store.list_subscriptions()
+            if now - (sub["updated_at"] or 0) >= sub["interval_min"] * 60]
+
+
+async def refresh_subscriptions_job(ctx: "JobContext", store: ProfileStore,
+                                    force: bool = False,
+                                    sub_ids: Optional[List[int]] = None) -> List[RefreshResult]:
+    """
+    刷新订阅（任务引擎任务）：默认只刷新到期的订阅，各订阅并行获取。
+
+    Args:
+        force: 刷新全部订阅并忽略条件请求
+        sub_ids: 只刷新指定的订阅
+    """
+    if sub_ids is not None:
+        subs = [s for s in store.list_subscriptions() if s["id"] in sub_ids]
+    elif force:
+        subs = store.list_subscriptions()
+    else:
+        subs = due_subscriptions(store)
+    if not subs:
+        return []
+
+    ctx.progress(f"正在更新 {len(subs)} 个订阅...")
+
+    async def _one(sub: Dict) -> RefreshResult:
+        try:
+            return await ctx.run_blocking(refresh_subscription, sub, store, force)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("订阅 %s 更新失败: %s", sub["name"], e)
+            store.update_subscription_state(sub["id"], last_error=str(e))
+            return RefreshResult(sub["name"], error=str(e))
+
+    results = await asyncio.gather(*(_one(sub) for sub in subs))
+    return list(results)
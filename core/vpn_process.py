@@ -33,10 +33,14 @@ from typing import Any, Dict, Optional, Tuple
 
 import psutil
 
+from core import config_io, config_repo
+from core.output_capture import OutputCapture
+
 log = logging.getLogger("ov2n.vpn")
 
 IS_WINDOWS = platform.system() == "Windows"
 _CREATE_NO_WINDOW = 0x08000000 if IS_WINDOWS else 0
+OPENVPN_EARLY_EXIT_WAIT = 0.5   # 配置错误时 openvpn 会立即退出，启动后观察的时间（秒）
 
 
 # ---------------------------------------------------------------------------
@@ -44,37 +48,27 @@ _CREATE_NO_WINDOW = 0x08000000 if IS_WINDOWS else 0
 # ---------------------------------------------------------------------------
 
 def _load_xray_config(config_path: Path) -> dict:
-    """读取 Xray config.json，支持多种编码和行注释。"""
+    """读取 Xray config.json，支持多种编码和行注释（解析结果由 config_repo 缓存）。"""
     log.info("加载配置: %s", config_path)
-
-    for encoding in ('utf-8', 'utf-8-sig', 'gbk', 'gb2312', 'gb18030', 'latin-1'):
-        try:
-            raw = config_path.read_text(encoding=encoding)
-            log.info("✓ 编码: %s", encoding)
-            raw = re.sub(r"(?m)^\s*//.*$", "", raw)
-            config = json.loads(raw)
-            log.info("✓ 配置解析成功")
-            return config
-        except (UnicodeDecodeError, LookupError):
-            continue
-        except json.JSONDecodeError as e:
-            raise ValueError(f"JSON 解析失败: {e}") from e
-
-    raise UnicodeDecodeError("unknown", b"", 0, 1, "无法读取配置文件")
+    try:
+        config = config_repo.load_document(str(config_path)).to_dict()
+    except json.JSONDecodeError as e:
+        raise ValueError(f"JSON 解析失败: {e}") from e
+    log.info("✓ 配置解析成功")
+    return config
 
 
 def _save_xray_config_no_bom(config: dict, output_path: Path) -> None:
-    """保存为无 BOM UTF-8，并验证编码和 JSON 合法性。"""
+    """保存为无 BOM UTF-8：内存中序列化并校验，内容与现有文件相同时不重写，否则原子写入。"""
+    data = config_io.dump_json_bytes(config)
+    try:
+        if output_path.read_bytes() == data:
+            log.info("runtime 配置未变化，跳过写入: %s", output_path)
+            return
+    except OSError:
+        pass
     log.info("保存 runtime 配置: %s", output_path)
-    json_str = json.dumps(config, ensure_ascii=False, indent=2)
-    output_path.write_bytes(json_str.encode("utf-8"))
-
-    header = output_path.read_bytes()[:3]
-    log.info("文件头: %s", header.hex().upper())
-    if header[:3] == b'\xef\xbb\xbf':
-        raise ValueError("runtime config 含有 BOM，写入异常")
-
-    json.loads(output_path.read_text(encoding="utf-8"))
+    config_io.atomic_write_bytes(str(output_path), data)
     log.info("✓ 配置保存成功")
 
 
@@ -314,6 +308,30 @@ def _restore_dns_windows(backup_path: Path) -> None:
         log.error("❌ DNS 恢复失败: %s", e)
 
 
+def _kill_by_name(keyword: str, timeout: float = 10) -> int:
+    """
+    强制结束名称包含 keyword 的所有进程，并等待它们退出。
+    psutil.wait_procs 在进程退出时立即返回，不按固定间隔轮询。
+
+    Returns:
+        结束的进程数
+    """
+    procs = []
+    for proc in psutil.process_iter(["name", "pid"]):
+        try:
+            if proc.info["name"] and keyword in proc.info["name"].lower():
+                log.info("  终止 PID=%d (%s)", proc.info["pid"], proc.info["name"])
+                proc.kill()
+                procs.append(proc)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    if procs:
+        _, alive = psutil.wait_procs(procs, timeout=timeout)
+        if alive:
+            log.warning("⚠ %d 个 %s 进程在 %ss 内未退出", len(alive), keyword, timeout)
+    return len(procs)
+
+
 # ---------------------------------------------------------------------------
 # Linux 网络操作（占位，原有逻辑）
 # ---------------------------------------------------------------------------
@@ -338,6 +356,7 @@ class OpenVPNManager:
         self.openvpn_exe = openvpn_exe
         self.log_path = log_path
         self._proc: Optional[subprocess.Popen] = None
+        self.capture = OutputCapture(log_path)
 
     @property
     def is_running(self) -> bool:
@@ -355,26 +374,34 @@ class OpenVPNManager:
             log.error("❌ 配置文件未找到: %s", config_file)
             return False
 
-        self.log_path.parent.mkdir(parents=True, exist_ok=True)
-        log_file = open(self.log_path, "a", encoding="utf-8")
-
         try:
+            # 输出走管道进入 OutputCapture（环形缓冲 + 轮转文件），不再用 --log-append
             self._proc = subprocess.Popen(
-                [str(self.openvpn_exe), "--config", str(config_file),
-                 "--log-append", str(self.log_path)],
+                [str(self.openvpn_exe), "--config", str(config_file)],
                 cwd=str(self.openvpn_exe.parent),
-                stdout=log_file,
-                stderr=log_file,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
                 stdin=subprocess.DEVNULL,
                 creationflags=_CREATE_NO_WINDOW,
             )
-            log.info("✓ OpenVPN 已启动 (PID=%d)", self._proc.pid)
-            return True
+            self.capture.attach(self._proc, "openvpn")
         except Exception as e:
             log.error("❌ OpenVPN 启动失败: %s", e)
             return False
 
-    def stop(self, timeout: int = 10) -> None:
+        try:
+            rc = self._proc.wait(timeout=OPENVPN_EARLY_EXIT_WAIT)
+        except subprocess.TimeoutExpired:
+            log.info("✓ OpenVPN 已启动 (PID=%d)", self._proc.pid)
+            return True
+        self.capture.join(timeout=1)
+        log.error("❌ OpenVPN 启动后立即退出 (rc=%s)", rc)
+        tail = self.capture.last_lines(30)
+        if tail:
+            log.error("   OpenVPN 最后输出:\n%s", "\n".join(tail))
+        return False
+
+    def stop(self, timeout: float = 10) -> None:
         if self._proc:
             if self._proc.poll() is None:
                 self._proc.terminate()
@@ -384,12 +411,7 @@ class OpenVPNManager:
                     self._proc.kill()
         self._proc = None
         # 清理孤儿进程
-        for proc in psutil.process_iter(["name", "pid"]):
-            try:
-                if proc.info["name"] and "openvpn" in proc.info["name"].lower():
-                    proc.kill()
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                pass
+        _kill_by_name("openvpn", timeout=min(timeout, 5))
         log.info("✓ OpenVPN 已停止")
 
     def get_pid(self) -> Optional[int]:
@@ -427,6 +449,7 @@ class XrayManager:
         self._dns_backup = xray_dir / "dns_backup.txt"
         self._runtime_config = xray_dir / "config.runtime.json"
         self._vps_addr = ""
+        self.capture = OutputCapture(log_path)
 
     @property
     def is_running(self) -> bool:
@@ -477,13 +500,13 @@ class XrayManager:
             log.exception("❌ Xray 启动失败: %s", e)
             return False
 
-    def stop(self) -> None:
+    def stop(self, timeout: float = 10) -> None:
         """停止 Xray（完全对标 stop-xray.ps1，零 PowerShell）。"""
         log.info("=" * 60)
         log.info("========== 停止 Xray ==========")
         log.info("=" * 60)
 
-        self._kill_xray()
+        self._kill_xray(timeout)
         self._cleanup_routes()
         _restore_dns_windows(self._dns_backup)
         _run_cmd(["ipconfig", "/flushdns"])
@@ -520,32 +543,14 @@ class XrayManager:
         raise FileNotFoundError(
             "找不到 Xray 配置文件（已检查：用户传入、APPDATA、resources/xray）")
 
-    def _kill_xray(self) -> None:
+    def _kill_xray(self, timeout: float = 10) -> None:
         """
         终止所有 xray.exe 进程。
         对标 PS1：Get-Process -Name "xray" | Stop-Process -Force
         用 psutil，零 PowerShell。
         """
         log.info("清理 Xray 进程...")
-        killed = 0
-        for proc in psutil.process_iter(["name", "pid"]):
-            try:
-                if proc.info["name"] and "xray" in proc.info["name"].lower():
-                    log.info("  终止 PID=%d (%s)", proc.info["pid"], proc.info["name"])
-                    proc.kill()
-                    killed += 1
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                pass
-
-        if killed > 0:
-            # 对标 PS1：while (Get-Process xray) { Start-Sleep 1 }
-            for _ in range(10):
-                still = [p for p in psutil.process_iter(["name"])
-                         if p.info["name"] and "xray" in p.info["name"].lower()]
-                if not still:
-                    break
-                time.sleep(1)
-
+        killed = _kill_by_name("xray", timeout)
         log.info("✓ 已清理 %d 个 Xray 进程", killed)
 
     def _cleanup_routes(self) -> None:
@@ -562,17 +567,15 @@ class XrayManager:
         if not self.xray_exe.exists():
             raise FileNotFoundError(f"xray.exe 未找到: {self.xray_exe}")
 
-        self.log_path.parent.mkdir(parents=True, exist_ok=True)
-        log_file = open(self.log_path, "a", encoding="utf-8")
-
         self._proc = subprocess.Popen(
             [str(self.xray_exe), "-config", str(self._runtime_config)],
             cwd=str(self.xray_dir),
-            stdout=log_file,
-            stderr=log_file,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
             stdin=subprocess.DEVNULL,
             creationflags=_CREATE_NO_WINDOW,
         )
+        self.capture.attach(self._proc, "xray")
         log.info("✓ xray.exe 已启动 (PID=%d)", self._proc.pid)
         log.info("配置: %s", self._runtime_config)
 
@@ -584,6 +587,9 @@ class XrayManager:
             log.error("❌ xray-tun 20s 内未出现")
             log.error("   日志: %s", self.log_path)
             log.error("   可能原因: xray 启动失败 / config 格式错误 / 缺少管理员权限")
+            tail = self.capture.last_lines(30)
+            if tail:
+                log.error("   xray 最后输出:\n%s", "\n".join(tail))
             raise RuntimeError("xray-tun 未出现，xray.exe 可能启动失败")
 
         log.info("✓ xray-tun 已出现 (idx=%d)", tun_idx)
@@ -608,6 +614,12 @@ class XrayManager:
             新代码：psutil.net_if_addrs() 直接读取系统网卡列表，毫秒级，无 PowerShell
         """
         for i in range(1, timeout + 1):
+            # xray 已退出就不必等满超时，直接让调用方输出最后几行日志
+            if self._proc is not None and self._proc.poll() is not None:
+                log.error("xray.exe 已退出 (rc=%s)", self._proc.returncode)
+                self.capture.join(timeout=1)
+                return None
+
             # psutil.net_if_addrs() 返回 {网卡名: [地址列表]}，键即为网卡名
             if self.TUN_NAME in psutil.net_if_addrs():
                 tun_idx = _get_tun_index()
@@ -694,7 +706,7 @@ class V2RayManager:
         return False
 
     def start(self, config_path: Path, **kwargs) -> bool:
-        log.warning("V2Ray 启动应通过 worker.py 的 SingleV2RayThread 调用（Linux 专用）")
+        log.warning("V2Ray 启动应通过 worker.py 的 start_v2ray_job 调用（Linux 专用）")
         return False
 
     def stop(self) -> None:
@@ -1,34 +1,64 @@
 """
-后台工作线程模块
-包含所有 VPN/Xray 启停操作的 QThread 子类：
-  - SingleVPNThread:      独立启动 OpenVPN（不影响 Xray）
-  - SingleV2RayThread:    独立启动 Xray（不影响 OpenVPN）
-  - CombinedStartThread:  联合启动 OpenVPN + Xray
+后台任务模块
+所有 VPN/Xray 启停操作，均为提交到 core.job_engine 的协程任务：
+  - start_vpn_job:       独立启动 OpenVPN（不影响 Xray）
+  - start_v2ray_job:     独立启动 Xray（不影响 OpenVPN）
+  - start_combined_job:  联合启动 OpenVPN + Xray
+  - stop_job:            停止 OpenVPN 和/或 Xray（并行拆除，带总时限）
+  - reconnect_vpn_job:   重新连接 OpenVPN（SIGUSR1 软重启，不可用时才停止后重启）
+  - reload_v2ray_job:    把配置改动应用到运行中的 Xray（热更新 / 双实例切换 / 重启）
+  - failover_job:        当前节点劣化时切换节点，同样按上述顺序应用
+
+任务通过 ctx.progress() 上报进度，返回值即 JobHandle.finished 的结果，
+失败抛出 JobError（消息直接展示给用户）。资源名见 RES_OPENVPN / RES_XRAY，
+同一资源上的操作由任务引擎串行执行。
 
 Windows / Linux 双平台：
-  Linux   → pkexec + PolkitHelper（原有逻辑不变）
+  Linux   → pkexec + vpn-helper.py（异步子进程，可取消）
   Windows → vpn_process.py 中的 OpenVPNManager / XrayManager
-             - 完全替代 PowerShell 脚本和 NSSM 服务
-             - 直接 subprocess 启动进程，更轻量更安全
+             - 阻塞调用放到任务引擎线程池中执行
 """
+import asyncio
 import os
 import platform
 import subprocess
-import time
 import logging
+import time
 from pathlib import Path
 from typing import Optional
 
-from PyQt5.QtCore import QThread, pyqtSignal
-
-from core.vpn_process import create_managers
+from core import config_repo
+from core.job_engine import JobContext, JobError
+from core.latency_probe import auto_select_proxy, tproxy_bypass
+from core.artifacts import KIND_RULES, Manifest, compile_artifacts, mark_in_use
+from core.config_validation import check_schema, validate_runtime
+from core.handoff import (
+    HANDOFF_GRACE, can_handoff, running_slot, shared_inbounds, wait_ready,
+)
+from core.hot_reload import (
+    XrayApi, api_inbound_port, api_server, find_xray_binary, load_config, reload_from_files,
+)
+from core.ovpn_profile import prepare_profile
+from core.ovpn_session import SoftRestartPending, load_session, soft_restart
+from core.perf_profiles import PROFILE_NONE
 
 IS_WINDOWS = platform.system() == "Windows"
 
 log = logging.getLogger("ov2n.worker")
 
+# 任务引擎中的资源名：每个隧道同一时间只允许一个生命周期操作
+RES_OPENVPN = "openvpn"
+RES_XRAY = "xray"
+
+HELPER_TIMEOUT = 60  # 给用户足够时间输入密码
+STOP_DEADLINE = 8.0  # 停止操作的总时限（秒），超时后 helper 发送 SIGKILL
+
 if not IS_WINDOWS:
     from core.polkit_helper import PolkitHelper
+    from core.platform.linux.paths import LinuxPaths
+
+    _OPENVPN_LOG_HINT = f"cat {LinuxPaths().openvpn_log}"
+    _V2RAY_LOG_HINT = f"cat {LinuxPaths().v2ray_log}"
 
 
 # ============================================================
@@ -46,6 +76,14 @@ def parse_pid_from_output(stdout: str, keyword: str) -> Optional[int]:
     return None
 
 
+def _parse_status(stdout: str, keyword: str) -> Optional[str]:
+    """从脚本输出中取出 "KEYWORD: value" 行的值。"""
+    for line in stdout.split('\n'):
+        if line.startswith(keyword + ':'):
+            return line.split(':', 1)[1].strip()
+    return None
+
+
 def format_process_error(result: subprocess.CompletedProcess,
                          fallback_log: str) -> str:
     """格式化进程错误信息。"""
@@ -65,393 +103,777 @@ def check_user_cancelled(stderr: str) -> bool:
     return "dismissed" in lower or "cancelled" in lower
 
 
+async def run_helper(ctx: JobContext, *args: str, timeout: float = HELPER_TIMEOUT,
+                     check_cancel: bool = True,
+                     on_cancel=None) -> subprocess.CompletedProcess:
+    """通过 pkexec 异步调用 vpn-helper.py（Linux），参数含义见 JobContext.run_process。"""
+    cmd = ["pkexec", PolkitHelper.HELPER_SCRIPT, *args]
+    log.debug("执行: %s", " ".join(cmd))
+    return await ctx.run_process(cmd, timeout=timeout, check_cancel=check_cancel,
+                                 on_cancel=on_cancel)
+
+
+def _rollback_on_cancel(ctx: JobContext, keyword: str, name: str):
+    """
+    取消启动时 helper 已以 root 运行、无法终止：等它结束后停掉它启动的进程，
+    避免留下界面上"未连接"却仍在运行的核心。
+    """
+    async def _rollback(result: subprocess.CompletedProcess) -> None:
+        pid = parse_pid_from_output(result.stdout, keyword)
+        if result.returncode == 0 and pid:
+            await _linux_rollback(ctx, pid, name)
+    return _rollback
+
+
 # ============================================================
-# 独立启动 OpenVPN 线程
+# Linux: 单个核心启动 / 回滚
 # ============================================================
 
-class SingleVPNThread(QThread):
-    """独立启动 OpenVPN（不涉及 Xray）。"""
-    update_signal = pyqtSignal(str)
-    error_signal = pyqtSignal(str)
-    success_signal = pyqtSignal(int)  # Windows: 1(占位); Linux: 真实 PID
+async def _linux_start_openvpn(ctx: JobContext, vpn_config_path: str,
+                               perf_profile: str = PROFILE_NONE) -> int:
+    vpn_config_path = await prepare_profile(ctx, vpn_config_path, perf_profile)
+    ctx.progress("正在启动 OpenVPN...")
+    r = await run_helper(ctx, "start-vpn-only", vpn_config_path,
+                         on_cancel=_rollback_on_cancel(ctx, 'OpenVPN PID', "openvpn"))
+    if r.returncode != 0:
+        if check_user_cancelled(r.stderr):
+            raise JobError("用户取消了权限授权")
+        raise JobError(
+            f"OpenVPN 启动失败 (退出码 {r.returncode}):\n\n"
+            + format_process_error(r, _OPENVPN_LOG_HINT))
+    pid = parse_pid_from_output(r.stdout, 'OpenVPN PID')
+    if not pid:
+        raise JobError(f"无法获取 OpenVPN PID\n\n日志: {_OPENVPN_LOG_HINT}")
+    ctx.progress("✓ OpenVPN 启动成功")
+    return pid
+
+
+async def _linux_start_v2ray(ctx: JobContext, v2ray_config_path: str,
+                             manifest: Optional[Manifest] = None, slot: int = 0) -> int:
+    ctx.progress("正在启动 V2Ray...")
+    args = [_runtime_path(manifest, v2ray_config_path)]
+    if manifest is not None and manifest.geo_dir:
+        args += ["--assets", manifest.geo_dir]
+    r = await run_helper(ctx, "start-v2ray-only", *args,
+                         on_cancel=_rollback_on_cancel(ctx, 'V2Ray PID', "v2ray"))
+    if r.returncode != 0:
+        if check_user_cancelled(r.stderr):
+            raise JobError("用户取消了权限授权")
+        raise JobError(
+            f"V2Ray 启动失败 (退出码 {r.returncode}):\n\n"
+            + format_process_error(r, _V2RAY_LOG_HINT))
+    pid = parse_pid_from_output(r.stdout, 'V2Ray PID')
+    if not pid:
+        raise JobError(f"无法获取 V2Ray PID\n\n日志: {_V2RAY_LOG_HINT}")
+    _mark_running(manifest, slot)
+    ctx.progress("✓ V2Ray 启动成功")
+    return pid
+
+
+async def _linux_start_tproxy(ctx: JobContext, tproxy: dict,
+                              manifest: Optional[Manifest] = None) -> bool:
+    """配置透明代理：有编译好的规则集时交给 helper 校验哈希后一次性应用，规则未变时不重建。"""
+    ctx.progress("正在配置透明代理...")
+    await ctx.sleep(1)
+    rules_path = manifest.rules_path if manifest is not None else None
+    if rules_path:
+        r = await run_helper(ctx, "tproxy-apply", rules_path,
+                             "--sha256", manifest.sha256(KIND_RULES), timeout=30)
+        ok = r.returncode == 0
+        if ok and "TPROXY_STATUS: UNCHANGED" in r.stdout:
+            ctx.progress("✓ 透明代理规则未变化，沿用现有规则")
+            return True
+        msg = ("用户取消了权限授权" if check_user_cancelled(r.stderr)
+               else (r.stderr or "").strip() or "未知错误")
+    else:
+        ok, msg = await ctx.run_blocking(
+            PolkitHelper.start_tproxy, tproxy['port'], tproxy['vps_ip'],
+            tproxy['mark'], tproxy['table'])
+    if ok:
+        ctx.progress("✓ 透明代理已配置")
+    else:
+        ctx.progress(f"⚠ 透明代理配置失败: {msg}")
+    return ok
+
+
+async def _compile(ctx: JobContext, v2ray_config_path: Optional[str], perf_profile: str,
+                   tproxy: Optional[dict], slot: int = 0,
+                   api_port: Optional[int] = None) -> Optional[Manifest]:
+    """
+    编译运行时产物（运行时配置、透明代理规则集、裁剪后的 geo 文件），
+    输入未变的产物复用上次的结果。失败时返回 None（_validate 随后报告为无效配置）。
+    slot 为端口槽位（见 core.handoff），api_port 为 API 端口，热更新时与运行中的 Xray 保持一致。
+    """
+    if not v2ray_config_path:
+        return None
+    try:
+        manifest = await ctx.run_blocking(
+            compile_artifacts, v2ray_config_path, perf_profile, tproxy,
+            slot=slot, api_port=api_port)
+    except (OSError, ValueError) as e:
+        log.warning("生成运行时产物失败: %s", e)
+        ctx.progress(f"⚠ 运行时配置生成失败: {e}")
+        return None
+    if manifest.rebuilt:
+        ctx.progress(f"已更新运行时产物: {', '.join(manifest.rebuilt)}")
+    else:
+        ctx.progress("配置未变化，复用上次的运行时产物")
+    return manifest
+
+
+async def _validate(ctx: JobContext, v2ray_config_path: str, manifest: Optional[Manifest],
+                    xray_mgr=None) -> Optional[str]:
+    """
+    启动前校验配置：结构校验后用 `xray run -test` 校验运行时配置
+    （结果按哈希缓存，见 core.config_validation）。
+    返回错误信息；配置有效或无法判断时返回 None。
+    manifest 为 None（运行时产物编译失败）时同样返回错误，不再拿原文件启动。
+    """
+    if manifest is None:
+        if not v2ray_config_path or not Path(v2ray_config_path).exists():
+            return None     # 没有配置文件，由启动流程报告或跳过
+        result = await ctx.run_blocking(check_schema, v2ray_config_path)
+        if result is not None:
+            return result.error
+        return "无法生成运行时配置，请检查 config.json 是否为完整有效的 JSON"
+    binary = str(xray_mgr.xray_exe) if IS_WINDOWS and xray_mgr is not None else None
+    result = await ctx.run_blocking(validate_runtime, manifest, binary, v2ray_config_path)
+    if result is None or result.ok:
+        if result is not None and not result.cached:
+            ctx.progress("✓ 配置校验通过")
+        return None
+    return result.error
+
 
-    def __init__(self, vpn_config_path: str):
-        super().__init__()
-        self.vpn_config_path = vpn_config_path
+def _invalid_config_error(error: str) -> JobError:
+    return JobError(f"V2Ray 配置无效，未启动 Xray:\n\n{error}")
 
-    def run(self):
-        if IS_WINDOWS:
-            self._run_windows()
-        else:
-            self._run_linux()
 
-    def _run_windows(self):
-        """Windows: 使用 vpn_process.py 的 OpenVPNManager。"""
-        try:
-            self.update_signal.emit("正在启动 OpenVPN...")
-            
-            # 获取项目根目录
-            app_root = Path(__file__).resolve().parent.parent
-            openvpn_mgr, _ = create_managers(app_root)
-            
-            config_path = Path(self.vpn_config_path)
-            if not config_path.exists():
-                self.error_signal.emit(f"配置文件不存在: {self.vpn_config_path}")
-                return
-            
-            if openvpn_mgr.start(config_path):
-                pid = openvpn_mgr.get_pid() or 1
-                self.update_signal.emit("✓ OpenVPN 启动成功")
-                self.success_signal.emit(pid)
-            else:
-                self.error_signal.emit("OpenVPN 启动失败，请检查配置文件")
-        except Exception as e:
-            log.exception("OpenVPN 启动异常")
-            self.error_signal.emit(f"OpenVPN 启动异常: {e}")
-
-    def _run_linux(self):
-        """Linux: 保持原有 pkexec 流程。"""
+def _runtime_path(manifest: Optional[Manifest], v2ray_config_path: str) -> str:
+    return manifest.runtime_path if manifest is not None else v2ray_config_path
+
+
+def _mark_running(manifest: Optional[Manifest], slot: int = 0) -> None:
+    """运行中的 Xray 使用的产物不参与清理（热更新需要读取运行时配置和 geo 目录）。"""
+    if manifest is not None:
+        mark_in_use(slot, manifest.paths())
+
+
+async def _linux_rollback(ctx: JobContext, pid: int, name: str) -> None:
+    """紧急停止进程（回滚），任务被取消时同样执行。"""
+    try:
+        await asyncio.shield(run_helper(
+            ctx, "stop", f"--{name}-pid", str(pid), timeout=30, check_cancel=False))
+    except Exception as e:
+        log.warning("回滚停止进程失败: %s", e)
+
+
+# ============================================================
+# 独立启动 OpenVPN
+# ============================================================
+
+def _openvpn_failure(openvpn_mgr) -> str:
+    """Windows OpenVPN 启动失败的提示，附带捕获到的最后几行输出。"""
+    tail = "\n".join(openvpn_mgr.capture.last_lines(10))
+    return ("OpenVPN 启动失败，请检查配置文件\n"
+            f"查看日志: {openvpn_mgr.log_path}"
+            + (f"\n\n{tail}" if tail else ""))
+
+
+async def start_vpn_job(ctx: JobContext, vpn_config_path: str,
+                        openvpn_mgr=None, perf_profile: str = PROFILE_NONE) -> int:
+    """
+    独立启动 OpenVPN（不涉及 Xray），资源: RES_OPENVPN。
+    perf_profile 为性能档位，运行时配置按档位追加调优指令（core.ovpn_tuning）。
+
+    Returns:
+        Windows: 进程 PID 或 1(占位); Linux: 真实 PID
+    """
+    if not IS_WINDOWS:
+        return await _linux_start_openvpn(ctx, vpn_config_path, perf_profile)
+
+    config_path = Path(vpn_config_path)
+    if not config_path.exists():
+        raise JobError(f"配置文件不存在: {vpn_config_path}")
+    config_path = Path(await prepare_profile(ctx, vpn_config_path, perf_profile))
+    ctx.progress("正在启动 OpenVPN...")
+    if not await ctx.run_blocking(openvpn_mgr.start, config_path,
+                                  on_cancel=openvpn_mgr.stop):
+        raise JobError(_openvpn_failure(openvpn_mgr))
+    ctx.progress("✓ OpenVPN 启动成功")
+    return openvpn_mgr.get_pid() or 1
+
+
+# ============================================================
+# 重新连接 OpenVPN
+# ============================================================
+
+async def reconnect_vpn_job(ctx: JobContext, vpn_config_path: str, vpn_pid: Optional[int],
+                            openvpn_mgr=None, perf_profile: str = PROFILE_NONE) -> dict:
+    """
+    重新连接 OpenVPN，资源: RES_OPENVPN。依次尝试：
+      1. 管理接口 `signal SIGUSR1`：进程、tun 设备和路由不变，只重新协商会话，
+         不需要授权，收到 CONNECTED 状态通知后返回
+      2. Linux：helper 向 OpenVPN 发送 SIGUSR1（用户配置自带 management 时，运行时配置
+         同样带 persist-tun / persist-key），无法确认状态
+      3. 停止后重新启动（软重启不可用且 OpenVPN 仍在运行时）
+
+    Returns:
+        {"vpn_pid": int, "soft": bool, "confirmed": bool, "elapsed": 秒,
+         "error": 未能重连时的提示（可选），没有运行中的 OpenVPN 时不会新启动}
+
+    Raises:
+        JobError: 停止后重新启动失败（OpenVPN 已停止）
+    """
+    started = time.monotonic()
+
+    def result(pid, soft: bool, confirmed: bool, **extra) -> dict:
+        return dict(vpn_pid=pid, soft=soft, confirmed=confirmed,
+                    elapsed=time.monotonic() - started, **extra)
+
+    session = await ctx.run_blocking(load_session)
+    if session is not None:
+        ctx.progress("正在重新协商会话...")
         try:
-            self.update_signal.emit("正在启动 OpenVPN...")
-            cmd = ["pkexec", PolkitHelper.HELPER_SCRIPT,
-                   "start-vpn-only", self.vpn_config_path]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-            if result.returncode == 0:
-                pid = parse_pid_from_output(result.stdout, 'OpenVPN PID')
-                if pid:
-                    self.update_signal.emit("✓ OpenVPN 启动成功")
-                    self.success_signal.emit(pid)
-                else:
-                    self.error_signal.emit(
-                        "无法获取 OpenVPN PID\n\n日志: cat /tmp/openvpn.log")
-            else:
-                if check_user_cancelled(result.stderr):
-                    self.error_signal.emit("用户取消了权限授权")
-                else:
-                    detail = format_process_error(result, "cat /tmp/openvpn.log")
-                    self.error_signal.emit(
-                        f"OpenVPN 启动失败 (退出码 {result.returncode}):\n\n{detail}")
-        except subprocess.TimeoutExpired:
-            self.error_signal.emit("OpenVPN 启动超时（60s）")
-        except Exception as e:
-            log.exception("OpenVPN 启动异常")
-            self.error_signal.emit(f"OpenVPN 启动异常: {e}")
+            await ctx.run_blocking(soft_restart, session)
+            ctx.progress("✓ OpenVPN 已重新连接")
+            return result(vpn_pid, soft=True, confirmed=True)
+        except SoftRestartPending as e:
+            # 信号已生效，网络尚未恢复；OpenVPN 会继续自动重试，不再重启
+            return result(vpn_pid, soft=True, confirmed=False, error=f"OpenVPN {e}，正在自动重试")
+        except (OSError, RuntimeError) as e:
+            log.warning("管理接口软重启失败: %s", e)
+
+    if not IS_WINDOWS and vpn_pid:
+        ctx.progress("正在发送重连信号...")
+        r = await run_helper(ctx, "reconnect-vpn", "--openvpn-pid", str(vpn_pid))
+        if r.returncode == 0 and _parse_status(r.stdout, "OPENVPN_STATUS") == "SIGNALED":
+            return result(vpn_pid, soft=True, confirmed=False)
+        if check_user_cancelled(r.stderr):
+            return result(vpn_pid, soft=False, confirmed=False, error="用户取消了权限授权")
+        log.warning("helper 发送重连信号失败: %s", (r.stderr or r.stdout).strip())
+
+    running = openvpn_mgr.is_running if IS_WINDOWS and openvpn_mgr is not None else bool(vpn_pid)
+    if not running:
+        # 会话信息缺失且没有已知的进程：重连不负责启动 OpenVPN
+        return result(None, soft=False, confirmed=False, error="没有运行中的 OpenVPN")
+
+    ctx.progress("软重启不可用，正在重新启动 OpenVPN...")
+    stopped = await stop_job(ctx, vpn_pid=vpn_pid, openvpn_mgr=openvpn_mgr)
+    if stopped['warnings']:
+        return result(vpn_pid, soft=False, confirmed=False, error="\n".join(stopped['warnings']))
+    pid = await start_vpn_job(ctx, vpn_config_path, openvpn_mgr, perf_profile)
+    return result(pid, soft=False, confirmed=True)
 
 
 # ============================================================
-# 独立启动 Xray 线程
+# 独立启动 Xray
 # ============================================================
 
-class SingleV2RayThread(QThread):
+async def _select_fastest(ctx: JobContext, v2ray_config_path: str, store,
+                          tproxy: Optional[dict]) -> Optional[str]:
+    """启动前测速并切换到最快节点；失败时只提示，不阻止启动。"""
+    try:
+        selected = await auto_select_proxy(ctx, v2ray_config_path, store)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        log.warning("自动选择节点失败: %s", e)
+        ctx.progress(f"⚠ 自动选择节点失败: {e}")
+        return None
+    if selected and tproxy:
+        _refresh_vps_ip(v2ray_config_path, tproxy)
+    return selected
+
+
+def _refresh_vps_ip(v2ray_config_path: str, tproxy: dict) -> None:
+    """切换节点后，透明代理需要绕过新节点的服务器地址。"""
+    doc = config_repo.get_document(v2ray_config_path)
+    if doc is not None and doc.vps_ip:
+        tproxy['vps_ip'] = doc.vps_ip
+
+
+async def start_v2ray_job(ctx: JobContext, v2ray_config_path: str,
+                          xray_mgr=None, tproxy: Optional[dict] = None,
+                          auto_select: bool = False, store=None,
+                          perf_profile: str = PROFILE_NONE) -> dict:
     """
-    独立启动 Xray（不涉及 OpenVPN）。
-    
+    独立启动 Xray（不涉及 OpenVPN），资源: RES_XRAY。
+    auto_select 时先测速，把最快的节点（档案库 store 中的节点或 config.json 中的出站）
+    设为 proxy 再启动。xray 使用编译后的运行时配置（按 perf_profile 调优，见 core.artifacts）。
+
     Windows:
-      - 使用 vpn_process.py 的 XrayManager
-      - 完整处理：配置选择、sendThrough 注入、TUN 网卡、IP 配置、路由、DNS
-      - TProxy 参数在 Windows 上被忽略（Windows 使用 TUN 模式）
-    
+      - 使用 vpn_process.py 的 XrayManager（TUN 模式，自动配置网卡、路由、DNS）
+      - TProxy 参数在 Windows 上被忽略
     Linux:
-      - 原有 pkexec + PolkitHelper 流程
-      - 支持 TProxy 配置
+      - pkexec + vpn-helper.py，tproxy 不为 None 时配置透明代理
+        （键: port / vps_ip / mark / table）
+
+    Returns:
+        {"pid": int, "tproxy_ok": bool, "selected": str 或 None,
+         "runtime": 运行时配置路径（热更新时作为 running_config 传入）}
     """
+    selected = None
+    if auto_select:
+        selected = await _select_fastest(ctx, v2ray_config_path, store, tproxy)
+    manifest = await _compile(ctx, v2ray_config_path, perf_profile, tproxy)
+    error = await _validate(ctx, v2ray_config_path, manifest, xray_mgr)
+    if error:
+        raise _invalid_config_error(error)
+    runtime_path = _runtime_path(manifest, v2ray_config_path)
+
+    if not IS_WINDOWS:
+        pid = await _linux_start_v2ray(ctx, v2ray_config_path, manifest)
+        tproxy_ok = await _linux_start_tproxy(ctx, tproxy, manifest) if tproxy else False
+        return {'pid': pid, 'tproxy_ok': tproxy_ok, 'selected': selected,
+                'runtime': runtime_path}
+
+    ctx.progress("正在启动 Xray（TUN 模式）...")
+    config_path = Path(runtime_path) if runtime_path else None
+    if not await ctx.run_blocking(xray_mgr.start, config_path,
+                                  on_cancel=xray_mgr.stop):
+        tail = "\n".join(xray_mgr.capture.last_lines(10))
+        raise JobError(
+            "Xray 启动失败，请检查配置文件和网络设置。\n"
+            f"查看日志: {xray_mgr.log_path}"
+            + (f"\n\n{tail}" if tail else ""))
+    _mark_running(manifest)
+    ctx.progress("✓ Xray 启动成功（TUN 模式自动配置）")
+    return {'pid': xray_mgr.get_pid() or 1, 'tproxy_ok': False, 'selected': selected,
+            'runtime': runtime_path}
 
-    update_signal = pyqtSignal(str)
-    error_signal = pyqtSignal(str)
-    success_signal = pyqtSignal(dict)  # {"pid": int, "tproxy_ok": bool}
-
-    def __init__(self, v2ray_config_path: str, tproxy_enabled: bool = False,
-                 tproxy_port: int = 12345, tproxy_vps_ip: str = "",
-                 tproxy_mark: int = 1, tproxy_table: int = 100):
-        super().__init__()
-        self.v2ray_config_path = v2ray_config_path
-        self.tproxy_enabled = tproxy_enabled
-        self.tproxy_port = tproxy_port
-        self.tproxy_vps_ip = tproxy_vps_ip
-        self.tproxy_mark = tproxy_mark
-        self.tproxy_table = tproxy_table
-
-    def run(self):
-        if IS_WINDOWS:
-            self._run_windows()
-        else:
-            self._run_linux()
-
-    def _run_windows(self):
-        """
-        Windows: 使用 vpn_process.py 的 XrayManager。
-        完全替代 start-xray.ps1，包括：
-          - 配置文件优先级处理（用户 > APPDATA > 内置）
-          - 注入 sendThrough
-          - 启动 xray.exe
-          - 创建 xray-tun 虚拟网卡
-          - 配置 IP (10.0.0.1/24)
-          - 设置路由表（VPS、网关、默认路由）
-          - 配置 DNS (114.114.114.114, 8.8.8.8)
-        """
-        try:
-            self.update_signal.emit("正在启动 Xray（TUN 模式）...")
-            
-            # 获取项目根目录
-            app_root = Path(__file__).resolve().parent.parent
-            _, xray_mgr = create_managers(app_root)
-            
-            config_path = Path(self.v2ray_config_path) if self.v2ray_config_path else None
-            
-            if xray_mgr.start(config_path):
-                pid = xray_mgr.get_pid() or 1
-                self.update_signal.emit("✓ Xray 启动成功（TUN 模式自动配置）")
-                self.success_signal.emit({
-                    'pid': pid,
-                    'tproxy_ok': False  # Windows TUN 模式不使用 TProxy
-                })
-            else:
-                self.error_signal.emit(
-                    "Xray 启动失败，请检查配置文件和网络设置。\n"
-                    "查看日志: logs/xray.log")
-        except Exception as e:
-            log.exception("Xray 启动异常")
-            self.error_signal.emit(f"Xray 启动异常: {e}")
-
-    def _run_linux(self):
-        """Linux: 原有 pkexec + PolkitHelper 流程，支持 TProxy。"""
-        try:
-            self.update_signal.emit("正在启动 V2Ray...")
-            cmd = ["pkexec", PolkitHelper.HELPER_SCRIPT,
-                   "start-v2ray-only", self.v2ray_config_path]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-            if result.returncode != 0:
-                if check_user_cancelled(result.stderr):
-                    self.error_signal.emit("用户取消了权限授权")
-                else:
-                    detail = format_process_error(result, "cat /tmp/v2ray.log")
-                    self.error_signal.emit(
-                        f"V2Ray 启动失败 (退出码 {result.returncode}):\n\n{detail}")
-                return
-
-            v2ray_pid = parse_pid_from_output(result.stdout, 'V2Ray PID')
-            if not v2ray_pid:
-                self.error_signal.emit(
-                    "无法获取 V2Ray PID\n\n日志: cat /tmp/v2ray.log")
-                return
-
-            tproxy_ok = False
-            if self.tproxy_enabled:
-                self.update_signal.emit("正在配置透明代理...")
-                time.sleep(1)
-                ok, msg = PolkitHelper.start_tproxy(
-                    self.tproxy_port, self.tproxy_vps_ip,
-                    self.tproxy_mark, self.tproxy_table)
-                tproxy_ok = ok
-                if ok:
-                    self.update_signal.emit("✓ 透明代理已配置")
-                else:
-                    self.update_signal.emit(f"⚠ 透明代理配置失败: {msg}")
 
-            self.success_signal.emit({'pid': v2ray_pid, 'tproxy_ok': tproxy_ok})
-        except subprocess.TimeoutExpired:
-            self.error_signal.emit("V2Ray 启动超时（60s）")
-        except Exception as e:
-            log.exception("V2Ray 启动异常")
-            self.error_signal.emit(f"V2Ray 启动异常: {e}")
+# ============================================================
+# 配置热更新 / 故障切换
+# ============================================================
+
+async def _apply_config(ctx: JobContext, v2ray_config_path: str,
+                        running_config: Optional[str], v2ray_pid: Optional[int],
+                        xray_mgr, tproxy: Optional[dict], perf_profile: str) -> dict:
+    """
+    把 config.json 应用到运行中的 Xray，Linux 上依次尝试：
+      1. 通过 xray API 热更新（见 core.hot_reload，已建立的连接不受影响）
+      2. 透明代理运行时，双实例切换（见 core.handoff，TProxy 流量只中断毫秒级）
+      3. 停止旧核心后重启
+    Windows 的 TUN 模式由 XrayManager 另行改写运行时配置，始终重启。
+    新配置未通过预校验或无法编译（如无法解析）时不做任何改动，结果中的 error 为错误信息。
+    """
+    if tproxy:
+        _refresh_vps_ip(v2ray_config_path, tproxy)
+    running = None
+    if not IS_WINDOWS and running_config and v2ray_pid:
+        running = await ctx.run_blocking(load_config, running_config)
+    slot = running_slot(running, tproxy['port'] if tproxy else None)
+    if running_config:
+        # 应用前不能被清理：热更新要与它比较
+        mark_in_use(slot, [running_config], replace=False)
+    manifest = await _compile(ctx, v2ray_config_path, perf_profile, tproxy, slot,
+                              api_inbound_port(running))
+    error = await _validate(ctx, v2ray_config_path, manifest, xray_mgr)
+    if error:
+        # 运行中的 Xray 保持不变（包括配置无法解析，例如编辑器只保存了一半）
+        ctx.progress("⚠ 新配置无效，继续使用当前配置")
+        return {'pid': v2ray_pid, 'tproxy_ok': bool(tproxy), 'reloaded': False,
+                'runtime': running_config, 'error': error}
+    runtime_path = _runtime_path(manifest, v2ray_config_path)
+
+    if running is not None:
+        plan = await ctx.run_blocking(reload_from_files, running_config, runtime_path)
+        if plan is not None:
+            _mark_running(manifest, slot)
+            ctx.progress("Xray 配置未变化" if plan.empty else "✓ 已热更新 Xray 配置，现有连接保持")
+            tproxy_ok = await _linux_start_tproxy(ctx, tproxy, manifest) if tproxy else False
+            return {'pid': v2ray_pid, 'tproxy_ok': tproxy_ok, 'reloaded': True,
+                    'runtime': runtime_path}
+        if tproxy and can_handoff(running):
+            result = await _linux_handoff(ctx, v2ray_config_path, running, v2ray_pid,
+                                          tproxy, perf_profile, 1 - slot)
+            if result is not None:
+                return result
+
+    ctx.progress("正在重启 Xray...")
+    if IS_WINDOWS:
+        await ctx.run_blocking(xray_mgr.stop)
+        if not await ctx.run_blocking(xray_mgr.start, Path(runtime_path),
+                                      on_cancel=xray_mgr.stop):
+            raise JobError(f"Xray 重启失败\n查看日志: {xray_mgr.log_path}")
+        _mark_running(manifest)
+        return {'pid': xray_mgr.get_pid() or 1, 'tproxy_ok': False, 'reloaded': False,
+                'runtime': runtime_path}
+
+    if v2ray_pid:
+        await _linux_rollback(ctx, v2ray_pid, "v2ray")
+    pid = await _linux_start_v2ray(ctx, v2ray_config_path, manifest, slot)
+    tproxy_ok = await _linux_start_tproxy(ctx, tproxy, manifest) if tproxy else False
+    return {'pid': pid, 'tproxy_ok': tproxy_ok, 'reloaded': False, 'runtime': runtime_path}
+
+
+async def _linux_handoff(ctx: JobContext, v2ray_config_path: str, running: dict,
+                         old_pid: int, tproxy: dict, perf_profile: str,
+                         slot: int) -> Optional[dict]:
+    """
+    双实例切换：新核心在另一槽位的端口上启动并就绪后，helper 原子替换 TPROXY 目标端口，
+    旧核心排空 HANDOFF_GRACE 秒后停止。任一步骤失败时撤销已做的改动并返回 None（由调用方重启）。
+    """
+    binary = find_xray_binary()
+    if binary is None:
+        return None
+    try:
+        # 旧核心仍占用着它的 API 端口，新核心另选空闲端口
+        manifest = await ctx.run_blocking(
+            compile_artifacts, v2ray_config_path, perf_profile, tproxy, slot=slot)
+    except (OSError, ValueError) as e:
+        log.info("无法生成切换用的运行时产物: %s", e)
+        return None
+    if manifest.rules_path is None or manifest.api_port is None:
+        return None
+
+    api = XrayApi(binary, api_server(running))
+    released = []
+    new_pid = None
+    try:
+        # 本地入站端口不随槽位变化，先从旧核心释放
+        for inbound in shared_inbounds(running):
+            await ctx.run_blocking(api.remove_inbound, inbound['tag'])
+            released.append(inbound)
+        ctx.progress("正在启动新实例...")
+        new_pid = await _linux_start_v2ray(ctx, v2ray_config_path, manifest, slot)
+        if not await ctx.run_blocking(wait_ready, manifest.api_port):
+            raise JobError("新实例未就绪")
+        r = await run_helper(ctx, "tproxy-handoff", manifest.rules_path,
+                             "--sha256", manifest.sha256(KIND_RULES), timeout=30)
+        if r.returncode != 0:
+            raise JobError((r.stderr or "").strip() or "切换透明代理端口失败")
+    except (JobError, OSError, RuntimeError, subprocess.SubprocessError) as e:
+        log.warning("双实例切换失败，改为重启: %s", e)
+        ctx.progress(f"⚠ 无缝切换失败，改为重启: {e}")
+        if new_pid:
+            await _linux_rollback(ctx, new_pid, "v2ray")
+        if released:
+            try:
+                await ctx.run_blocking(api.add_inbounds, released)
+            except (OSError, RuntimeError, subprocess.SubprocessError) as e:
+                log.warning("恢复旧实例入站失败: %s", e)
+        return None
+
+    gap = _parse_status(r.stdout, "TPROXY_SWITCH_MS")
+    ctx.progress(f"✓ 已切换到新实例 (PID: {new_pid})"
+                 + (f"，切换耗时 {gap} ms" if gap else ""))
+    ctx.progress(f"等待旧实例上的连接结束 ({HANDOFF_GRACE:g} 秒)...")
+    await ctx.sleep(HANDOFF_GRACE)
+    await _linux_rollback(ctx, old_pid, "v2ray")
+    return {'pid': new_pid, 'tproxy_ok': True, 'reloaded': False, 'handoff': True,
+            'runtime': manifest.runtime_path}
+
+
+async def reload_v2ray_job(ctx: JobContext, v2ray_config_path: str,
+                           running_config: Optional[str], v2ray_pid: Optional[int],
+                           xray_mgr=None, tproxy: Optional[dict] = None,
+                           perf_profile: str = PROFILE_NONE) -> dict:
+    """
+    config.json 改动后（切换节点、编辑规则、导入服务器）应用到运行中的 Xray，资源: RES_XRAY。
+    running_config 为运行中 Xray 的运行时配置（启动结果中的 runtime）。
+
+    Returns:
+        {"pid": int, "tproxy_ok": bool, "reloaded": bool（True 表示未重启）, "runtime": str,
+         "handoff": True（仅双实例切换时）, "error": str（仅新配置无效时）}
+    """
+    return await _apply_config(ctx, v2ray_config_path, running_config, v2ray_pid,
+                               xray_mgr, tproxy, perf_profile)
+
+
+async def failover_job(ctx: JobContext, controller, v2ray_config_path: str,
+                       v2ray_pid: Optional[int], xray_mgr=None,
+                       tproxy: Optional[dict] = None,
+                       perf_profile: str = PROFILE_NONE,
+                       running_config: Optional[str] = None) -> dict:
+    """
+    当前节点劣化时切换到最快的备用节点，热更新或重启 Xray，资源: RES_XRAY。
+    controller 为 core.failover.FailoverController；
+    没有可用备用节点或选点失败时不做改动，返回的 selected 为 None（reason 为失败原因）；
+    新节点配置无效、或应用失败但旧核心仍在运行时恢复切换前的配置，结果中的 error 为错误信息。
+    只有旧核心已停止、新核心未能启动时任务才失败。
+    tproxy 不为 None 时按透明代理生效处理，会被 TPROXY 重定向的备用节点不参与测速。
+
+    Returns:
+        {"pid": int, "tproxy_ok": bool, "selected": str 或 None, "reloaded": bool,
+         "runtime": str}
+    """
+    unchanged = {'pid': v2ray_pid, 'tproxy_ok': bool(tproxy), 'selected': None,
+                 'reloaded': False, 'runtime': running_config}
+    bypass = tproxy_bypass(tproxy.get('vps_ip')) if tproxy else None
+    try:
+        selected = await controller.fail_over(ctx, bypass)
+    except Exception as e:
+        # Xray 没有改动；写了一半的配置（如档案库已切换节点）一并恢复
+        log.warning("故障切换选点失败: %s", e)
+        await _revert_failover(ctx, controller)
+        return dict(unchanged, reason=str(e))
+    if not selected:
+        return unchanged
+    try:
+        result = await _apply_config(ctx, v2ray_config_path, running_config, v2ray_pid,
+                                     xray_mgr, tproxy, perf_profile)
+    except Exception as e:
+        if not core_alive(v2ray_pid, xray_mgr):
+            raise
+        log.warning("应用新节点失败，旧核心仍在运行: %s", e)
+        result = dict(unchanged, error=str(e))
+    if result.get('error'):
+        # Xray 仍在使用旧节点，config.json 和档案库也恢复到旧节点
+        await _revert_failover(ctx, controller)
+    result['selected'] = selected
+    return result
+
+
+async def _revert_failover(ctx: JobContext, controller) -> None:
+    try:
+        await controller.revert(ctx)
+    except Exception as e:
+        log.warning("恢复切换前的配置失败: %s", e)
+
+
+def core_alive(pid: Optional[int], xray_mgr=None) -> bool:
+    """
+    核心进程是否仍在运行。Linux 上核心以 root 运行，
+    普通用户发送信号 0 得到 EPERM，同样说明进程存在。
+    """
+    if IS_WINDOWS:
+        return xray_mgr is not None and xray_mgr.is_running
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
 
 
 # ============================================================
-# 联合启动线程
+# 联合启动
 # ============================================================
 
-class CombinedStartThread(QThread):
+async def start_combined_job(ctx: JobContext, vpn_config_path: Optional[str],
+                             v2ray_config_path: Optional[str],
+                             current_vpn_pid: Optional[int] = None,
+                             current_v2ray_pid: Optional[int] = None,
+                             openvpn_mgr=None, xray_mgr=None,
+                             tproxy: Optional[dict] = None,
+                             perf_profile: str = PROFILE_NONE) -> dict:
     """
-    联合启动 OpenVPN + Xray。
+    联合启动 OpenVPN + Xray，资源: RES_OPENVPN + RES_XRAY。
+    perf_profile 含义同 start_v2ray_job，同时用于 OpenVPN（见 start_vpn_job）。
 
     Windows:
-      - 使用 vpn_process.py 的管理器，完全替代旧脚本
       - OpenVPN 和 Xray 独立启动，任一缺失/失败不阻断另一个
-      - success_signal 携带 'warnings' 列表供 UI 显示部分失败提示
-
+      - 结果携带 'warnings' 列表供 UI 显示部分失败提示
     Linux:
-      - 原有 pkexec 流程
-      - OpenVPN 失败则中止（原逻辑）
-    """
+      - OpenVPN 失败则中止；V2Ray 失败时回滚本次启动的 OpenVPN
 
-    update_signal = pyqtSignal(str)
-    error_signal = pyqtSignal(str)
-    success_signal = pyqtSignal(dict)
-
-    def __init__(self, vpn_config_path: str, v2ray_config_path: str,
-                 current_vpn_pid: Optional[int], current_v2ray_pid: Optional[int],
-                 tproxy_enabled: bool = False, tproxy_port: int = 12345,
-                 tproxy_vps_ip: str = "", tproxy_mark: int = 1,
-                 tproxy_table: int = 100):
-        super().__init__()
-        self.vpn_config_path = vpn_config_path
-        self.v2ray_config_path = v2ray_config_path
-        self.current_vpn_pid = current_vpn_pid
-        self.current_v2ray_pid = current_v2ray_pid
-        self.tproxy_enabled = tproxy_enabled
-        self.tproxy_port = tproxy_port
-        self.tproxy_vps_ip = tproxy_vps_ip
-        self.tproxy_mark = tproxy_mark
-        self.tproxy_table = tproxy_table
-
-    def run(self):
-        if IS_WINDOWS:
-            self._run_windows()
-        else:
-            self._run_linux()
-
-    def _run_windows(self):
-        """
-        Windows: 完全使用 vpn_process.py。
-        OpenVPN 和 Xray 独立启动，互不依赖。
-        """
+    Returns:
+        {"vpn_pid": int, "v2ray_pid": int, "tproxy_ok": bool, "warnings": [str],
+         "runtime": 本次启动的 Xray 使用的运行时配置路径（Xray 已在运行时为 None）}
+    """
+    manifest = None
+    if not current_v2ray_pid:
+        manifest = await _compile(ctx, v2ray_config_path, perf_profile, tproxy)
+        # 在启动 OpenVPN 之前拒绝无效配置
+        error = await _validate(ctx, v2ray_config_path, manifest, xray_mgr)
+        if error:
+            raise _invalid_config_error(error)
+
+    runtime_path = _runtime_path(manifest, v2ray_config_path)
+
+    if IS_WINDOWS:
+        result = await _windows_start_combined(
+            ctx, vpn_config_path, runtime_path,
+            current_vpn_pid, current_v2ray_pid, openvpn_mgr, xray_mgr, perf_profile)
+        result['runtime'] = None if current_v2ray_pid else runtime_path
+        if not current_v2ray_pid:
+            _mark_running(manifest)
+        return result
+
+    res_vpn_pid = current_vpn_pid
+    res_v2ray_pid = current_v2ray_pid
+
+    if not current_vpn_pid:
+        res_vpn_pid = await _linux_start_openvpn(ctx, vpn_config_path, perf_profile)
+    else:
+        ctx.progress("OpenVPN 已在运行，跳过启动")
+
+    if not current_v2ray_pid:
         try:
-            app_root = Path(__file__).resolve().parent.parent
-            openvpn_mgr, xray_mgr = create_managers(app_root)
-            
-            openvpn_started = bool(self.current_vpn_pid)
-            xray_started = bool(self.current_v2ray_pid)
-            errors = []
-
-            # ── 启动 OpenVPN（可选）──
-            if openvpn_started:
-                self.update_signal.emit("OpenVPN 已在运行，跳过启动")
-            else:
-                vpn_cfg = Path(self.vpn_config_path) if self.vpn_config_path else None
-                if vpn_cfg and vpn_cfg.exists():
-                    self.update_signal.emit("正在启动 OpenVPN...")
-                    try:
-                        if openvpn_mgr.start(vpn_cfg):
-                            openvpn_started = True
-                            self.update_signal.emit("✓ OpenVPN 启动成功")
-                        else:
-                            errors.append("OpenVPN 启动失败")
-                    except Exception as e:
-                        errors.append(f"OpenVPN 异常: {e}")
-                else:
-                    self.update_signal.emit("未提供 OpenVPN 配置，跳过")
-
-            # ── 启动 Xray（可选）──
-            if xray_started:
-                self.update_signal.emit("Xray 已在运行，跳过启动")
-            else:
-                xray_cfg = Path(self.v2ray_config_path) if self.v2ray_config_path else None
-                if xray_cfg and xray_cfg.exists():
-                    self.update_signal.emit("正在启动 Xray（TUN 模式）...")
-                    try:
-                        if xray_mgr.start(xray_cfg):
-                            xray_started = True
-                            self.update_signal.emit("✓ Xray 启动成功")
-                        else:
-                            errors.append("Xray 启动失败")
-                    except Exception as e:
-                        errors.append(f"Xray 异常: {e}")
+            res_v2ray_pid = await _linux_start_v2ray(ctx, v2ray_config_path, manifest)
+        except BaseException:
+            if res_vpn_pid and not current_vpn_pid:
+                await _linux_rollback(ctx, res_vpn_pid, "openvpn")
+            raise
+    else:
+        ctx.progress("V2Ray 已在运行，跳过启动")
+
+    tproxy_ok = await _linux_start_tproxy(ctx, tproxy, manifest) if tproxy else False
+    return {
+        'vpn_pid': res_vpn_pid,
+        'v2ray_pid': res_v2ray_pid,
+        'tproxy_ok': tproxy_ok,
+        'warnings': [],
+        'runtime': None if current_v2ray_pid else runtime_path,
+    }
+
+
+async def _windows_start_combined(ctx: JobContext, vpn_config_path, v2ray_config_path,
+                                  current_vpn_pid, current_v2ray_pid,
+                                  openvpn_mgr, xray_mgr,
+                                  perf_profile: str = PROFILE_NONE) -> dict:
+    """Windows: OpenVPN 和 Xray 独立启动，互不依赖。"""
+    openvpn_started = bool(current_vpn_pid)
+    xray_started = bool(current_v2ray_pid)
+    errors = []
+
+    # ── 启动 OpenVPN（可选）──
+    if openvpn_started:
+        ctx.progress("OpenVPN 已在运行，跳过启动")
+    else:
+        vpn_cfg = Path(vpn_config_path) if vpn_config_path else None
+        if vpn_cfg and vpn_cfg.exists():
+            vpn_cfg = Path(await prepare_profile(ctx, str(vpn_cfg), perf_profile))
+            ctx.progress("正在启动 OpenVPN...")
+            try:
+                if await ctx.run_blocking(openvpn_mgr.start, vpn_cfg,
+                                          on_cancel=openvpn_mgr.stop):
+                    openvpn_started = True
+                    ctx.progress("✓ OpenVPN 启动成功")
                 else:
-                    self.update_signal.emit("未提供 Xray 配置，跳过")
-
-            # ── 检查结果──
-            if not openvpn_started and not xray_started:
-                self.error_signal.emit(
-                    "没有任何服务成功启动。\n\n" +
-                    "\n".join(f"• {e}" for e in errors))
-                return
-
-            self.success_signal.emit({
-                'vpn_pid': 1 if openvpn_started else 0,
-                'v2ray_pid': 1 if xray_started else 0,
-                'tproxy_ok': False,
-                'warnings': errors,
-            })
-
-        except Exception as e:
-            log.exception("联合启动异常")
-            self.error_signal.emit(f"启动异常: {e}")
-
-    def _run_linux(self):
-        """Linux: 原有 pkexec 流程。"""
-        try:
-            res_vpn_pid = self.current_vpn_pid
-            res_v2ray_pid = self.current_v2ray_pid
-            tproxy_ok = False
-
-            # ── 启动 OpenVPN ──
-            if not self.current_vpn_pid:
-                self.update_signal.emit("正在启动 OpenVPN...")
-                r = subprocess.run(
-                    ["pkexec", PolkitHelper.HELPER_SCRIPT,
-                     "start-vpn-only", self.vpn_config_path],
-                    capture_output=True, text=True, timeout=60)
-                if r.returncode != 0:
-                    self.error_signal.emit(
-                        f"OpenVPN 启动失败 (退出码 {r.returncode}):\n\n"
-                        + format_process_error(r, "cat /tmp/openvpn.log"))
-                    return
-                res_vpn_pid = parse_pid_from_output(r.stdout, 'OpenVPN PID')
-                if not res_vpn_pid:
-                    self.error_signal.emit(
-                        "无法获取 OpenVPN PID\n\n日志: cat /tmp/openvpn.log")
-                    return
-                self.update_signal.emit("✓ OpenVPN 启动成功")
-            else:
-                self.update_signal.emit("OpenVPN 已在运行，跳过启动")
-
-            # ── 启动 V2Ray ──
-            if not self.current_v2ray_pid:
-                self.update_signal.emit("正在启动 V2Ray...")
-                r = subprocess.run(
-                    ["pkexec", PolkitHelper.HELPER_SCRIPT,
-                     "start-v2ray-only", self.v2ray_config_path],
-                    capture_output=True, text=True, timeout=60)
-                if r.returncode != 0:
-                    self.error_signal.emit(
-                        f"V2Ray 启动失败 (退出码 {r.returncode}):\n\n"
-                        + format_process_error(r, "cat /tmp/v2ray.log"))
-                    if res_vpn_pid and not self.current_vpn_pid:
-                        self._stop_process(res_vpn_pid, "openvpn")
-                    return
-                res_v2ray_pid = parse_pid_from_output(r.stdout, 'V2Ray PID')
-                if not res_v2ray_pid:
-                    self.error_signal.emit(
-                        "无法获取 V2Ray PID\n\n日志: cat /tmp/v2ray.log")
-                    if res_vpn_pid and not self.current_vpn_pid:
-                        self._stop_process(res_vpn_pid, "openvpn")
-                    return
-                self.update_signal.emit("✓ V2Ray 启动成功")
-            else:
-                self.update_signal.emit("V2Ray 已在运行，跳过启动")
-
-            # ── 配置 TProxy（Linux 仅）──
-            if self.tproxy_enabled:
-                self.update_signal.emit("正在配置透明代理...")
-                time.sleep(1)
-                ok, msg = PolkitHelper.start_tproxy(
-                    self.tproxy_port, self.tproxy_vps_ip,
-                    self.tproxy_mark, self.tproxy_table)
-                tproxy_ok = ok
-                if ok:
-                    self.update_signal.emit("✓ 透明代理已配置")
+                    errors.append(_openvpn_failure(openvpn_mgr))
+            except Exception as e:
+                errors.append(f"OpenVPN 异常: {e}")
+        else:
+            ctx.progress("未提供 OpenVPN 配置，跳过")
+
+    # ── 启动 Xray（可选）──
+    if xray_started:
+        ctx.progress("Xray 已在运行，跳过启动")
+    else:
+        xray_cfg = Path(v2ray_config_path) if v2ray_config_path else None
+        if xray_cfg and xray_cfg.exists():
+            ctx.progress("正在启动 Xray（TUN 模式）...")
+            try:
+                if await ctx.run_blocking(xray_mgr.start, xray_cfg,
+                                          on_cancel=xray_mgr.stop):
+                    xray_started = True
+                    ctx.progress("✓ Xray 启动成功")
                 else:
-                    self.update_signal.emit(f"⚠ 透明代理配置失败: {msg}")
-
-            self.success_signal.emit({
-                'vpn_pid': res_vpn_pid,
-                'v2ray_pid': res_v2ray_pid,
-                'tproxy_ok': tproxy_ok,
-                'warnings': [],
-            })
-
-        except subprocess.TimeoutExpired:
-            self.error_signal.emit("启动超时（60s）")
-        except Exception as e:
-            log.exception("联合启动异常")
-            self.error_signal.emit(f"启动异常: {e}")
-
-    def _stop_process(self, pid: int, name: str) -> None:
-        """紧急停止进程（回滚）。"""
-        try:
-            subprocess.run(
-                ["pkexec", PolkitHelper.HELPER_SCRIPT,
-                 "stop", f"--{name}-pid", str(pid)],
-                capture_output=True, text=True, timeout=30)
-        except Exception as e:
-            log.warning("回滚停止进程失败: %s", e)
\ No newline at end of file
+                    errors.append("Xray 启动失败")
+            except Exception as e:
+                errors.append(f"Xray 异常: {e}")
+        else:
+            ctx.progress("未提供 Xray 配置，跳过")
+
+    # ── 检查结果──
+    if not openvpn_started and not xray_started:
+        raise JobError(
+            "没有任何服务成功启动。\n\n" +
+            "\n".join(f"• {e}" for e in errors))
+
+    return {
+        'vpn_pid': (current_vpn_pid or openvpn_mgr.get_pid() or 1) if openvpn_started else 0,
+        'v2ray_pid': (current_v2ray_pid or xray_mgr.get_pid() or 1) if xray_started else 0,
+        'tproxy_ok': False,
+        'warnings': errors,
+    }
+
+
+# ============================================================
+# 停止（OpenVPN / Xray 并行拆除）
+# ============================================================
+
+async def stop_job(ctx: JobContext, vpn_pid: Optional[int] = None,
+                   v2ray_pid: Optional[int] = None,
+                   openvpn_mgr=None, xray_mgr=None,
+                   tproxy: Optional[dict] = None,
+                   deadline: float = STOP_DEADLINE) -> dict:
+    """
+    停止 OpenVPN 和/或 Xray，两侧并行拆除，总耗时受 deadline 约束。
+    资源: 被停止的一侧（RES_OPENVPN / RES_XRAY）。停止任务不响应取消。
+
+    Linux:   一次 pkexec 调用 helper stop（并行 SIGTERM，超时 SIGKILL），
+             tproxy 不为 None 时同时清理透明代理规则
+    Windows: 两个管理器的 stop() 在线程池中并行执行
+
+    Returns:
+        {"vpn_stopped": bool, "v2ray_stopped": bool, "warnings": [str]}
+    """
+    if not vpn_pid and not v2ray_pid:
+        return {'vpn_stopped': False, 'v2ray_stopped': False, 'warnings': []}
+    if IS_WINDOWS:
+        return await _windows_stop(ctx, vpn_pid, v2ray_pid,
+                                   openvpn_mgr, xray_mgr, deadline)
+
+    args = ["stop", "--deadline", f"{deadline:g}"]
+    if vpn_pid:
+        ctx.progress("正在停止 OpenVPN...")
+        args += ["--openvpn-pid", str(vpn_pid)]
+    if v2ray_pid:
+        ctx.progress("正在停止 V2Ray...")
+        args += ["--v2ray-pid", str(v2ray_pid)]
+    if tproxy:
+        args += ["--port", str(tproxy['port']), "--vps-ip", str(tproxy['vps_ip']),
+                 "--mark", str(tproxy['mark']), "--table", str(tproxy['table'])]
+
+    r = await run_helper(ctx, *args, timeout=HELPER_TIMEOUT + deadline,
+                         check_cancel=False)
+    if r.returncode != 0 and check_user_cancelled(r.stderr):
+        raise JobError("用户取消了权限授权")
+
+    # helper 失败时在 stderr 中逐行列出仍在运行的进程: "  - openvpn: PID 123"
+    vpn_alive = r.returncode != 0 and "- openvpn:" in r.stderr
+    v2ray_alive = r.returncode != 0 and "- v2ray:" in r.stderr
+    warnings = []
+    if vpn_pid:
+        if vpn_alive:
+            warnings.append(f"OpenVPN (PID {vpn_pid}) 未能停止")
+        else:
+            ctx.progress("✓ OpenVPN 已停止")
+    if v2ray_pid:
+        if v2ray_alive:
+            warnings.append(f"V2Ray (PID {v2ray_pid}) 未能停止")
+        else:
+            ctx.progress("✓ V2Ray 已停止")
+    if r.returncode != 0 and not warnings:
+        warnings.append(format_process_error(r, _OPENVPN_LOG_HINT))
+
+    return {
+        'vpn_stopped': bool(vpn_pid) and not vpn_alive,
+        'v2ray_stopped': bool(v2ray_pid) and not v2ray_alive,
+        'warnings': warnings,
+    }
+
+
+async def _windows_stop(ctx: JobContext, vpn_pid, v2ray_pid,
+                        openvpn_mgr, xray_mgr, deadline: float) -> dict:
+    """Windows: 并行调用两个管理器的 stop()，超过 deadline 的一侧记为未停止。"""
+    async def _stop(name: str, mgr) -> None:
+        ctx.progress(f"正在停止 {name}...")
+        await ctx.run_blocking(mgr.stop, deadline)
+        ctx.progress(f"✓ {name} 已停止")
+
+    tasks = {}
+    if vpn_pid:
+        tasks['vpn'] = asyncio.ensure_future(_stop("OpenVPN", openvpn_mgr))
+    if v2ray_pid:
+        tasks['v2ray'] = asyncio.ensure_future(_stop("Xray", xray_mgr))
+    await asyncio.wait(tasks.values(), timeout=deadline)
+
+    names = {'vpn': "OpenVPN", 'v2ray': "Xray"}
+    result = {'vpn_stopped': False, 'v2ray_stopped': False, 'warnings': []}
+    for key, task in tasks.items():
+        if not task.done():
+            task.cancel()
+            result['warnings'].append(f"{names[key]} 未在 {deadline:g}s 内停止")
+        elif task.exception() is not None:
+            result['warnings'].append(f"{names[key]} 停止失败: {task.exception()}")
+        else:
+            result[f'{key}_stopped'] = True
+    return result
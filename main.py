@@ -5,9 +5,11 @@ OpenVPN + V2Ray Client with Polkit
 """
 import sys
 from PyQt5.QtWidgets import QApplication
+from core.log_manager import init_logging
 from ui.main_window import MainWindow
 
 def main():
+    init_logging()
     app = QApplication(sys.argv)
     app.setApplicationName("Ov2n Client")
     app.setOrganizationName("Example")
@@ -7,7 +7,7 @@ VPN Helper Script for Polkit (增强版 - 优化 Geo 更新逻辑)
 增强功能:
 - 优先使用预打包的 geo 文件 (resources 目录)
 - 运行时异步检查 geo 文件更新 (带超时控制)
-- 自动检测 V2Ray 版本并使用正确的启动命令
+- 自动检测 V2Ray 版本并使用正确的启动命令 (按二进制缓存, 不重复探测)
 - 完善的错误处理和日志记录
 - 超时 30 秒后使用原有文件,不阻塞启动
 """
@@ -22,6 +22,10 @@ import datetime
 import shutil
 import urllib.request
 import socket
+import json
+import re
+import logging
+import logging.handlers
 
 
 # ============ 版本信息 ============
@@ -54,17 +58,224 @@ def _get_version():
     return _VERSION_CACHE
 
 
-# ============ 调试日志 ============
-DEBUG_LOG = "/tmp/vpn-helper-debug.log"
+# ============ 日志 ============
+# 所有日志集中在 LOG_ROOT 下:
+#   helper.log                 helper 自身的 JSON 行日志 (按大小/时间轮转)
+#   sessions/<id>/openvpn.log  每次启动命令一个会话目录, 保存核心进程输出
+#   sessions/<id>/v2ray.log
+#   openvpn.log / v2ray.log    指向最近一次会话的符号链接 (供 GUI 查看)
+# 旧会话按数量和时间清理, 崩溃现场可以保留到下一次连接之后。
+LOG_ROOT = "/var/log/ov2n"
+SESSIONS_DIR = os.path.join(LOG_ROOT, "sessions")
+HELPER_LOG = os.path.join(LOG_ROOT, "helper.log")
+HELPER_LOG_MAX_BYTES = 1024 * 1024  # 单个 helper.log 最大 1MB
+HELPER_LOG_BACKUPS = 3              # 保留 helper.log.1 ~ helper.log.3
+HELPER_LOG_MAX_AGE = 24 * 3600      # 单个日志文件最多写 1 天
+LOG_FLUSH_INTERVAL = 2.0            # 缓冲落盘间隔 (秒), WARNING 以上立即落盘
+SESSION_KEEP = 20                   # 最多保留的会话目录数
+SESSION_MAX_AGE = 7 * 24 * 3600     # 会话目录最长保留 7 天
+
+
+class _JsonFormatter(logging.Formatter):
+    """每条记录输出为一行 JSON。"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "pid": record.process,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _BufferedRotatingHandler(logging.handlers.RotatingFileHandler):
+    """
+    单一文件句柄 + 用户态缓冲的轮转日志处理器
+
+    - 文件在整个进程生命周期内只打开一次
+    - 普通记录只写入缓冲区, 超过 flush_interval 或遇到 WARNING 以上才真正 flush
+    - 自行累计已写字节数判断轮转, 不在每条记录上 stat/seek 文件
+    - 除大小上限外, 文件写满 max_age 秒也会轮转
+    """
+
+    def __init__(self, filename, max_bytes, backup_count, max_age,
+                 flush_interval=LOG_FLUSH_INTERVAL, buffer_size=64 * 1024):
+        self._buffer_size = buffer_size
+        self._max_age = max_age
+        self._flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+        self._force_flush = False
+        self._bytes = 0
+        self._opened_at = time.time()
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count,
+                         encoding="utf-8", delay=True)
+
+    def _open(self):
+        stream = open(self.baseFilename, self.mode, encoding=self.encoding,
+                      buffering=self._buffer_size)
+        stream.seek(0, os.SEEK_END)
+        self._bytes = stream.tell()
+        self._opened_at = self._first_record_time() if self._bytes else time.time()
+        return stream
+
+    def _first_record_time(self):
+        """读取文件首条记录的时间戳, 作为该文件的创建时间 (helper 是短进程)。"""
+        try:
+            with open(self.baseFilename, "r", encoding="utf-8") as f:
+                first = json.loads(f.readline())
+            return datetime.datetime.fromisoformat(first["ts"]).timestamp()
+        except Exception:
+            return time.time()
+
+    def _need_rollover(self, size):
+        if self.maxBytes > 0 and self._bytes + size > self.maxBytes:
+            return True
+        return self._max_age > 0 and self._bytes > 0 \
+            and time.time() - self._opened_at >= self._max_age
+
+    def emit(self, record):
+        try:
+            msg = self.format(record) + self.terminator
+            size = len(msg.encode("utf-8"))
+            if self.stream is None:
+                self.stream = self._open()
+            if self._need_rollover(size):
+                self.doRollover()
+                if self.stream is None:
+                    self.stream = self._open()
+            self.stream.write(msg)
+            self._bytes += size
+            self._force_flush = record.levelno >= logging.WARNING
+            self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        now = time.monotonic()
+        if self._force_flush or now - self._last_flush >= self._flush_interval:
+            self._force_flush = False
+            self._last_flush = now
+            super().flush()
+
+    def close(self):
+        self._force_flush = True
+        super().close()
+
+
+def _prepare_log_root():
+    """准备日志根目录; 非 root 运行 (开发调试) 时回退到临时目录。"""
+    global LOG_ROOT, SESSIONS_DIR, HELPER_LOG
+    try:
+        os.makedirs(SESSIONS_DIR, mode=0o755, exist_ok=True)
+        if os.access(LOG_ROOT, os.W_OK):
+            return
+    except OSError:
+        pass
+    import tempfile
+    LOG_ROOT = os.path.join(tempfile.gettempdir(), f"ov2n-logs-{os.getuid()}")
+    SESSIONS_DIR = os.path.join(LOG_ROOT, "sessions")
+    HELPER_LOG = os.path.join(LOG_ROOT, "helper.log")
+    os.makedirs(SESSIONS_DIR, mode=0o755, exist_ok=True)
+
+
+def _setup_logger():
+    logger = logging.getLogger("ov2n.helper")
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    try:
+        _prepare_log_root()
+        handler = _BufferedRotatingHandler(
+            HELPER_LOG, HELPER_LOG_MAX_BYTES, HELPER_LOG_BACKUPS, HELPER_LOG_MAX_AGE)
+        handler.setFormatter(_JsonFormatter())
+        logger.addHandler(handler)
+    except Exception:
+        logger.addHandler(logging.NullHandler())  # 日志不可用时静默, 不影响主流程
+    return logger
+
+
+_log = _setup_logger()
+
 
 def log_debug(msg):
-    """写入调试日志"""
+    """写入 DEBUG 级别日志"""
+    _log.debug(msg)
+
+
+def log_info(msg):
+    _log.info(msg)
+
+
+def log_warning(msg):
+    _log.warning(msg)
+
+
+def log_error(msg, exc_info=False):
+    _log.error(msg, exc_info=exc_info)
+
+
+# ============ 会话日志目录 ============
+_SESSION_DIR = None
+
+
+def _prune_sessions():
+    """按数量和时间清理旧的会话目录。"""
     try:
-        with open(DEBUG_LOG, "a", encoding="utf-8") as f:           
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            f.write(f"[{timestamp}] {msg}\n")
-    except:
-        pass  # 静默失败,不影响主流程
+        entries = sorted(
+            (e for e in os.scandir(SESSIONS_DIR) if e.is_dir(follow_symlinks=False)),
+            key=lambda e: e.name, reverse=True)
+    except OSError:
+        return
+    now = time.time()
+    for index, entry in enumerate(entries):
+        try:
+            expired = now - entry.stat(follow_symlinks=False).st_mtime > SESSION_MAX_AGE
+            if index >= SESSION_KEEP or expired:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                log_debug(f"prune_sessions: 已删除旧会话 {entry.name}")
+        except OSError:
+            continue
+
+
+def get_session_dir():
+    """
+    获取 (首次调用时创建) 本次命令的会话日志目录
+    目录名: <时间>-<helper PID>, 按名字排序即按时间排序
+    """
+    global _SESSION_DIR
+    if _SESSION_DIR is None:
+        name = datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+        _SESSION_DIR = os.path.join(SESSIONS_DIR, name)
+        os.makedirs(_SESSION_DIR, mode=0o755, exist_ok=True)
+        log_info(f"session: 会话目录 {_SESSION_DIR}")
+        _prune_sessions()
+    return _SESSION_DIR
+
+
+def open_session_log(name):
+    """
+    以追加模式打开会话目录下的核心日志, 并把 LOG_ROOT/<name> 链接到它
+
+    Returns:
+        (文件对象, 日志路径)
+    """
+    path = os.path.join(get_session_dir(), name)
+    log_file = open(path, "a")
+    link = os.path.join(LOG_ROOT, name)
+    tmp_link = f"{link}.{os.getpid()}.tmp"
+    try:
+        os.symlink(path, tmp_link)
+        os.replace(tmp_link, link)
+    except OSError as e:
+        log_warning(f"open_session_log: 更新链接 {link} 失败 - {e}")
+        try:
+            os.unlink(tmp_link)
+        except OSError:
+            pass
+    return log_file, path
 # ===========================================
 
 # ============ Geo 文件相关常量 ============
@@ -97,49 +308,184 @@ GEO_FILES_CONFIG = {
 }
 # ===========================================
 
-def find_xray_binary():
+# ============ 运行环境探测 ============
+# 每次 start 都要确认 openvpn/xray 的位置、xray 的命令行格式以及 v2ray.service
+# 是否在运行。结果缓存在 ENV_CACHE_FILE 中:
+#   - 查找用 shutil.which (纯 stat), 记录搜索目录的 mtime, 目录有变化才重新查找
+#   - 二进制按 (inode, mtime, size) 校验, 升级/替换后自动重新探测版本
+#   - systemd 单元状态直接读 /run/systemd, 只有单元确实在运行时才调用 systemctl
+# 命中缓存时, 环境探测不启动任何子进程。
+ENV_CACHE_DIR = "/var/cache/ov2n"
+ENV_CACHE_FILE = os.path.join(ENV_CACHE_DIR, "env.json")
+ENV_CACHE_VERSION = 1
+BINARY_DIRS = ["/usr/local/bin"]    # 优先于 PATH 搜索的目录
+SYSTEMD_UNIT_DIRS = [
+    "/etc/systemd/system",
+    "/run/systemd/system",
+    "/usr/local/lib/systemd/system",
+    "/usr/lib/systemd/system",
+    "/lib/systemd/system",
+]
+
+_ENV_CACHE = None
+_ENV_DIRTY = False
+
+
+def _stat_key(path):
+    """文件身份: inode + mtime + size"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_ino, st.st_mtime_ns, st.st_size]
+
+
+def _dir_mtime(directory):
+    try:
+        return os.stat(directory).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _load_env_cache():
+    global _ENV_CACHE
+    if _ENV_CACHE is None:
+        try:
+            with open(ENV_CACHE_FILE, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != ENV_CACHE_VERSION:
+                raise ValueError("缓存版本不匹配")
+            _ENV_CACHE = data
+        except (OSError, ValueError, AttributeError):
+            _ENV_CACHE = {"version": ENV_CACHE_VERSION, "lookups": {}, "binaries": {}}
+    return _ENV_CACHE
+
+
+def _save_env_cache():
+    global _ENV_DIRTY
+    if not _ENV_DIRTY:
+        return
+    tmp = f"{ENV_CACHE_FILE}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(ENV_CACHE_DIR, mode=0o755, exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(_ENV_CACHE, f)
+        os.replace(tmp, ENV_CACHE_FILE)
+        _ENV_DIRTY = False
+    except OSError as e:
+        log_debug(f"写入环境缓存失败 (无害): {e}")
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+
+
+def resolve_binary(names):
     """
-    查找 xray 或 v2ray 可执行文件
-    优先使用绝对路径，再尝试 PATH 查找
+    按顺序查找 names 中第一个存在的可执行文件
+    搜索顺序: BINARY_DIRS > PATH
+    返回: 绝对路径或 None
     """
-    candidates = [
-        '/usr/local/bin/xray',
-        '/usr/local/bin/v2ray',
-    ]
-
-    # 1️⃣ 检查绝对路径
-    for path in candidates:
-        if os.path.isfile(path) and os.access(path, os.X_OK):
-            log_debug(f"找到二进制文件: {path}")
+    global _ENV_DIRTY
+    dirs = list(BINARY_DIRS)
+    for d in os.environ.get("PATH", os.defpath).split(os.pathsep):
+        if d and d not in dirs:
+            dirs.append(d)
+    search_path = os.pathsep.join(dirs)
+    lookup_key = f"{'|'.join(names)}@{search_path}"
+
+    cache = _load_env_cache()
+    entry = cache["lookups"].get(lookup_key)
+    if entry and all(_dir_mtime(d) == m for d, m in entry["dirs"].items()):
+        path = entry["path"]
+        binary = cache["binaries"].get(path) if path else None
+        if path is None or (binary and binary["key"] == _stat_key(path)):
+            log_debug(f"resolve_binary: 缓存命中 {names} -> {path}")
             return path
 
-    # 2️⃣ 确保 PATH 包含 /usr/local/bin
-    current_path = os.environ.get('PATH', '')
-    if '/usr/local/bin' not in current_path:
-        os.environ['PATH'] = current_path + os.pathsep + '/usr/local/bin'
-        log_debug(f"PATH 更新为: {os.environ['PATH']}")
+    path = None
+    for name in names:
+        path = shutil.which(name, path=search_path)
+        if path:
+            break
+    cache["lookups"][lookup_key] = {
+        "path": path,
+        "dirs": {d: _dir_mtime(d) for d in dirs},
+    }
+    if path:
+        key = _stat_key(path)
+        binary = cache["binaries"].get(path)
+        if not binary or binary["key"] != key:
+            cache["binaries"][path] = {"key": key}
+    _ENV_DIRTY = True
+    _save_env_cache()
+    log_debug(f"resolve_binary: 探测 {names} -> {path}")
+    return path
+
+
+def get_core_info(binary):
+    """
+    返回 xray/v2ray 的版本信息 (首行) 和命令行格式
+    同一个二进制文件只执行一次 `<binary> version`
+    探测失败 (超时 / 无输出) 时不写缓存, 下次重新探测
+    返回: dict {"version": str, "legacy_cli": bool}
+    """
+    global _ENV_DIRTY
+    key = _stat_key(binary)
+    cache = _load_env_cache()
+    info = cache["binaries"].get(binary)
+    if info and info["key"] == key and "legacy_cli" in info:
+        return info
+
+    try:
+        result = subprocess.run([binary, 'version'], capture_output=True,
+                                text=True, timeout=10)
+        output = result.stdout
+    except (OSError, subprocess.SubprocessError) as e:
+        log_debug(f"get_core_info: {binary} version 失败 - {e}")
+        output = ""
+    info = {
+        "key": key,
+        "version": output.strip().splitlines()[0] if output.strip() else "",
+        # V2Ray 3.x/4.x 使用 `-config`, 之后的版本和 xray 使用 `run -c`
+        "legacy_cli": 'V2Ray 4' in output or 'V2Ray 3' in output,
+    }
+    if not info["version"]:
+        return info     # 冷启动超时等临时失败不能固定为新版命令行格式
+    cache["binaries"][binary] = info
+    _ENV_DIRTY = True
+    _save_env_cache()
+    return info
 
-    # 3️⃣ 尝试 PATH 查找
-    for binary in ['xray', 'v2ray']:
-        try:
-            result = subprocess.run(
-                ['which', binary],
-                capture_output=True,
-                text=True
-            )
-            log_debug(f"which {binary} -> returncode={result.returncode}, stdout={result.stdout!r}")
-            
-            if result.returncode == 0:
-                path_found = result.stdout.strip()
-                if os.path.isfile(path_found) and os.access(path_found, os.X_OK):
-                    log_debug(f"PATH 查找成功: {path_found}")
-                    return path_found
-        except Exception as e:
-            log_debug(f"查找 {binary} 出错: {e}")
-            continue
 
-    log_debug("未找到 xray/v2ray 可执行文件")
-    return None
+def find_xray_binary():
+    """
+    查找 xray 或 v2ray 可执行文件
+    优先 /usr/local/bin, 再查 PATH; 结果经环境缓存校验, 不启动子进程
+    """
+    return resolve_binary(['xray', 'v2ray'])
+
+
+def is_systemd_unit_active(unit):
+    """
+    判断 systemd 单元是否在运行
+    单元文件不存在或 /run/systemd/units 下没有 invocation 记录时直接返回 False,
+    只有疑似运行中才调用 systemctl 确认。
+    """
+    if not os.path.isdir("/run/systemd/system"):
+        return False    # 非 systemd 系统
+    if not any(os.path.exists(os.path.join(d, unit)) for d in SYSTEMD_UNIT_DIRS):
+        return False
+    if not os.path.lexists(f"/run/systemd/units/invocation:{unit}"):
+        return False
+    try:
+        result = subprocess.run(['systemctl', 'is-active', unit],
+                                capture_output=True, text=True, timeout=10)
+        return result.returncode == 0
+    except (OSError, subprocess.SubprocessError) as e:
+        log_debug(f"is_systemd_unit_active: systemctl 失败 - {e}")
+        return False
+# ===========================================
 
 def is_geo_file_valid(filepath):
     """
@@ -542,12 +888,12 @@ def start_openvpn(config_path):
     try:
         log_debug(f"start_openvpn: 配置文件 {config_path}")
 
-        result = subprocess.run(['which', 'openvpn'], capture_output=True, text=True)
-        if result.returncode != 0:
+        openvpn = resolve_binary(['openvpn'])
+        if not openvpn:
             print("错误: openvpn 未安装", file=sys.stderr)
             log_debug("start_openvpn: openvpn 未找到")
             return None
-        log_debug(f"start_openvpn: openvpn 路径 {result.stdout.strip()}")
+        log_debug(f"start_openvpn: openvpn 路径 {openvpn}")
 
         # 准备 pidfile
         config_basename = os.path.splitext(os.path.basename(config_path))[0]
@@ -559,10 +905,13 @@ def start_openvpn(config_path):
         except Exception as e:
             log_debug(f"start_openvpn: 清理旧 pidfile 失败 (无害) - {e}")
 
-        cmd = ['openvpn', '--config', config_path, '--daemon', '--writepid', pid_file]
+        # daemon 化之后 openvpn 的输出默认进 syslog, 用 --log-append 写入会话日志
+        log_file, log_path = open_session_log("openvpn.log")
+        log_start = log_file.tell()
+        cmd = [openvpn, '--config', config_path, '--daemon', '--writepid', pid_file,
+               '--log-append', log_path]
         log_debug(f"start_openvpn: 启动命令 {' '.join(cmd)}")
 
-        log_file = open("/tmp/openvpn.log", "w")
         process = subprocess.Popen(cmd, stdout=log_file, stderr=log_file)
         log_file.close()
         log_debug(f"start_openvpn: Popen 完成, 初始 PID={process.pid} (daemon 后无效)")
@@ -593,15 +942,13 @@ def start_openvpn(config_path):
             return pid
 
         print("错误: OpenVPN 启动失败", file=sys.stderr)
-        log_debug("start_openvpn: ✗ 三种策略均失败")
-        _dump_openvpn_log()
+        log_error("start_openvpn: ✗ 三种策略均失败")
+        _dump_openvpn_log(log_path, log_start)
         return None
 
     except Exception as e:
         print(f"启动 OpenVPN 失败: {e}", file=sys.stderr)
-        log_debug(f"start_openvpn: 异常 - {e}")
-        import traceback
-        log_debug(f"start_openvpn: 堆栈 - {traceback.format_exc()}")
+        log_error(f"start_openvpn: 异常 - {e}", exc_info=True)
         return None
 
 
@@ -678,20 +1025,40 @@ def _find_openvpn_pid_proc(config_path):
     return None
 
 
-def _dump_openvpn_log(max_bytes=1000):
-    """打印 openvpn 日志，辅助排查启动失败原因。"""
+def tail_lines(path, n=40, start=0, block_size=8192):
+    """
+    从文件末尾倒序分块读取最后 n 行 (真正的错误通常在日志末尾)
+    start: 只看该偏移量之后的内容 (本次启动追加的部分)
+    """
     try:
-        with open("/tmp/openvpn.log", "r") as f:
-            content = f.read(max_bytes)
-        if content:
-            log_debug(f"openvpn log:\n{content}")
-            print(f"OpenVPN 日志:\n{content}", file=sys.stderr)
-    except Exception:
-        pass
-
-
-def start_v2ray(config_path):
-    """启动 V2Ray/Xray"""
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            data = b""
+            while pos > start and data.count(b"\n") <= n:
+                read_size = min(block_size, pos - start)
+                pos -= read_size
+                f.seek(pos)
+                data = f.read(read_size) + data
+    except OSError:
+        return []
+    return data.decode("utf-8", errors="replace").splitlines()[-n:]
+
+
+def _dump_openvpn_log(log_path, start=0, max_lines=40):
+    """打印 openvpn 日志最后几行，辅助排查启动失败原因。"""
+    lines = tail_lines(log_path, max_lines, start)
+    if lines:
+        content = "\n".join(lines)
+        log_error(f"openvpn log:\n{content}")
+        print(f"OpenVPN 日志 ({log_path}):\n{content}", file=sys.stderr)
+
+
+def start_v2ray(config_path, assets_dir=None):
+    """
+    启动 V2Ray/Xray
+    assets_dir: 客户端编译的 geo 文件目录 (只含配置引用的分类), 为 None 时使用系统 geo 目录
+    """
     try:
         # 【增强】启动前检查 geo 文件 (优先使用预打包文件,带超时控制)
         print("检查 geo 数据文件...", file=sys.stderr)
@@ -713,12 +1080,7 @@ def start_v2ray(config_path):
 
         # 检查 systemd 服务是否在运行
         log_debug("检查 v2ray.service 状态...")
-        systemd_check = subprocess.run(
-            ['systemctl', 'is-active', 'v2ray.service'],
-            capture_output=True,
-            text=True
-        )
-        if systemd_check.returncode == 0:
+        if is_systemd_unit_active('v2ray.service'):
             log_debug("警告: v2ray.service 正在运行,尝试停止...")
             print("警告: 检测到 v2ray.service 正在运行,将先停止它", file=sys.stderr)
             subprocess.run(['systemctl', 'stop', 'v2ray.service'], capture_output=True)
@@ -735,14 +1097,10 @@ def start_v2ray(config_path):
 
         log_debug(f"start_v2ray: 使用 {binary}, 配置文件 {config_path}")
 
-        # 检测版本以确定正确的命令行格式
-        version_result = subprocess.run(
-            [binary, 'version'],
-            capture_output=True,
-            text=True
-        )
-
-        if 'V2Ray 4' in version_result.stdout or 'V2Ray 3' in version_result.stdout:
+        # 检测版本以确定正确的命令行格式 (按二进制文件缓存)
+        core_info = get_core_info(binary)
+        log_debug(f"start_v2ray: 版本 {core_info['version']!r}")
+        if core_info['legacy_cli']:
             cmd = [binary, '-config', config_path]
             log_debug(f"start_v2ray: 检测到 V2Ray 4.x/3.x,使用旧格式命令")
         else:
@@ -751,11 +1109,19 @@ def start_v2ray(config_path):
 
         log_debug(f"start_v2ray: 启动命令 {' '.join(cmd)}")
 
-        log_file = open("/tmp/v2ray.log", "w")
+        env = None
+        if assets_dir:
+            env = dict(os.environ, XRAY_LOCATION_ASSET=assets_dir,
+                       V2RAY_LOCATION_ASSET=assets_dir)
+            log_debug(f"start_v2ray: 使用 geo 目录 {assets_dir}")
+
+        log_file, log_path = open_session_log("v2ray.log")
+        log_start = log_file.tell()
         process = subprocess.Popen(
             cmd,
             stdout=log_file,
-            stderr=log_file
+            stderr=log_file,
+            env=env
         )
         log_file.close()
 
@@ -777,11 +1143,10 @@ def start_v2ray(config_path):
         if not stable:
             print("错误: V2Ray 启动失败", file=sys.stderr)
             try:
-                with open("/tmp/v2ray.log", "r") as f:
-                    log_content = f.read(1000)
+                log_content = "\n".join(tail_lines(log_path, 40, log_start))
                 if log_content:
-                    log_debug(f"start_v2ray: v2ray 日志={log_content}")
-                    print(f"V2Ray 日志:\n{log_content}", file=sys.stderr)
+                    log_error(f"start_v2ray: v2ray 日志={log_content}")
+                    print(f"V2Ray 日志 ({log_path}):\n{log_content}", file=sys.stderr)
 
                     if "geoip.dat" in log_content or "geosite.dat" in log_content:
                         print("\n提示: 这可能是 geo 数据文件问题", file=sys.stderr)
@@ -803,18 +1168,14 @@ def start_v2ray(config_path):
 
     except Exception as e:
         print(f"启动 V2Ray 失败: {e}", file=sys.stderr)
-        log_debug(f"start_v2ray: 异常 - {e}")
-        import traceback
-        log_debug(f"start_v2ray: 堆栈 - {traceback.format_exc()}")
+        log_error(f"start_v2ray: 异常 - {e}", exc_info=True)
         return None
 
 
 def is_process_alive(pid):
-    """检查进程是否存在"""
-    log_debug(f"is_process_alive({pid}): 开始检查")
+    """检查进程是否存在 (轮询热路径, 只在异常分支记录日志)"""
     try:
         os.kill(pid, 0)
-        log_debug(f"is_process_alive({pid}): 进程存在")
         return True
     except ProcessLookupError as e:
         log_debug(f"is_process_alive({pid}): ProcessLookupError - {e}")
@@ -827,10 +1188,41 @@ def is_process_alive(pid):
         return False
 
 
-def stop_process(pid):
+STOP_DEADLINE = 8.0          # stop 命令的总时限 (秒), 超时后 SIGKILL
+STOP_POLL_INTERVAL = 0.1     # 等待进程退出的轮询间隔 (秒)
+
+
+def _wait_exit(pid, timeout):
+    """等待进程退出, 返回是否已退出"""
+    deadline = time.monotonic() + timeout
+    while True:
+        if not is_process_alive(pid):
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(STOP_POLL_INTERVAL)
+
+
+def _send_signal(pid, sig):
+    """发送信号, 返回 False 表示进程已不存在"""
+    try:
+        os.kill(pid, sig)
+        log_debug(f"_send_signal({pid}): {sig.name} 发送成功")
+    except ProcessLookupError:
+        return False
+    except OSError as e:
+        flag = '-9' if sig == signal.SIGKILL else '-TERM'
+        log_debug(f"_send_signal({pid}): OSError {e}, 尝试 kill {flag}")
+        result = subprocess.run(['kill', flag, str(pid)], capture_output=True, text=True)
+        log_debug(f"_send_signal({pid}): kill {flag} 返回码={result.returncode}, stderr={result.stderr}")
+    return True
+
+
+def stop_process(pid, term_timeout=5.0):
     """
-    停止进程
+    停止进程: SIGTERM, 最多等待 term_timeout 秒, 仍未退出则 SIGKILL
     如果进程已经不存在 (No such process),视为成功停止
+    进程一退出立即返回, 不按固定间隔空等
     """
     log_debug(f"stop_process({pid}): 开始停止进程")
 
@@ -839,56 +1231,110 @@ def stop_process(pid):
         log_debug(f"stop_process({pid}): 进程不存在,返回 True")
         return True
 
-    try:
-        log_debug(f"stop_process({pid}): 发送 SIGTERM")
-        os.kill(pid, signal.SIGTERM)
-        log_debug(f"stop_process({pid}): SIGTERM 发送成功")
-    except ProcessLookupError:
+    started = time.monotonic()
+    if not _send_signal(pid, signal.SIGTERM):
         print(f"  进程 {pid} 已退出")
-        log_debug(f"stop_process({pid}): ProcessLookupError 在 SIGTERM,返回 True")
         return True
-    except OSError as e:
-        print(f"  os.kill({pid}, SIGTERM) 失败: {e}, 尝试 kill 命令...")
-        log_debug(f"stop_process({pid}): OSError 在 SIGTERM - {e}, 尝试 kill 命令")
-        result = subprocess.run(['kill', '-TERM', str(pid)], capture_output=True, text=True)
-        log_debug(f"stop_process({pid}): kill -TERM 返回码={result.returncode}, stderr={result.stderr}")
 
-    log_debug(f"stop_process({pid}): 等待进程终止 (最多5秒)")
-    for i in range(10):
-        if not is_process_alive(pid):
-            print(f"  进程 {pid} 已终止")
-            log_debug(f"stop_process({pid}): 进程已终止 (耗时 {i*0.5}秒),返回 True")
-            return True
-        time.sleep(0.5)
+    if _wait_exit(pid, term_timeout):
+        print(f"  进程 {pid} 已终止")
+        log_debug(f"stop_process({pid}): 进程已终止 (耗时 {time.monotonic() - started:.2f}秒)")
+        return True
 
     print(f"  进程 {pid} 未响应 SIGTERM,发送 SIGKILL...")
-    log_debug(f"stop_process({pid}): SIGTERM 超时,发送 SIGKILL")
-    try:
-        os.kill(pid, signal.SIGKILL)
-        log_debug(f"stop_process({pid}): SIGKILL 发送成功")
-    except ProcessLookupError:
-        log_debug(f"stop_process({pid}): ProcessLookupError 在 SIGKILL,返回 True")
+    log_warning(f"stop_process({pid}): SIGTERM 超时,发送 SIGKILL")
+    if not _send_signal(pid, signal.SIGKILL):
         return True
-    except OSError as e:
-        log_debug(f"stop_process({pid}): OSError 在 SIGKILL - {e}, 尝试 kill -9")
-        result = subprocess.run(['kill', '-9', str(pid)], capture_output=True, text=True)
-        log_debug(f"stop_process({pid}): kill -9 返回码={result.returncode}, stderr={result.stderr}")
 
-    time.sleep(1)
-    if not is_process_alive(pid):
+    if _wait_exit(pid, 1.0):
         print(f"  进程 {pid} 已强制终止")
         log_debug(f"stop_process({pid}): SIGKILL 成功,返回 True")
         return True
 
     print(f"  警告: 进程 {pid} 可能仍在运行", file=sys.stderr)
-    log_debug(f"stop_process({pid}): 进程仍在运行,返回 False")
+    log_error(f"stop_process({pid}): 进程仍在运行,返回 False")
     return False
 
 
+def reconnect_openvpn(pid):
+    """
+    向 OpenVPN 发送 SIGUSR1 软重启: 进程、tun 设备和路由保持不变, 只重新协商会话
+    (运行时配置带 persist-tun / persist-key, 见 core.ovpn_session)
+    只接受 openvpn 进程, 避免以 root 身份向任意进程发信号
+    """
+    try:
+        with open(f"/proc/{pid}/comm") as f:
+            comm = f.read().strip()
+    except OSError as e:
+        print(f"错误: 进程 {pid} 不存在", file=sys.stderr)
+        log_debug(f"reconnect_openvpn({pid}): 读取 comm 失败 - {e}")
+        return False
+    if comm != "openvpn":
+        print(f"错误: PID {pid} 不是 openvpn 进程 ({comm})", file=sys.stderr)
+        log_warning(f"reconnect_openvpn({pid}): 拒绝向 {comm} 发送信号")
+        return False
+    try:
+        os.kill(pid, signal.SIGUSR1)
+    except OSError as e:
+        print(f"错误: 发送 SIGUSR1 失败: {e}", file=sys.stderr)
+        log_error(f"reconnect_openvpn({pid}): 发送 SIGUSR1 失败 - {e}")
+        return False
+    log_info(f"reconnect_openvpn({pid}): 已发送 SIGUSR1")
+    print("OPENVPN_STATUS: SIGNALED")
+    return True
+
+
+def stop_processes(targets, deadline=STOP_DEADLINE):
+    """
+    并行停止多个进程, 总耗时取决于最慢退出的那个
+    targets: [(name, pid), ...]
+    返回: {name: bool}
+    """
+    # 给 SIGKILL 和确认留出约 1.5 秒
+    term_timeout = max(0.5, deadline - 1.5)
+    results = {}
+
+    def _stop(name, pid):
+        results[name] = stop_process(pid, term_timeout)
+
+    threads = []
+    for name, pid in targets:
+        print(f"正在停止 {name} (PID: {pid})...")
+        t = threading.Thread(target=_stop, args=(name, pid), name=f"stop-{name}", daemon=True)
+        t.start()
+        threads.append(t)
+
+    end = time.monotonic() + deadline + 1.0
+    for t in threads:
+        t.join(max(0.0, end - time.monotonic()))
+    for name, _ in targets:
+        results.setdefault(name, False)
+    return results
+
+
 ########################################
 # TProxy 透明代理相关函数
 ########################################
 
+# 客户端编译的规则集 (tproxy-apply) 当前应用的状态, 重启后随 /run 清空
+TPROXY_STATE_DIR = "/run/ov2n"
+TPROXY_STATE_FILE = os.path.join(TPROXY_STATE_DIR, "tproxy.json")
+
+_RULESET_HEADER_RE = re.compile(
+    r"^# ov2n-tproxy port=(\d+) vps_ip=([0-9A-Za-z.:-]+) mark=(\d+) table=(\d+)$")
+# 规则集只允许 tproxy_setup 会生成的规则, 其余内容一律拒绝
+_RULESET_LINE_RES = [re.compile(p) for p in (
+    r"^\*mangle$",
+    r"^:V2RAY - \[0:0\]$",
+    r"^-A V2RAY -d [0-9A-Za-z.:/-]+ -j RETURN$",
+    r"^-A V2RAY -m mark --mark \d+ -j RETURN$",
+    r"^-A V2RAY -p (tcp|udp) -j MARK --set-mark \d+$",
+    r"^-A (OUTPUT|PREROUTING) -j V2RAY$",
+    r"^-A PREROUTING -m mark --mark \d+ -p (tcp|udp) -j TPROXY --on-port \d+ --tproxy-mark \d+$",
+    r"^COMMIT$",
+)]
+
+
 def run_cmd(cmd, ignore_error=False):
     """执行 shell 命令"""
     result = subprocess.run(
@@ -909,8 +1355,14 @@ def tproxy_clean(v2ray_port, vps_ip, mark, table):
     run_cmd(f"iptables -t mangle -D OUTPUT -j V2RAY", ignore_error=True)
     run_cmd(f"iptables -t mangle -D PREROUTING -j V2RAY", ignore_error=True)
 
-    run_cmd(f"iptables -t mangle -D PREROUTING -p tcp -m mark --mark {mark} -j TPROXY --on-port {v2ray_port} --tproxy-mark {mark}", ignore_error=True)
-    run_cmd(f"iptables -t mangle -D PREROUTING -p udp -m mark --mark {mark} -j TPROXY --on-port {v2ray_port} --tproxy-mark {mark}", ignore_error=True)
+    # 双实例切换 (tproxy-handoff) 后 TPROXY 可能指向另一个端口
+    ports = {v2ray_port}
+    state = _load_tproxy_state()
+    if state.get("port") and state.get("mark") == mark:
+        ports.add(state["port"])
+    for port in ports:
+        run_cmd(f"iptables -t mangle -D PREROUTING -p tcp -m mark --mark {mark} -j TPROXY --on-port {port} --tproxy-mark {mark}", ignore_error=True)
+        run_cmd(f"iptables -t mangle -D PREROUTING -p udp -m mark --mark {mark} -j TPROXY --on-port {port} --tproxy-mark {mark}", ignore_error=True)
 
     run_cmd("iptables -t mangle -F V2RAY", ignore_error=True)
     run_cmd("iptables -t mangle -X V2RAY", ignore_error=True)
@@ -925,6 +1377,11 @@ def tproxy_clean(v2ray_port, vps_ip, mark, table):
 
     run_cmd(f"ip route flush table {table}", ignore_error=True)
 
+    try:
+        os.unlink(TPROXY_STATE_FILE)
+    except OSError:
+        pass
+
     print("[tproxy] ✓ 旧规则清理完成")
 
 
@@ -981,9 +1438,152 @@ def tproxy_setup(v2ray_port, vps_ip, mark, table):
     return True
 
 
+def _parse_ruleset(text):
+    """校验规则集, 返回首行携带的参数; 含不允许的规则时抛出 ValueError"""
+    lines = text.splitlines()
+    header = _RULESET_HEADER_RE.match(lines[0]) if lines else None
+    if not header:
+        raise ValueError("规则集缺少参数头")
+    for line in lines[1:]:
+        if line and not any(p.match(line) for p in _RULESET_LINE_RES):
+            raise ValueError(f"规则集含有不允许的规则: {line}")
+    port, vps_ip, mark, table = header.groups()
+    return {"port": int(port), "vps_ip": vps_ip, "mark": int(mark), "table": int(table)}
+
+
+def _load_tproxy_state():
+    try:
+        with open(TPROXY_STATE_FILE, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _tproxy_active(mark):
+    if not run_cmd("iptables -t mangle -C OUTPUT -j V2RAY", ignore_error=True):
+        return False
+    ret = subprocess.run(["ip", "rule", "list", "fwmark", str(mark)],
+                         capture_output=True, text=True)
+    return ret.returncode == 0 and bool(ret.stdout.strip())
+
+
+def _read_ruleset(rules_path, expected_sha256):
+    """只读取一次文件并校验 sha256 和规则白名单, 返回 (文本, 参数); 失败时返回 None"""
+    try:
+        with open(rules_path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        print(f"错误: 无法读取规则集: {e}", file=sys.stderr)
+        return None
+    if hashlib.sha256(data).hexdigest() != expected_sha256:
+        print("错误: 规则集哈希不匹配", file=sys.stderr)
+        return None
+    text = data.decode("utf-8", errors="replace")
+    try:
+        return text, _parse_ruleset(text)
+    except ValueError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return None
+
+
+def _save_tproxy_state(params, sha256):
+    try:
+        os.makedirs(TPROXY_STATE_DIR, mode=0o755, exist_ok=True)
+        with open(TPROXY_STATE_FILE, "w", encoding="utf-8") as f:
+            json.dump(dict(params, sha256=sha256), f)
+    except OSError as e:
+        log_debug(f"写入 tproxy 状态文件失败 (无害): {e}")
+
+
+def tproxy_apply(rules_path, expected_sha256):
+    """
+    应用客户端编译的规则集 (iptables-restore 格式)
+    与当前已应用的规则集相同且规则仍在时不做任何改动
+    返回: "OK" / "UNCHANGED" / None (失败)
+    """
+    ruleset = _read_ruleset(rules_path, expected_sha256)
+    if ruleset is None:
+        return None
+    text, params = ruleset
+
+    state = _load_tproxy_state()
+    if state.get("sha256") == expected_sha256 and _tproxy_active(params["mark"]):
+        print("[tproxy] 规则集未变化, 保持现有规则")
+        log_debug(f"tproxy_apply: 规则集未变化 {expected_sha256[:12]}")
+        return "UNCHANGED"
+
+    if state.get("vps_ip"):
+        tproxy_clean(state["port"], state["vps_ip"], state["mark"], state["table"])
+    tproxy_clean(params["port"], params["vps_ip"], params["mark"], params["table"])
+
+    run_cmd("sysctl -w net.ipv4.ip_forward=1", ignore_error=True)
+    run_cmd(f"ip rule add fwmark {params['mark']} table {params['table']}", ignore_error=True)
+    run_cmd(f"ip route add local 0.0.0.0/0 dev lo table {params['table']}", ignore_error=True)
+
+    print("[tproxy] 应用规则集...")
+    result = subprocess.run(["iptables-restore", "--noflush"], input=text,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"错误: iptables-restore 失败: {result.stderr.strip()}", file=sys.stderr)
+        tproxy_clean(params["port"], params["vps_ip"], params["mark"], params["table"])
+        return None
+
+    _save_tproxy_state(params, expected_sha256)
+    print("[tproxy] ✓ 透明代理配置完成")
+    return "OK"
+
+
+def tproxy_handoff(rules_path, expected_sha256):
+    """
+    双实例切换: 在一个 iptables-restore 事务中重建 V2RAY 链并把 TPROXY --on-port
+    从当前端口换到规则集中的端口, 不经过"清理 → 重建"的空窗期
+    当前没有由 tproxy-apply 建立的规则 (或 mark / table 不同) 时退化为 tproxy_apply
+    返回: "SWITCHED" / "OK" / "UNCHANGED" / None (失败)
+    """
+    ruleset = _read_ruleset(rules_path, expected_sha256)
+    if ruleset is None:
+        return None
+    text, params = ruleset
+
+    state = _load_tproxy_state()
+    if (not state.get("port") or state.get("mark") != params["mark"]
+            or state.get("table") != params["table"] or not _tproxy_active(params["mark"])):
+        log_debug("tproxy_handoff: 没有可切换的现有规则, 完整应用规则集")
+        return tproxy_apply(rules_path, expected_sha256)
+
+    mark, old_port = params["mark"], state["port"]
+    lines = ["*mangle", "-F V2RAY"]
+    for line in text.splitlines()[1:]:
+        # 链和 OUTPUT / PREROUTING 的跳转已经存在, 只替换链内规则和 TPROXY 目标
+        if line.startswith("-A V2RAY ") or "-j TPROXY " in line:
+            lines.append(line)
+    if old_port != params["port"]:
+        lines += [f"-D PREROUTING -m mark --mark {mark} -p {proto} -j TPROXY "
+                  f"--on-port {old_port} --tproxy-mark {mark}" for proto in ("tcp", "udp")]
+    else:
+        lines = [line for line in lines if "-j TPROXY " not in line]
+    lines.append("COMMIT")
+
+    print(f"[tproxy] 切换 TPROXY 端口 {old_port} -> {params['port']}...")
+    started = time.monotonic()
+    result = subprocess.run(["iptables-restore", "--noflush"], input="\n".join(lines) + "\n",
+                            capture_output=True, text=True)
+    elapsed = (time.monotonic() - started) * 1000
+    if result.returncode != 0:
+        # 事务失败时规则保持原样, 旧实例继续工作
+        print(f"错误: iptables-restore 失败: {result.stderr.strip()}", file=sys.stderr)
+        return None
+
+    _save_tproxy_state(params, expected_sha256)
+    log_info(f"tproxy_handoff: {old_port} -> {params['port']}, 耗时 {elapsed:.1f}ms")
+    print(f"TPROXY_SWITCH_MS: {elapsed:.1f}")
+    print("[tproxy] ✓ 已切换")
+    return "SWITCHED"
+
+
 def main():
-    log_debug("=" * 50)
-    log_debug(f"脚本启动: {' '.join(sys.argv)}")
+    log_info(f"脚本启动: {' '.join(sys.argv)}")
     log_debug(f"UID={os.getuid()}, EUID={os.geteuid()}")
 
     if len(sys.argv) < 2:
@@ -1030,60 +1630,71 @@ def main():
 
         openvpn_pid = None
         v2ray_pid = None
+        deadline = STOP_DEADLINE
+        # 可选: 同时清理 tproxy 规则 (提供 --vps-ip 时), 省去一次单独的授权
+        tproxy_args = {"port": 12345, "vps_ip": None, "mark": 1, "table": 100}
 
         i = 2
         while i < len(sys.argv):
-            if sys.argv[i] == "--openvpn-pid" and i + 1 < len(sys.argv):
-                openvpn_pid = int(sys.argv[i + 1])
+            arg = sys.argv[i]
+            value = sys.argv[i + 1] if i + 1 < len(sys.argv) else None
+            if value is None:
+                log_debug(f"参数缺少值: {arg}")
+                i += 1
+            elif arg == "--openvpn-pid":
+                openvpn_pid = int(value)
                 log_debug(f"接收到 openvpn_pid={openvpn_pid}")
                 i += 2
-            elif sys.argv[i] == "--v2ray-pid" and i + 1 < len(sys.argv):
-                v2ray_pid = int(sys.argv[i + 1])
+            elif arg == "--v2ray-pid":
+                v2ray_pid = int(value)
                 log_debug(f"接收到 v2ray_pid={v2ray_pid}")
                 i += 2
+            elif arg == "--deadline":
+                deadline = float(value)
+                i += 2
+            elif arg == "--port":
+                tproxy_args["port"] = int(value)
+                i += 2
+            elif arg == "--vps-ip":
+                tproxy_args["vps_ip"] = value
+                i += 2
+            elif arg == "--mark":
+                tproxy_args["mark"] = int(value)
+                i += 2
+            elif arg == "--table":
+                tproxy_args["table"] = int(value)
+                i += 2
             else:
-                log_debug(f"未知参数: {sys.argv[i]}")
+                log_debug(f"未知参数: {arg}")
                 i += 1
 
-        all_ok = True
+        # 先撤掉 tproxy 规则, 避免 v2ray 退出后流量被黑洞
+        if tproxy_args["vps_ip"]:
+            tproxy_clean(tproxy_args["port"], tproxy_args["vps_ip"],
+                         tproxy_args["mark"], tproxy_args["table"])
+            print("TPROXY_STATUS: CLEANED")
 
+        targets = []
         if openvpn_pid:
-            print(f"正在停止 OpenVPN (PID: {openvpn_pid})...")
-            if not stop_process(openvpn_pid):
-                log_debug(f"stop_process(openvpn_pid={openvpn_pid}) 返回 False")
-                all_ok = False
-            else:
-                log_debug(f"stop_process(openvpn_pid={openvpn_pid}) 返回 True")
-
+            targets.append(('openvpn', openvpn_pid))
         if v2ray_pid:
-            print(f"正在停止 V2Ray (PID: {v2ray_pid})...")
-            if not stop_process(v2ray_pid):
-                log_debug(f"stop_process(v2ray_pid={v2ray_pid}) 返回 False")
-                all_ok = False
-            else:
-                log_debug(f"stop_process(v2ray_pid={v2ray_pid}) 返回 True")
-
-        log_debug("验证指定 PID 是否已停止...")
-        still_running = []
+            targets.append(('v2ray', v2ray_pid))
 
-        if openvpn_pid and is_process_alive(openvpn_pid):
-            log_debug(f"警告: OpenVPN PID {openvpn_pid} 仍在运行")
-            still_running.append(('openvpn', openvpn_pid))
+        started = time.monotonic()
+        results = stop_processes(targets, deadline)
+        log_info(f"stop: 结果={results}, 耗时 {time.monotonic() - started:.2f}秒")
 
-        if v2ray_pid and is_process_alive(v2ray_pid):
-            log_debug(f"警告: V2Ray PID {v2ray_pid} 仍在运行")
-            still_running.append(('v2ray', v2ray_pid))
+        still_running = [(name, pid) for name, pid in targets
+                         if not results.get(name) and is_process_alive(pid)]
 
         if still_running:
-            log_debug(f"✗ 仍有 {len(still_running)} 个进程在运行: {still_running}")
+            log_error(f"✗ 仍有 {len(still_running)} 个进程在运行: {still_running}")
             print(f"警告: 以下进程未能停止:", file=sys.stderr)
             for pname, pid in still_running:
                 print(f"  - {pname}: PID {pid}", file=sys.stderr)
             print("停止失败: 部分进程仍在运行", file=sys.stderr)
-            log_debug("停止命令失败,退出码 1")
             sys.exit(1)
         else:
-            log_debug(f"✓ 所有进程已停止,all_ok={all_ok}")
             print("停止成功")
             log_debug("停止命令成功,退出码 0")
             sys.exit(0)
@@ -1150,18 +1761,51 @@ def main():
         print("TPROXY_STATUS: CLEANED")
         sys.exit(0)
 
+    elif command == "tproxy-apply":
+        if len(sys.argv) < 5 or sys.argv[3] != "--sha256":
+            print("用法: vpn-helper.py tproxy-apply <rules_file> --sha256 <hex>", file=sys.stderr)
+            sys.exit(1)
+
+        status = tproxy_apply(sys.argv[2], sys.argv[4])
+        if status:
+            print(f"TPROXY_STATUS: {status}")
+            sys.exit(0)
+        else:
+            print("TPROXY_STATUS: FAILED", file=sys.stderr)
+            sys.exit(1)
+
+    elif command == "tproxy-handoff":
+        if len(sys.argv) < 5 or sys.argv[3] != "--sha256":
+            print("用法: vpn-helper.py tproxy-handoff <rules_file> --sha256 <hex>", file=sys.stderr)
+            sys.exit(1)
+
+        status = tproxy_handoff(sys.argv[2], sys.argv[4])
+        if status:
+            print(f"TPROXY_STATUS: {status}")
+            sys.exit(0)
+        else:
+            print("TPROXY_STATUS: FAILED", file=sys.stderr)
+            sys.exit(1)
+
     elif command == "start-v2ray-only":
         if len(sys.argv) < 3:
-            print("用法: vpn-helper.py start-v2ray-only <v2ray_config>", file=sys.stderr)
+            print("用法: vpn-helper.py start-v2ray-only <v2ray_config> [--assets <geo_dir>]", file=sys.stderr)
             sys.exit(1)
         
         v2ray_config = sys.argv[2]
         if not os.path.exists(v2ray_config):
             print(f"错误: V2Ray 配置文件不存在: {v2ray_config}", file=sys.stderr)
             sys.exit(1)
+
+        assets_dir = None
+        if len(sys.argv) >= 5 and sys.argv[3] == "--assets":
+            assets_dir = sys.argv[4]
+            if not os.path.isdir(assets_dir):
+                log_warning(f"geo 目录不存在, 使用系统 geo 文件: {assets_dir}")
+                assets_dir = None
         
         print("正在启动 V2Ray...")
-        v2ray_pid = start_v2ray(v2ray_config)
+        v2ray_pid = start_v2ray(v2ray_config, assets_dir)
         
         if v2ray_pid:
             print("启动成功")
@@ -1170,6 +1814,17 @@ def main():
             print("启动失败", file=sys.stderr)
             sys.exit(1)
 
+    elif command == "reconnect-vpn":
+        if len(sys.argv) < 4 or sys.argv[2] != "--openvpn-pid":
+            print("用法: vpn-helper.py reconnect-vpn --openvpn-pid <pid>", file=sys.stderr)
+            sys.exit(1)
+        try:
+            pid = int(sys.argv[3])
+        except ValueError:
+            print(f"错误: 无效的 PID: {sys.argv[3]}", file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0 if reconnect_openvpn(pid) else 1)
+
     elif command == "start-vpn-only":
         if len(sys.argv) < 3:
             print("用法: vpn-helper.py start-vpn-only <vpn_config>", file=sys.stderr)
@@ -1191,7 +1846,7 @@ def main():
             sys.exit(1)
     else:
         print(f"未知命令: {command}", file=sys.stderr)
-        print("可用命令: start, stop, start-vpn-only, start-v2ray-only, tproxy-start, tproxy-stop", file=sys.stderr)
+        print("可用命令: start, stop, reconnect-vpn, start-vpn-only, start-v2ray-only, tproxy-start, tproxy-apply, tproxy-handoff, tproxy-stop", file=sys.stderr)
         sys.exit(1)
 
 
@@ -1199,14 +1854,13 @@ if __name__ == "__main__":
     try:
         main()
     except KeyboardInterrupt:
-        log_debug("脚本被 Ctrl+C 中断")
+        log_warning("脚本被 Ctrl+C 中断")
         print("\n脚本被中断", file=sys.stderr)
         sys.exit(130)
     except Exception as e:
-        log_debug(f"未捕获的异常: {e}")
-        import traceback
-        log_debug(f"异常堆栈:\n{traceback.format_exc()}")
+        log_error(f"未捕获的异常: {e}", exc_info=True)
         print(f"致命错误: {e}", file=sys.stderr)
         sys.exit(1)
     finally:
-        log_debug("脚本执行结束")
\ No newline at end of file
+        log_debug("脚本执行结束")
+        logging.shutdown()
\ No newline at end of file
@@ -0,0 +1,10 @@
+"""
+测试公共设置：把仓库根目录加入 sys.path，测试只导入不依赖 PyQt5 的 core 模块。
+
+运行（在仓库根目录）：
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
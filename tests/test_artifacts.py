@@ -0,0 +1,193 @@
+"""core.artifacts：运行时产物编译、geo 裁剪与缓存复用。"""
+import json
+import os
+import socket
+import threading
+
+import pytest
+
+from core import artifacts, hot_reload
+from core.artifacts import (
+    KIND_GEO, KIND_RULES, KIND_RUNTIME, ArtifactStore, compile_artifacts, geo_references,
+    mark_in_use, trim_geo_file,
+)
+
+
+def _field(number: int, payload: bytes) -> bytes:
+    assert len(payload) < 128
+    return bytes([number << 3 | 2, len(payload)]) + payload
+
+
+def _geo_list(*codes: str) -> bytes:
+    # GeoIPList / GeoSiteList：repeated 字段 1，每个条目字段 1 为分类名，字段 2 为内容
+    return b"".join(_field(1, _field(1, code.encode()) + _field(2, b"x" * 8)) for code in codes)
+
+
+@pytest.fixture
+def geo_source(tmp_path):
+    directory = tmp_path / "geo"
+    directory.mkdir()
+    (directory / "geoip.dat").write_bytes(_geo_list("CN", "PRIVATE", "US"))
+    (directory / "geosite.dat").write_bytes(_geo_list("CN", "GOOGLE", "CATEGORY-ADS"))
+    return str(directory)
+
+
+def _config(address: str = "1.1.1.1") -> dict:
+    return {
+        "inbounds": [{"tag": "socks", "port": 1080, "protocol": "socks"}],
+        "outbounds": [
+            {"tag": "proxy", "protocol": "shadowsocks", "settings": {"servers": [
+                {"address": address, "port": 8388, "method": "aes-256-gcm", "password": "x"}]}},
+            {"tag": "direct", "protocol": "freedom"},
+        ],
+        "routing": {"rules": [
+            {"type": "field", "ip": ["geoip:private", "geoip:cn"], "outboundTag": "direct"},
+            {"type": "field", "domain": ["geosite:cn"], "outboundTag": "direct"},
+        ]},
+    }
+
+
+def _write(path, config: dict) -> str:
+    path.write_text(json.dumps(config), encoding="utf-8")
+    return str(path)
+
+
+TPROXY = {"port": 12345, "vps_ip": "1.1.1.1", "mark": 1, "table": 100}
+
+
+def test_trim_geo_file_keeps_referenced_codes():
+    data = _geo_list("CN", "PRIVATE", "US")
+    assert trim_geo_file(data, {"cn", "us"}) == _geo_list("CN", "US")
+    assert trim_geo_file(data, set()) == b""
+    with pytest.raises(ValueError):
+        trim_geo_file(data[:-3], {"cn"})
+    with pytest.raises(ValueError):
+        trim_geo_file(b"\x12\x00", {"cn"})
+
+
+def test_geo_references():
+    refs = geo_references({"rules": [{"domain": ["geosite:!CN@ads", "full:a.com"]},
+                                     {"ip": ["geoip:private"]}]})
+    assert refs == {"geoip": {"private"}, "geosite": {"cn"}}
+    assert geo_references({"rules": [{"domain": ["ext:custom.dat:tag"]}]}) is None
+
+
+def test_second_compile_reuses_everything(tmp_path, geo_source):
+    config = _write(tmp_path / "config.json", _config())
+    store = ArtifactStore(str(tmp_path / "artifacts"))
+    first = compile_artifacts(config, tproxy=TPROXY, geo_source=geo_source, store=store)
+    assert sorted(first.rebuilt) == [KIND_GEO, KIND_RULES, KIND_RUNTIME]
+    second = compile_artifacts(config, tproxy=TPROXY, geo_source=geo_source, store=store)
+    assert second.rebuilt == []
+    assert second.entries == first.entries
+    with open(os.path.join(first.geo_dir, "geosite.dat"), "rb") as f:
+        assert f.read() == _geo_list("CN")
+
+
+def test_node_change_does_not_rebuild_geo(tmp_path, geo_source):
+    path = tmp_path / "config.json"
+    store = ArtifactStore(str(tmp_path / "artifacts"))
+    compile_artifacts(_write(path, _config()), tproxy=TPROXY, geo_source=geo_source, store=store)
+    tproxy = dict(TPROXY, vps_ip="2.2.2.2")
+    manifest = compile_artifacts(_write(path, _config("2.2.2.2")), tproxy=tproxy,
+                                 geo_source=geo_source, store=store)
+    assert sorted(manifest.rebuilt) == [KIND_RULES, KIND_RUNTIME]
+
+
+def test_new_geo_reference_rebuilds_geo(tmp_path, geo_source):
+    path = tmp_path / "config.json"
+    store = ArtifactStore(str(tmp_path / "artifacts"))
+    compile_artifacts(_write(path, _config()), geo_source=geo_source, store=store)
+    config = _config()
+    config["routing"]["rules"].append(
+        {"type": "field", "domain": ["geosite:google"], "outboundTag": "proxy"})
+    manifest = compile_artifacts(_write(path, config), geo_source=geo_source, store=store)
+    assert sorted(manifest.rebuilt) == [KIND_GEO, KIND_RUNTIME]
+
+
+def test_runtime_enables_api_and_marks_proxy_for_tproxy(tmp_path):
+    config = _write(tmp_path / "config.json", _config())
+    store = ArtifactStore(str(tmp_path / "artifacts"))
+    manifest = compile_artifacts(config, tproxy=TPROXY, geo_source=None, store=store)
+    with open(manifest.runtime_path, encoding="utf-8") as f:
+        runtime = json.load(f)
+    assert "api" in runtime
+    proxy = runtime["outbounds"][0]
+    assert proxy["streamSettings"]["sockopt"]["mark"] == artifacts.TPROXY_SKIP_MARK
+    with open(manifest.rules_path, encoding="utf-8") as f:
+        assert "-A V2RAY -d 1.1.1.1 -j RETURN" in f.read()
+
+
+def test_api_port_is_recorded_and_reused_while_free(tmp_path):
+    config = _write(tmp_path / "config.json", _config())
+    store = ArtifactStore(str(tmp_path / "artifacts"))
+    first = compile_artifacts(config, geo_source=None, store=store)
+    with open(first.runtime_path, encoding="utf-8") as f:
+        assert hot_reload.api_inbound_port(json.load(f)) == first.api_port
+    assert store.load_manifest().api_port == first.api_port
+
+    again = compile_artifacts(config, geo_source=None, store=store)
+    assert (again.api_port, again.rebuilt) == (first.api_port, [])
+
+    # 端口被占用（如切换时旧核心仍在运行）时另选端口
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", first.api_port))
+        sock.listen(1)
+        moved = compile_artifacts(config, geo_source=None, store=store)
+    assert moved.api_port not in (None, first.api_port)
+
+    # 热更新时沿用运行中核心的端口
+    kept = compile_artifacts(config, geo_source=None, store=store, api_port=first.api_port)
+    assert kept.api_port == first.api_port and kept.runtime_path == first.runtime_path
+
+
+def test_no_api_when_no_port_can_be_bound(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, "pick_api_port", lambda: None)
+    config = _write(tmp_path / "config.json", _config())
+    manifest = compile_artifacts(config, geo_source=None,
+                                 store=ArtifactStore(str(tmp_path / "artifacts")))
+    assert manifest.api_port is None
+    with open(manifest.runtime_path, encoding="utf-8") as f:
+        assert hot_reload.api_server(json.load(f)) is None
+
+
+def test_invalid_config_raises_value_error(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text('{"outbounds": [', encoding="utf-8")
+    with pytest.raises(ValueError):
+        compile_artifacts(str(path), store=ArtifactStore(str(tmp_path / "artifacts")))
+
+
+def test_prune_keeps_runtime_in_use(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, "_in_use", {})
+    path = tmp_path / "config.json"
+    store = ArtifactStore(str(tmp_path / "artifacts"))
+    running = compile_artifacts(_write(path, _config("9.9.9.9")), store=store)
+    mark_in_use(0, running.paths())
+    for i in range(artifacts.KEEP_PER_KIND + 3):
+        compile_artifacts(_write(path, _config(f"10.0.0.{i}")), store=store)
+    assert os.path.exists(running.runtime_path)
+    remaining = os.listdir(os.path.join(store.root, KIND_RUNTIME))
+    assert len(remaining) == artifacts.KEEP_PER_KIND + 1
+
+
+def test_concurrent_compiles(tmp_path, geo_source):
+    store_root = str(tmp_path / "artifacts")
+    paths = [_write(tmp_path / f"config{i}.json", _config(f"10.0.1.{i}")) for i in range(8)]
+    errors, manifests = [], []
+
+    def run(path):
+        try:
+            manifests.append(compile_artifacts(path, geo_source=geo_source,
+                                               store=ArtifactStore(store_root)))
+        except Exception as e:  # noqa: BLE001
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(p,)) for p in paths]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert len({m.geo_dir for m in manifests}) == 1
+    assert all(os.path.exists(m.runtime_path) for m in manifests[-artifacts.KEEP_PER_KIND:])
@@ -0,0 +1,88 @@
+"""core.balancer：均衡器与观测配置生成。"""
+import copy
+
+import pytest
+
+from core.balancer import (
+    BALANCER_TAG, CATCH_ALL_RULE_TAG, balancer_info, build_balanced_config, remove_balancer,
+)
+
+
+def _ss(tag: str, address: str) -> dict:
+    return {"tag": tag, "protocol": "shadowsocks", "settings": {"servers": [
+        {"address": address, "port": 8388, "method": "aes-256-gcm", "password": "x"}]}}
+
+
+def _default_style_config() -> dict:
+    # 与 config_manager.create_default_v2ray_config 相同的结构：没有兜底规则，默认出站为 proxy
+    return {
+        "outbounds": [_ss("proxy", "1.1.1.1"), _ss("backup", "2.2.2.2"),
+                      {"tag": "direct", "protocol": "freedom", "settings": {}}],
+        "routing": {"rules": [
+            {"type": "field", "ip": ["geoip:private"], "outboundTag": "direct"},
+            {"type": "field", "domain": ["geosite:cn"], "outboundTag": "direct"},
+        ]},
+    }
+
+
+def test_default_route_goes_to_balancer():
+    config = _default_style_config()
+    result = build_balanced_config(config)
+    rules = result["routing"]["rules"]
+    assert rules[-1] == {"type": "field", "network": "tcp,udp",
+                         "balancerTag": BALANCER_TAG, "ruleTag": CATCH_ALL_RULE_TAG}
+    assert balancer_info(result)["selector"] == ["proxy", "backup"]
+    assert result["observatory"]["subjectSelector"] == ["proxy", "backup"]
+    assert config == _default_style_config()    # 不修改传入的配置
+
+
+def test_rebuild_does_not_duplicate_catch_all():
+    twice = build_balanced_config(build_balanced_config(_default_style_config()))
+    tags = [r.get("ruleTag") for r in twice["routing"]["rules"]]
+    assert tags.count(CATCH_ALL_RULE_TAG) == 1
+
+
+def test_existing_proxy_rules_are_redirected_without_catch_all():
+    config = _default_style_config()
+    config["routing"]["rules"].append(
+        {"type": "field", "network": "tcp,udp", "outboundTag": "proxy"})
+    rules = build_balanced_config(config)["routing"]["rules"]
+    assert rules[-1] == {"type": "field", "network": "tcp,udp", "balancerTag": BALANCER_TAG}
+    assert all(r.get("ruleTag") != CATCH_ALL_RULE_TAG for r in rules)
+
+
+def test_no_catch_all_when_default_outbound_is_not_proxy():
+    config = _default_style_config()
+    config["outbounds"].insert(0, config["outbounds"].pop())    # direct 为默认出站
+    rules = build_balanced_config(config)["routing"]["rules"]
+    assert all(r.get("ruleTag") != CATCH_ALL_RULE_TAG for r in rules)
+
+
+def test_remove_balancer_restores_routing():
+    config = _default_style_config()
+    config["routing"]["rules"].append(
+        {"type": "field", "domain": ["geosite:google"], "outboundTag": "proxy"})
+    restored = remove_balancer(build_balanced_config(config))
+    assert restored["routing"] == config["routing"]
+    assert "observatory" not in restored
+    assert [ob["tag"] for ob in restored["outbounds"]] == ["proxy", "backup", "direct"]
+
+
+def test_extra_nodes_are_added_and_dropped():
+    config = _default_style_config()
+    result = build_balanced_config(config, extra_outbounds=[("node-7", _ss("x", "3.3.3.3"))],
+                                   strategy="leastLoad")
+    assert balancer_info(result)["selector"] == ["proxy", "backup", "node-7"]
+    assert "burstObservatory" in result and "observatory" not in result
+    node = next(ob for ob in result["outbounds"] if ob["tag"] == "node-7")
+    assert node["streamSettings"]["sockopt"]["mark"] == 255
+    assert all(ob["tag"] != "node-7" for ob in remove_balancer(result)["outbounds"])
+
+
+def test_needs_two_nodes_and_known_strategy():
+    config = copy.deepcopy(_default_style_config())
+    del config["outbounds"][1]
+    with pytest.raises(ValueError):
+        build_balanced_config(config)
+    with pytest.raises(ValueError):
+        build_balanced_config(_default_style_config(), strategy="fastest")
@@ -0,0 +1,51 @@
+"""core.config_io：原子写入保留符号链接和文件权限。"""
+import os
+import stat
+
+import pytest
+
+from core.config_io import atomic_write_bytes, read_text, write_private
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="POSIX 权限与符号链接")
+
+
+def _mode(path) -> int:
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_symlink_target_is_written_and_link_kept(tmp_path):
+    target = tmp_path / "real" / "config.json"
+    target.parent.mkdir()
+    target.write_bytes(b"{}")
+    link = tmp_path / "config.json"
+    link.symlink_to(target)
+
+    atomic_write_bytes(str(link), b'{"a": 1}')
+    assert link.is_symlink()
+    assert target.read_bytes() == b'{"a": 1}'
+    assert read_text(str(link))[0] == '{"a": 1}'
+    assert sorted(os.listdir(tmp_path / "real")) == ["config.json"]   # 没有遗留临时文件
+
+
+def test_existing_mode_is_kept(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_bytes(b"{}")
+    os.chmod(path, 0o600)
+    atomic_write_bytes(str(path), b'{"a": 1}')
+    assert _mode(path) == 0o600
+    assert path.read_bytes() == b'{"a": 1}'
+
+
+def test_new_file_and_private_mode(tmp_path):
+    umask = os.umask(0o022)
+    try:
+        atomic_write_bytes(str(tmp_path / "new.json"), b"{}")
+        assert _mode(tmp_path / "new.json") == 0o644
+
+        secret = tmp_path / "secret.json"
+        secret.write_bytes(b"{}")
+        os.chmod(secret, 0o644)
+        write_private(str(secret), b"{}")
+        assert _mode(secret) == 0o600     # 显式权限优先于已有文件的权限
+    finally:
+        os.umask(umask)
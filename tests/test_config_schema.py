@@ -0,0 +1,113 @@
+"""core.config_schema：配置结构校验。"""
+from core.config_schema import LEVEL_ERROR, LEVEL_WARNING, errors, format_issues, validate
+
+
+def _config() -> dict:
+    return {
+        "inbounds": [
+            {"tag": "socks", "port": 1080, "protocol": "socks"},
+            {"tag": "tproxy", "port": 12345, "protocol": "dokodemo-door",
+             "settings": {"network": "tcp,udp", "followRedirect": True},
+             "streamSettings": {"sockopt": {"tproxy": "tproxy"}}},
+        ],
+        "outbounds": [
+            {"tag": "proxy", "protocol": "vmess", "settings": {"vnext": [
+                {"address": "1.1.1.1", "port": 443, "users": [{"id": "uuid"}]}]}},
+            {"tag": "direct", "protocol": "freedom"},
+        ],
+        "routing": {
+            "rules": [{"type": "field", "inboundTag": ["socks"], "outboundTag": "direct"},
+                      {"type": "field", "network": "tcp,udp", "balancerTag": "b"}],
+            "balancers": [{"tag": "b", "selector": ["proxy"]}],
+        },
+    }
+
+
+def _by_path(config) -> dict:
+    return {issue.path: issue for issue in validate(config)}
+
+
+def test_valid_config_has_no_issues():
+    assert validate(_config()) == []
+
+
+def test_missing_required_fields_are_reported_by_path():
+    config = _config()
+    server = config["outbounds"][0]["settings"]["vnext"][0]
+    server["port"] = 70000
+    del server["users"][0]["id"]
+    issues = _by_path(config)
+    assert "1-65535" in issues["outbounds[0].settings.vnext[0].port"].message
+    assert "outbounds[0].settings.vnext[0].users[0].id" in issues
+
+    config = _config()
+    config["outbounds"][0] = {"tag": "proxy", "protocol": "shadowsocks"}
+    assert "outbounds[0].settings" in _by_path(config)
+
+
+def test_flattened_outbound_settings():
+    config = _config()
+    config["outbounds"][0]["settings"] = {"address": "1.1.1.1", "port": 443, "id": "uuid"}
+    config["outbounds"].append({"tag": "ss", "protocol": "shadowsocks", "settings": {
+        "address": "2.2.2.2", "port": 8388, "method": "aes-256-gcm", "password": "x"}})
+    config["outbounds"].append({"tag": "socks-out", "protocol": "socks", "settings": {
+        "address": "3.3.3.3", "port": 1080}})
+    assert validate(config) == []
+
+    del config["outbounds"][0]["settings"]["id"]
+    del config["outbounds"][2]["settings"]["password"]
+    config["outbounds"][3]["settings"]["port"] = 0
+    assert sorted(_by_path(config)) == [
+        "outbounds[0].settings.id", "outbounds[2].settings.password",
+        "outbounds[3].settings.port"]
+
+    # 两种写法都没有时按 vnext / servers 报告
+    config["outbounds"][2]["settings"] = {}
+    assert "outbounds[2].settings.servers" in _by_path(config)
+
+
+def test_tag_references_and_duplicates():
+    config = _config()
+    config["routing"]["rules"][0]["outboundTag"] = "missing"
+    config["routing"]["rules"][1]["balancerTag"] = "nope"
+    config["outbounds"][1]["tag"] = "proxy"
+    config["routing"]["balancers"][0]["selector"] = ["zzz"]
+    issues = _by_path(config)
+    assert "missing" in issues["routing.rules[0].outboundTag"].message
+    assert "nope" in issues["routing.rules[1].balancerTag"].message
+    assert "重复" in issues["outbounds[1].tag"].message
+    assert issues["routing.balancers[0].selector[0]"].level == LEVEL_WARNING
+
+
+def test_tproxy_inbound_checks():
+    config = _config()
+    config["inbounds"][0]["streamSettings"] = {"sockopt": {"tproxy": "tproxy"}}
+    config["inbounds"][1]["settings"]["followRedirect"] = False
+    issues = _by_path(config)
+    assert "dokodemo-door" in issues["inbounds[0].streamSettings.sockopt.tproxy"].message
+    assert "inbounds[1].settings.followRedirect" in issues
+
+
+def test_port_ranges_and_env():
+    config = _config()
+    config["inbounds"][0]["port"] = "1000-2000,3000"
+    config["inbounds"][1]["port"] = "env:PORT"
+    assert validate(config) == []
+    config["inbounds"][0]["port"] = "1000-70000"
+    assert list(_by_path(config)) == ["inbounds[0].port"]
+
+
+def test_errors_sorted_first_and_formatting():
+    config = _config()
+    config["routing"]["balancers"][0]["selector"] = ["zzz"]     # 警告
+    config["outbounds"][1]["protocol"] = "unknown"               # 错误
+    issues = validate(config)
+    assert [i.level for i in issues] == [LEVEL_ERROR, LEVEL_WARNING]
+    assert errors(issues) == issues[:1]
+    text = format_issues(issues, limit=1)
+    assert text.splitlines()[0] == str(issues[0])
+    assert "另有 1 处" in text
+
+
+def test_non_object_config():
+    assert [str(i) for i in validate([])] == ["$: 应为对象"]
@@ -0,0 +1,59 @@
+"""core.handoff：双实例切换的端口槽位。"""
+import pytest
+
+from core.handoff import (
+    HANDOFF_PORT_OFFSET, apply_slot, can_handoff, running_slot, shared_inbounds,
+)
+from core.hot_reload import API_INBOUND_TAG, enable_api
+
+API_PORT = 23456
+
+
+def _config() -> dict:
+    return enable_api({
+        "inbounds": [
+            {"tag": "socks", "port": 1080, "protocol": "socks"},
+            {"tag": "tproxy", "port": 12345, "protocol": "dokodemo-door",
+             "settings": {"network": "tcp,udp", "followRedirect": True}},
+        ],
+        "outbounds": [{"tag": "proxy", "protocol": "freedom"}],
+    }, API_PORT)
+
+
+def _ports(config: dict) -> dict:
+    return {ib["tag"]: ib["port"] for ib in config["inbounds"]}
+
+
+def test_slot_zero_is_an_unchanged_copy():
+    config = _config()
+    result = apply_slot(config, 0)
+    assert result == config and result is not config
+    assert running_slot(result, 12345) == 0
+
+
+def test_slot_one_moves_tproxy_only():
+    config = _config()
+    result = apply_slot(config, 1)
+    assert _ports(result) == {"socks": 1080, "tproxy": 12345 + HANDOFF_PORT_OFFSET,
+                              API_INBOUND_TAG: API_PORT}
+    assert _ports(config)["tproxy"] == 12345    # 不修改传入的配置
+    assert running_slot(result, 12345) == 1
+    assert running_slot(result, None) == 0
+    assert [ib["tag"] for ib in shared_inbounds(result)] == ["socks"]
+
+
+def test_slot_port_conflict():
+    config = _config()
+    config["inbounds"][0]["port"] = 12345 + HANDOFF_PORT_OFFSET
+    with pytest.raises(ValueError):
+        apply_slot(config, 1)
+
+
+def test_can_handoff():
+    assert can_handoff(_config())
+    config = _config()
+    del config["inbounds"][0]["tag"]
+    assert not can_handoff(config)      # 无 tag 的本地入站无法通过 API 移交
+    config = _config()
+    config["inbounds"] = [ib for ib in config["inbounds"] if ib["tag"] != "tproxy"]
+    assert not can_handoff(config)
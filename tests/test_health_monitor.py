@@ -0,0 +1,223 @@
+"""core.health_monitor：经本地 SOCKS5 替身访问 http.server 的探测、健康分与退避。"""
+import http.server
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+import pytest
+
+from core.health_monitor import (
+    HealthMonitor, HealthSample, ProxyError, ProxyHttpClient,
+)
+
+
+class _Site:
+    """探测目标的状态：返回码、响应前的延迟、是否关闭连接。"""
+
+    def __init__(self):
+        self.status = 204
+        self.delay = 0.0
+        self.close = False
+        self.requests = 0
+
+
+class _SiteHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        site = self.server.site
+        site.requests += 1
+        time.sleep(site.delay)
+        self.send_response(site.status)
+        self.send_header("Content-Length", "0")
+        if site.close:
+            self.send_header("Connection", "close")
+        self.end_headers()
+
+
+class _Socks5(socketserver.ThreadingTCPServer):
+    """最小的 SOCKS5 替身：无认证、只支持域名 CONNECT，记录建立的隧道数。"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _SocksHandler)
+        self.tunnels = 0
+        self.reply = 0
+
+
+class _SocksHandler(socketserver.BaseRequestHandler):
+    def _read(self, n):
+        data = b""
+        while len(data) < n:
+            chunk = self.request.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError
+            data += chunk
+        return data
+
+    def handle(self):
+        try:
+            self._read(3)
+            self.request.sendall(b"\x05\x00")
+            _ver, _cmd, _rsv, atyp = self._read(4)
+            assert atyp == 3
+            host = self._read(self._read(1)[0]).decode()
+            port = struct.unpack("!H", self._read(2))[0]
+        except ConnectionError:
+            return
+        if self.server.reply:
+            self.request.sendall(bytes((5, self.server.reply, 0, 1)) + b"\0" * 6)
+            return
+        upstream = socket.create_connection((host, port))
+        self.server.tunnels += 1
+        self.request.sendall(b"\x05\x00\x00\x01" + b"\0" * 6)
+        pump = threading.Thread(target=self._pump, args=(upstream, self.request), daemon=True)
+        pump.start()
+        self._pump(self.request, upstream)
+        pump.join()
+        upstream.close()
+
+    @staticmethod
+    def _pump(src, dst):
+        try:
+            while True:
+                data = src.recv(65536)
+                if not data:
+                    break
+                dst.sendall(data)
+        except OSError:
+            pass
+        try:
+            dst.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+
+def _serve(server):
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def site():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _SiteHandler)
+    server.daemon_threads = True
+    server.site = _Site()
+    server.site.url = f"http://127.0.0.1:{server.server_address[1]}/generate_204"
+    yield _serve(server).site
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def socks():
+    server = _serve(_Socks5())
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(site, socks):
+    client = ProxyHttpClient("socks", socks.server_address, site.url, timeout=3)
+    yield client
+    client.close()
+
+
+def test_keep_alive_reuses_tunnel(site, socks, client):
+    assert client.fetch()[::2] == (204, False)
+    for _ in range(3):
+        status, ttfb, reused = client.fetch()
+        assert (status, reused) == (204, True)
+        assert ttfb < 1000
+    assert socks.tunnels == 1 and site.requests == 4
+
+
+def test_closed_connection_opens_new_tunnel(site, socks, client):
+    site.close = True
+    client.fetch()
+    site.close = False
+    assert client.fetch()[2] is False
+    assert client.fetch()[2] is True
+    assert socks.tunnels == 2
+
+
+def test_injected_delay_is_measured(site, client):
+    client.fetch()
+    site.delay = 0.2
+    _status, ttfb, reused = client.fetch()
+    assert reused and 200 <= ttfb < 1500
+
+
+def test_socks_rejection_is_recorded_as_failure(site, socks, client):
+    socks.reply = 5
+    with pytest.raises(ProxyError):
+        client.fetch()
+    monitor = HealthMonitor(client, activity=None)
+    sample = monitor.check()
+    assert not sample.ok and sample.ttfb_ms is None and "REP=5" in sample.error
+    assert monitor.score == 0
+
+
+def test_monitor_check_and_score(site, client):
+    monitor = HealthMonitor(client, activity=None)
+    assert monitor.score is None and monitor.summary() == "未检测"
+    assert monitor.check().ok
+    assert monitor.score == 100
+    site.status = 503
+    sample = monitor.check()
+    assert not sample.ok and sample.error == "HTTP 503"
+    assert monitor.success_rate == 0.5
+    assert monitor.summary().startswith("异常 (50)")
+
+
+def test_score_latency_factor():
+    monitor = HealthMonitor(client=None, activity=None)
+    for ttfb in (1100.0, 1150.0, 1200.0):
+        monitor.samples.append(HealthSample(0.0, True, ttfb))
+    assert monitor.score == 75          # 中位数 1150 ms：延迟系数 0.75
+    monitor.samples.append(HealthSample(0.0, False, None, "timeout"))
+    assert monitor.score == 56          # 成功率 0.75
+
+
+class _StubClient:
+    def __init__(self):
+        self.ok = True
+
+    def fetch(self):
+        if not self.ok:
+            raise OSError("down")
+        return 204, 10.0, True
+
+    def close(self):
+        pass
+
+
+def test_backoff_when_idle_and_reset_on_traffic_or_failure():
+    traffic = [0]
+    stub = _StubClient()
+    monitor = HealthMonitor(stub, activity=lambda: traffic[0],
+                            base_interval=1.0, max_interval=5.0)
+    delays = []
+    for _ in range(5):
+        monitor.check()
+        delays.append(monitor.next_delay())
+    # 第一次探测没有上一次的流量读数，不算空闲
+    assert delays == [1.0, 2.0, 4.0, 5.0, 5.0]
+
+    traffic[0] += 1 << 20
+    monitor.check()
+    assert monitor.next_delay() == 1.0
+
+    monitor.check()
+    assert monitor.next_delay() == 2.0
+    stub.ok = False
+    monitor.check()
+    assert monitor.next_delay() == 1.0  # min(FAILURE_INTERVAL, base_interval)
@@ -0,0 +1,84 @@
+"""core.hot_reload：热更新步骤。"""
+import copy
+import socket
+
+from core.hot_reload import (
+    API_INBOUND_TAG, api_inbound_port, api_server, enable_api, pick_api_port, plan_reload,
+    port_free,
+)
+
+
+def _ss(tag: str, address: str) -> dict:
+    return {"tag": tag, "protocol": "shadowsocks", "settings": {"servers": [
+        {"address": address, "port": 8388, "method": "aes-256-gcm", "password": "x"}]}}
+
+
+def _running() -> dict:
+    return enable_api({
+        "inbounds": [{"tag": "socks", "port": 1080, "protocol": "socks"}],
+        "outbounds": [_ss("proxy", "1.1.1.1"), _ss("backup", "2.2.2.2"),
+                      {"tag": "direct", "protocol": "freedom"}],
+        "routing": {"domainStrategy": "AsIs", "rules": [
+            {"type": "field", "ip": ["geoip:private"], "outboundTag": "direct"}]},
+    }, 23456)
+
+
+def test_enable_api_adds_inbound_and_rule():
+    config = _running()
+    assert api_server(config) == "127.0.0.1:23456"
+    assert api_inbound_port(config) == 23456
+    assert config["routing"]["rules"][0]["inboundTag"] == [API_INBOUND_TAG]
+    assert enable_api(config, 34567) == config  # 已有 api 段时不重复加入
+
+
+def test_picked_port_is_free():
+    port = pick_api_port()
+    assert port and port_free(port)
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", port))
+        sock.listen(1)
+        assert not port_free(port)
+
+
+def test_unchanged_config_gives_empty_plan():
+    plan = plan_reload(_running(), _running())
+    assert plan is not None and plan.empty
+
+
+def test_changed_added_and_removed_outbounds():
+    new = _running()
+    new["outbounds"][1] = _ss("backup", "3.3.3.3")
+    new["outbounds"].insert(2, _ss("extra", "4.4.4.4"))
+    plan = plan_reload(_running(), new)
+    assert plan.remove == ["backup"]
+    assert [ob["tag"] for ob in plan.add] == ["backup", "extra"]
+    assert plan.routing is None
+
+    new = _running()
+    del new["outbounds"][1]
+    plan = plan_reload(_running(), new)
+    assert (plan.remove, plan.add) == (["backup"], [])
+
+
+def test_routing_rules_are_replaced():
+    new = _running()
+    new["routing"]["rules"].append({"type": "field", "domain": ["x"], "outboundTag": "backup"})
+    plan = plan_reload(_running(), new)
+    assert plan.routing == {"rules": new["routing"]["rules"]}
+    assert not plan.remove and not plan.add
+
+
+def test_changes_that_need_restart():
+    old = _running()
+    for mutate in (
+        lambda c: c["inbounds"][0].update(port=1081),           # 入站变化
+        lambda c: c["routing"].update(domainStrategy="IPIfNonMatch"),
+        lambda c: c["outbounds"].reverse(),                    # 默认出站变化
+        lambda c: c["outbounds"].append({"protocol": "freedom"}),   # 没有 tag
+        lambda c: c.update(dns={"servers": ["1.1.1.1"]}),
+    ):
+        new = copy.deepcopy(old)
+        mutate(new)
+        assert plan_reload(old, new) is None
+    without_api = {k: v for k, v in old.items() if k != "api"}
+    assert plan_reload(without_api, without_api) is None
@@ -0,0 +1,49 @@
+"""core.jsonc：带注释和尾随逗号的 JSON 解析。"""
+import json
+
+import pytest
+
+from core.jsonc import loads, strip_jsonc
+
+
+def test_plain_json_is_unchanged():
+    text = '{"a": [1, 2], "b": "x"}'
+    assert strip_jsonc(text) == text
+    assert loads(text) == {"a": [1, 2], "b": "x"}
+
+
+def test_comments_and_trailing_commas():
+    text = """{
+  // 行尾注释
+  "log": {"loglevel": "warning",},  /* 块注释 */
+  "outbounds": [
+    {"tag": "proxy"}, /* 跨行
+    注释 */
+  ],
+}"""
+    assert loads(text) == {"log": {"loglevel": "warning"}, "outbounds": [{"tag": "proxy"}]}
+
+
+def test_markers_inside_strings_are_kept():
+    text = r'{"url": "http://a/b", "glob": "/*x*/", "q": "say \"//\",]", "s": ",}"}'
+    assert loads(text + " // c") == json.loads(text)
+
+
+def test_stripped_text_keeps_length_and_lines():
+    text = '{\n  "a": 1, /* x\n y */ "b": 2, // z\n}\n'
+    stripped = strip_jsonc(text)
+    assert len(stripped) == len(text)
+    assert stripped.count("\n") == text.count("\n")
+
+
+def test_error_position_points_into_original():
+    text = '{\n  // 注释\n  "a": 1,\n  "b": ?\n}'
+    with pytest.raises(json.JSONDecodeError) as info:
+        loads(text)
+    assert (info.value.lineno, info.value.colno) == (4, 8)
+    assert info.value.doc == text
+
+
+def test_unterminated_block_comment():
+    with pytest.raises(json.JSONDecodeError):
+        loads('{"a": 1 /* 未闭合')
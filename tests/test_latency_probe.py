@@ -0,0 +1,141 @@
+"""core.latency_probe：滚动统计、对本地监听端口注入延迟的测速，以及透明代理下的跳过。"""
+import asyncio
+import socket
+
+import pytest
+
+from core.latency_probe import (
+    LatencyProber, ProbeStats, ProbeTarget, is_direct, tproxy_bypass,
+)
+
+
+class _DelayedProber(LatencyProber):
+    """按目标端口在建立连接前注入延迟。"""
+
+    def __init__(self, delays, **kwargs):
+        super().__init__(**kwargs)
+        self.delays = delays
+        self.opened = []
+
+    async def _open(self, family, ip, port):
+        self.opened.append((ip, port))
+        await asyncio.sleep(self.delays.get(port, 0.0))
+        return await super()._open(family, ip, port)
+
+
+class _TproxyProber(_DelayedProber):
+    """模拟透明代理：节点域名解析到公网地址，连接实际由本机监听端口（Xray）接受。"""
+
+    def __init__(self, addresses, local_port, **kwargs):
+        super().__init__({}, **kwargs)
+        self.addresses = addresses
+        self.local_port = local_port
+
+    async def _resolve(self, host):
+        return socket.AF_INET, self.addresses[host]
+
+    async def _open(self, family, ip, port):
+        self.opened.append((ip, port))
+        return await LatencyProber._open(self, family, "127.0.0.1", self.local_port)
+
+
+@pytest.fixture
+def listeners():
+    socks = []
+
+    def make(count):
+        for _ in range(count):
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            s.bind(("127.0.0.1", 0))
+            s.listen(64)
+            socks.append(s)
+        return [s.getsockname()[1] for s in socks[-count:]]
+
+    yield make
+    for s in socks:
+        s.close()
+
+
+def _closed_port() -> int:
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def test_stats_median_jitter_loss():
+    stats = ProbeStats(window=4)
+    for value in (10.0, 14.0, None, 12.0):
+        stats.add(value)
+    assert stats.median == 12.0
+    assert stats.jitter == pytest.approx(3.0)     # |14-10|, |12-14|
+    assert stats.loss == pytest.approx(0.25)
+    assert stats.score == pytest.approx(15.0)
+
+    stats.add(11.0, tls_ms=30.0)                  # 丢包窗口滚动，耗时窗口保留最近 4 次成功
+    assert stats.samples == 4 and stats.loss == pytest.approx(0.25)
+    assert list(stats.connect) == [10.0, 14.0, 12.0, 11.0]
+    assert stats.score == pytest.approx(11.5 + 7.0 / 3 + 30.0)
+
+
+def test_empty_stats():
+    stats = ProbeStats()
+    assert (stats.median, stats.jitter, stats.loss, stats.score) == (None, 0.0, 0.0, None)
+
+
+def test_probe_ranks_by_injected_delay(listeners):
+    fast, slow, hung = listeners(3)
+    refused = _closed_port()
+    prober = _DelayedProber({fast: 0.01, slow: 0.15, hung: 5.0}, timeout=0.5)
+    targets = [ProbeTarget(name, name, "127.0.0.1", port)
+               for name, port in (("fast", fast), ("slow", slow),
+                                  ("hung", hung), ("refused", refused))]
+    results = asyncio.run(prober.probe(targets, rounds=2))
+
+    assert results["fast"].median < results["slow"].median
+    assert results["slow"].median >= 150
+    # 超时与拒绝连接都记为丢包
+    for key in ("hung", "refused"):
+        assert results[key].median is None
+        assert (results[key].samples, results[key].loss) == (2, 1.0)
+    assert prober.best(results) == "fast"
+    assert prober.best(["slow", "hung"]) == "slow"
+    assert prober.best(["hung", "refused"]) is None
+
+
+def test_best_skips_lossy_nodes():
+    prober = LatencyProber()
+    lossy = prober.stats["lossy"] = ProbeStats()
+    for value in (5.0, None, None):
+        lossy.add(value)
+    steady = prober.stats["steady"] = ProbeStats()
+    for value in (40.0, 40.0, 40.0):
+        steady.add(value)
+    assert prober.best() == "steady"
+    assert prober.best(max_loss=1.0) == "lossy"
+
+
+def test_redirected_probe_is_not_reported_as_rtt(listeners):
+    local, = listeners(1)
+    addresses = {"node.example": "203.0.113.7", "vps.example": "198.51.100.1"}
+    targets = [ProbeTarget("remote", "remote", "node.example", 443),
+               ProbeTarget("vps", "vps", "vps.example", 443)]
+
+    # 未告知透明代理时，被本机接受的连接会被当成极低的延迟
+    naive = _TproxyProber(addresses, local)
+    assert asyncio.run(naive.probe(targets))["remote"].median is not None
+
+    prober = _TproxyProber(addresses, local)
+    results = asyncio.run(prober.probe(targets, bypass=tproxy_bypass("198.51.100.1")))
+    assert "remote" not in results and "remote" not in prober.stats
+    assert ("203.0.113.7", 443) not in prober.opened
+    assert results["vps"].median is not None      # vps_ip 有 RETURN 规则，仍可直连
+    assert prober.best(results) == "vps"
+
+
+def test_is_direct():
+    bypass = tproxy_bypass("not-an-ip.example")
+    assert is_direct("192.168.1.5", bypass)
+    assert not is_direct("203.0.113.7", bypass)
+    assert is_direct("2001:db8::1", bypass)       # TPROXY 规则只对 IPv4 生效
@@ -0,0 +1,120 @@
+"""core.link_codec：分享链接解析与编码。"""
+import base64
+import json
+
+import pytest
+
+from core.link_codec import (
+    LinkParseError, ProxyLink, decode_subscription, from_outbound, parse_link,
+    parse_link_strict, parse_links,
+)
+
+
+def _b64(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+@pytest.mark.parametrize("password", [
+    "p@ss", "a@b:c", "p@ss@5.6.7.8:8388", "with space/slash?#&=%", "密码", ":", "@",
+])
+def test_ss_password_special_characters_round_trip(password):
+    link = ProxyLink("shadowsocks", "节点 #1", "1.2.3.4", 8388,
+                     {"method": "aes-256-gcm", "password": password})
+    parsed = parse_link_strict(link.to_link())
+    assert parsed.settings == link.settings
+    assert (parsed.address, parsed.port, parsed.name) == ("1.2.3.4", 8388, "节点 #1")
+
+
+def test_ss_base64_userinfo_keeps_at_in_password():
+    parsed = parse_link_strict(f"ss://{_b64('aes-256-gcm:p@ss')}@1.2.3.4:8388")
+    assert parsed.settings["password"] == "p@ss"
+
+
+def test_ss_base64_userinfo_with_trailing_host_port():
+    # 个别客户端会把 host:port 也编码进 userinfo
+    parsed = parse_link_strict(f"ss://{_b64('aes-256-gcm:p@ss@1.2.3.4:8388')}@1.2.3.4:8388")
+    assert parsed.settings == {"method": "aes-256-gcm", "password": "p@ss"}
+
+
+def test_ss_legacy_full_base64():
+    parsed = parse_link_strict("ss://" + _b64("chacha20-ietf-poly1305:p@ss@example.com:443"))
+    assert (parsed.address, parsed.port) == ("example.com", 443)
+    assert parsed.settings == {"method": "chacha20-ietf-poly1305", "password": "p@ss"}
+
+
+def test_ss_plain_userinfo_and_ipv6():
+    parsed = parse_link_strict("ss://aes-128-gcm:secret@[2001:db8::1]:8388#v6")
+    assert (parsed.address, parsed.port, parsed.name) == ("2001:db8::1", 8388, "v6")
+    assert parse_link_strict(parsed.to_link()).address == "2001:db8::1"
+
+
+def test_vmess_round_trip():
+    link = ProxyLink("vmess", "vm", "example.com", 443,
+                     {"id": "11111111-2222-3333-4444-555555555555", "alterId": 0,
+                      "security": "auto"},
+                     {"network": "ws", "security": "tls", "host": "cdn.example.com",
+                      "path": "/ws", "sni": "example.com"})
+    parsed = parse_link_strict(link.to_link())
+    assert parsed.settings == link.settings
+    assert parsed.to_outbound() == link.to_outbound()
+
+
+@pytest.mark.parametrize("scheme,secret_key", [("trojan", "password"), ("vless", "id")])
+def test_url_style_round_trip(scheme, secret_key):
+    protocol = scheme
+    settings = {secret_key: "s3cr@t/+?"}
+    if scheme == "vless":
+        settings.update(encryption="none", flow="xtls-rprx-vision")
+    link = ProxyLink(protocol, "n", "example.com", 443, settings,
+                     {"network": "grpc", "security": "reality", "service_name": "svc",
+                      "sni": "www.example.com", "fp": "chrome", "pbk": "key", "sid": "ab"})
+    parsed = parse_link_strict(link.to_link())
+    assert parsed.protocol == protocol
+    assert parsed.to_outbound() == link.to_outbound()
+
+
+def test_outbound_round_trip():
+    outbound = {"tag": "proxy", "protocol": "shadowsocks", "settings": {"servers": [
+        {"address": "1.2.3.4", "port": 8388, "method": "aes-256-gcm", "password": "p@ss"}]}}
+    assert from_outbound(outbound).to_outbound() == outbound
+
+
+@pytest.mark.parametrize("link", [
+    "http://example.com",
+    "ss://not-base64",
+    "ss://YWVzLTI1Ni1nY206cGFzcw@1.2.3.4:0",
+    "vmess://" + base64.b64encode(json.dumps({"add": "a"}).encode()).decode(),
+    "trojan://example.com:443",
+])
+def test_invalid_links(link):
+    with pytest.raises(LinkParseError):
+        parse_link_strict(link)
+    assert parse_link(link) is None
+
+
+def test_parse_links_reports_failures_by_index():
+    good = ProxyLink("trojan", "", "a.example", 443, {"password": "x"}).to_link()
+    nodes, errors = parse_links([good, "vless://broken", good])
+    assert len(nodes) == 2
+    assert [(e.index, e.scheme) for e in errors] == [(1, "vless")]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1000])
+def test_subscription_decoder_chunked_base64(chunk_size):
+    links = [ProxyLink("trojan", f"n{i}", "a.example", 443, {"password": str(i)}).to_link()
+             for i in range(20)]
+    data = base64.b64encode("\n".join(links).encode()).decode()
+    data = "\n".join(data[i:i + 76] for i in range(0, len(data), 76)).encode()
+
+    from core.link_codec import SubscriptionDecoder
+    decoder = SubscriptionDecoder()
+    decoded = []
+    for i in range(0, len(data), chunk_size):
+        decoded += decoder.feed(data[i:i + chunk_size])
+    decoded += decoder.finish()
+    assert decoded == links
+
+
+def test_subscription_decoder_plain_text():
+    text = b"\r\nss://YWVzLTI1Ni1nY206cGFzcw@1.2.3.4:8388#a\r\n\r\nnot a link\n"
+    assert list(decode_subscription(text)) == ["ss://YWVzLTI1Ni1nY206cGFzcw@1.2.3.4:8388#a"]
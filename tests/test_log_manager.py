@@ -0,0 +1,42 @@
+"""core.log_manager：缓冲日志处理器的落盘时机。"""
+import json
+import logging
+import time
+
+from core.log_manager import BufferedRotatingFileHandler, JsonFormatter
+
+
+def _lines(path) -> list:
+    return [json.loads(line)["msg"] for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def _record(msg: str, level: int = logging.INFO) -> logging.LogRecord:
+    return logging.LogRecord("ov2n.test", level, __file__, 1, msg, None, None)
+
+
+def test_idle_buffer_is_flushed_by_timer(tmp_path):
+    path = tmp_path / "ov2n.log"
+    handler = BufferedRotatingFileHandler(str(path), flush_interval=0.2)
+    handler.setFormatter(JsonFormatter())
+    try:
+        handler.handle(_record("first"))
+        handler.handle(_record("second"))
+        assert not path.exists() or _lines(path) == []     # 仍在缓冲中
+        deadline = time.monotonic() + 2.0
+        while time.monotonic() < deadline and (not path.exists() or len(_lines(path)) < 2):
+            time.sleep(0.05)
+        assert _lines(path) == ["first", "second"]
+    finally:
+        handler.close()
+
+
+def test_warning_flushes_immediately(tmp_path):
+    path = tmp_path / "ov2n.log"
+    handler = BufferedRotatingFileHandler(str(path), flush_interval=60.0)
+    handler.setFormatter(JsonFormatter())
+    try:
+        handler.handle(_record("info"))
+        handler.handle(_record("warn", logging.WARNING))
+        assert _lines(path) == ["info", "warn"]
+    finally:
+        handler.close()
@@ -0,0 +1,87 @@
+"""core.ovpn_profile：.ovpn 解析、改写与 remote 探测。"""
+import asyncio
+import socket
+import time
+
+from core.ovpn_profile import (
+    DEAD, REACHABLE, TLS_WRAP_ICMP_WAIT, UNKNOWN, Endpoint, parse_profile, probe_profile,
+    render_profile,
+)
+
+PROFILE = """client
+dev tun
+proto tcp-client
+port 443
+remote a.example.com
+remote b.example.com 1194 udp
+remote-random
+<ca>
+remote not-a-directive 1
+</ca>
+"""
+
+
+def test_parse_remotes_with_defaults():
+    profile = parse_profile(PROFILE)
+    assert [(r.host, r.port, r.proto, r.transport) for r in profile.remotes] == [
+        ("a.example.com", 443, "tcp-client", "tcp"),
+        ("b.example.com", 1194, "udp", "udp"),
+    ]
+    assert profile.remote_lines == [4, 5]
+    assert "ca" in profile.options and not profile.tls_wrapped
+    assert profile.rewritable
+
+
+def test_parse_rport_tls_wrap_and_unsupported():
+    profile = parse_profile("rport 1195\nport 1196\ntls-auth ta.key 1\nremote x\n")
+    assert profile.remotes[0].port == 1195 and profile.tls_wrapped
+    assert not parse_profile("remote x\nhttp-proxy p 8080\n").rewritable
+    assert not parse_profile("<connection>\nremote x\n</connection>\n").rewritable
+    assert parse_profile("remote x nope\n").remotes == []
+
+
+def _endpoint(profile, index: int, address: str, state: str, latency=None) -> Endpoint:
+    endpoint = Endpoint(profile.remotes[index], index, address)
+    endpoint.state, endpoint.latency = state, latency
+    return endpoint
+
+
+def test_render_replaces_remotes_in_place():
+    profile = parse_profile(PROFILE)
+    endpoints = [_endpoint(profile, 1, "2.2.2.2", REACHABLE, 12.3),
+                 _endpoint(profile, 0, "1.1.1.1", DEAD)]
+    lines = render_profile(profile, endpoints, "/etc/my vpn").splitlines()
+    assert lines[:4] == ['cd "/etc/my vpn"', "client", "dev tun", "proto tcp-client"]
+    remotes = [line for line in lines if line.startswith("remote")]
+    assert remotes == ["remote 2.2.2.2 1194 udp", "remote 1.1.1.1 443",
+                       "remote not-a-directive 1"]     # inline 块原样保留
+    assert "# b.example.com: reachable 12 ms" in lines
+    assert "remote-random" not in lines
+
+
+def test_render_without_endpoints_keeps_remotes():
+    profile = parse_profile("cd /x\n" + PROFILE)
+    text = render_profile(profile, None, "/ignored")
+    assert text == "cd /x\n" + PROFILE
+
+
+def test_tls_wrapped_udp_probe_does_not_wait_full_timeout():
+    silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    silent.bind(("127.0.0.1", 0))
+    closed = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    closed.bind(("127.0.0.1", 0))
+    closed_port = closed.getsockname()[1]
+    closed.close()
+    try:
+        profile = parse_profile(
+            "client\nproto udp\ntls-crypt ta.key\n"
+            f"remote 127.0.0.1 {silent.getsockname()[1]}\nremote 127.0.0.1 {closed_port}\n")
+        started = time.monotonic()
+        endpoints = asyncio.run(probe_profile(profile, timeout=2.0))
+        elapsed = time.monotonic() - started
+    finally:
+        silent.close()
+    states = {e.remote.port: e.state for e in endpoints}
+    assert states == {profile.remotes[0].port: UNKNOWN,
+                      closed_port: DEAD}
+    assert elapsed < TLS_WRAP_ICMP_WAIT + 0.5
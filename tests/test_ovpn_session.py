@@ -0,0 +1,139 @@
+"""core.ovpn_session：管理接口指令与客户端。"""
+import asyncio
+import socket
+import threading
+
+import pytest
+
+from core import ovpn_session
+from core.ovpn_profile import prepare_profile
+from core.ovpn_session import (
+    MANAGEMENT_HOST, SESSION_HEADER, ManagementClient, ManagementSession, SoftRestartPending,
+    render_directives, soft_restart,
+)
+
+PASSWORD = "secret"
+
+
+class _FakeOpenVPN:
+    """在 127.0.0.1 上模拟 OpenVPN 管理接口：replies 为命令 → 回应的各行。"""
+
+    def __init__(self, replies: dict):
+        self.replies = replies
+        self.received = []
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.bind((MANAGEMENT_HOST, 0))
+        self._server.listen(1)
+        self.session = ManagementSession(self._server.getsockname()[1], PASSWORD)
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self) -> None:
+        conn, _ = self._server.accept()
+        with conn, conn.makefile("rwb", buffering=0) as stream:
+            stream.write(b"ENTER PASSWORD:")    # 密码提示没有换行
+            if stream.readline().strip().decode() != PASSWORD:
+                stream.write(b"ERROR: bad password\n")
+                return
+            stream.write(b"SUCCESS: password is correct\n"
+                         b">INFO:OpenVPN Management Interface Version 5\n")
+            for raw in stream:
+                command = raw.decode().strip()
+                self.received.append(command)
+                lines = self.replies.get(command, [f"ERROR: unknown command [{command}]"])
+                stream.write("".join(f"{line}\n" for line in lines).encode())
+
+    def close(self) -> None:
+        self._server.close()
+        self._thread.join(timeout=5)
+
+
+class _Context:
+    """prepare_profile 用到的 JobContext 接口。"""
+
+    def progress(self, message: str) -> None:
+        pass
+
+    async def run_blocking(self, func, *args, **kwargs):
+        return func(*args, **kwargs)
+
+
+@pytest.fixture
+def fake_openvpn():
+    servers = []
+
+    def start(replies: dict) -> _FakeOpenVPN:
+        servers.append(_FakeOpenVPN(replies))
+        return servers[-1]
+    yield start
+    for server in servers:
+        server.close()
+
+
+def test_command_and_error(fake_openvpn):
+    server = fake_openvpn({"pid": [">HOLD:Waiting for hold release", "SUCCESS: pid=42"]})
+    with ManagementClient(server.session, timeout=2.0) as client:
+        assert client.command("pid") == "pid=42"     # 期间的实时通知被忽略
+        with pytest.raises(RuntimeError, match="unknown command"):
+            client.command("bogus")
+    assert server.received == ["pid", "bogus"]
+
+
+def test_wrong_password(fake_openvpn):
+    server = fake_openvpn({})
+    session = ManagementSession(server.session.port, "wrong")
+    with pytest.raises(RuntimeError, match="认证失败"):
+        ManagementClient(session, timeout=2.0).connect()
+
+
+def test_soft_restart_waits_for_connected(fake_openvpn):
+    server = fake_openvpn({
+        "state on": ["SUCCESS: real-time state notification set to ON"],
+        "signal SIGUSR1": ["SUCCESS: signal SIGUSR1 thrown",
+                           ">STATE:1,RECONNECTING,SIGUSR1,,,,,",
+                           ">STATE:2,WAIT,,,,,,",
+                           ">STATE:3,CONNECTED,SUCCESS,10.8.0.2,1.2.3.4,1194,,"],
+    })
+    assert soft_restart(server.session, timeout=2.0) >= 0
+    assert server.received == ["state on", "signal SIGUSR1"]
+
+
+def test_soft_restart_pending_and_exiting(fake_openvpn):
+    state_on = ["SUCCESS: real-time state notification set to ON"]
+    server = fake_openvpn({"state on": state_on, "signal SIGUSR1": [
+        "SUCCESS: signal SIGUSR1 thrown", ">STATE:1,RECONNECTING,SIGUSR1,,,,,"]})
+    with pytest.raises(SoftRestartPending):
+        soft_restart(server.session, timeout=0.3)
+
+    server = fake_openvpn({"state on": state_on, "signal SIGUSR1": [
+        "SUCCESS: signal SIGUSR1 thrown", ">STATE:1,EXITING,SIGTERM,,,,,"]})
+    with pytest.raises(RuntimeError, match="退出"):
+        soft_restart(server.session, timeout=2.0)
+
+
+def test_render_directives_adds_management_and_persist():
+    text = render_directives(ManagementSession(7505, "pw"), ["client", "persist-key"])
+    lines = text.splitlines()
+    assert lines[0] == SESSION_HEADER
+    assert lines[1].startswith("management 127.0.0.1 7505 ")
+    assert lines[2:] == ["persist-tun"]
+
+
+def test_render_directives_without_session_keeps_persist():
+    assert render_directives(None, ["client"]).splitlines() == [
+        SESSION_HEADER, "persist-tun", "persist-key"]
+    assert render_directives(None, ["persist-tun", "persist-key"]) == ""
+
+
+def test_own_management_profile_still_gets_persist(tmp_path, monkeypatch):
+    # 用户配置自带 management 时由 helper 发送 SIGUSR1，运行时配置也要保留 tun 设备和密钥
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    config = tmp_path / "user.ovpn"
+    config.write_text("client\ndev tun\nproto udp\nremote 127.0.0.1 1194\n"
+                      "management 127.0.0.1 7505\n", encoding="utf-8")
+    path = asyncio.run(prepare_profile(_Context(), str(config)))
+    assert path != str(config)
+    text = open(path, encoding="utf-8").read()
+    assert "persist-tun" in text.splitlines() and "persist-key" in text.splitlines()
+    assert text.count("management ") == 1
+    assert ovpn_session.load_session() is None
@@ -0,0 +1,87 @@
+"""core.profile_store：订阅刷新时的分组同步与文件权限。"""
+import os
+import stat
+
+import pytest
+
+from core.profile_store import ProfileStore
+
+
+def _ss(address: str, password: str = "x") -> dict:
+    return {"protocol": "shadowsocks", "settings": {"servers": [
+        {"address": address, "port": 8388, "method": "aes-256-gcm", "password": password}]}}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ProfileStore(str(tmp_path / "profiles.db"))
+    yield store
+    store.close()
+
+
+def _ids(store: ProfileStore, group: str = "sub") -> dict:
+    return {node.name: node.id for node in store.find_nodes(group=group)}
+
+
+def test_sync_adds_then_keeps_unchanged_nodes(store):
+    items = [("a", _ss("1.1.1.1")), ("b", _ss("2.2.2.2"))]
+    assert store.sync_group("sub", items) == (2, 0, 0)
+    ids = _ids(store)
+    store.set_latency(ids["a"], 42.0)
+
+    assert store.sync_group("sub", items) == (0, 0, 0)
+    assert _ids(store) == ids
+    assert store.get_node(ids["a"]).latency_ms == 42.0
+
+
+def test_sync_updates_changed_and_removes_missing(store):
+    store.sync_group("sub", [("a", _ss("1.1.1.1")), ("b", _ss("2.2.2.2"))])
+    ids = _ids(store)
+    store.select_node(ids["b"])
+
+    result = store.sync_group("sub", [("a", _ss("1.1.1.1", password="new")),
+                                      ("c", _ss("3.3.3.3"))])
+    assert result == (1, 1, 1)
+    after = _ids(store)
+    assert set(after) == {"a", "c"}
+    assert after["a"] == ids["a"]       # 内容变化的节点保留 id
+    assert store.get_outbound(ids["a"])["settings"]["servers"][0]["password"] == "new"
+    assert store.selected_node_id() is None     # 选中的节点被删除
+
+
+def test_sync_only_touches_its_group(store):
+    store.add_node("manual", _ss("9.9.9.9"))
+    store.sync_group("sub", [("a", _ss("1.1.1.1"))])
+    assert store.sync_group("sub", []) == (0, 1, 0)
+    assert [n.name for n in store.find_nodes()] == ["manual"]
+
+
+def test_sync_duplicate_items_last_wins(store):
+    items = [("a", _ss("1.1.1.1", "old")), ("a", _ss("1.1.1.1", "new"))]
+    assert store.sync_group("sub", items) == (1, 0, 0)
+    node_id = _ids(store)["a"]
+    assert store.get_outbound(node_id)["settings"]["servers"][0]["password"] == "new"
+
+
+@pytest.mark.skipif(os.name == "nt", reason="POSIX 权限")
+def test_database_and_activated_profile_are_private(tmp_path, store):
+    store.add_node("a", _ss("1.1.1.1"))     # 触发 -wal 文件
+    assert stat.S_IMODE(os.stat(store.db_path).st_mode) == 0o600
+    wal = store.db_path + "-wal"
+    if os.path.exists(wal):
+        assert stat.S_IMODE(os.stat(wal).st_mode) == 0o600
+
+    profile_id = store.add_vpn_profile("work", "client\n<key>\nsecret\n</key>\n")
+    target = tmp_path / "client.ovpn"
+    store.activate_vpn_profile(profile_id, str(target))
+    assert stat.S_IMODE(os.stat(target).st_mode) == 0o600
+    assert store.selected_vpn_id() == profile_id
+
+
+@pytest.mark.skipif(os.name == "nt", reason="POSIX 权限")
+def test_existing_database_is_tightened(tmp_path):
+    path = tmp_path / "old.db"
+    ProfileStore(str(path)).close()
+    os.chmod(path, 0o644)
+    ProfileStore(str(path)).close()
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
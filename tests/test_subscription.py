@@ -0,0 +1,170 @@
+"""core.subscription：对本地 http.server 的订阅刷新。"""
+import base64
+import gzip
+import hashlib
+import http.server
+import threading
+import time
+
+import pytest
+
+from core.link_codec import ProxyLink
+from core.profile_store import ProfileStore
+from core.subscription import HttpPool, refresh_subscription
+
+
+def _link(index: int, password: str = "x") -> str:
+    return ProxyLink("shadowsocks", f"node-{index}", f"10.0.{index // 250}.{index % 250 + 1}",
+                     8388, {"method": "aes-256-gcm", "password": password}).to_link()
+
+
+def _body(links) -> bytes:
+    return base64.b64encode("\n".join(links).encode("utf-8"))
+
+
+class _Feed:
+    """订阅服务端的状态：响应体、是否发送 ETag、是否 gzip，以及收到的请求。"""
+
+    def __init__(self):
+        self.body = _body([_link(i) for i in range(3)])
+        self.etag = True
+        self.gzip = False
+        self.requests = []
+        self.connections = 0
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive
+
+    def setup(self):
+        super().setup()
+        self.server.feed.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        feed = self.server.feed
+        feed.requests.append((self.path, dict(self.headers)))
+        if self.path == "/redirect":
+            self._reply(302, b"", {"Location": "/sub"})
+            return
+        etag = '"%s"' % hashlib.sha1(feed.body).hexdigest()
+        if feed.etag and self.headers.get("If-None-Match") == etag:
+            self._reply(304, b"", {"ETag": etag})
+            return
+        headers = {"ETag": etag} if feed.etag else {}
+        body = feed.body
+        if feed.gzip and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        self._reply(200, body, headers)
+
+    def _reply(self, status: int, body: bytes, headers: dict):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def feed():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.feed = _Feed()
+    server.feed.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.feed
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ProfileStore(str(tmp_path / "profiles.db"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def pool():
+    pool = HttpPool(timeout=5)
+    yield pool
+    pool.close()
+
+
+def _refresh(store, pool, url: str, force: bool = False):
+    if not store.list_subscriptions():
+        store.add_subscription("sub", url)
+    return refresh_subscription(store.list_subscriptions()[0], store, force, pool)
+
+
+def _names(store) -> list:
+    return sorted(n.name for n in store.find_nodes(group="sub"))
+
+
+def test_etag_gives_304_without_parsing(feed, store, pool):
+    result = _refresh(store, pool, feed.url + "/sub")
+    assert (result.added, result.total, result.not_modified) == (3, 3, False)
+    etag = store.list_subscriptions()[0]["etag"]
+    assert etag
+
+    result = _refresh(store, pool, feed.url + "/sub")
+    assert result.not_modified and not result.has_changes
+    assert feed.requests[-1][1].get("If-None-Match") == etag
+
+    result = _refresh(store, pool, feed.url + "/sub", force=True)
+    assert not result.not_modified and not result.has_changes
+    assert "If-None-Match" not in feed.requests[-1][1]
+
+
+def test_body_hash_skip_without_etag(feed, store, pool):
+    feed.etag = False
+    assert _refresh(store, pool, feed.url + "/sub").added == 3
+    ids = {n.name: n.id for n in store.find_nodes(group="sub")}
+    result = _refresh(store, pool, feed.url + "/sub")
+    assert result.not_modified
+    assert {n.name: n.id for n in store.find_nodes(group="sub")} == ids
+
+
+def test_gzip_body(feed, store, pool):
+    feed.gzip = True
+    result = _refresh(store, pool, feed.url + "/sub")
+    assert result.added == 3
+    assert "gzip" in feed.requests[-1][1].get("Accept-Encoding", "")
+
+
+def test_redirect_is_followed_on_the_same_connection(feed, store, pool):
+    result = _refresh(store, pool, feed.url + "/redirect")
+    assert result.added == 3
+    assert [path for path, _ in feed.requests] == ["/redirect", "/sub"]
+    assert feed.connections == 1    # keep-alive 复用
+
+
+def test_sync_counts(feed, store, pool):
+    _refresh(store, pool, feed.url + "/sub")
+    feed.body = _body([_link(0), _link(1, password="changed"), _link(3)])
+    result = _refresh(store, pool, feed.url + "/sub")
+    assert (result.added, result.removed, result.changed, result.total) == (1, 1, 1, 3)
+    assert _names(store) == ["node-0", "node-1", "node-3"]
+
+
+def test_large_feed_timing(feed, store, pool):
+    links = [_link(i) for i in range(2000)]
+    feed.body = _body(links)
+    started = time.monotonic()
+    result = _refresh(store, pool, feed.url + "/sub")
+    first = time.monotonic() - started
+    assert (result.added, result.total) == (2000, 2000)
+
+    links[7] = _link(7, password="changed")
+    feed.body = _body(links)
+    started = time.monotonic()
+    result = _refresh(store, pool, feed.url + "/sub")
+    second = time.monotonic() - started
+    assert (result.added, result.removed, result.changed) == (0, 0, 1)
+    assert first < 5.0 and second < 5.0
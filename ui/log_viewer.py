@@ -0,0 +1,203 @@
+"""
+日志查看窗口
+实时跟随核心进程与 GUI 自身的日志文件：
+  - QFileSystemWatcher 监听文件及其所在目录（Linux 上基于 inotify），有写入才读取，无轮询
+  - 从上次读到的偏移量增量读取，只处理新增字节
+  - 文件被截断、轮转或符号链接指向新的会话文件时，从头重新跟随
+  - QPlainTextEdit 限制最大行数，长时间打开也不会占用过多内存
+"""
+import os
+import platform
+from typing import List, Tuple
+
+from PyQt5.QtCore import QFileSystemWatcher
+from PyQt5.QtGui import QFont, QTextCursor
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QComboBox, QPlainTextEdit,
+    QPushButton, QLabel,
+)
+
+from core.log_manager import get_session_dir
+from core.output_capture import tail_file
+from ui.styles import btn_plain_style
+
+IS_WINDOWS = platform.system() == "Windows"
+
+VIEWER_MAX_BLOCKS = 5000   # 窗口中保留的最大行数
+VIEWER_INITIAL_LINES = 200 # 打开时先显示的最后行数
+VIEWER_READ_LIMIT = 256 * 1024  # 单次增量读取上限，积压更多时只读末尾
+
+
+def _log_sources() -> List[Tuple[str, str]]:
+    """可查看的日志列表：(显示名, 路径)。"""
+    if IS_WINDOWS:
+        from core.platform.windows.paths import WindowsPaths
+        paths = WindowsPaths()
+    else:
+        from core.platform.linux.paths import LinuxPaths
+        paths = LinuxPaths()
+
+    sources = [("OpenVPN", paths.openvpn_log), ("V2Ray / Xray", paths.v2ray_log)]
+    if not IS_WINDOWS:
+        sources.append(("Helper", os.path.join(paths.log_dir, "helper.log")))
+    session_dir = get_session_dir()
+    if session_dir:
+        sources.append(("ov2n 界面", os.path.join(session_dir, "ov2n.log")))
+    return sources
+
+
+class LogViewerDialog(QDialog):
+    """只读日志查看窗口，打开期间自动跟随文件新增内容。"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("查看日志")
+        self.resize(760, 480)
+
+        self._path = ""
+        self._real_path = ""
+        self._offset = 0
+        self._partial = b""
+
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.fileChanged.connect(self._on_file_changed)
+        self._watcher.directoryChanged.connect(self._on_dir_changed)
+
+        self._build_ui()
+        for name, path in _log_sources():
+            self.source_combo.addItem(name, path)
+        self.source_combo.currentIndexChanged.connect(self._on_source_changed)
+        self._on_source_changed(self.source_combo.currentIndex())
+
+    def _build_ui(self):
+        self.source_combo = QComboBox()
+        self.path_label = QLabel()
+        self.path_label.setStyleSheet("color: #666; font-size: 11px;")
+
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.text.setMaximumBlockCount(VIEWER_MAX_BLOCKS)
+        self.text.setLineWrapMode(QPlainTextEdit.NoWrap)
+        font = QFont("Monospace")
+        font.setStyleHint(QFont.TypeWriter)
+        self.text.setFont(font)
+
+        clear_button = QPushButton("清空")
+        clear_button.setStyleSheet(btn_plain_style())
+        clear_button.clicked.connect(self.text.clear)
+        close_button = QPushButton("关闭")
+        close_button.setStyleSheet(btn_plain_style())
+        close_button.clicked.connect(self.close)
+
+        top = QHBoxLayout()
+        top.addWidget(QLabel("日志:"))
+        top.addWidget(self.source_combo, 1)
+
+        bottom = QHBoxLayout()
+        bottom.addWidget(self.path_label, 1)
+        bottom.addWidget(clear_button)
+        bottom.addWidget(close_button)
+
+        layout = QVBoxLayout()
+        layout.addLayout(top)
+        layout.addWidget(self.text)
+        layout.addLayout(bottom)
+        self.setLayout(layout)
+
+    # ══════════════════════════════════════════
+    # 文件跟随
+    # ══════════════════════════════════════════
+
+    def _on_source_changed(self, index: int):
+        path = self.source_combo.itemData(index) or ""
+        watched = self._watcher.files() + self._watcher.directories()
+        if watched:
+            self._watcher.removePaths(watched)
+
+        self._path = path
+        self.path_label.setText(path)
+        self.text.clear()
+        if not path:
+            return
+
+        directory = os.path.dirname(path)
+        if os.path.isdir(directory):
+            self._watcher.addPath(directory)
+        self._reopen()
+
+    def _reopen(self):
+        """从最后 N 行开始重新跟随当前文件。"""
+        self._partial = b""
+        self._real_path = os.path.realpath(self._path)
+        try:
+            self._offset = os.path.getsize(self._real_path)
+        except OSError:
+            self._offset = 0
+            self.text.appendPlainText(f"（日志文件尚未生成: {self._path}）")
+            return
+
+        lines = tail_file(self._real_path, VIEWER_INITIAL_LINES)
+        if lines:
+            self.text.appendPlainText("\n".join(lines))
+        if self._real_path not in self._watcher.files():
+            self._watcher.addPath(self._real_path)
+        self._scroll_to_end()
+
+    def _on_dir_changed(self, _directory: str):
+        # 文件新建、轮转或符号链接切换到新会话文件
+        if not self._path:
+            return
+        real_path = os.path.realpath(self._path)
+        if real_path != self._real_path or real_path not in self._watcher.files():
+            if self._real_path in self._watcher.files():
+                self._watcher.removePath(self._real_path)
+            self.text.appendPlainText(f"── 日志文件已切换: {real_path} ──")
+            self._reopen()
+        else:
+            self._read_new()
+
+    def _on_file_changed(self, _path: str):
+        self._read_new()
+
+    def _read_new(self):
+        """读取自上次偏移量之后新增的内容。"""
+        try:
+            size = os.path.getsize(self._real_path)
+        except OSError:
+            return
+        if size < self._offset:
+            # 文件被截断或原地轮转
+            self.text.appendPlainText("── 日志文件已截断，从头读取 ──")
+            self._offset = 0
+            self._partial = b""
+        if size == self._offset:
+            return
+
+        # 一次积压过多时只显示末尾部分（窗口本身也只保留 VIEWER_MAX_BLOCKS 行）
+        if size - self._offset > VIEWER_READ_LIMIT:
+            self._offset = size - VIEWER_READ_LIMIT
+            self._partial = b""
+        try:
+            with open(self._real_path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read(size - self._offset)
+        except OSError:
+            return
+        self._offset += len(data)
+
+        data = self._partial + data
+        complete, _, self._partial = data.rpartition(b"\n")
+        if complete:
+            self.text.appendPlainText(
+                complete.decode("utf-8", errors="replace").rstrip("\r"))
+            self._scroll_to_end()
+
+    def _scroll_to_end(self):
+        self.text.moveCursor(QTextCursor.End)
+        self.text.ensureCursorVisible()
+
+    def closeEvent(self, event):
+        watched = self._watcher.files() + self._watcher.directories()
+        if watched:
+            self._watcher.removePaths(watched)
+        super().closeEvent(event)
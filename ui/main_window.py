@@ -20,17 +20,19 @@ import os
 import platform
 import subprocess
 import logging
+import urllib.parse
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional
 
 from PyQt5.QtGui import QDragEnterEvent, QDropEvent
-from PyQt5.QtCore import Qt, QTimer, QThread, pyqtSignal
+from PyQt5.QtCore import Qt, QTimer, QFileSystemWatcher
 from PyQt5.QtWidgets import (
     QMainWindow, QLabel, QPushButton, QVBoxLayout, QHBoxLayout, QWidget,
-    QFileDialog, QMessageBox, QCheckBox, QLineEdit,
+    QFileDialog, QMessageBox, QCheckBox, QLineEdit, QComboBox, QInputDialog,
     QGroupBox, QFormLayout, QSpinBox, QApplication,
 )
 
+from core import config_io
 from core.config_manager import (
     load_imported_flags, save_imported_flags,
     load_tproxy_config, save_tproxy_config,
@@ -45,6 +47,18 @@ from core.icon_helper import (
     load_window_icon, apply_window_icon, emoji_supported,
 )
 from core.ss_config_manager import import_ss_url_from_clipboard, V2RayConfigManager
+from core.profile_store import ProfileStore, get_store, outbound_endpoint
+from core.subscription import (
+    RES_SUBSCRIPTION, SUBSCRIPTION_CHECK_INTERVAL, refresh_subscriptions_job,
+)
+from core.latency_probe import RES_PROBE, probe_nodes_job, tproxy_bypass
+from core.health_monitor import (
+    RES_HEALTH, HealthMonitor, health_check_job, load_probe_url, save_probe_url,
+)
+from core.failover import FailoverController
+from core.balancer import NODE_TAG_PREFIX
+from core.perf_profiles import PROFILE_NONE, PROFILES, load_profile_name, save_profile_name
+from core.config_validation import RES_VALIDATE, validate_config_job
 from ui.styles import (
     group_box_style, drop_area_empty_style, drop_area_ok_style,
     btn_green_style, btn_red_style, btn_blue_style, btn_plain_style,
@@ -52,9 +66,19 @@ from ui.styles import (
     readonly_spinbox_style, editable_spinbox_style,
 )
 from core.vpn_process import create_managers
+from core.job_engine import JobHandle, get_engine
+from core.worker import (
+    RES_OPENVPN, RES_XRAY,
+    start_vpn_job, start_v2ray_job, start_combined_job, stop_job, failover_job,
+    reload_v2ray_job, reconnect_vpn_job, core_alive,
+)
+from ui.log_viewer import LogViewerDialog
 
 IS_WINDOWS = platform.system() == "Windows"
 
+MAX_BALANCED_NODES = 16  # 负载均衡时从档案库加入的节点数上限
+RELOAD_DEBOUNCE_MS = 800  # config.json 变化后等待编辑器写完再应用
+
 log = logging.getLogger("ov2n.ui")
 
 # Linux 专用导入
@@ -67,113 +91,6 @@ def _get_windows_handler():
     return WindowsPrivilegeHandler()
 
 
-# ══════════════════════════════════════════
-# 后台工作线程
-# ══════════════════════════════════════════
-
-class OpenVPNWorker(QThread):
-    """在后台线程启动 OpenVPN，避免 UI 卡死。"""
-    update_signal = pyqtSignal(str)        # 进度消息
-    error_signal = pyqtSignal(str)         # 错误信息
-    success_signal = pyqtSignal(int)       # 成功，返回 PID
-
-    def __init__(self, config_path: Path, openvpn_manager):
-        super().__init__()
-        self.config_path = config_path
-        self.manager = openvpn_manager
-
-    def run(self):
-        try:
-            self.update_signal.emit("正在启动 OpenVPN...")
-            if self.manager.start(self.config_path):
-                pid = self.manager.get_pid() or 1
-                self.update_signal.emit("OpenVPN 启动成功")
-                self.success_signal.emit(pid)
-            else:
-                self.error_signal.emit("OpenVPN 启动失败，请检查配置文件")
-        except Exception as e:
-            log.exception("OpenVPN 启动异常")
-            self.error_signal.emit(f"OpenVPN 启动异常: {e}")
-
-
-class XrayWorker(QThread):
-    """在后台线程启动 Xray，避免 UI 卡死。"""
-    update_signal = pyqtSignal(str)        # 进度消息
-    error_signal = pyqtSignal(str)         # 错误信息
-    success_signal = pyqtSignal(dict)      # 成功，返回 {"pid": int, "tproxy_ok": bool}
-
-    def __init__(self, config_path: Path, xray_manager, tproxy_enabled: bool = False):
-        super().__init__()
-        self.config_path = config_path
-        self.manager = xray_manager
-        self.tproxy_enabled = tproxy_enabled
-
-    def run(self):
-        try:
-            self.update_signal.emit("正在启动 V2Ray/Xray...")
-            if self.manager.start(self.config_path):
-                pid = self.manager.get_pid() or 1
-                self.update_signal.emit("V2Ray/Xray 启动成功")
-                self.success_signal.emit({
-                    "pid": pid,
-                    "tproxy_ok": self.tproxy_enabled and not IS_WINDOWS
-                })
-            else:
-                self.error_signal.emit("V2Ray/Xray 启动失败，请检查配置文件")
-        except Exception as e:
-            log.exception("V2Ray/Xray 启动异常")
-            self.error_signal.emit(f"V2Ray/Xray 启动异常: {e}")
-
-
-class CombinedWorker(QThread):
-    """顺序启动 OpenVPN 和 Xray，支持单侧启动。"""
-    update_signal = pyqtSignal(str)        # 进度消息
-    error_signal = pyqtSignal(str)         # 错误信息
-    success_signal = pyqtSignal(dict)      # 成功，返回 {"vpn_pid": int, "v2ray_pid": int, "warnings": []}
-
-    def __init__(self, ovpn_mgr, xray_mgr,
-                 ovpn_config: Optional[Path] = None,
-                 xray_config: Optional[Path] = None,
-                 tproxy_enabled: bool = False):
-        super().__init__()
-        self.ovpn_mgr = ovpn_mgr
-        self.xray_mgr = xray_mgr
-        self.ovpn_config = ovpn_config
-        self.xray_config = xray_config
-        self.tproxy_enabled = tproxy_enabled
-
-    def run(self):
-        result = {"vpn_pid": 0, "v2ray_pid": 0, "warnings": []}
-        try:
-            # 启动 OpenVPN（如果配置存在）
-            if self.ovpn_config and self.ovpn_config.exists():
-                self.update_signal.emit("正在启动 OpenVPN...")
-                if self.ovpn_mgr.start(self.ovpn_config):
-                    result["vpn_pid"] = self.ovpn_mgr.get_pid() or 1
-                    self.update_signal.emit("OpenVPN 启动成功")
-                else:
-                    result["warnings"].append("OpenVPN 启动失败")
-
-            # 启动 Xray（如果配置存在）
-            if self.xray_config and self.xray_config.exists():
-                self.update_signal.emit("正在启动 V2Ray/Xray...")
-                if self.xray_mgr.start(self.xray_config):
-                    result["v2ray_pid"] = self.xray_mgr.get_pid() or 1
-                    result["tproxy_ok"] = self.tproxy_enabled and not IS_WINDOWS
-                    self.update_signal.emit("V2Ray/Xray 启动成功")
-                else:
-                    result["warnings"].append("V2Ray/Xray 启动失败")
-
-            # 检查是否至少有一个服务启动成功
-            if result["vpn_pid"] or result["v2ray_pid"]:
-                self.success_signal.emit(result)
-            else:
-                self.error_signal.emit("所有服务启动失败")
-        except Exception as e:
-            log.exception("联合启动异常")
-            self.error_signal.emit(f"启动异常: {e}")
-
-
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -188,6 +105,37 @@ class MainWindow(QMainWindow):
         self.vpn_pid = None
         self.v2ray_pid = None
         self.tproxy_active = False
+        self._log_viewer: Optional[LogViewerDialog] = None
+
+        # ── 后台任务 ──────────────────────────────
+        # 所有启停操作提交到任务引擎，同一隧道上的操作按顺序排队执行
+        self._engine = get_engine()
+        self._jobs: Dict[str, JobHandle] = {}   # 资源名 -> 进行中的任务
+        self._quitting = False
+        # 订阅刷新进行中时到达的请求 (force, sub_ids, notify)，当前任务结束后依次提交
+        self._pending_subscription_refreshes: List[tuple] = []
+
+        # ── 代理健康监测（V2Ray 运行期间经本地入站定时探测）──
+        self._health: Optional[HealthMonitor] = None
+        self._failover: Optional[FailoverController] = None
+        self._health_timer = QTimer(self)
+        self._health_timer.setSingleShot(True)
+        self._health_timer.timeout.connect(self._run_health_check)
+
+        # ── 配置热更新：config.json 变化（切换节点、外部编辑等）时应用到运行中的 Xray ──
+        self._v2ray_runtime: Optional[str] = None   # 运行中的 Xray 使用的运行时配置
+        self._config_watcher = QFileSystemWatcher(self)
+        self._config_watcher.fileChanged.connect(self._on_config_file_changed)
+        self._reload_timer = QTimer(self)
+        self._reload_timer.setSingleShot(True)
+        self._reload_timer.timeout.connect(self._apply_v2ray_changes)
+
+        # ── 配置档案库（多节点 / 多 OpenVPN 配置）──────
+        try:
+            self._store: Optional[ProfileStore] = get_store()
+        except Exception as e:
+            log.error("打开配置档案库失败，节点切换不可用: %s", e)
+            self._store = None
 
         # ── 进程管理器 ────────────────────────────
         app_root = Path(get_app_root())
@@ -255,8 +203,16 @@ class MainWindow(QMainWindow):
 
         self._update_config_display()
         self._auto_extract_tproxy_config()
+        self._reload_profile_lists()
         self._refresh_buttons()
 
+        # ── 订阅定时刷新（只刷新到期的订阅）─────────────
+        self._subscription_timer = QTimer(self)
+        self._subscription_timer.timeout.connect(lambda: self._refresh_subscriptions())
+        if self._store is not None:
+            self._subscription_timer.start(SUBSCRIPTION_CHECK_INTERVAL * 1000)
+            QTimer.singleShot(3000, lambda: self._refresh_subscriptions())
+
         log.info("emoji 支持: %s", emoji_supported())
         log.info("平台: %s", "Windows" if IS_WINDOWS else "Linux")
 
@@ -272,9 +228,16 @@ class MainWindow(QMainWindow):
         sl = QVBoxLayout()
         self.vpn_status_label = QLabel("OpenVPN: 未连接")
         self.v2ray_status_label = QLabel("V2Ray: 未连接")
-        for lbl in (self.vpn_status_label, self.v2ray_status_label):
+        self.health_label = QLabel("代理健康: 未检测")
+        self.health_label.setToolTip("点击修改探测地址")
+        self.health_label.mousePressEvent = lambda e: self.edit_probe_url()
+        for lbl in (self.vpn_status_label, self.v2ray_status_label, self.health_label):
             lbl.setStyleSheet(status_label_style("#999"))
             sl.addWidget(lbl)
+        self.view_log_button = QPushButton("查看日志")
+        self.view_log_button.setStyleSheet(btn_plain_style())
+        self.view_log_button.clicked.connect(self.show_log_viewer)
+        sl.addWidget(self.view_log_button)
         self.status_group.setLayout(sl)
 
         # ── VPN 配置 ───────────────────────────────
@@ -290,6 +253,13 @@ class MainWindow(QMainWindow):
         self.vpn_drop_area.mousePressEvent = lambda e: self.select_vpn_config()
         vl.addWidget(self.vpn_drop_area)
 
+        vpl = QHBoxLayout()
+        vpl.addWidget(QLabel("配置:"))
+        self.vpn_profile_combo = QComboBox()
+        self.vpn_profile_combo.activated.connect(self._on_vpn_profile_selected)
+        vpl.addWidget(self.vpn_profile_combo, 1)
+        vl.addLayout(vpl)
+
         vbl = QHBoxLayout()
         self.start_vpn_button = QPushButton(btn_text("start", "启动 VPN"))
         self.start_vpn_button.setStyleSheet(btn_green_style())
@@ -297,8 +267,15 @@ class MainWindow(QMainWindow):
         self.stop_vpn_button = QPushButton(btn_text("stop", "停止 VPN"))
         self.stop_vpn_button.setStyleSheet(btn_red_style())
         self.stop_vpn_button.clicked.connect(self.stop_vpn_only)
+        self.reconnect_vpn_button = QPushButton("重新连接")
+        self.reconnect_vpn_button.setStyleSheet(btn_plain_style())
+        self.reconnect_vpn_button.setToolTip(
+            "网络波动后重新协商 OpenVPN 会话（SIGUSR1 软重启），"
+            "tun 设备和路由保持不变，通常不需要重新授权")
+        self.reconnect_vpn_button.clicked.connect(self.reconnect_vpn)
         vbl.addWidget(self.start_vpn_button)
         vbl.addWidget(self.stop_vpn_button)
+        vbl.addWidget(self.reconnect_vpn_button)
         vl.addLayout(vbl)
         self.vpn_group.setLayout(vl)
 
@@ -315,6 +292,44 @@ class MainWindow(QMainWindow):
         self.v2ray_drop_area.mousePressEvent = lambda e: self.select_v2ray_config()
         ssl.addWidget(self.v2ray_drop_area)
 
+        snl = QHBoxLayout()
+        snl.addWidget(QLabel("节点:"))
+        self.node_combo = QComboBox()
+        self.node_combo.activated.connect(self._on_node_selected)
+        snl.addWidget(self.node_combo, 1)
+        self.probe_button = QPushButton("测速")
+        self.probe_button.setStyleSheet(btn_plain_style())
+        self.probe_button.clicked.connect(self.probe_nodes)
+        snl.addWidget(self.probe_button)
+        ssl.addLayout(snl)
+
+        sal = QHBoxLayout()
+        self.auto_select_checkbox = QCheckBox("启动前自动选择最快节点")
+        self.auto_failover_checkbox = QCheckBox("节点异常时自动切换")
+        self.balancer_checkbox = QCheckBox("多节点负载均衡")
+        self.balancer_checkbox.setToolTip(
+            "当前节点所在分组的节点（最多 %d 个）组成 xray 均衡器，按延迟自动分流"
+            % MAX_BALANCED_NODES)
+        self.balancer_checkbox.clicked.connect(self._on_balancer_toggled)
+        sal.addWidget(self.auto_select_checkbox)
+        sal.addWidget(self.auto_failover_checkbox)
+        sal.addWidget(self.balancer_checkbox)
+        ssl.addLayout(sal)
+
+        spl = QHBoxLayout()
+        spl.addWidget(QLabel("性能档位:"))
+        self.perf_combo = QComboBox()
+        self.perf_combo.addItem("默认（不调整）", PROFILE_NONE)
+        for profile in PROFILES.values():
+            self.perf_combo.addItem(profile.label, profile.name)
+        self.perf_combo.setCurrentIndex(max(0, self.perf_combo.findData(load_profile_name())))
+        self.perf_combo.setToolTip(
+            "启动时按档位调整 Xray 的 sockopt、mux 和缓冲区，以及 OpenVPN 的 socket 缓冲区、"
+            "fast-io、mssfix 和加密算法顺序，生成单独的运行时配置，原配置文件不变")
+        self.perf_combo.activated.connect(self._on_perf_profile_selected)
+        spl.addWidget(self.perf_combo, 1)
+        ssl.addLayout(spl)
+
         sr1 = QHBoxLayout()
         self.import_ss_button = QPushButton(btn_text("import_clip", "从剪贴板导入"))
         self.import_ss_button.setStyleSheet(btn_blue_style())
@@ -325,6 +340,17 @@ class MainWindow(QMainWindow):
         sr1.addWidget(self.import_ss_button)
         sr1.addWidget(self.edit_ss_button)
 
+        sr3 = QHBoxLayout()
+        self.add_subscription_button = QPushButton("添加订阅")
+        self.add_subscription_button.setStyleSheet(btn_plain_style())
+        self.add_subscription_button.clicked.connect(self.add_subscription)
+        self.update_subscription_button = QPushButton("更新订阅")
+        self.update_subscription_button.setStyleSheet(btn_plain_style())
+        self.update_subscription_button.clicked.connect(
+            lambda: self._refresh_subscriptions(force=True))
+        sr3.addWidget(self.add_subscription_button)
+        sr3.addWidget(self.update_subscription_button)
+
         sr2 = QHBoxLayout()
         self.start_v2ray_button = QPushButton(btn_text("start", "启动 V2Ray"))
         self.start_v2ray_button.setStyleSheet(btn_green_style(small=True))
@@ -336,6 +362,7 @@ class MainWindow(QMainWindow):
         sr2.addWidget(self.stop_v2ray_button)
 
         ssl.addLayout(sr1)
+        ssl.addLayout(sr3)
         ssl.addLayout(sr2)
         self.ss_group.setLayout(ssl)
 
@@ -413,18 +440,270 @@ class MainWindow(QMainWindow):
     # 按钮状态统一管理
     # ══════════════════════════════════════════
 
-    def _refresh_buttons(self, starting: bool = False):
+    def _refresh_buttons(self):
         vpn_running = bool(self.vpn_pid)
         v2ray_running = bool(self.v2ray_pid)
         both_running = vpn_running and v2ray_running
+        vpn_busy = RES_OPENVPN in self._jobs
+        v2ray_busy = RES_XRAY in self._jobs
+        vpn_cancel = self._job_cancellable(RES_OPENVPN)
+        v2ray_cancel = self._job_cancellable(RES_XRAY)
+
+        self.start_vpn_button.setEnabled(not vpn_running and not vpn_busy)
+        self.start_v2ray_button.setEnabled(not v2ray_running and not v2ray_busy)
+        self.start_all_button.setEnabled(
+            not both_running and not vpn_busy and not v2ray_busy)
+
+        # 启动过程中停止按钮用于取消；停止过程中禁用
+        self.stop_vpn_button.setEnabled(
+            vpn_cancel or (vpn_running and not vpn_busy))
+        self.reconnect_vpn_button.setEnabled(vpn_running and not vpn_busy)
+        self.stop_v2ray_button.setEnabled(
+            v2ray_cancel or (v2ray_running and not v2ray_busy))
+        self.stop_all_button.setEnabled(
+            vpn_cancel or v2ray_cancel
+            or ((vpn_running or v2ray_running) and not vpn_busy and not v2ray_busy))
+        self._sync_health_monitor()
 
-        self.start_vpn_button.setEnabled(not vpn_running and not starting)
-        self.start_v2ray_button.setEnabled(not v2ray_running and not starting)
-        self.start_all_button.setEnabled(not both_running and not starting)
+    # ══════════════════════════════════════════
+    # 代理健康监测
+    # ══════════════════════════════════════════
 
-        self.stop_vpn_button.setEnabled(vpn_running)
-        self.stop_v2ray_button.setEnabled(v2ray_running)
-        self.stop_all_button.setEnabled(vpn_running or v2ray_running)
+    def _sync_health_monitor(self):
+        """V2Ray 运行时启动健康监测，停止后关闭。"""
+        if self.v2ray_pid and self._health is None:
+            try:
+                self._health = HealthMonitor.from_config(
+                    str(self.v2ray_config_path), load_probe_url())
+            except ValueError as e:
+                log.warning("无法启动健康监测: %s", e)
+            if self._health is None:
+                self._set_health_text("无可用的 socks/http 入站", "#999")
+                return
+            self._failover = FailoverController(
+                self._health, str(self.v2ray_config_path), self._store)
+            self._set_health_text("检测中...", "#FF9800")
+            self._health_timer.start(2000)
+        elif not self.v2ray_pid and self._health is not None:
+            self._health_timer.stop()
+            self._health.close()
+            self._health = None
+            self._failover = None
+            self._set_health_text("未检测", "#999")
+
+    def _run_health_check(self):
+        monitor = self._health
+        if monitor is None or RES_HEALTH in self._jobs:
+            return
+        self._submit_job(
+            health_check_job, monitor,
+            resources=(RES_HEALTH,), name="health",
+            on_progress=lambda msg: None,
+            on_finished=lambda sample: self._on_health_checked(monitor, sample),
+            on_failed=lambda err: self._on_health_checked(monitor, None))
+
+    def _on_health_checked(self, monitor: HealthMonitor, sample):
+        if monitor is not self._health:
+            return
+        score = monitor.score
+        color = ("#999" if score is None else "#4CAF50" if score >= 80
+                 else "#FF9800" if score >= 50 else "#F44336")
+        self._set_health_text(monitor.summary(), color)
+
+        failover = self._failover
+        if (sample is not None and failover is not None
+                and failover.observe(sample)
+                and self.auto_failover_checkbox.isChecked()
+                and RES_XRAY not in self._jobs):
+            self._start_failover(failover)
+            return
+        delay = failover.next_delay() if failover is not None else monitor.next_delay()
+        self._health_timer.start(int(delay * 1000))
+
+    def _start_failover(self, failover: FailoverController):
+        """当前节点劣化：切换到最快的备用节点并应用到 Xray（不可取消）。"""
+        self._set_v2ray_status("节点异常，正在切换...", "#FF9800")
+        self._submit_job(
+            failover_job, failover, str(self.v2ray_config_path), self.v2ray_pid,
+            self.xray_mgr, self._tproxy_job_params(), self._perf_profile(),
+            self._v2ray_runtime,
+            resources=(RES_XRAY, RES_HEALTH), name="failover", cancellable=False,
+            on_progress=lambda m: self._set_v2ray_status(m, "#FF9800"),
+            on_finished=self._on_failover_done,
+            on_failed=self._on_failover_failed)
+
+    def _on_failover_done(self, result: dict):
+        if result.get('error'):
+            self._update_config_display()
+            self._reload_profile_lists()
+            self._set_v2ray_status(
+                f"⚠ 切换到 {result['selected']} 失败，继续使用当前节点", "#FF9800")
+            log.warning("切换到 %s 失败: %s", result['selected'], result['error'])
+        elif result['selected']:
+            self.v2ray_pid = result['pid'] or 1
+            self.tproxy_active = result['tproxy_ok']
+            self._v2ray_runtime = result['runtime']
+            self._update_config_display()
+            self._auto_extract_tproxy_config()
+            self._reload_profile_lists()
+            self._set_v2ray_status(
+                f"✓ 已切换到 {result['selected']} (PID: {self.v2ray_pid})", "#4CAF50")
+        elif result.get('reason'):
+            self._set_v2ray_status(f"⚠ 节点切换失败: {result['reason']}", "#F44336")
+        else:
+            self._set_v2ray_status("节点异常，没有可用的备用节点", "#F44336")
+        self._refresh_buttons()
+        self._resume_health_checks()
+
+    def _on_failover_failed(self, err: str):
+        if core_alive(self.v2ray_pid, self.xray_mgr):
+            self._set_v2ray_status("⚠ 节点切换失败，继续使用当前节点", "#FF9800")
+        else:
+            # 旧进程已停止，新进程未能启动
+            self.v2ray_pid = None
+            self.tproxy_active = False
+            self._set_v2ray_status("未连接", "#999")
+        self._refresh_buttons()
+        self._resume_health_checks()
+        QMessageBox.critical(self, "节点切换失败", err)
+
+    def _resume_health_checks(self):
+        """切换任务结束后（无论成败）继续健康探测；V2Ray 已停止时监测器已被关闭。"""
+        if self._failover is not None:
+            self._health_timer.start(int(self._failover.next_delay() * 1000))
+
+    # ── 配置热更新 ──────────────────────────────
+
+    def _watch_config(self):
+        path = str(self.v2ray_config_path)
+        if os.path.exists(path) and path not in self._config_watcher.files():
+            self._config_watcher.addPath(path)
+
+    def _on_config_file_changed(self, path: str):
+        # 原子替换会使监视失效，需要重新加入
+        self._watch_config()
+        if self.v2ray_pid:
+            self._reload_timer.start(RELOAD_DEBOUNCE_MS)
+
+    def _apply_v2ray_changes(self):
+        """把配置改动应用到运行中的 Xray：能热更新时不重启，现有连接保持。"""
+        if not self.v2ray_pid or self._quitting:
+            return
+        if RES_XRAY in self._jobs:
+            # 启动、切换等任务可能正是改动的来源，等它们结束后再比较
+            self._reload_timer.start(RELOAD_DEBOUNCE_MS)
+            return
+        self._submit_job(
+            reload_v2ray_job, str(self.v2ray_config_path), self._v2ray_runtime,
+            self.v2ray_pid, self.xray_mgr, self._tproxy_job_params(), self._perf_profile(),
+            resources=(RES_XRAY,), name="reload-xray", cancellable=False,
+            on_progress=lambda m: self._set_v2ray_status(m, "#FF9800"),
+            on_finished=self._on_v2ray_reloaded,
+            on_failed=self._on_v2ray_reload_failed)
+
+    def _on_v2ray_reloaded(self, result: dict):
+        if result.get('error'):
+            # 未通过预校验，运行中的 Xray 没有改动
+            self._set_v2ray_status("⚠ 新配置无效，继续使用当前配置", "#FF9800")
+            QMessageBox.warning(self, "配置无效", result['error'])
+            return
+        self.v2ray_pid = result['pid'] or 1
+        self.tproxy_active = result['tproxy_ok']
+        self._v2ray_runtime = result['runtime']
+        if result['reloaded']:
+            how = "已热更新"
+        else:
+            how = "已无缝切换" if result.get('handoff') else "已重启"
+        self._set_v2ray_status(f"✓ 配置{how} (PID: {self.v2ray_pid})", "#4CAF50")
+        self._refresh_buttons()
+
+    def _on_v2ray_reload_failed(self, err: str):
+        # 热更新失败后重启也失败：旧进程已停止
+        self.v2ray_pid = None
+        self.tproxy_active = False
+        self._set_v2ray_status("未连接", "#999")
+        self._refresh_buttons()
+        QMessageBox.critical(self, "应用配置失败", err)
+
+    def _set_health_text(self, text: str, color: str):
+        self.health_label.setText(f"代理健康: {text}")
+        self.health_label.setStyleSheet(status_label_style(color))
+
+    def edit_probe_url(self):
+        url, ok = QInputDialog.getText(
+            self, "探测地址", "经代理访问的探测地址 (http/https):", text=load_probe_url())
+        url = url.strip()
+        if not ok or not url:
+            return
+        if not url.startswith(("http://", "https://")):
+            QMessageBox.warning(self, "地址无效", "探测地址必须以 http:// 或 https:// 开头。")
+            return
+        try:
+            save_probe_url(url)
+        except OSError as e:
+            QMessageBox.warning(self, "保存失败", str(e))
+            return
+        if self._health is not None:
+            # 按新地址重建监测器
+            self._health_timer.stop()
+            self._health.close()
+            self._health = None
+            self._sync_health_monitor()
+
+    # ══════════════════════════════════════════
+    # 后台任务
+    # ══════════════════════════════════════════
+
+    def _submit_job(self, job, *args, resources, on_progress, on_finished,
+                    on_failed, name: str = "", cancellable: bool = True,
+                    **kwargs) -> JobHandle:
+        """提交任务到任务引擎，并登记其占用的资源（用于按钮状态和取消）。"""
+        handle = self._engine.create_job(
+            job, *args, resources=resources, name=name,
+            cancellable=cancellable, **kwargs)
+        for resource in handle.resources:
+            self._jobs[resource] = handle
+        # 先释放登记再回调，回调中的 _refresh_buttons() 才能看到最新状态
+        for sig in (handle.finished, handle.failed, handle.cancelled):
+            sig.connect(lambda *_, h=handle: self._release_job(h))
+        handle.progress.connect(on_progress)
+        handle.finished.connect(on_finished)
+        handle.failed.connect(on_failed)
+        handle.cancelled.connect(lambda h=handle: self._on_job_cancelled(h))
+        handle.start()
+        self._refresh_buttons()
+        return handle
+
+    def _release_job(self, handle: JobHandle):
+        for resource in handle.resources:
+            if self._jobs.get(resource) is handle:
+                del self._jobs[resource]
+
+    def _cancel_jobs(self, *resources: str) -> bool:
+        """
+        取消占用这些资源的可取消任务（启动类）。
+        返回这些资源上是否有进行中的任务（含不可取消的停止任务），有则调用方不再重复提交。
+        """
+        handles = {self._jobs[r] for r in resources if r in self._jobs}
+        for handle in handles:
+            if handle.cancellable:
+                log.info("取消任务 %r", handle)
+                handle.cancel()
+        return bool(handles)
+
+    def _job_cancellable(self, resource: str) -> bool:
+        handle = self._jobs.get(resource)
+        return handle is not None and handle.cancellable
+
+    def _on_job_cancelled(self, handle: JobHandle):
+        if RES_OPENVPN in handle.resources and not self.vpn_pid:
+            self._set_vpn_status("已取消", "#999")
+        if RES_XRAY in handle.resources and not self.v2ray_pid:
+            self._set_v2ray_status("已取消", "#999")
+        if RES_SUBSCRIPTION in handle.resources:
+            self.update_subscription_button.setEnabled(True)
+            self._run_pending_subscription_refresh()
+        self._refresh_buttons()
 
     # ══════════════════════════════════════════
     # 配置显示与提取
@@ -447,6 +726,8 @@ class MainWindow(QMainWindow):
         else:
             self.v2ray_drop_area.setText(f"{dp}点击选择或拖拽 config.json 到此处")
             self.v2ray_drop_area.setStyleSheet(drop_area_empty_style())
+        self._sync_balancer_checkbox()
+        self._watch_config()
 
     def _auto_extract_tproxy_config(self):
         if not self.v2ray_config_path.exists():
@@ -464,6 +745,256 @@ class MainWindow(QMainWindow):
         self.mark_input.setEnabled(enabled)
         self.table_input.setEnabled(enabled)
 
+    # ══════════════════════════════════════════
+    # 配置档案库（节点 / OpenVPN 配置切换）
+    # ══════════════════════════════════════════
+
+    def _reload_profile_lists(self):
+        """从档案库刷新节点和 OpenVPN 配置下拉框。"""
+        for combo in (self.node_combo, self.vpn_profile_combo):
+            combo.clear()
+            combo.setEnabled(self._store is not None)
+        if self._store is None:
+            return
+
+        selected = self._store.selected_node_id()
+        for node in self._store.find_nodes():
+            label = f"{node.group} / {node.name}" if node.group else node.name
+            if node.latency_ms is not None:
+                label += f"  ({node.latency_ms:.0f} ms)"
+            self.node_combo.addItem(label, node.id)
+            if node.id == selected:
+                self.node_combo.setCurrentIndex(self.node_combo.count() - 1)
+
+        selected = self._store.selected_vpn_id()
+        for profile_id, name, group in self._store.list_vpn_profiles():
+            self.vpn_profile_combo.addItem(f"{group} / {name}" if group else name, profile_id)
+            if profile_id == selected:
+                self.vpn_profile_combo.setCurrentIndex(self.vpn_profile_combo.count() - 1)
+
+        self.node_combo.setEnabled(self.node_combo.count() > 0)
+        self.vpn_profile_combo.setEnabled(self.vpn_profile_combo.count() > 0)
+
+    def _sync_balancer_checkbox(self):
+        enabled = False
+        if self.v2ray_config_path.exists():
+            try:
+                enabled = V2RayConfigManager(str(self.v2ray_config_path)).balancer_enabled()
+            except Exception as e:
+                log.debug("读取均衡器状态失败: %s", e)
+        self.balancer_checkbox.setChecked(enabled)
+
+    def _remember_proxy_node(self, group: str, import_all: bool = False):
+        """
+        把当前 config.json 中的 proxy 出站保存为节点并设为当前节点。
+        import_all 时同时导入其他带服务器地址的代理出站。
+        """
+        if self._store is None:
+            return
+        try:
+            config = V2RayConfigManager(str(self.v2ray_config_path)).config
+            if import_all:
+                self._store.import_outbounds(config, group)
+            proxy = next((ob for ob in config.get("outbounds", [])
+                          if ob.get("tag") == "proxy"), None)
+            if proxy is not None:
+                _protocol, address, port = outbound_endpoint(proxy)
+                if address:
+                    node_id = self._store.add_node(f"{address}:{port}", proxy, group)
+                    self._store.select_node(node_id)
+        except Exception as e:
+            log.warning("保存节点到档案库失败: %s", e)
+        self._reload_profile_lists()
+
+    def _on_node_selected(self, index: int):
+        node_id = self.node_combo.itemData(index)
+        if self._store is None or node_id is None:
+            return
+        if node_id == self._store.selected_node_id() and self.v2ray_config_path.exists():
+            return
+        try:
+            base = V2RayConfigManager(str(self.v2ray_config_path)).config
+            self._store.activate_node(node_id, str(self.v2ray_config_path), base)
+        except Exception as e:
+            QMessageBox.critical(self, "切换失败", f"生成节点配置失败:\n{e}")
+            self._reload_profile_lists()
+            return
+
+        self.v2ray_config_imported = True
+        save_imported_flags(self.vpn_config_imported, self.v2ray_config_imported)
+        self._update_config_display()
+        self._auto_extract_tproxy_config()
+        self._refresh_buttons()
+
+    def add_subscription(self):
+        """添加订阅地址并立即获取节点。"""
+        if self._store is None:
+            QMessageBox.warning(self, "不可用", "配置档案库未能打开，无法添加订阅。")
+            return
+        url, ok = QInputDialog.getText(self, "添加订阅", "订阅地址 (http/https):")
+        url = url.strip()
+        if not ok or not url:
+            return
+        if not url.startswith(("http://", "https://")):
+            QMessageBox.warning(self, "地址无效", "订阅地址必须以 http:// 或 https:// 开头。")
+            return
+        default_name = urllib.parse.urlsplit(url).hostname or "订阅"
+        name, ok = QInputDialog.getText(self, "添加订阅", "名称（作为节点分组）:",
+                                        text=default_name)
+        if not ok or not name.strip():
+            return
+        sub_id = self._store.add_subscription(name.strip(), url)
+        busy = RES_SUBSCRIPTION in self._jobs
+        self._refresh_subscriptions(force=True, sub_ids=[sub_id], notify=True)
+        if busy:
+            QMessageBox.information(
+                self, "添加订阅", "订阅已添加。\n正在进行的订阅更新完成后会自动获取该订阅的节点。")
+
+    def _refresh_subscriptions(self, force: bool = False,
+                               sub_ids: Optional[list] = None,
+                               notify: Optional[bool] = None):
+        """
+        提交订阅刷新任务；force 时刷新全部订阅（手动“更新订阅”）。
+        已有刷新任务时排队，当前任务结束后再提交（刚添加的订阅不会被丢掉）。
+        """
+        if self._store is None:
+            return
+        if notify is None:
+            notify = force
+        if RES_SUBSCRIPTION in self._jobs:
+            request = (force, sub_ids, notify)
+            if request not in self._pending_subscription_refreshes:
+                log.info("订阅更新进行中，稍后刷新: force=%s sub_ids=%s", force, sub_ids)
+                self._pending_subscription_refreshes.append(request)
+            return
+        if force:
+            self.update_subscription_button.setEnabled(False)
+        self._submit_job(
+            refresh_subscriptions_job, self._store, force=force, sub_ids=sub_ids,
+            resources=(RES_SUBSCRIPTION,), name="subscriptions",
+            on_progress=lambda msg: log.info("%s", msg),
+            on_finished=lambda results: self._on_subscriptions_refreshed(results, notify),
+            on_failed=lambda err: self._on_subscriptions_failed(err, notify))
+
+    def _run_pending_subscription_refresh(self):
+        if self._pending_subscription_refreshes and not self._quitting:
+            force, sub_ids, notify = self._pending_subscription_refreshes.pop(0)
+            self._refresh_subscriptions(force=force, sub_ids=sub_ids, notify=notify)
+
+    def _on_subscriptions_refreshed(self, results: list, notify: bool):
+        self.update_subscription_button.setEnabled(True)
+        self._run_pending_subscription_refresh()
+        if any(r.has_changes for r in results):
+            self._reload_profile_lists()
+        if notify:
+            if results:
+                QMessageBox.information(
+                    self, "订阅更新", "\n".join(str(r) for r in results))
+            else:
+                QMessageBox.information(self, "订阅更新", "尚未添加订阅。")
+
+    def _on_subscriptions_failed(self, err: str, notify: bool):
+        self.update_subscription_button.setEnabled(True)
+        self._run_pending_subscription_refresh()
+        log.warning("订阅更新失败: %s", err)
+        if notify:
+            QMessageBox.warning(self, "订阅更新失败", err)
+
+    def _balancer_nodes(self) -> list:
+        """当前节点所在分组中延迟最低的若干节点，作为均衡器的额外出站。"""
+        if self._store is None:
+            return []
+        selected = self._store.selected_node_id()
+        node = self._store.get_node(selected) if selected else None
+        if node is None:
+            return []
+        items = []
+        for other in self._store.find_nodes(group=node.group, order_by_latency=True,
+                                            limit=MAX_BALANCED_NODES):
+            outbound = self._store.get_outbound(other.id)
+            if other.id != selected and outbound is not None:
+                items.append((f"{NODE_TAG_PREFIX}{other.id}", outbound))
+        return items
+
+    def _on_balancer_toggled(self, checked: bool):
+        manager = V2RayConfigManager(str(self.v2ray_config_path))
+        try:
+            if checked:
+                ok = manager.enable_balancer(extra_outbounds=self._balancer_nodes())
+            else:
+                ok = manager.disable_balancer()
+        except ValueError as e:
+            self.balancer_checkbox.setChecked(not checked)
+            QMessageBox.warning(self, "无法启用负载均衡", str(e))
+            return
+        if not ok:
+            self.balancer_checkbox.setChecked(not checked)
+            QMessageBox.critical(self, "错误", "保存配置失败，请检查文件权限")
+            return
+        self._update_config_display()
+
+    def _perf_profile(self) -> str:
+        return self.perf_combo.currentData() or PROFILE_NONE
+
+    def _on_perf_profile_selected(self, index: int):
+        try:
+            save_profile_name(self.perf_combo.itemData(index))
+        except OSError as e:
+            QMessageBox.warning(self, "保存失败", str(e))
+            return
+        self._apply_v2ray_changes()
+
+    def probe_nodes(self):
+        """测速：有档案库时测全部节点并显示在节点列表中，否则测 config.json 中的出站。"""
+        if RES_PROBE in self._jobs:
+            return
+        self.probe_button.setEnabled(False)
+        # 透明代理生效时本机直连会被转给 Xray，测得的不是节点延迟
+        bypass = tproxy_bypass(self.vps_ip_input.text().strip()) if self.tproxy_active else None
+        self._submit_job(
+            probe_nodes_job, self._store, str(self.v2ray_config_path), tls=True, bypass=bypass,
+            resources=(RES_PROBE,), name="probe",
+            on_progress=lambda msg: log.info("%s", msg),
+            on_finished=self._on_nodes_probed,
+            on_failed=self._on_probe_failed)
+
+    def _on_nodes_probed(self, results: dict):
+        self.probe_button.setEnabled(True)
+        if not results:
+            QMessageBox.information(self, "测速", "没有可测速的节点。")
+            return
+        if self._store is not None:
+            self._reload_profile_lists()
+            return
+        lines = [f"{key}: {stats.median:.0f} ms" if stats.median is not None
+                 else f"{key}: 不可达" for key, stats in results.items()]
+        QMessageBox.information(self, "测速结果", "\n".join(lines))
+
+    def _on_probe_failed(self, err: str):
+        self.probe_button.setEnabled(True)
+        log.warning("测速失败: %s", err)
+        QMessageBox.warning(self, "测速失败", err)
+
+    def _on_vpn_profile_selected(self, index: int):
+        profile_id = self.vpn_profile_combo.itemData(index)
+        if self._store is None or profile_id is None:
+            return
+        if profile_id == self._store.selected_vpn_id() and self.vpn_config_path.exists():
+            return
+        try:
+            self._store.activate_vpn_profile(profile_id, str(self.vpn_config_path))
+        except Exception as e:
+            QMessageBox.critical(self, "切换失败", f"写出 OpenVPN 配置失败:\n{e}")
+            self._reload_profile_lists()
+            return
+
+        self.vpn_config_imported = True
+        save_imported_flags(self.vpn_config_imported, self.v2ray_config_imported)
+        self._update_config_display()
+        self._refresh_buttons()
+        if self.vpn_pid:
+            self._set_vpn_status("配置已切换，重启 VPN 后生效", "#FF9800")
+
     # ══════════════════════════════════════════
     # 配置就绪检查
     # ══════════════════════════════════════════
@@ -511,6 +1042,17 @@ class MainWindow(QMainWindow):
             'tproxy_table': self.table_input.value(),
         }
 
+    def _tproxy_job_params(self) -> Optional[dict]:
+        """启动任务的透明代理参数，未启用（或 Windows）时返回 None。"""
+        if IS_WINDOWS or not self.tproxy_checkbox.isChecked():
+            return None
+        return {
+            'port': self.tproxy_port_input.value(),
+            'vps_ip': self.vps_ip_input.text().strip(),
+            'mark': self.mark_input.value(),
+            'table': self.table_input.value(),
+        }
+
     # ══════════════════════════════════════════
     # 配置导入（拖拽 + 文件选择 + 剪贴板）
     # ══════════════════════════════════════════
@@ -533,6 +1075,15 @@ class MainWindow(QMainWindow):
         self.vpn_drop_area.setText(f"{check_mark()}{Path(source_path).name}")
         self.vpn_drop_area.setStyleSheet(drop_area_ok_style())
 
+        if self._store is not None:
+            try:
+                content, _encoding = config_io.read_text(str(self.vpn_config_path))
+                profile_id = self._store.add_vpn_profile(Path(source_path).stem, content)
+                self._store.select_vpn_profile(profile_id)
+            except Exception as e:
+                log.warning("保存 OpenVPN 配置到档案库失败: %s", e)
+            self._reload_profile_lists()
+
     def _on_v2ray_config_imported(self, source_path: str):
         """
         处理 V2Ray 配置导入：将源文件复制到用户配置目录。
@@ -551,6 +1102,26 @@ class MainWindow(QMainWindow):
         self.v2ray_drop_area.setText(f"{check_mark()}{Path(source_path).name}")
         self.v2ray_drop_area.setStyleSheet(drop_area_ok_style(pad="15px"))
         self._auto_extract_tproxy_config()
+        self._remember_proxy_node(Path(source_path).stem, import_all=True)
+        self._validate_v2ray_config()
+
+    def _validate_v2ray_config(self):
+        """导入后在后台校验配置，结果按哈希缓存，连接时直接使用。"""
+        self._submit_job(
+            validate_config_job, str(self.v2ray_config_path), self._perf_profile(),
+            self._tproxy_job_params(),
+            str(self.xray_mgr.xray_exe) if IS_WINDOWS and self.xray_mgr else None,
+            resources=(RES_VALIDATE,), name="validate",
+            on_progress=lambda msg: log.info("%s", msg),
+            on_finished=self._on_config_validated,
+            on_failed=lambda err: log.warning("配置校验失败: %s", err))
+
+    def _on_config_validated(self, result):
+        if result is None:
+            log.info("未找到 xray，跳过配置校验")
+        elif not result.ok:
+            QMessageBox.warning(self, "配置无效",
+                                f"导入的 V2Ray 配置无法通过 xray 校验:\n\n{result.error}")
 
     def dragEnterEvent(self, event: QDragEnterEvent):
         if event.mimeData().hasUrls():
@@ -573,6 +1144,19 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(
                 self, "错误", "不支持的文件类型!\n请拖拽 .ovpn 或 .json 文件")
 
+    def show_log_viewer(self):
+        """打开（或激活）实时日志窗口。"""
+        if self._log_viewer is None:
+            self._log_viewer = LogViewerDialog(self)
+            self._log_viewer.finished.connect(self._on_log_viewer_closed)
+        self._log_viewer.show()
+        self._log_viewer.raise_()
+        self._log_viewer.activateWindow()
+
+    def _on_log_viewer_closed(self):
+        self._log_viewer.deleteLater()
+        self._log_viewer = None
+
     def select_vpn_config(self):
         start = os.path.expanduser("~")
         path, _ = QFileDialog.getOpenFileName(
@@ -607,9 +1191,11 @@ class MainWindow(QMainWindow):
                 f"{check_mark()}{self.v2ray_config_path.name} (已更新)")
             self.v2ray_drop_area.setStyleSheet(drop_area_ok_style(pad="15px"))
             self._auto_extract_tproxy_config()
+            self._remember_proxy_node("剪贴板")
+            self._validate_v2ray_config()
             QMessageBox.information(
                 self, "成功",
-                "配置已更新，透明代理参数已自动提取。\n如需应用，请重启 V2Ray。")
+                "配置已更新，透明代理参数已自动提取。\nV2Ray 运行中时会自动应用。")
 
     def edit_v2ray_config(self):
         if not self.v2ray_config_path.exists():
@@ -626,7 +1212,7 @@ class MainWindow(QMainWindow):
                 subprocess.Popen(["xdg-open", str(self.v2ray_config_path)])
             QMessageBox.information(
                 self, "提示",
-                "配置文件已在外部编辑器中打开。\n编辑完成后请重启 V2Ray 以应用更改。")
+                "配置文件已在外部编辑器中打开。\n保存后，运行中的 V2Ray 会自动应用更改。")
         except Exception as e:
             QMessageBox.critical(self, "错误", f"无法打开编辑器: {e}")
 
@@ -652,14 +1238,13 @@ class MainWindow(QMainWindow):
         if self.vpn_pid:
             QMessageBox.warning(self, "警告", "OpenVPN 已在运行")
             return
-        self._refresh_buttons(starting=True)
         self._set_vpn_status("正在启动...", "#FF9800")
-        self._vpn_worker = OpenVPNWorker(self.vpn_config_path, self.openvpn_mgr)
-        self._vpn_worker.update_signal.connect(
-            lambda m: self._set_vpn_status(m, "#FF9800"))
-        self._vpn_worker.error_signal.connect(self._on_vpn_error)
-        self._vpn_worker.success_signal.connect(self._on_vpn_started)
-        self._vpn_worker.start()
+        self._submit_job(
+            start_vpn_job, str(self.vpn_config_path), self.openvpn_mgr, self._perf_profile(),
+            resources=(RES_OPENVPN,), name="start-openvpn",
+            on_progress=lambda m: self._set_vpn_status(m, "#FF9800"),
+            on_finished=self._on_vpn_started,
+            on_failed=self._on_vpn_error)
 
     def _on_vpn_started(self, pid: int):
         self.vpn_pid = pid
@@ -675,19 +1260,44 @@ class MainWindow(QMainWindow):
         QMessageBox.critical(self, "OpenVPN 启动失败", err)
 
     def stop_vpn_only(self):
+        if self._job_cancellable(RES_OPENVPN):
+            self._set_vpn_status("正在取消...", "#FF9800")
+        if self._cancel_jobs(RES_OPENVPN):
+            return
         if not self.vpn_pid:
             return
-        self.stop_vpn_button.setEnabled(False)
-        self._set_vpn_status("正在停止...", "#FF9800")
-        try:
-            self.openvpn_mgr.stop()
-            self.vpn_pid = None
-            self._set_vpn_status("未连接", "#999")
-            self._refresh_buttons()
-            QMessageBox.information(self, "成功", "OpenVPN 已停止")
-        except Exception as e:
-            self._refresh_buttons()
-            QMessageBox.critical(self, "错误", f"停止失败: {e}")
+        self._submit_stop(vpn=True, v2ray=False, done_message="OpenVPN 已停止")
+
+    def reconnect_vpn(self):
+        if not self.vpn_pid or RES_OPENVPN in self._jobs:
+            return
+        self._set_vpn_status("正在重新连接...", "#FF9800")
+        self._submit_job(
+            reconnect_vpn_job, str(self.vpn_config_path), self.vpn_pid, self.openvpn_mgr,
+            self._perf_profile(),
+            resources=(RES_OPENVPN,), name="reconnect-openvpn", cancellable=False,
+            on_progress=lambda m: self._set_vpn_status(m, "#FF9800"),
+            on_finished=self._on_vpn_reconnected,
+            on_failed=self._on_vpn_reconnect_failed)
+
+    def _on_vpn_reconnected(self, result: dict):
+        self.vpn_pid = result['vpn_pid']
+        if result.get('error'):
+            self._set_vpn_status(f"⚠ {result['error']}", "#FF9800")
+        elif not result['soft']:
+            self._set_vpn_status(f"✓ 已重新启动 (PID: {self.vpn_pid})", "#4CAF50")
+        elif result['confirmed']:
+            self._set_vpn_status(f"✓ 已重新连接 ({result['elapsed']:.1f}s)", "#4CAF50")
+        else:
+            self._set_vpn_status("✓ 已发送重连信号", "#4CAF50")
+        self._refresh_buttons()
+
+    def _on_vpn_reconnect_failed(self, err: str):
+        # 软重启不可用时停止后重新启动，启动失败：OpenVPN 已停止
+        self.vpn_pid = None
+        self._set_vpn_status("未连接", "#999")
+        self._refresh_buttons()
+        QMessageBox.critical(self, "OpenVPN 重新连接失败", err)
 
     # ══════════════════════════════════════════
     # V2Ray 独立启停
@@ -701,21 +1311,26 @@ class MainWindow(QMainWindow):
             return
         if not self._validate_tproxy_params():
             return
-        self._refresh_buttons(starting=True)
         self._set_v2ray_status("正在启动...", "#FF9800")
-        tproxy_enabled = self.tproxy_checkbox.isChecked() and not IS_WINDOWS
-        self._v2ray_worker = XrayWorker(
-            self.v2ray_config_path, self.xray_mgr, tproxy_enabled)
-        self._v2ray_worker.update_signal.connect(
-            lambda m: self._set_v2ray_status(m, "#FF9800"))
-        self._v2ray_worker.error_signal.connect(self._on_v2ray_error)
-        self._v2ray_worker.success_signal.connect(self._on_v2ray_started)
-        self._v2ray_worker.start()
+        self._submit_job(
+            start_v2ray_job, str(self.v2ray_config_path), self.xray_mgr,
+            tproxy=self._tproxy_job_params(),
+            auto_select=self.auto_select_checkbox.isChecked(), store=self._store,
+            perf_profile=self._perf_profile(),
+            resources=(RES_XRAY,), name="start-xray",
+            on_progress=lambda m: self._set_v2ray_status(m, "#FF9800"),
+            on_finished=self._on_v2ray_started,
+            on_failed=self._on_v2ray_error)
 
     def _on_v2ray_started(self, result: dict):
+        if result.get('selected'):
+            self._update_config_display()
+            self._auto_extract_tproxy_config()
+            self._reload_profile_lists()
         pid = result['pid'] or 1
         self.v2ray_pid = pid
         self.tproxy_active = result.get('tproxy_ok', False)
+        self._v2ray_runtime = result.get('runtime')
         if IS_WINDOWS:
             self._set_v2ray_status("✓ Xray 运行中 (TUN)", "#4CAF50")
         else:
@@ -729,19 +1344,13 @@ class MainWindow(QMainWindow):
         QMessageBox.critical(self, "V2Ray 启动失败", err)
 
     def stop_v2ray_only(self):
+        if self._job_cancellable(RES_XRAY):
+            self._set_v2ray_status("正在取消...", "#FF9800")
+        if self._cancel_jobs(RES_XRAY):
+            return
         if not self.v2ray_pid:
             return
-        self.stop_v2ray_button.setEnabled(False)
-        self._set_v2ray_status("正在停止...", "#FF9800")
-        try:
-            self.xray_mgr.stop()
-            self.v2ray_pid = None
-            self._set_v2ray_status("未连接", "#999")
-            self._refresh_buttons()
-            QMessageBox.information(self, "成功", "V2Ray 已停止")
-        except Exception as e:
-            self._refresh_buttons()
-            QMessageBox.critical(self, "错误", f"停止失败: {e}")
+        self._submit_stop(vpn=False, v2ray=True, done_message="V2Ray 已停止")
 
     # ══════════════════════════════════════════
     # 联合启停
@@ -770,8 +1379,6 @@ class MainWindow(QMainWindow):
             if not self._validate_tproxy_params():
                 return
 
-        self._refresh_buttons(starting=True)
-        tproxy_enabled = self.tproxy_checkbox.isChecked() and not IS_WINDOWS
         if not IS_WINDOWS:
             tproxy_params = self._get_tproxy_params()
             save_tproxy_config(
@@ -787,13 +1394,17 @@ class MainWindow(QMainWindow):
         xray_cfg = self.v2ray_config_path if (
             self.v2ray_config_imported and self.v2ray_config_path.exists()) else None
 
-        self._combined_worker = CombinedWorker(
-            self.openvpn_mgr, self.xray_mgr,
-            ovpn_cfg, xray_cfg, tproxy_enabled)
-        self._combined_worker.update_signal.connect(self._on_combined_update)
-        self._combined_worker.error_signal.connect(self._on_combined_error)
-        self._combined_worker.success_signal.connect(self._on_combined_started)
-        self._combined_worker.start()
+        self._submit_job(
+            start_combined_job,
+            str(ovpn_cfg) if ovpn_cfg else None,
+            str(xray_cfg) if xray_cfg else None,
+            self.vpn_pid, self.v2ray_pid,
+            openvpn_mgr=self.openvpn_mgr, xray_mgr=self.xray_mgr,
+            tproxy=self._tproxy_job_params(), perf_profile=self._perf_profile(),
+            resources=(RES_OPENVPN, RES_XRAY), name="start-combined",
+            on_progress=self._on_combined_update,
+            on_finished=self._on_combined_started,
+            on_failed=self._on_combined_error)
 
     def _on_combined_update(self, msg: str):
         if "OpenVPN" in msg:
@@ -816,6 +1427,8 @@ class MainWindow(QMainWindow):
         if v2ray_pid:
             self.v2ray_pid = v2ray_pid
             self.tproxy_active = result.get('tproxy_ok', False)
+            if result.get('runtime'):
+                self._v2ray_runtime = result['runtime']
             if IS_WINDOWS:
                 self._set_v2ray_status("✓ Xray 运行中 (TUN)", "#4CAF50")
             else:
@@ -841,32 +1454,97 @@ class MainWindow(QMainWindow):
                     " + ".join(started) + " 已启动")
 
     def _on_combined_error(self, err: str):
+        if not self.vpn_pid:
+            self._set_vpn_status("未连接", "#999")
+        if not self.v2ray_pid:
+            self._set_v2ray_status("未连接", "#999")
         self._refresh_buttons()
         QMessageBox.critical(self, "启动失败", err)
 
     def stop_combined(self):
+        if self._cancel_jobs(RES_OPENVPN, RES_XRAY):
+            return
         if not self.vpn_pid and not self.v2ray_pid:
             QMessageBox.warning(self, "警告", "没有运行中的服务")
             return
-        self.stop_all_button.setEnabled(False)
-        try:
-            if self.v2ray_pid:
-                self._set_v2ray_status("正在停止...", "#FF9800")
-                self.xray_mgr.stop()
-                self.v2ray_pid = None
-                self._set_v2ray_status("未连接", "#999")
-
-            if self.vpn_pid:
-                self._set_vpn_status("正在停止...", "#FF9800")
-                self.openvpn_mgr.stop()
-                self.vpn_pid = None
-                self._set_vpn_status("未连接", "#999")
-
-            self._refresh_buttons()
-            QMessageBox.information(self, "成功", "所有服务已停止")
-        except Exception as e:
-            self._refresh_buttons()
-            QMessageBox.critical(self, "错误", f"停止失败: {e}")
+        self._submit_stop(vpn=True, v2ray=True, done_message="所有服务已停止")
+
+    def _submit_stop(self, vpn: bool, v2ray: bool, done_message: str = "",
+                     on_done=None) -> Optional[JobHandle]:
+        """
+        在任务引擎中停止服务：两侧并行拆除，UI 线程不阻塞。
+        done_message 为空时不弹出结果提示（退出程序时使用）。
+        """
+        vpn_pid = self.vpn_pid if vpn else None
+        v2ray_pid = self.v2ray_pid if v2ray else None
+        if not vpn_pid and not v2ray_pid:
+            return None
+        resources = []
+        if vpn_pid:
+            resources.append(RES_OPENVPN)
+            self._set_vpn_status("正在停止...", "#FF9800")
+        if v2ray_pid:
+            resources.append(RES_XRAY)
+            self._set_v2ray_status("正在停止...", "#FF9800")
+        tproxy = self._tproxy_job_params() if (v2ray_pid and self.tproxy_active) else None
+
+        def _finished(result: dict):
+            self._on_stop_finished(result, done_message)
+            if on_done:
+                on_done()
+
+        def _failed(err: str):
+            self._on_stop_failed(err, done_message)
+            if on_done:
+                on_done()
+
+        return self._submit_job(
+            stop_job, vpn_pid, v2ray_pid,
+            openvpn_mgr=self.openvpn_mgr, xray_mgr=self.xray_mgr, tproxy=tproxy,
+            resources=resources, name="stop", cancellable=False,
+            on_progress=self._on_combined_update,
+            on_finished=_finished, on_failed=_failed)
+
+    def _on_stop_finished(self, result: dict, done_message: str):
+        if result.get('vpn_stopped'):
+            self.vpn_pid = None
+            self._set_vpn_status("未连接", "#999")
+        if result.get('v2ray_stopped'):
+            self.v2ray_pid = None
+            self.tproxy_active = False
+            self._set_v2ray_status("未连接", "#999")
+        self._restore_running_status()
+        self._refresh_buttons()
+
+        warnings = result.get('warnings', [])
+        if not done_message:
+            return
+        if warnings:
+            QMessageBox.warning(self, "部分停止失败",
+                "\n".join(f"• {w}" for w in warnings))
+        else:
+            QMessageBox.information(self, "成功", done_message)
+
+    def _on_stop_failed(self, err: str, done_message: str):
+        self._restore_running_status()
+        self._refresh_buttons()
+        if done_message:
+            QMessageBox.critical(self, "错误", f"停止失败: {err}")
+
+    def _restore_running_status(self):
+        """停止未成功的一侧恢复"运行中"显示。"""
+        if self.vpn_pid:
+            if IS_WINDOWS:
+                self._set_vpn_status("✓ 服务运行中 (OV2NService)", "#4CAF50")
+            else:
+                self._set_vpn_status(f"✓ 已连接 (PID: {self.vpn_pid})", "#4CAF50")
+        if self.v2ray_pid:
+            if IS_WINDOWS:
+                self._set_v2ray_status("✓ Xray 运行中 (TUN)", "#4CAF50")
+            else:
+                suffix = " + TProxy" if self.tproxy_active else ""
+                self._set_v2ray_status(
+                    f"✓ 已连接{suffix} (PID: {self.v2ray_pid})", "#4CAF50")
 
     # ══════════════════════════════════════════
     # 窗口事件
@@ -877,15 +1555,33 @@ class MainWindow(QMainWindow):
         QTimer.singleShot(100, lambda: apply_window_icon(self))
 
     def closeEvent(self, event):
-        if self.vpn_pid or self.v2ray_pid:
-            reply = QMessageBox.question(
-                self, "确认退出",
-                "服务正在运行中，确定要退出吗？\n退出将自动停止所有服务。",
-                QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
-            if reply == QMessageBox.Yes:
-                self.stop_combined()
-                event.accept()
-            else:
-                event.ignore()
-        else:
-            event.accept()
\ No newline at end of file
+        # 停止任务结束后再次进入（或停止过程中用户再次关闭窗口）：直接退出
+        if self._quitting:
+            self._engine.shutdown(timeout=1.0)
+            event.accept()
+            return
+
+        # 启动中的任务与运行中的服务同样处理：取消后要等它回滚（停止已由 pkexec 启动的进程）
+        starting = any(self._engine.is_busy(r) for r in (RES_OPENVPN, RES_XRAY))
+        if not self.vpn_pid and not self.v2ray_pid and not starting:
+            self._quitting = True
+            self._engine.shutdown(timeout=1.0)
+            event.accept()
+            return
+
+        reply = QMessageBox.question(
+            self, "确认退出",
+            "服务正在运行或启动中，确定要退出吗？\n退出将自动停止所有服务。",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            event.ignore()
+            return
+
+        # 在后台并行停止所有服务，窗口保持响应，最慢的一侧退出后立即关闭；
+        # 再次进入时 shutdown() 等待已取消任务的回滚结束
+        event.ignore()
+        self._quitting = True
+        self.centralWidget().setEnabled(False)
+        self._cancel_jobs(RES_OPENVPN, RES_XRAY)
+        if self._submit_stop(vpn=True, v2ray=True, on_done=self.close) is None:
+            QTimer.singleShot(0, self.close)
\ No newline at end of file